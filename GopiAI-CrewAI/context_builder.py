@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Построение контекста диалога для LLM на стороне сервера
+
+1. История берется из базы чатов UI (chats.db, только чтение) по session_id -
+   UI больше не пересылает историю в каждом запросе
+2. Токены считаются токенизатором tiktoken; кодировщик создается один раз,
+   результаты кэшируются по хэшу текста
+3. История упаковывается от новых сообщений к старым в бюджет модели,
+   рассчитанный по tpm/rpm из LLM_MODELS_CONFIG
+4. Не поместившиеся старые сообщения могут быть заменены кратким содержанием
+   (summarizer), которое кэшируется и пересчитывается только при сдвиге окна
+5. Найденные в долговременной памяти фрагменты (memory_service) занимают
+   отдельную часть бюджета; повторяющие историю фрагменты отбрасываются
+6. Контекст собирается один раз на запрос; fit() подрезает его под сообщение
+   каждой итерации, которое растет по мере добавления результатов инструментов
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Та же директория, что и в memory_config UI: GOPIAI_MEMORY_DIR, иначе memory/ рядом с сервером
+# на Windows и ~/.gopiai/memory на Linux/Mac; база чатов переопределяется через GOPIAI_CHATS_DB
+if os.getenv('GOPIAI_MEMORY_DIR'):
+    MEMORY_BASE_DIR = Path(os.environ['GOPIAI_MEMORY_DIR'])
+elif os.name == 'nt':  # Windows
+    MEMORY_BASE_DIR = Path(__file__).resolve().parent / "memory"
+else:  # Linux/Mac
+    MEMORY_BASE_DIR = Path.home() / ".gopiai" / "memory"
+DEFAULT_CHATS_DB_PATH = MEMORY_BASE_DIR / "chats.db"
+# Верхняя граница контекста независимо от лимитов модели
+DEFAULT_CONTEXT_MAX_TOKENS = int(os.getenv('GOPIAI_CONTEXT_MAX_TOKENS', '32000'))
+# Токены, оставляемые под ответ модели
+DEFAULT_RESPONSE_RESERVE = int(os.getenv('GOPIAI_CONTEXT_RESPONSE_RESERVE', '2048'))
+# Токены под краткое содержание старой части диалога
+SUMMARY_MAX_TOKENS = 512
+# Токены под фрагменты долговременной памяти (семантический поиск по прошлым разговорам)
+MEMORY_MAX_TOKENS = int(os.getenv('GOPIAI_MEMORY_MAX_TOKENS', '1024'))
+MEMORY_SNIPPET_MAX_TOKENS = 256
+# Сколько не поместившихся сообщений передается в summarizer
+SUMMARY_SOURCE_MAX_MESSAGES = 100
+HISTORY_PAGE_SIZE = 50
+# Префикс роли ("Human: ") и перевод строки
+MESSAGE_OVERHEAD_TOKENS = 4
+CONTEXT_ROLES = ('user', 'assistant')
+
+Summarizer = Callable[[List[Dict[str, Any]]], str]
+
+
+class TokenCounter:
+    """Подсчет токенов с кэшем; без tiktoken - оценка по байтам UTF-8"""
+
+    def __init__(self, encoding_name: Optional[str] = 'cl100k_base', cache_size: int = 4096):
+        self.encoding_name = encoding_name
+        self.cache_size = cache_size
+        self._encode = None
+        self._encoder_loaded = False
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _encoder(self):
+        if not self._encoder_loaded:
+            self._encoder_loaded = True
+            if self.encoding_name:
+                try:
+                    import tiktoken
+                    self._encode = tiktoken.get_encoding(self.encoding_name).encode
+                except Exception as e:
+                    logger.warning(f"[CONTEXT] ⚠️ Токенизатор tiktoken недоступен ({e}), используем оценку по байтам")
+        return self._encode
+
+    @property
+    def exact(self) -> bool:
+        return self._encoder() is not None
+
+    def _count(self, text: str) -> int:
+        encode = self._encoder()
+        if encode is not None:
+            return len(encode(text, disallowed_special=()))
+        # ~4 байта UTF-8 на токен: для кириллицы это ~2 символа, для латиницы ~4
+        return math.ceil(len(text.encode('utf-8')) / 4)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        tokens = self._count(text)
+        with self._lock:
+            self._cache[key] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+
+class ChatHistoryStore:
+    """
+    Чтение истории чатов из базы UI (chats.db) в режиме только для чтения
+
+    Соединение открывается на каждый поток и процесс, как в SQLiteTaskStore.
+    """
+
+    def __init__(self, db_path=DEFAULT_CHATS_DB_PATH):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            if not self.db_path.exists():
+                return None
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=5)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def iter_recent(self, session_id: str, page_size: int = HISTORY_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """Сообщения сессии от новых к старым; читаются страницами по мере потребления"""
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"[CONTEXT] Не удалось открыть историю чатов {self.db_path}: {e}")
+            return
+        if conn is None:
+            return
+        cursor = None
+        while True:
+            query = "SELECT seq, id, role, content, timestamp FROM messages WHERE session_id = ?"
+            params: List[Any] = [str(session_id)]
+            if cursor is not None:
+                query += " AND (timestamp < ? OR (timestamp = ? AND seq < ?))"
+                params += [cursor[0], cursor[0], cursor[1]]
+            query += " ORDER BY timestamp DESC, seq DESC LIMIT ?"
+            try:
+                rows = conn.execute(query, params + [page_size]).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"[CONTEXT] Ошибка чтения истории сессии {session_id}: {e}")
+                return
+            for seq, message_id, role, content, timestamp in rows:
+                yield {'id': message_id, 'role': role, 'content': content or '', 'timestamp': timestamp}
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1][4], rows[-1][0])
+
+    def has_session(self, session_id: str) -> bool:
+        return next(self.iter_recent(session_id, page_size=1), None) is not None
+
+
+def get_context_budget(model_id: Optional[str], models_config: Iterable[Dict[str, Any]],
+                       max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS) -> int:
+    """
+    Бюджет контекста модели в токенах
+
+    Берется доля минутного лимита tpm на один запрос (tpm / rpm), но не больше max_tokens.
+    """
+    if model_id:
+        short_id = model_id.split('/', 1)[-1]
+        for model in models_config:
+            if model.get('id') in (model_id, short_id) or model.get('id', '').split('/', 1)[-1] == short_id:
+                tpm = model.get('tpm')
+                if tpm:
+                    return min(max_tokens, int(tpm / max(model.get('rpm') or 1, 1)))
+                break
+    return max_tokens
+
+
+def _message_key(message: Dict[str, Any]) -> str:
+    if message.get('id'):
+        return str(message['id'])
+    raw = f"{message.get('timestamp', '')}\x00{message.get('role', '')}\x00{message.get('content', '')}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ContextBuilder:
+    """Упаковывает историю сессии в бюджет модели"""
+
+    def __init__(self, history_store: Optional[ChatHistoryStore], models_config: Iterable[Dict[str, Any]],
+                 token_counter: Optional[TokenCounter] = None, summarizer: Optional[Summarizer] = None,
+                 max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS, response_reserve: int = DEFAULT_RESPONSE_RESERVE,
+                 summary_cache_size: int = 256):
+        self.history_store = history_store
+        self.models_config = list(models_config)
+        self.tokens = token_counter or TokenCounter()
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.response_reserve = response_reserve
+        self.summary_cache_size = summary_cache_size
+        self._summaries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _history(self, session_id: Optional[str], fallback_history: Optional[List[Dict[str, Any]]]):
+        """История от новых к старым: из базы чатов, иначе из присланной клиентом (старые версии UI)"""
+        if session_id and self.history_store is not None and self.history_store.has_session(session_id):
+            return self.history_store.iter_recent(session_id), 'store'
+        return reversed(fallback_history or []), 'request'
+
+    def build(self, session_id: Optional[str], message: str, model_id: Optional[str] = None,
+              reserved_tokens: int = 0, fallback_history: Optional[List[Dict[str, Any]]] = None,
+              memories: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Собирает контекст для запроса
+
+        reserved_tokens - токены, уже занятые системным промптом и инструкциями.
+        memories - фрагменты долговременной памяти (text, role), лучшие первыми.
+        Returns:
+            dict: messages (по времени), summary, memories, tokens, budget, truncated, source
+        """
+        budget = get_context_budget(model_id, self.models_config, self.max_tokens)
+        available = budget - self.response_reserve - reserved_tokens - self.tokens.count(message)
+        if self.summarizer is not None:
+            available -= SUMMARY_MAX_TOKENS
+        memories, memory_tokens = self._fit_memories(memories or [], message, min(MEMORY_MAX_TOKENS, available // 4))
+        available -= memory_tokens
+
+        history, source = self._history(session_id, fallback_history)
+        packed: List[Dict[str, str]] = []
+        dropped: List[Dict[str, Any]] = []
+        used = 0
+        skipped_current = False
+        for entry in history:
+            role = entry.get('role')
+            content = entry.get('content') or ''
+            if role not in CONTEXT_ROLES or not content:
+                continue
+            # UI сохраняет сообщение пользователя в историю до отправки запроса
+            if not skipped_current and not packed and role == 'user' and content == message:
+                skipped_current = True
+                continue
+            if dropped:
+                dropped.append(entry)
+                if len(dropped) >= SUMMARY_SOURCE_MAX_MESSAGES or self.summarizer is None:
+                    break
+                continue
+            cost = self.tokens.count(content) + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > available:
+                dropped.append(entry)
+                if self.summarizer is None:
+                    break
+                continue
+            packed.append({'role': role, 'content': content})
+            used += cost
+        packed.reverse()
+
+        if memories:
+            # Фрагменты, уже попавшие в историю, не дублируем
+            packed_texts = {entry['content'].strip() for entry in packed}
+            memories = [memory for memory in memories if memory['text'] not in packed_texts]
+            used += sum(memory['tokens'] for memory in memories)
+
+        summary = None
+        if dropped and self.summarizer is not None:
+            dropped.reverse()
+            summary = self._summarize(session_id, dropped)
+            if summary:
+                used += self.tokens.count(summary) + MESSAGE_OVERHEAD_TOKENS
+
+        logger.debug(
+            f"[CONTEXT] Сессия {session_id}: {len(packed)} сообщений ({source}), {used}/{budget} токенов, "
+            f"обрезано: {bool(dropped)}"
+        )
+        return {
+            'messages': packed,
+            'summary': summary,
+            'memories': [{'role': memory['role'], 'text': memory['text']} for memory in memories],
+            'tokens': used,
+            'budget': budget,
+            'truncated': bool(dropped),
+            'source': source,
+        }
+
+    def fit(self, context: Dict[str, Any], message: str, reserved_tokens: int = 0) -> Dict[str, Any]:
+        """
+        Подрезает собранный build() контекст, чтобы он поместился в бюджет вместе с message
+
+        Сначала убираются самые старые сообщения истории, затем худшие фрагменты памяти,
+        затем краткое содержание. Если контекст и так помещается, возвращается он же.
+        """
+        overflow = (context['tokens'] + reserved_tokens + self.response_reserve
+                    + self.tokens.count(message) - context['budget'])
+        if overflow <= 0:
+            return context
+
+        messages = list(context['messages'])
+        memories = list(context['memories'])
+        summary = context['summary']
+        used = context['tokens']
+        while overflow > 0 and messages:
+            cost = self.tokens.count(messages.pop(0)['content']) + MESSAGE_OVERHEAD_TOKENS
+            overflow -= cost
+            used -= cost
+        while overflow > 0 and memories:
+            cost = self.tokens.count(memories.pop()['text']) + MESSAGE_OVERHEAD_TOKENS
+            overflow -= cost
+            used -= cost
+        if overflow > 0 and summary:
+            cost = self.tokens.count(summary) + MESSAGE_OVERHEAD_TOKENS
+            overflow -= cost
+            used -= cost
+            summary = None
+
+        logger.debug(
+            f"[CONTEXT] Контекст подрезан под сообщение: {len(context['messages'])} -> {len(messages)} сообщений, "
+            f"{used}/{context['budget']} токенов"
+        )
+        return {**context, 'messages': messages, 'memories': memories, 'summary': summary,
+                'tokens': max(used, 0), 'truncated': True}
+
+    def _fit_memories(self, memories: List[Dict[str, Any]], message: str, limit: int):
+        """Отбирает фрагменты памяти в пределах limit токенов; длинные фрагменты обрезаются"""
+        fitted, used = [], 0
+        for memory in memories:
+            text = (memory.get('text') or '').strip()
+            if not text or text == message:
+                continue
+            tokens = self.tokens.count(text)
+            if tokens > MEMORY_SNIPPET_MAX_TOKENS:
+                text = text[:int(len(text) * MEMORY_SNIPPET_MAX_TOKENS / tokens)] + '…'
+                tokens = self.tokens.count(text)
+            cost = tokens + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > limit:
+                break
+            fitted.append({'role': memory.get('role'), 'text': text, 'tokens': cost})
+            used += cost
+        return fitted, used
+
+    def _summarize(self, session_id: Optional[str], messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Краткое содержание старой части диалога; кэшируется по последнему не поместившемуся сообщению"""
+        key = (session_id, _message_key(messages[-1]), len(messages))
+        with self._lock:
+            cached = self._summaries.get(key)
+            if cached is not None:
+                self._summaries.move_to_end(key)
+                return cached
+        try:
+            summary = (self.summarizer(messages) or '').strip()
+        except Exception as e:
+            logger.warning(f"[CONTEXT] ⚠️ Не удалось получить краткое содержание истории: {e}")
+            return None
+        if self.tokens.count(summary) > SUMMARY_MAX_TOKENS:
+            # Грубая обрезка по доле символов, если модель не уложилась в лимит
+            ratio = SUMMARY_MAX_TOKENS / self.tokens.count(summary)
+            summary = summary[:int(len(summary) * ratio)]
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.summary_cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+
+def format_prompt(system_prompt: str, context: Dict[str, Any], message: str) -> str:
+    """Формирует текстовый промпт (System/Human/Assistant) из контекста и текущего сообщения"""
+    parts = [f"System: {system_prompt}\n"]
+    if context.get('summary'):
+        parts.append(f"System: Краткое содержание предыдущей части разговора: {context['summary']}\n")
+    if context.get('memories'):
+        snippets = '\n'.join(
+            f"- ({'пользователь' if memory['role'] == 'user' else 'ассистент'}) {memory['text']}"
+            for memory in context['memories']
+        )
+        parts.append(f"System: Релевантные фрагменты прошлых разговоров:\n{snippets}\n")
+    for entry in context.get('messages', []):
+        prefix = 'Human' if entry['role'] == 'user' else 'Assistant'
+        parts.append(f"{prefix}: {entry['content']}\n")
+    parts.append(f"Human: {message}\n")
+    return ''.join(parts)
@@ -1,6 +1,8 @@
 # --- START OF FILE crewai_api_server.py (ИСПРАВЛЕННАЯ ВЕРСИЯ) ---
 
 # Standard library imports
+import atexit
+import json
 import logging
 import os
 import re
@@ -8,9 +10,7 @@ import subprocess
 import time
 import traceback
 import uuid
-from enum import Enum, auto
 from pathlib import Path
-from threading import Thread
 
 # Third-party imports
 from crewai import Agent, Crew, Task
@@ -19,7 +19,7 @@ from crewai_tools import TavilySearchTool, WebsiteSearchTool
 # или используется ваша локальная версия, если она необходима.
 # Для простоты предположим, что все поисковые инструменты из crewai_tools.
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from langchain_core.messages import (
     AIMessage, HumanMessage, SystemMessage
@@ -40,8 +40,15 @@ from iterative_execution_system import (
     IterativeExecutor, process_message_iteratively
 )
 from llm_rotation_config import (
-    select_llm_model_safe, rate_limit_monitor, get_api_key_for_provider
+    LLM_MODELS_CONFIG, select_llm_model_safe, rate_limit_monitor, model_router, get_api_key_for_provider
 )
+from task_engine import (
+    TaskStatus, TaskQueueFullError, TokenEventBuffer, create_task_engine
+)
+from llm_pool import LLMPool, run_startup_validation
+from llm_hedging import HedgedLLMCaller, hedging_enabled
+from context_builder import DEFAULT_CHATS_DB_PATH, ChatHistoryStore, ContextBuilder, format_prompt
+from memory_service import MemoryService
 
 
 # --- НАЧАЛО ВАЖНОГО БЛОКА ---
@@ -54,12 +61,6 @@ else:
     print(f"[ERROR] Файл .env не найден по пути: {env_path}")
 # --- КОНЕЦ ВАЖНОГО БЛОКА ---
 
-class TaskStatus(Enum): # Изменено: убрано str, добавлено Enum
-    PENDING = auto()
-    PROCESSING = auto()
-    COMPLETED = auto()
-    FAILED = auto()
-
 # Настройка читаемого логирования для CrewAI сервера
 # Логи переносим в $HOME/.gopiai/logs с гарантированным созданием каталога.
 _LOG_DIR = Path.home() / ".gopiai" / "logs"
@@ -103,8 +104,10 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# Глобальное хранилище задач
-tasks_storage = {}
+# Пул воркеров и межпроцессное хранилище задач (SQLite по умолчанию,
+# поэтому /api/tasks/<id> консистентен между воркерами gunicorn)
+task_engine = create_task_engine()
+task_store = task_engine.store
 
 # Состояние UI для синхронизации с model_selector_widget
 ui_state = {
@@ -154,6 +157,15 @@ def execute_terminal_command(command: str) -> str:
     except Exception as e:
         return f"Ошибка выполнения команды '{command}': {str(e)}"
 
+# Пул экземпляров LLM: один объект на (provider, model, temperature) вместо нового на каждый запрос
+# Таймаут HTTP запроса к провайдеру: по его истечении litellm закрывает соединение,
+# поэтому отмененный по таймауту вызов не продолжает тратить квоту
+LLM_REQUEST_TIMEOUT = float(os.getenv('GOPIAI_LLM_REQUEST_TIMEOUT', '45'))
+llm_pool = LLMPool(
+    lambda model, temperature: LLM(model=model, temperature=temperature, timeout=LLM_REQUEST_TIMEOUT),
+    max_size=int(os.getenv('GOPIAI_LLM_POOL_SIZE', '16'))
+)
+
 # Функция для создания LLM динамически
 def create_llm(provider="gemini", model=None, temperature=0.7):
     """
@@ -184,12 +196,11 @@ def create_llm(provider="gemini", model=None, temperature=0.7):
         
         # Попробуем сначала использовать запрашиваемую модель
         try:
-            # Создаем LLM с указанными параметрами
-            llm = LLM(
-                model=normalized_model,
-                temperature=temperature
-            )
-            logger.debug(f"✅ LLM создан успешно: {normalized_model}")
+            if not llm_pool.is_healthy(normalized_model):
+                raise Exception(f"модель {normalized_model} временно помечена нездоровой")
+            # Берем LLM из пула (создается только при первом обращении)
+            llm = llm_pool.get(provider, normalized_model, temperature)
+            logger.debug(f"✅ LLM получен из пула: {normalized_model}")
             return llm
             
         except Exception as model_error:
@@ -209,11 +220,8 @@ def create_llm(provider="gemini", model=None, temperature=0.7):
                 if alternative_model:
                     logger.info(f"🎯 Система ротации предложила модель: {alternative_model}")
                     
-                    # Создаем LLM с альтернативной моделью
-                    llm = LLM(
-                        model=alternative_model,
-                        temperature=temperature
-                    )
+                    # Берем LLM с альтернативной моделью из пула
+                    llm = llm_pool.get(provider, alternative_model, temperature)
                     
                     # Отмечаем использование модели в мониторе
                     rate_limit_monitor.register_use(alternative_model, tokens=0)
@@ -238,36 +246,183 @@ def create_llm(provider="gemini", model=None, temperature=0.7):
             if not fallback_model.startswith("gemini/"):
                 fallback_model = f"gemini/{fallback_model}" if fallback_model.startswith("gemini-") else f"gemini/{fallback_model}"
             
-            fallback_llm = LLM(
-                model=fallback_model,
-                temperature=temperature
-            )
-            return fallback_llm
+            return llm_pool.get(provider, fallback_model, temperature)
         else:
             raise Exception("Нет доступных моделей для fallback")
     except Exception as fallback_error:
         logger.error(f"❌ Критическая ошибка: нет доступных моделей: {fallback_error}")
         raise
 
-# Проверка доступности API ключей при старте
-try:
-    logger.info("🔧 Проверка доступности API...")
-    logger.debug(f"DEBUG: GEMINI_API_KEY начинается с: {os.getenv('GEMINI_API_KEY', 'НЕТ')[:10]}...")
-    
-    # Создаем LLM для тестирования соединения (автоматический выбор)
-    test_llm = create_llm("gemini")
-    logger.info("✅ Проверка API прошла успешно")
+class LLMCallCancelled(Exception):
+    """Вызов LLM отменен (например, по таймауту итеративного исполнителя)"""
+
+
+def call_llm(llm, prompt, on_token=None, cancel_event=None):
+    """
+    Вызывает LLM; если передан on_token - в потоковом режиме через litellm
+
+    Токены передаются в on_token по мере поступления, возвращается полный ответ.
+    Если выставлен cancel_event, чтение потока прекращается и HTTP ответ закрывается.
+    Потоковый вызов использует те же параметры модели (ключ, endpoint, max_tokens)
+    и общий keep-alive клиент пула. Без on_token (и если потоковый вызов создать
+    не удалось) используется llm.call() пула с его настройками; cancel_event тогда проверяется только перед вызовом, а сам вызов
+    ограничен таймаутом LLM_REQUEST_TIMEOUT.
+    Время ответа и ошибки записываются в model_router для выбора моделей.
+    """
+    model_id = getattr(llm, 'model', None)
+    started = time.monotonic()
+    try:
+        response = _call_llm(llm, prompt, on_token, cancel_event)
+    except LLMCallCancelled:
+        raise
+    except Exception as e:
+        if model_id:
+            model_router.record_failure(model_id, str(e))
+        raise
+    if model_id:
+        model_router.record_success(model_id, time.monotonic() - started)
+        llm_pool.mark_healthy(model_id)
+    return response
+
+# Атрибуты crewai.LLM, которые он сам передает в litellm.completion
+LLM_COMPLETION_ATTRS = (
+    'temperature', 'top_p', 'n', 'stop', 'max_tokens', 'max_completion_tokens', 'presence_penalty',
+    'frequency_penalty', 'seed', 'timeout', 'api_key', 'base_url', 'api_base', 'api_version',
+)
+
+def _completion_params(llm, prompt):
+    """
+    Параметры потокового litellm.completion с теми же настройками, что у llm.call()
+
+    Берутся из самого LLM (_prepare_completion_params в crewai), а в старых версиях -
+    из его атрибутов: ключ, endpoint и max_tokens модели не теряются в потоковом режиме.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    params = None
+    prepare = getattr(llm, '_prepare_completion_params', None)
+    if prepare is not None:
+        try:
+            params = dict(prepare(messages))
+        except Exception as e:
+            logger.debug(f"DEBUG: _prepare_completion_params недоступен ({e}), берем атрибуты LLM")
+    if not params:
+        params = {'model': llm.model, 'messages': messages,
+                  **{name: getattr(llm, name, None) for name in LLM_COMPLETION_ATTRS}}
+    params = {name: value for name, value in params.items() if value is not None}
+    params.setdefault('timeout', LLM_REQUEST_TIMEOUT)
+    params['stream'] = True
+    return params
+
+def _call_llm(llm, prompt, on_token, cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise LLMCallCancelled(f"Вызов {getattr(llm, 'model', None)} отменен до начала")
+    if on_token is None or not isinstance(prompt, str):
+        return llm.call(prompt)
+    try:
+        import litellm
+        # Общий keep-alive клиент пула, как у llm.call()
+        llm_pool.ensure_http_client()
+        stream = litellm.completion(**_completion_params(llm, prompt))
+    except ImportError as e:
+        logger.debug(f"DEBUG: Потоковый режим недоступен ({e}), используем обычный вызов")
+        return llm.call(prompt)
     
-except Exception as e:
-    logger.error(f"❌ Ошибка проверки API: {e}")
-    logger.error("🔍 Проверьте GEMINI_API_KEY в .env файле")
-    exit(1)
+    chunks = []
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise LLMCallCancelled(f"Вызов {llm.model} отменен")
+            choices = getattr(chunk, 'choices', None)
+            delta = choices[0].delta.content if choices else None
+            if delta:
+                chunks.append(delta)
+                if on_token is not None:
+                    on_token(delta)
+    finally:
+        # Закрываем HTTP ответ, если поток не дочитан (отмена или ошибка)
+        close = getattr(getattr(stream, 'completion_stream', None), 'close', None) or getattr(stream, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+    return ''.join(chunks)
+
+# Дублирование медленных запросов на запасную модель (включается флагом 'hedge' или GOPIAI_LLM_HEDGING)
+llm_hedger = HedgedLLMCaller(
+    call_llm,
+    lambda provider, model, temperature: llm_pool.get(provider, model, temperature),
+    model_router,
+    rate_limit_monitor
+)
+
+# Сколько символов старой части диалога передается модели для краткого содержания
+SUMMARY_SOURCE_MAX_CHARS = 24000
+
+def summarize_history(messages):
+    """Краткое содержание старой части диалога, не поместившейся в бюджет контекста"""
+    transcript = "\n".join(
+        f"{'Human' if m.get('role') == 'user' else 'Assistant'}: {m.get('content', '')}" for m in messages
+    )[-SUMMARY_SOURCE_MAX_CHARS:]
+    prompt = (
+        "Кратко (не более 200 слов) перескажи ключевые факты, решения и договоренности из этого диалога. "
+        "Отвечай на языке диалога.\n\n" + transcript
+    )
+    llm = create_llm("gemini", select_llm_model_safe("summarize"), 0.2)
+    return str(call_llm(llm, prompt))
+
+# Контекст диалога собирается на сервере: история берется из базы чатов UI по session_id
+# и упаковывается в бюджет модели (GOPIAI_CONTEXT_SUMMARIZE=1 - краткое содержание старых сообщений)
+context_builder = ContextBuilder(
+    ChatHistoryStore(os.getenv('GOPIAI_CHATS_DB', str(DEFAULT_CHATS_DB_PATH))),
+    LLM_MODELS_CONFIG,
+    summarizer=summarize_history if os.getenv('GOPIAI_CONTEXT_SUMMARIZE', '0') == '1' else None
+)
+
+# Долговременная память: сообщения индексируются в фоне, релевантные фрагменты
+# прошлых разговоров добавляются в контекст (GOPIAI_MEMORY_ENABLED=1 - включить).
+# Фоновый поток стартует при первом обращении в каждом воркере (preload_app + fork),
+# и каждый воркер загружает свою модель эмбеддингов и индекс - поэтому память выключена
+# по умолчанию; при включении под gunicorn стоит уменьшить число воркеров.
+memory_service = None
+if os.getenv('GOPIAI_MEMORY_ENABLED', '0') == '1':
+    memory_service = MemoryService()
+    atexit.register(memory_service.stop)
+
+# Проверка доступности API ключей - в фоне, чтобы не задерживать запуск воркера.
+# Поток запускается при первом запросе в каждом процессе: при preload_app модуль импортируется
+# в мастере gunicorn, а потоки и keep-alive соединения мастера не переживают fork().
+# Результат доступен в /api/health (llm_validation), сервер больше не завершается при ошибке.
+logger.debug(f"DEBUG: GEMINI_API_KEY начинается с: {os.getenv('GEMINI_API_KEY', 'НЕТ')[:10]}...")
+LLM_VALIDATION_TIMEOUT = float(os.getenv('GOPIAI_LLM_VALIDATION_TIMEOUT', '15'))
+
+def validate_llm_access():
+    """Минимальный реальный запрос к провайдеру (1 токен ответа): проверяет ключ и доступность API"""
+    import litellm
+    llm = create_llm("gemini")
+    litellm.completion(
+        model=llm.model,
+        messages=[{"role": "user", "content": "ping"}],
+        max_tokens=1,
+        timeout=LLM_VALIDATION_TIMEOUT
+    )
+    llm_pool.mark_healthy(llm.model)
+
+llm_validation_state = {'status': 'not_started', 'error': None, 'checked_at': None, 'pid': None}
+
+@app.before_request
+def start_llm_validation():
+    """Запускает фоновую проверку API в текущем процессе (один раз на процесс)"""
+    if run_startup_validation(validate_llm_access, llm_validation_state):
+        logger.info(f"🔧 Проверка доступности API (в фоне, pid {os.getpid()})...")
 
 # Response Refinement Service будет создаваться динамически при необходимости
 logger.info("🔄 Response Refinement Service настроен для динамического создания")
 refinement_service = None  # Будет создаваться по запросу
 
-# Shared store для pending команд с thread-safe access
+# Shared store для pending команд с thread-safe access.
+# Хранилище и ожидание подтверждения живут в памяти процесса: под gunicorn подтверждения
+# работают только с одним воркером (по умолчанию в gunicorn_config.py)
 import threading
 pending_commands_store = {}
 pending_commands_lock = threading.Lock()
@@ -366,8 +521,7 @@ def execute_crew_task(task_data):
         logger.info(f"🎯 Начинаем выполнение задачи {task_id}")
         
         # Обновляем статус задачи
-        tasks_storage[task_id]['status'] = TaskStatus.PROCESSING
-        tasks_storage[task_id]['progress'] = 'Инициализация агентов...'
+        task_store.update(task_id, status=TaskStatus.PROCESSING, progress='Инициализация агентов...')
         
         # Создание агентов
         logger.info("👥 Создание команды агентов...")
@@ -385,7 +539,7 @@ def execute_crew_task(task_data):
         )
         
         # Обновляем прогресс
-        tasks_storage[task_id]['progress'] = 'Создание задач...'
+        task_store.update(task_id, progress='Создание задач...')
         
         # Создание задач
         logger.info("📋 Создание задач для команды...")
@@ -403,7 +557,7 @@ def execute_crew_task(task_data):
         )
         
         # Обновляем прогресс
-        tasks_storage[task_id]['progress'] = 'Запуск команды...'
+        task_store.update(task_id, progress='Запуск команды...')
         
         # Создание и запуск команды
         logger.info("🚀 Запуск команды CrewAI...")
@@ -416,17 +570,20 @@ def execute_crew_task(task_data):
         
         # Выполнение задач
         logger.info("⚡ Команда начинает работу...")
-        tasks_storage[task_id]['progress'] = 'Выполнение задач...'
+        task_store.update(task_id, progress='Выполнение задач...')
         
         result = crew.kickoff()
         
         # Сохраняем результат
         logger.info(f"✅ Задача {task_id} успешно выполнена")
         
-        tasks_storage[task_id]['status'] = TaskStatus.COMPLETED
-        tasks_storage[task_id]['result'] = str(result)
-        tasks_storage[task_id]['progress'] = 'Завершено'
-        tasks_storage[task_id]['completed_at'] = time.time()
+        task_store.update(
+            task_id,
+            status=TaskStatus.COMPLETED,
+            result=str(result),
+            progress='Завершено',
+            completed_at=time.time()
+        )
         
         logger.info(f"📊 Результат сохранен для задачи {task_id}")
         
@@ -434,9 +591,7 @@ def execute_crew_task(task_data):
         logger.error(f"❌ Ошибка выполнения задачи {task_id}: {e}")
         logger.error(f"🔍 Полная трассировка: {traceback.format_exc()}")
         
-        tasks_storage[task_id]['status'] = TaskStatus.FAILED
-        tasks_storage[task_id]['error'] = str(e)
-        tasks_storage[task_id]['progress'] = f'Ошибка: {str(e)}'
+        task_store.update(task_id, status=TaskStatus.FAILED, error=str(e), progress=f'Ошибка: {str(e)}')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -445,48 +600,78 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'CrewAI API Server',
-        'timestamp': time.time()
+        'timestamp': time.time(),
+        'llm_validation': llm_validation_state,
+        'llm_pool': llm_pool.get_stats(),
+        'memory': memory_service.get_stats() if memory_service else {'enabled': False}
     })
 
 
-# ВАЖНО: Привязываем инструменты к LLM
-if llm and all_tools:
-    llm_with_tools = llm.bind_tools(all_tools)
-    logger.info("✅ Инструменты успешно привязаны к LLM")
-else:
-    llm_with_tools = llm # Работаем без инструментов, если что-то пошло не так
-    logger.warning("⚠️ LLM или инструменты не были инициализированы. Работаем без привязки инструментов.")
-
-
 # --- Основной эндпоинт для обработки сообщений ---
 @app.route('/api/process', methods=['POST'])
 def process_message():
-    if not llm_with_tools:
-        return jsonify({'error': 'LLM не инициализирован, проверьте логи сервера'}), 503
-
-    data = request.get_json()
-    message_text = data.get('message', '')
-    if not message_text:
-        return jsonify({'error': 'Сообщение не может быть пустым'}), 400
-
-    # ВАЖНО: Упрощенный вызов для демонстрации
-    # Создаем агента "на лету" для выполнения задачи
-    # В полноценной системе здесь была бы более сложная логика
-    assistant_agent = Agent(
-        role='Многофункциональный ассистент',
-        goal='Точно и полно отвечать на запросы пользователя, используя все доступные инструменты.',
-        backstory='Вы - продвинутый ИИ-ассистент, способный искать информацию в интернете, работать с файловой системой и выполнять команды в терминале для решения задач пользователя.',
-        llm=llm_with_tools, # Передаем LLM с привязанными инструментами
-        tools=all_tools,    # И сами инструменты
-        verbose=True,
-        allow_delegation=False
-    )
-
-    task = Task(
-        description=f"Ответь на следующий запрос от пользователя: '{message_text}'",
-        agent=assistant_agent,
-        expected_output="Полный и исчерпывающий ответ на запрос пользователя."
-    )
+    """Принимает сообщение и ставит его обработку в пул задач"""
+    try:
+        logger.debug("💬 Запрос на обработку сообщения")
+        logger.debug(f"DEBUG: Получен request.json: {request.json}")
+        
+        if not request.json:
+            logger.error("DEBUG: Отсутствует JSON данные в запросе")
+            return jsonify({'error': 'Отсутствует JSON данные'}), 400
+            
+        message = request.json.get('message', '')
+        session_id = request.json.get('session_id', str(uuid.uuid4()))
+        provider = request.json.get('provider', 'gemini')
+        # UI отправляет 'model_id', но также поддерживаем 'model' для обратной совместимости
+        # Получаем модель из запроса или выбираем динамически
+        model = request.json.get('model_id') or request.json.get('model')
+        if not model:
+            from llm_rotation_config import select_llm_model_safe
+            model = select_llm_model_safe("dialog") or "gemini/gemini-1.5-flash"
+        
+        logger.debug(f"DEBUG: Извлеченные данные - message: '{message[:100]}...', session_id: {session_id}, provider: {provider}, model: {model}")
+        
+        if not message:
+            logger.error("DEBUG: Сообщение пустое")
+            return jsonify({'error': 'Сообщение не может быть пустым'}), 400
+        
+        # Создаем задачу обработки
+        task_id = str(uuid.uuid4())
+        task_data = {
+            'task_id': task_id,
+            'session_id': session_id,
+            'description': f'Обработка сообщения: {message[:50]}...' if len(message) > 50 else message,
+            'status': TaskStatus.PENDING,
+            'progress': 0,
+            'created_at': time.time(),
+            'message': message
+        }
+        
+        # Ставим обработку в ограниченный пул воркеров
+        try:
+            task_engine.submit(task_data, process_message_async, request.json)
+        except TaskQueueFullError as queue_error:
+            logger.warning(f"⏳ Очередь задач переполнена ({queue_error.depth}/{queue_error.limit}), отклоняем запрос")
+            response = jsonify({
+                'error': 'Сервер перегружен, повторите запрос позже',
+                'queue_depth': queue_error.depth,
+                'queue_limit': queue_error.limit
+            })
+            response.headers['Retry-After'] = str(queue_error.retry_after)
+            return response, 429
+        
+        logger.info(f"📝 Создана задача обработки сообщения: {task_id}")
+        
+        return jsonify({
+            'task_id': task_id,
+            'session_id': session_id,
+            'status': 'processing',
+            'message': 'Сообщение принято к обработке'
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Ошибка выполнения Crew: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/iterate', methods=['POST'])
 def iterate_execution():
@@ -826,75 +1011,15 @@ def get_agents():
         logger.error(f"❌ Ошибка получения списка агентов: {e}")
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
-    # Для простоты примера, мы вернем ответ сразу, но в идеале
-    # нужно использовать систему задач, как у вас уже было
-    try:
-        logger.debug("💬 Запрос на обработку сообщения")
-        logger.debug(f"DEBUG: Получен request.json: {request.json}")
-        
-        if not request.json:
-            logger.error("DEBUG: Отсутствует JSON данные в запросе")
-            return jsonify({'error': 'Отсутствует JSON данные'}), 400
-            
-        message = request.json.get('message', '')
-        session_id = request.json.get('session_id', str(uuid.uuid4()))
-        provider = request.json.get('provider', 'gemini')
-        # UI отправляет 'model_id', но также поддерживаем 'model' для обратной совместимости
-        # Получаем модель из запроса или выбираем динамически
-        model = request.json.get('model_id') or request.json.get('model')
-        if not model:
-            from llm_rotation_config import select_llm_model_safe
-            model = select_llm_model_safe("dialog") or "gemini/gemini-1.5-flash"
-        
-        logger.debug(f"DEBUG: Извлеченные данные - message: '{message[:100]}...', session_id: {session_id}, provider: {provider}, model: {model}")
-        
-        if not message:
-            logger.error("DEBUG: Сообщение пустое")
-            return jsonify({'error': 'Сообщение не может быть пустым'}), 400
-        
-        # Создаем задачу обработки
-        task_id = str(uuid.uuid4())
-        task_data = {
-            'task_id': task_id,
-            'session_id': session_id,
-            'description': f'Обработка сообщения: {message[:50]}...' if len(message) > 50 else message,
-            'status': TaskStatus.PENDING,
-            'progress': 0,
-            'created_at': time.time(),
-            'message': message
-        }
-        
-        tasks_storage[task_id] = task_data
-        
-        logger.info(f"📝 Создана задача обработки сообщения: {task_id}")
-        
-        # Запускаем обработку в отдельном потоке
-        thread = Thread(target=process_message_async, args=(task_id, request.json))
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({
-            'task_id': task_id,
-            'session_id': session_id,
-            'status': 'processing',
-            'message': 'Сообщение принято к обработке'
-        }), 202
-        
-    except Exception as e:
-        logger.error(f"Ошибка выполнения Crew: {traceback.format_exc()}")
-        return jsonify({'error': str(e)}), 500
-
 def process_message_async(task_id, request_data):
     """Асинхронная обработка сообщения с использованием Gemini LLM"""
     try:
         logger.debug(f"DEBUG: Входим в process_message_async для task_id: {task_id}")
-        task = tasks_storage.get(task_id)
-        if not task:
+        if not task_store.update(task_id, status=TaskStatus.PROCESSING, progress=10):
             logger.error(f"DEBUG: Задача {task_id} не найдена в хранилище")
             return
+        task_store.publish_event(task_id, 'progress', {'progress': 10})
             
-        task['status'] = TaskStatus.PROCESSING
-        task['progress'] = 10
         logger.debug(f"DEBUG: Статус задачи {task_id} изменен на PROCESSING")
         
         logger.info(f"🔄 Начата обработка задачи {task_id}")
@@ -902,9 +1027,18 @@ def process_message_async(task_id, request_data):
         # Извлекаем данные из запроса
         message = request_data.get('message', '')
         metadata = request_data.get('metadata', {})
+        # Старые версии UI присылают историю в metadata; новые - только session_id
         chat_history = metadata.get('chat_history', [])
+        session_id = metadata.get('session_id')
         
-        logger.debug(f"DEBUG: Получена chat_history с {len(chat_history)} сообщениями")
+        logger.debug(f"DEBUG: Сессия {session_id}, chat_history в запросе: {len(chat_history)} сообщений")
+        answered = False
+        
+        # События итераций и инструментов всегда пишутся в журнал задачи;
+        # токены LLM - только если клиент запросил потоковый режим
+        def publish_iteration_event(event, data):
+            task_store.publish_event(task_id, event, data)
+        token_buffer = TokenEventBuffer(task_store, task_id) if request_data.get('stream') else None
         
         # Используем итеративную систему выполнения для обработки сообщения и выполнения tool_code блоков
         logger.info(f"🤖 Запуск итеративного выполнения для: '{message[:50]}{'...' if len(message) > 50 else ''}'")
@@ -913,38 +1047,60 @@ def process_message_async(task_id, request_data):
         try:
             # Создаем LLM client adapter для итеративного исполнителя
             class CrewAILLMAdapter:
-                def __init__(self, llm, provider='gemini', temperature=0.7):
+                def __init__(self, llm, provider='gemini', temperature=0.7, on_token=None):
                     self.llm = llm
                     self.provider = provider
+                    self.on_token = on_token
                     self.temperature = temperature
                     self.original_model = getattr(llm, 'model', None)
+                    # Дублирование не используется в потоковом режиме: токены двух моделей смешались бы
+                    self.hedge = hedging_enabled(request_data)
+                    self._system_prompt = None
+                    self._context = None
+                    self._reserved_tokens = 0
                     logger.debug(f"DEBUG: Создан CrewAI LLM адаптер с моделью: {self.original_model}")
                 
-                def generate_response(self, message_text, metadata):
-                    try:
-                        logger.debug("DEBUG: Получение системного промпта для итеративного выполнения")
+                def _get_context(self):
+                    """Системный промпт и история собираются один раз на запрос, а не на каждую итерацию (см. fit)"""
+                    if self._context is None:
                         from tools.gopiai_integration.system_prompts import get_iterative_execution_prompt
-                        system_prompt = get_iterative_execution_prompt()
-                        logger.debug(f"DEBUG: Системный промпт получен: {system_prompt[:100]}...")
-                        
-                        # Формируем полное сообщение с системным промптом и историей
-                        formatted_message = f"System: {system_prompt}\n"
-                        
-                        # Добавляем историю чата (последние 10 сообщений для контекста)
-                        recent_history = chat_history[-10:] if len(chat_history) > 10 else chat_history
-                        for hist_msg in recent_history:
-                            role = hist_msg.get('role')
-                            content = hist_msg.get('content', '')
-                            if role == 'user':
-                                formatted_message += f"Human: {content}\n"
-                            elif role == 'assistant':
-                                formatted_message += f"Assistant: {content}\n"
-                        
-                        # Добавляем текущее сообщение
-                        formatted_message += f"Human: {message_text}\n"
+                        self._system_prompt = get_iterative_execution_prompt()
+                        logger.debug(f"DEBUG: Системный промпт получен: {self._system_prompt[:100]}...")
+                        memories = memory_service.search(message) if memory_service else []
+                        self._reserved_tokens = context_builder.tokens.count(self._system_prompt)
+                        self._context = context_builder.build(
+                            session_id, message, self.original_model,
+                            reserved_tokens=self._reserved_tokens,
+                            fallback_history=chat_history,
+                            memories=memories
+                        )
+                        logger.info(
+                            f"🧠 Контекст: {len(self._context['messages'])} сообщений, "
+                            f"{len(self._context['memories'])} фрагментов памяти, "
+                            f"{self._context['tokens']}/{self._context['budget']} токенов"
+                            f"{', есть краткое содержание' if self._context['summary'] else ''}"
+                        )
+                    return self._system_prompt, self._context
+                
+                def generate_response(self, message_text, metadata, cancel_event=None):
+                    try:
+                        # Полное сообщение: системный промпт, история в бюджете модели и текущее сообщение
+                        system_prompt, context = self._get_context()
+                        # Сообщение растет с результатами инструментов - история подрезается под него
+                        context = context_builder.fit(context, message_text, reserved_tokens=self._reserved_tokens)
+                        formatted_message = format_prompt(system_prompt, context, message_text)
                         
                         logger.debug("DEBUG: Вызов LLM.call() через адаптер")
-                        response = self.llm.call(formatted_message)
+                        if self.hedge and self.on_token is None:
+                            # Ответ может прийти от запасной модели - дальше продолжаем с ней
+                            response, self.llm = llm_hedger.call(
+                                self.llm, formatted_message, self.provider, self.temperature,
+                                cancel_event=cancel_event
+                            )
+                        else:
+                            response = call_llm(self.llm, formatted_message, self.on_token, cancel_event)
+                        if self.on_token is not None:
+                            token_buffer.flush()
                         
                         logger.debug(f"DEBUG: Ответ от LLM: {str(response)[:200]}...")
                         return str(response)
@@ -979,6 +1135,7 @@ def process_message_async(task_id, request_data):
                                 if current_model:
                                     logger.warning(f"🔄 Помечаем модель {current_model} как недоступную из-за перегрузки/лимитов")
                                     rate_limit_monitor.mark_model_unavailable(current_model)
+                                    llm_pool.mark_unhealthy(current_model, error_str)
                                 else:
                                     logger.warning("⚠️ Не удалось определить текущую модель для блокировки")
                             except Exception as mark_error:
@@ -989,7 +1146,9 @@ def process_message_async(task_id, request_data):
                                 logger.info("🔄 Повторяем запрос с новой моделью после обнаружения проблем с текущей")
                                 try:
                                     # Повторяем запрос с новой моделью
-                                    response = self.llm.call(formatted_message)
+                                    response = call_llm(self.llm, formatted_message, self.on_token, cancel_event)
+                                    if self.on_token is not None:
+                                        token_buffer.flush()
                                     logger.info(f"✅ Успешный ответ от новой модели: {getattr(self.llm, 'model', 'unknown')}")
                                     return str(response)
                                 except Exception as retry_error:
@@ -1042,18 +1201,21 @@ def process_message_async(task_id, request_data):
             llm = create_llm(provider, model_name, temperature)
             
             # Создаем адаптер LLM с параметрами для переключения моделей
-            llm_client = CrewAILLMAdapter(llm, provider, temperature)
+            llm_client = CrewAILLMAdapter(llm, provider, temperature, on_token=token_buffer)
             
             # Запускаем итеративное выполнение
             logger.info("⚡ Запуск итеративного исполнителя")
+            task_store.publish_event(task_id, 'progress', {'progress': 20, 'model': getattr(llm, 'model', model_name)})
             result = iterative_executor.process_iteratively(
                 message, 
                 llm_client, 
-                metadata
+                metadata,
+                event_callback=publish_iteration_event
             )
             
             # Получаем финальный результат
             result_text = result['final_response']
+            answered = True
             logger.info(f"✅ Итеративное выполнение завершено за {result['iterations_count']} итераций")
             logger.debug(f"DEBUG: История выполнения: {len(result['execution_history'])} команд")
             
@@ -1087,6 +1249,7 @@ def process_message_async(task_id, request_data):
                     if current_model:
                         logger.warning(f"🔄 Помечаем модель {current_model} как недоступную")
                         rate_limit_monitor.mark_model_unavailable(current_model)
+                        llm_pool.mark_unhealthy(current_model, error_str)
                     
                     # Выбираем альтернативную модель
                     alternative_model = select_llm_model_safe("dialog", intelligence_priority=False)
@@ -1095,17 +1258,19 @@ def process_message_async(task_id, request_data):
                         
                         # Создаем новый LLM с альтернативной моделью
                         alternative_llm = create_llm(provider, alternative_model, temperature)
-                        alternative_client = CrewAILLMAdapter(alternative_llm, provider, temperature)
+                        alternative_client = CrewAILLMAdapter(alternative_llm, provider, temperature, on_token=token_buffer)
                         
                         # Повторяем попытку с новой моделью
                         logger.info("🔄 Повторяем итеративное выполнение с новой моделью")
                         result = iterative_executor.process_iteratively(
                             message, 
                             alternative_client, 
-                            metadata
+                            metadata,
+                            event_callback=publish_iteration_event
                         )
                         
                         result_text = result['final_response']
+                        answered = True
                         logger.info(f"✅ Успешно обработано с альтернативной моделью: {alternative_model}")
                         
                     else:
@@ -1125,19 +1290,143 @@ def process_message_async(task_id, request_data):
                 
         logger.info(f"✅ Получен финальный ответ: '{result_text[:100]}{'...' if len(result_text) > 100 else ''}')")
         
-        task['status'] = TaskStatus.COMPLETED
-        task['progress'] = 100
-        task['result'] = result_text
-        task['completed_at'] = time.time()
+        task_store.update(
+            task_id,
+            status=TaskStatus.COMPLETED,
+            progress=100,
+            result=result_text,
+            completed_at=time.time()
+        )
         
         logger.info(f"✅ Задача {task_id} завершена успешно")
         
+        # Индексация в долговременную память идет в фоне и не задерживает ответ
+        if memory_service and session_id:
+            memory_service.add_message(session_id, 'user', message)
+            if answered:
+                memory_service.add_message(session_id, 'assistant', result_text)
+        
     except Exception as e:
         logger.error(f"❌ Ошибка при асинхронной обработке задачи {task_id}: {e}")
-        task = tasks_storage.get(task_id)
-        if task:
-            task['status'] = TaskStatus.FAILED
-            task['error'] = str(e)
+        task_store.update(task_id, status=TaskStatus.FAILED, error=str(e))
+
+# === API ЭНДПОИНТЫ ДЛЯ СТАТУСА ЗАДАЧ ===
+
+# Максимум задач в одном ответе дельта-ленты; остаток клиент получит следующим запросом
+TASK_FEED_MAX_CHANGES = 500
+
+@app.route('/api/tasks', methods=['GET'])
+def list_tasks():
+    """
+    Список задач из общего хранилища (новые первыми)
+
+    С параметром ?since=<cursor> возвращает только задачи, измененные после cursor,
+    в порядке версий, и removed - id вытесненных задач. cursor из ответа передается
+    в следующий запрос. Если cursor больше версии хранилища (сервер перезапущен с
+    хранилищем в памяти) или старше сохраненных записей об удалении, отдается
+    полный список с reset=true.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        delta = None
+        if since is not None:
+            limit = request.args.get('limit', TASK_FEED_MAX_CHANGES, type=int)
+            delta = task_store.changes_since(since, limit=limit)
+        if delta is not None:
+            return jsonify({**delta, 'count': len(delta['tasks']), 'reset': False})
+
+        # Версия читается до списка: изменения между запросами придут в следующей дельте
+        cursor = task_store.current_version()
+        limit = request.args.get('limit', 100, type=int)
+        tasks = task_store.list(limit=limit)
+        return jsonify({
+            'tasks': tasks,
+            'count': len(tasks),
+            'cursor': cursor,
+            'reset': since is not None
+        })
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения списка задач: {e}")
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+@app.route('/api/tasks/stats', methods=['GET'])
+def get_tasks_stats():
+    """Метрики пула задач текущего воркера и число активных задач во всем хранилище"""
+    try:
+        stats = task_engine.get_stats()
+        stats['active_tasks'] = task_store.count_active()
+        if iterative_executor is not None:
+            stats['llm_calls'] = iterative_executor.llm_calls.get_stats()
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения метрик задач: {e}")
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+# Максимальная длительность одного SSE-соединения и интервал keepalive (секунды).
+# Длительность меньше timeout воркера gunicorn (120s): долгие задачи клиент дочитывает
+# новым соединением с Last-Event-ID, не теряя событий.
+TASK_STREAM_MAX_DURATION = int(os.getenv('GOPIAI_TASK_STREAM_MAX_DURATION', '90'))
+TASK_STREAM_KEEPALIVE = 15
+
+@app.route('/api/tasks/<task_id>/stream', methods=['GET'])
+def stream_task(task_id):
+    """
+    Server-Sent Events поток событий задачи
+
+    События: status, progress, iteration, tool_result, token и финальное done.
+    Поддерживает возобновление через заголовок Last-Event-ID или параметр ?after=<seq>.
+    """
+    if task_store.get(task_id) is None:
+        return jsonify({'error': 'Задача не найдена', 'task_id': task_id, 'status': 'not_found'}), 404
+    
+    last_seq = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+    
+    def format_event(event_id, event, data):
+        return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    
+    def generate():
+        seq = last_seq
+        deadline = time.monotonic() + TASK_STREAM_MAX_DURATION
+        last_sent = time.monotonic()
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            events = task_store.wait_for_events(task_id, seq, timeout=0.5)
+            for event in events:
+                seq = event['seq']
+                yield format_event(seq, event['event'], event['data'])
+                if event['event'] == 'done':
+                    return
+            if events:
+                last_sent = time.monotonic()
+                continue
+            # Задача завершилась, но финальное событие не записано (например, воркер упал)
+            task = task_store.get(task_id)
+            if task is None or task.get('status') in (TaskStatus.COMPLETED.name, TaskStatus.FAILED.name):
+                yield format_event(seq, 'done', {
+                    'status': task.get('status') if task else TaskStatus.FAILED.name,
+                    'result': task.get('result') if task else None,
+                    'error': task.get('error') if task else 'Задача не найдена'
+                })
+                return
+            if time.monotonic() - last_sent >= TASK_STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """Статус конкретной задачи"""
+    task = task_store.get(task_id)
+    if task is None:
+        logger.warning(f"🔍 Задача {task_id} не найдена")
+        return jsonify({'error': 'Задача не найдена', 'task_id': task_id, 'status': 'not_found'}), 404
+    task['done'] = task.get('status') in (TaskStatus.COMPLETED.name, TaskStatus.FAILED.name)
+    return jsonify(task)
 
 # ==========================================
 # Internal endpoints for UI synchronization
@@ -1177,10 +1466,8 @@ def handle_internal_models():
         provider = request.args.get('provider', 'gemini')
         logger.debug(f"DEBUG: /internal/models GET - провайдер: {provider}")
         
-        # Получаем модели через систему ротации (с перезагрузкой модуля)
-        import importlib
-        import llm_rotation_config
-        importlib.reload(llm_rotation_config)
+        # Получаем модели через систему ротации. Модуль не перезагружаем:
+        # reload пересоздал бы rate_limit_monitor и сбросил окна лимитов и blacklist
         from llm_rotation_config import get_available_models
         
         models = []
@@ -1200,6 +1487,24 @@ def handle_internal_models():
         logger.error(f"Ошибка получения моделей: {e}")
         return jsonify({'error': 'Ошибка получения моделей'}), 500
 
+@app.route('/internal/router', methods=['GET'])
+def handle_internal_router():
+    """Отладка роутера моделей: оценки кандидатов для task_type, последние решения и статистика"""
+    task_type = request.args.get('task_type', 'dialog')
+    tokens = request.args.get('tokens', 0, type=int)
+    return jsonify({
+        'task_type': task_type,
+        'candidates': model_router.explain(task_type, tokens),
+        'decisions': model_router.get_decisions(request.args.get('limit', 10, type=int)),
+        'models': model_router.get_stats(),
+        'hedging': llm_hedger.get_stats()
+    })
+
+@app.route('/internal/rate_limits', methods=['GET'])
+def handle_internal_rate_limits():
+    """Метрики лимитера: использование RPM/TPM/RPD в скользящих окнах, отказы и ожидания"""
+    return jsonify(rate_limit_monitor.get_metrics())
+
 # === API ЭНДПОИНТЫ ДЛЯ УПРАВЛЕНИЯ ПОДТВЕРЖДЕНИЯМИ КОМАНД ===
 
 @app.route('/api/commands/pending', methods=['GET'])
@@ -1219,19 +1524,27 @@ def get_pending_commands():
         logger.error(f"[APPROVAL-API] Ошибка при получении pending команд: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _resolve_command(command_id, status):
+    """Меняет статус команды и сразу будит поток, ожидающий подтверждения"""
+    if iterative_executor is not None:
+        return iterative_executor.resolve_command(command_id, status)
+    with pending_commands_lock:
+        command_info = pending_commands_store.get(command_id)
+        if not command_info or command_info.get('status') != 'pending':
+            return False
+        command_info['status'] = status
+        command_info[f'{status}_at'] = time.time()
+        return True
+
 @app.route('/api/commands/<command_id>/approve', methods=['POST'])
 def approve_command(command_id):
     """Подтвердить выполнение команды"""
     try:
-        with pending_commands_lock:
-            if command_id in pending_commands_store:
-                pending_commands_store[command_id]['status'] = 'approved'
-                pending_commands_store[command_id]['approved_at'] = time.time()
-                logger.info(f"[APPROVAL-API] Команда {command_id} подтверждена пользователем")
-                return jsonify({'success': True, 'message': 'Command approved'})
-            else:
-                logger.warning(f"[APPROVAL-API] Команда {command_id} не найдена для подтверждения")
-                return jsonify({'success': False, 'error': 'Command not found'}), 404
+        if _resolve_command(command_id, 'approved'):
+            logger.info(f"[APPROVAL-API] Команда {command_id} подтверждена пользователем")
+            return jsonify({'success': True, 'message': 'Command approved'})
+        logger.warning(f"[APPROVAL-API] Команда {command_id} не найдена для подтверждения")
+        return jsonify({'success': False, 'error': 'Command not found'}), 404
     except Exception as e:
         logger.error(f"[APPROVAL-API] Ошибка при подтверждении команды {command_id}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1240,19 +1553,58 @@ def approve_command(command_id):
 def reject_command(command_id):
     """Отклонить выполнение команды"""
     try:
-        with pending_commands_lock:
-            if command_id in pending_commands_store:
-                pending_commands_store[command_id]['status'] = 'rejected'
-                pending_commands_store[command_id]['rejected_at'] = time.time()
-                logger.info(f"[APPROVAL-API] Команда {command_id} отклонена пользователем")
-                return jsonify({'success': True, 'message': 'Command rejected'})
-            else:
-                logger.warning(f"[APPROVAL-API] Команда {command_id} не найдена для отклонения")
-                return jsonify({'success': False, 'error': 'Command not found'}), 404
+        if _resolve_command(command_id, 'rejected'):
+            logger.info(f"[APPROVAL-API] Команда {command_id} отклонена пользователем")
+            return jsonify({'success': True, 'message': 'Command rejected'})
+        logger.warning(f"[APPROVAL-API] Команда {command_id} не найдена для отклонения")
+        return jsonify({'success': False, 'error': 'Command not found'}), 404
     except Exception as e:
         logger.error(f"[APPROVAL-API] Ошибка при отклонении команды {command_id}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Поток подтверждений бессрочный для UI: сервер закрывает его раньше timeout воркера
+# gunicorn (120s), клиент переподключается по retry и получает свежий snapshot
+COMMAND_STREAM_MAX_DURATION = int(os.getenv('GOPIAI_COMMAND_STREAM_MAX_DURATION', '90'))
+
+@app.route('/api/commands/stream', methods=['GET'])
+def stream_commands():
+    """
+    Server-Sent Events поток подтверждений команд
+    
+    Сначала отправляется snapshot со всеми ожидающими командами, затем события
+    pending (новая команда) и resolved (approved/rejected/expired).
+    Соединение закрывается через COMMAND_STREAM_MAX_DURATION секунд; под gunicorn
+    требуется воркер gthread (см. gunicorn_config.py), иначе каждый открытый UI
+    занимает целый sync воркер.
+    """
+    if iterative_executor is None:
+        return jsonify({'success': False, 'error': 'Iterative Execution System недоступна'}), 503
+    
+    def format_event(event_id, event, data):
+        return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    
+    def generate():
+        seq = iterative_executor.approval_seq
+        with pending_commands_lock:
+            pending = [dict(cmd) for cmd in pending_commands_store.values() if cmd.get('status') == 'pending']
+        yield "retry: 2000\n\n"
+        yield format_event(seq, 'snapshot', {'pending_commands': pending})
+        deadline = time.monotonic() + COMMAND_STREAM_MAX_DURATION
+        while time.monotonic() < deadline:
+            events = iterative_executor.wait_for_approval_events(seq, timeout=TASK_STREAM_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                seq = event['seq']
+                yield format_event(seq, event['event'], event['data'])
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/commands/status', methods=['GET'])
 def get_commands_status():
     """Получить статистику по командам"""
@@ -1288,17 +1640,22 @@ def not_found(error):
         'available_endpoints': [
             '/api/health',
             '/health (legacy)',
-            '/api/tasks [POST, GET]',
+            '/api/tasks [GET, ?since=<cursor>]',
+            '/api/tasks/stats [GET]',
             '/api/tasks/<id> [GET]',
+            '/api/tasks/<id>/stream [GET, SSE]',
             '/api/tools [GET]',
             '/api/agents [GET]',
             '/api/process [POST]',
             '/api/commands/pending [GET]',
             '/api/commands/<id>/approve [POST]',
             '/api/commands/<id>/reject [POST]',
+            '/api/commands/stream [GET, SSE]',
             '/api/commands/status [GET]',
             '/internal/state [GET, POST]',
-            '/internal/models [GET]'
+            '/internal/models [GET]',
+            '/internal/router [GET]',
+            '/internal/rate_limits [GET]'
         ]
     }), 404
 
@@ -1309,13 +1666,17 @@ if __name__ == '__main__':
         logger.info("🔗 Доступные endpoints:")
         logger.info("   GET  /api/health - проверка здоровья сервера")
         logger.info("   GET  /health - проверка здоровья сервера (legacy)")
-        logger.info("   POST /api/tasks - создание новой задачи")
-        logger.info("   GET  /api/tasks - список всех задач")
+        logger.info("   POST /api/process - обработка сообщения через пул задач")
+        logger.info("   GET  /api/tasks - список всех задач (?since=<cursor> - только изменившиеся)")
+        logger.info("   GET  /api/tasks/stats - метрики пула задач")
         logger.info("   GET  /api/tasks/<id> - статус конкретной задачи")
+        logger.info("   GET  /api/tasks/<id>/stream - SSE поток прогресса и токенов задачи")
         logger.info("   POST /api/refine - итеративная обработка ответов")
         logger.info("   POST /api/iterate - итеративное выполнение команд")
         logger.info("   GET/POST /internal/state - управление состоянием UI")
         logger.info("   GET  /internal/models - получение списка моделей")
+        logger.info("   GET  /internal/router - решения и оценки роутера моделей")
+        logger.info("   GET  /internal/rate_limits - метрики лимитов моделей")
         logger.info("")
         logger.info("🚀 Сервер готов к работе на http://localhost:5052")
         logger.info(f"📁 Логи сохраняются в: {log_file}")
@@ -3,7 +3,6 @@
 Gunicorn configuration for production deployment of CrewAI API server
 """
 
-import multiprocessing
 import os
 
 # Server socket
@@ -11,8 +10,17 @@ bind = "0.0.0.0:5052"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Подтверждения команд (/api/commands/*) хранятся в памяти воркера, выполняющего команду:
+# при нескольких воркерах подтверждение может попасть в другой процесс и вернуть 404.
+# Поэтому по умолчанию запускается один воркер (параллелизм дают потоки gthread ниже).
+# Больше воркеров (GOPIAI_GUNICORN_WORKERS) - только если подтверждения команд не используются.
+workers = int(os.getenv('GOPIAI_GUNICORN_WORKERS', '1'))
+# SSE потоки (/api/tasks/<id>/stream, /api/commands/stream) держат соединение открытым.
+# С sync воркером каждый открытый поток занимал бы целый процесс, поэтому используется
+# gthread: поток держит только один поток воркера. Сами SSE потоки закрываются сервером
+# раньше timeout, клиент переподключается по retry и продолжает с Last-Event-ID.
+worker_class = "gthread"
+threads = int(os.getenv('GOPIAI_GUNICORN_THREADS', '16'))
 worker_connections = 1000
 timeout = 120
 keepalive = 2
@@ -39,6 +47,6 @@ limit_request_field_size = 8190
 # Performance
 enable_stdio_inheritance = True
 
-print(f"🚀 Gunicorn configured with {workers} workers")
+print(f"🚀 Gunicorn configured with {workers} {worker_class} workers x {threads} threads")
 print(f"📊 Binding to {bind}")
 print(f"📁 Logs: {accesslog} & {errorlog}")
\ No newline at end of file
@@ -13,19 +13,133 @@ Iterative Execution System для GopiAI
 import os
 import re
 import ast
+import inspect
 import threading
-import queue
 import json
 import time
 import uuid
 import logging
 import subprocess
-from typing import Dict, List, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Any, Optional
 from pathlib import Path
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Блок ```tool_code ... ``` в ответе модели
+_TOOL_CODE_BLOCK_RE = re.compile(r'```tool_code\s*\n(.*?)\n```', re.DOTALL | re.IGNORECASE)
+# Вызов инструмента: function_name(args...) или function_name.method_name(args...)
+_TOOL_CALL_RE = re.compile(r'(\w+)(?:\.[\w_]+)?\((.*?)\)')
+
+
+class LLMCallTimeout(Exception):
+    """LLM вызов не уложился в таймаут (или не дождался слота модели)"""
+
+
+class LLMCallManager:
+    """
+    Общий пул для LLM вызовов с отменой по таймауту и лимитом параллельности на модель
+    
+    Вместо нового daemon-потока на каждый вызов используется один ThreadPoolExecutor.
+    При таймауте выставляется cancel_event: клиент, принимающий его в generate_response,
+    прекращает чтение потока и закрывает HTTP запрос. Слот модели освобождается только
+    когда вызов действительно завершился, поэтому брошенные вызовы не превышают лимит.
+    """
+    
+    def __init__(self, max_workers: int = 16, max_concurrent_per_model: int = 4):
+        self.max_concurrent_per_model = max_concurrent_per_model
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gopiai-llm")
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._stats = {'calls': 0, 'timeouts': 0, 'cap_rejections': 0}
+    
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(model)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrent_per_model)
+                self._semaphores[model] = semaphore
+            return semaphore
+    
+    @staticmethod
+    def _accepts_cancel_event(func) -> bool:
+        try:
+            return 'cancel_event' in inspect.signature(func).parameters
+        except (TypeError, ValueError):
+            return False
+    
+    def call(self, llm_client, message: str, metadata: Dict, timeout: float):
+        """Вызывает llm_client.generate_response; при таймауте отменяет вызов и бросает LLMCallTimeout"""
+        model = getattr(getattr(llm_client, 'llm', None), 'model', None) or 'default'
+        started = time.monotonic()
+        semaphore = self._semaphore(model)
+        if not semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self._stats['cap_rejections'] += 1
+            raise LLMCallTimeout(f"Нет свободного слота для модели {model} за {timeout}s")
+        
+        cancel_event = threading.Event()
+        kwargs = {'cancel_event': cancel_event} if self._accepts_cancel_event(llm_client.generate_response) else {}
+        
+        def run():
+            try:
+                return llm_client.generate_response(message, metadata, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight[model] -= 1
+                semaphore.release()
+        
+        with self._lock:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            self._stats['calls'] += 1
+        try:
+            future = self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._in_flight[model] -= 1
+            semaphore.release()
+            raise
+        
+        try:
+            return future.result(timeout=max(0.0, timeout - (time.monotonic() - started)))
+        except FutureTimeoutError:
+            cancel_event.set()
+            with self._lock:
+                self._stats['timeouts'] += 1
+            # Вызов ещё стоял в очереди пула: run() не выполнится, слот освобождаем здесь
+            if future.cancel():
+                with self._lock:
+                    self._in_flight[model] -= 1
+                semaphore.release()
+            raise LLMCallTimeout(f"LLM вызов превысил timeout {timeout}s")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'in_flight': {model: count for model, count in self._in_flight.items() if count},
+                'max_concurrent_per_model': self.max_concurrent_per_model,
+            }
+
+
+_shared_llm_calls: Optional[LLMCallManager] = None
+_shared_llm_calls_lock = threading.Lock()
+
+
+def get_llm_call_manager() -> LLMCallManager:
+    """Общий для всех IterativeExecutor менеджер LLM вызовов (настройки из окружения)"""
+    global _shared_llm_calls
+    with _shared_llm_calls_lock:
+        if _shared_llm_calls is None:
+            _shared_llm_calls = LLMCallManager(
+                max_workers=int(os.getenv('GOPIAI_LLM_MAX_WORKERS', '16')),
+                max_concurrent_per_model=int(os.getenv('GOPIAI_LLM_MAX_PER_MODEL', '4'))
+            )
+        return _shared_llm_calls
+
 
 class IterativeExecutor:
     """Система итеративного выполнения команд и refinement"""
@@ -34,71 +148,75 @@ class IterativeExecutor:
         self.max_iterations = 5
         self.pending_commands_store = pending_commands_store if pending_commands_store is not None else {}
         self.pending_commands_lock = None
+        # Ожидание подтверждений: Event на команду + журнал событий для push-уведомлений UI
+        self._approval_events: Dict[str, threading.Event] = {}
+        self._approval_cond = threading.Condition()
+        self._approval_log = deque(maxlen=200)
+        self._approval_seq = 0
         self.execution_timeout = 30
         self.llm_timeout_seconds = 45  # Timeout для LLM вызовов
+        self.llm_calls = get_llm_call_manager()
         self.safe_commands = {
             'ls', 'cat', 'head', 'tail', 'grep', 'find', 'wc', 'pwd', 'date',
             'whoami', 'id', 'ps', 'df', 'du', 'free', 'uptime', 'uname'
         }
+        # Параллельное выполнение инструментов, только читающих данные (см. execute_tools)
+        self.parallel_tools = os.getenv('GOPIAI_PARALLEL_TOOLS', '1').lower() in ('1', 'true', 'yes')
+        self.tool_workers = int(os.getenv('GOPIAI_TOOL_WORKERS', '4'))
+        self._tool_pool = None
+        self._tool_pool_lock = threading.Lock()
         
     def extract_tool_codes(self, response: str) -> List[Dict[str, Any]]:
-        """Извлекает все tool_code блоки из ответа модели"""
-        tool_codes = []
-        
-        logger.info(f"🔍 Поиск tool_code блоков в ответе: {response[:200]}...")
-        
-        # Паттерн для поиска tool_code блоков
-        pattern = r'```tool_code\s*\n(.*?)\n```'
-        matches = re.findall(pattern, response, re.DOTALL | re.IGNORECASE)
+        """
+        Извлекает все tool_code блоки из ответа модели за один проход
         
-        logger.info(f"🔍 Найдено {len(matches)} tool_code блоков")
+        Блоки находятся одним предкомпилированным регулярным выражением, содержимое
+        каждого блока разбирается по первому символу без повторного сканирования ответа.
+        """
+        # Блок tool_code всегда начинается с ```, ответы без них не сканируем
+        if '```' not in response:
+            return []
         
-        for match in matches:
+        tool_codes = []
+        for block in _TOOL_CODE_BLOCK_RE.finditer(response):
+            match = block.group(1).strip()
             try:
-                # Убираем лишние пробелы и переносы строк
-                match = match.strip()
-                
-                # Пытаемся парсить как Python dict/expression
-                if match.startswith('{'):
-                    tool_data = ast.literal_eval(match)
-                    tool_codes.append(tool_data)
-                else:
-                    # Парсим как вызов функции (например, "time_helper()" или "time_helper.get_current_time()")
-                    # Ищем паттерн function_name.method_name(args...) или function_name(args...)
-                    func_pattern = r'(\w+)(?:\.[\w_]+)?\((.*?)\)'
-                    func_match = re.match(func_pattern, match)
-                    
-                    if func_match:
-                        func_name = func_match.group(1)
-                        func_args = func_match.group(2)
-                        
-                        # Обрабатываем различные типы инструментов
-                        tool_data = self.parse_tool_call(func_name, func_args)
-                        if tool_data:
-                            tool_codes.append(tool_data)
-                    elif 'datetime' in match and 'now()' in match:
-                        # Обрабатываем Python код для времени как time_helper
-                        tool_codes.append({'tool': 'time_info', 'params': {}})
-                    elif match.startswith('bash:'):
-                        # Обрабатываем команды в формате "bash: команда"
-                        command = match[5:].strip()  # Убираем "bash:" и пробелы
-                        tool_codes.append({'tool': 'terminal', 'params': {'command': command}})
-                        logger.info(f"🔧 Обработана bash команда: {command}")
-                    elif 'print(' in match or 'import ' in match:
-                        # Обрабатываем Python код как terminal команду
-                        # Запускаем через python -c
-                        python_code = match.replace('\n', '; ')
-                        tool_codes.append({'tool': 'terminal', 'params': {'command': f'python3 -c "{python_code}"'}})
-                    else:
-                        # Fallback для простых команд/строк
-                        tool_codes.append({'tool': 'terminal', 'params': {'command': match}})
-                        
+                tool_data = self._parse_tool_code_block(match)
             except Exception as e:
                 logger.warning(f"Не удалось распарсить tool_code: {match[:100]}... Error: {e}")
                 continue
-                
+            if tool_data is not None:
+                tool_codes.append(tool_data)
+        
+        logger.debug(f"🔍 Найдено {len(tool_codes)} tool_code блоков")
         return tool_codes
     
+    def _parse_tool_code_block(self, match: str) -> Optional[Dict[str, Any]]:
+        """Разбирает содержимое одного tool_code блока"""
+        # Python dict
+        if match.startswith('{'):
+            return ast.literal_eval(match)
+        
+        # Вызов функции: function_name.method_name(args...) или function_name(args...)
+        func_match = _TOOL_CALL_RE.match(match)
+        if func_match:
+            return self.parse_tool_call(func_match.group(1), func_match.group(2))
+        
+        if 'datetime' in match and 'now()' in match:
+            # Python код для времени обрабатывается как time_helper
+            return {'tool': 'time_info', 'params': {}}
+        if match.startswith('bash:'):
+            # Команды в формате "bash: команда"
+            command = match[5:].strip()
+            logger.debug(f"🔧 Обработана bash команда: {command}")
+            return {'tool': 'terminal', 'params': {'command': command}}
+        if 'print(' in match or 'import ' in match:
+            # Python код запускаем через python -c
+            python_code = match.replace('\n', '; ')
+            return {'tool': 'terminal', 'params': {'command': f'python3 -c "{python_code}"'}}
+        # Fallback для простых команд/строк
+        return {'tool': 'terminal', 'params': {'command': match}}
+    
     def parse_tool_call(self, func_name: str, func_args: str) -> Dict[str, Any]:
         """Парсит вызов инструмента в формате function_name(args...)"""
         try:
@@ -235,6 +353,9 @@ class IterativeExecutor:
             'reason': f'Command "{command}" requires approval (risk: {risk_level})'
         }
         
+        # Event создается до публикации команды, чтобы подтверждение не потерялось
+        self._approval_events[command_id] = threading.Event()
+        
         # Сохраняем в хранилище ожидающих команд
         if self.pending_commands_store is not None:
             if self.pending_commands_lock:
@@ -248,6 +369,7 @@ class IterativeExecutor:
             logger.warning(f"[PENDING] pending_commands_store is None! Команда не сохранена: {command_id}")
         
         logger.info(f"Команда требует подтверждения: {command} (ID: {command_id}, риск: {risk_level})")
+        self._publish_approval_event('pending', command_info)
         
         return {
             'needs_approval': True,
@@ -274,33 +396,74 @@ class IterativeExecutor:
         return 'LOW'
     
     def wait_for_approval(self, command_id: str, timeout: int = 60) -> bool:
-        """Ожидает подтверждения команды от пользователя"""
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            if self.pending_commands_store is None:
-                return False
-                
-            # Проверяем статус команды
+        """Ожидает подтверждения команды от пользователя (без опроса - до сигнала resolve_command)"""
+        if self.pending_commands_store is None:
+            return False
+        event = self._approval_events.get(command_id)
+        if event is None:
             command_info = self.pending_commands_store.get(command_id)
-            if not command_info:
-                return False
-                
-            status = command_info.get('status', 'pending')
-            
-            if status == 'approved':
-                logger.info(f"Команда {command_id} одобрена пользователем")
-                return True
-            elif status == 'rejected':
-                logger.info(f"Команда {command_id} отклонена пользователем")
+            return bool(command_info) and command_info.get('status') == 'approved'
+        
+        try:
+            # Если пользователь ответил одновременно с таймаутом, resolve_command вернет False
+            if not event.wait(timeout) and self.resolve_command(command_id, 'expired'):
+                logger.warning(f"Таймаут ожидания подтверждения команды {command_id}")
                 return False
-                
-            # Ждём немного перед следующей проверкой
-            time.sleep(1)
+        finally:
+            self._approval_events.pop(command_id, None)
         
-        logger.warning(f"Таймаут ожидания подтверждения команды {command_id}")
+        command_info = self.pending_commands_store.get(command_id) or {}
+        status = command_info.get('status', 'pending')
+        if status == 'approved':
+            logger.info(f"Команда {command_id} одобрена пользователем")
+            return True
+        logger.info(f"Команда {command_id} отклонена пользователем ({status})")
         return False
     
+    def resolve_command(self, command_id: str, status: str) -> bool:
+        """
+        Устанавливает статус команды (approved/rejected/expired) и будит ожидающий поток
+        
+        Returns: False, если команда не найдена или уже обработана
+        """
+        def update():
+            command_info = self.pending_commands_store.get(command_id)
+            if not command_info or command_info.get('status') != 'pending':
+                return None
+            command_info['status'] = status
+            command_info[f'{status}_at'] = time.time()
+            return command_info
+        
+        if self.pending_commands_lock:
+            with self.pending_commands_lock:
+                command_info = update()
+        else:
+            command_info = update()
+        if command_info is None:
+            return False
+        
+        event = self._approval_events.get(command_id)
+        if event is not None:
+            event.set()
+        self._publish_approval_event('resolved', {'id': command_id, 'status': status})
+        return True
+    
+    def _publish_approval_event(self, event: str, data: Dict[str, Any]):
+        with self._approval_cond:
+            self._approval_seq += 1
+            self._approval_log.append({'seq': self._approval_seq, 'event': event, 'data': data})
+            self._approval_cond.notify_all()
+    
+    def wait_for_approval_events(self, after_seq: int = 0, timeout: float = 15.0) -> List[Dict[str, Any]]:
+        """Ждет события подтверждений (pending/resolved) с номером больше after_seq"""
+        with self._approval_cond:
+            self._approval_cond.wait_for(lambda: self._approval_seq > after_seq, timeout=timeout)
+            return [dict(e) for e in self._approval_log if e['seq'] > after_seq]
+    
+    @property
+    def approval_seq(self) -> int:
+        return self._approval_seq
+    
     def execute_terminal_command(self, command: str) -> Dict[str, Any]:
         """Выполняет команду в терминале с интерактивным подтверждением"""
         
@@ -413,6 +576,86 @@ class IterativeExecutor:
                 'output': ''
             }
     
+    READ_ONLY_TOOLS = frozenset({'file_read', 'system_info', 'project_info', 'time_info'})
+    SHELL_CONTROL_TOKENS = ('>', '<', '&', '|', ';', '$(', '`', '\n')
+    # Действия find, которые удаляют файлы, запускают команды или пишут в файлы
+    # (префикс -fprint покрывает и -fprint0, -fprintf)
+    FIND_ACTIONS = ('-delete', '-exec', '-execdir', '-ok', '-okdir', '-fprint', '-fls')
+    
+    def is_read_only_tool(self, tool_data: Dict[str, Any]) -> bool:
+        """Инструмент только читает данные и не требует подтверждения - его можно запускать параллельно"""
+        tool_name = tool_data.get('tool', '').lower()
+        if tool_name in self.READ_ONLY_TOOLS:
+            return True
+        if tool_name != 'terminal':
+            return False
+        params = tool_data.get('params', {})
+        command = (params.get('command', params.get('raw_args', '')) or '').strip()
+        parts = command.split()
+        if not parts or parts[0] not in self.safe_commands:
+            return False
+        if parts[0] == 'find' and any(part.startswith(self.FIND_ACTIONS) for part in parts[1:]):
+            return False
+        # Перенаправления, конвейеры и подстановки могут изменять состояние
+        return not any(token in command for token in self.SHELL_CONTROL_TOKENS)
+    
+    def _get_tool_pool(self) -> ThreadPoolExecutor:
+        with self._tool_pool_lock:
+            if self._tool_pool is None:
+                self._tool_pool = ThreadPoolExecutor(max_workers=self.tool_workers, thread_name_prefix="gopiai-tool")
+            return self._tool_pool
+    
+    def execute_tools(
+        self,
+        tool_codes: List[Dict[str, Any]],
+        on_result: Optional[Callable[[int, Dict[str, Any], Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Выполняет инструменты одного ответа модели, возвращая результаты в исходном порядке
+        
+        Подряд идущие read-only инструменты выполняются параллельно в общем пуле.
+        Изменяющие и требующие подтверждения команды служат барьерами: они выполняются
+        по одной после завершения всех предыдущих, как при последовательном выполнении.
+        on_result(index, tool_data, result) вызывается в исходном порядке.
+        """
+        results: List[Dict[str, Any]] = []
+        
+        def finish(index, tool_data, result):
+            results.append(result)
+            logger.info(f"Выполнен инструмент: {result['success']}")
+            if on_result is not None:
+                on_result(index, tool_data, result)
+        
+        batch = []
+        
+        def flush_batch():
+            if not batch:
+                return
+            if len(batch) == 1:
+                index, tool_data = batch[0]
+                finish(index, tool_data, self.execute_tool(tool_data))
+            else:
+                logger.info(f"⚡ Параллельное выполнение {len(batch)} read-only инструментов")
+                pool = self._get_tool_pool()
+                futures = [(index, tool_data, pool.submit(self.execute_tool, tool_data)) for index, tool_data in batch]
+                for index, tool_data, future in futures:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'success': False, 'error': f'Ошибка выполнения инструмента: {e}', 'output': ''}
+                    finish(index, tool_data, result)
+            batch.clear()
+        
+        for index, tool_data in enumerate(tool_codes):
+            if self.parallel_tools and self.is_read_only_tool(tool_data):
+                batch.append((index, tool_data))
+                continue
+            flush_batch()
+            finish(index, tool_data, self.execute_tool(tool_data))
+        flush_batch()
+        
+        return results
+    
     def read_file(self, file_path: str) -> Dict[str, Any]:
         """Безопасное чтение файла"""
         try:
@@ -613,13 +856,20 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
                     
         return "\n".join(formatted)
     
-    def should_continue_iteration(self, response: str, iteration: int) -> bool:
-        """Определяет, нужна ли следующая итерация"""
+    def should_continue_iteration(self, response: str, iteration: int,
+                                  tool_codes: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """
+        Определяет, нужна ли следующая итерация
+        
+        tool_codes - уже извлеченные из response блоки (чтобы не разбирать ответ повторно)
+        """
         if iteration >= self.max_iterations:
             return False
             
         # Проверяем наличие tool_code блоков
-        if self.extract_tool_codes(response):
+        if tool_codes is None:
+            tool_codes = self.extract_tool_codes(response)
+        if tool_codes:
             return True
             
         # Проверяем ключевые слова о незавершенности
@@ -635,11 +885,21 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
                 
         return False
     
+    def _emit_event(self, event_callback: Optional[Callable[[str, Dict[str, Any]], None]], event: str, data: Dict[str, Any]):
+        """Передает событие итерации подписчику (ошибки подписчика не прерывают выполнение)"""
+        if event_callback is None:
+            return
+        try:
+            event_callback(event, data)
+        except Exception as e:
+            logger.warning(f"Ошибка обработчика события {event}: {e}")
+    
     def process_iteratively(
         self, 
         initial_message: str, 
         llm_client, 
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        event_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """
         Основная функция итеративной обработки
@@ -648,6 +908,8 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
             initial_message: Исходное сообщение пользователя
             llm_client: Клиент для вызова LLM (должен иметь метод generate_response)
             metadata: Дополнительные метаданные
+            event_callback: Необязательный обработчик событий (event, data) для потоковой
+                выдачи: 'iteration' после каждого ответа модели и 'tool_result' после каждого инструмента
             
         Returns:
             Dict с финальным ответом и историей итераций
@@ -662,61 +924,47 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
             # Генерируем ответ от модели с timeout
             try:
                 logger.debug(f"Вызов LLM с timeout {self.llm_timeout_seconds}s")
+                response = self.llm_calls.call(llm_client, current_message, metadata or {}, self.llm_timeout_seconds)
                 
-                result_queue = queue.Queue()
-                exception_queue = queue.Queue()
-                
-                def llm_call():
-                    try:
-                        result = llm_client.generate_response(current_message, metadata or {})
-                        result_queue.put(result)
-                    except Exception as e:
-                        exception_queue.put(e)
-                
-                thread = threading.Thread(target=llm_call)
-                thread.daemon = True
-                thread.start()
-                thread.join(timeout=self.llm_timeout_seconds)
-                
-                if thread.is_alive():
-                    logger.error(f"❌ LLM вызов превысил timeout {self.llm_timeout_seconds}s")
-                    # Попытаемся прервать итерацию и дать частичный ответ
-                    if conversation_history:
-                        logger.info("Возвращаем последний доступный ответ из-за timeout")
-                        break
-                    else:
-                        # Первая итерация - дадим базовый ответ
-                        response = "Извините, произошла ошибка с обработкой запроса (timeout). Попробуйте еще раз."
-                        conversation_history.append({
-                            'iteration': iteration + 1,
-                            'input': current_message,
-                            'response': response,
-                            'timestamp': time.time(),
-                            'error': 'timeout'
-                        })
-                        break
-                
-                if not exception_queue.empty():
-                    raise exception_queue.get()
-                    
-                if not result_queue.empty():
-                    response = result_queue.get()
+            except LLMCallTimeout as e:
+                logger.error(f"❌ {e}")
+                # Попытаемся прервать итерацию и дать частичный ответ
+                if conversation_history:
+                    logger.info("Возвращаем последний доступный ответ из-за timeout")
+                else:
+                    # Первая итерация - дадим базовый ответ
+                    response = "Извините, произошла ошибка с обработкой запроса (timeout). Попробуйте еще раз."
                     conversation_history.append({
                         'iteration': iteration + 1,
                         'input': current_message,
                         'response': response,
-                        'timestamp': time.time()
+                        'timestamp': time.time(),
+                        'error': 'timeout'
                     })
-                    
-                    logger.info(f"Получен ответ модели: {response[:200]}...")
-                else:
-                    logger.error("LLM не вернул результат")
-                    break
+                break
                 
             except Exception as e:
                 logger.error(f"Ошибка получения ответа от модели: {e}")
                 break
             
+            if response is None:
+                logger.error("LLM не вернул результат")
+                break
+            
+            conversation_history.append({
+                'iteration': iteration + 1,
+                'input': current_message,
+                'response': response,
+                'timestamp': time.time()
+            })
+            
+            logger.info(f"Получен ответ модели: {response[:200]}...")
+            self._emit_event(event_callback, 'iteration', {
+                'iteration': iteration + 1,
+                'max_iterations': self.max_iterations,
+                'response': response
+            })
+            
             # Извлекаем и выполняем tool_codes
             tool_codes = self.extract_tool_codes(response)
             execution_results = []
@@ -724,11 +972,15 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
             if tool_codes:
                 logger.info(f"Найдено {len(tool_codes)} инструментов для выполнения")
                 
-                for tool_data in tool_codes:
-                    result = self.execute_tool(tool_data)
-                    execution_results.append(result)
-                    logger.info(f"Выполнен инструмент: {result['success']}")
+                def publish_tool_result(index, tool_data, result):
+                    self._emit_event(event_callback, 'tool_result', {
+                        'iteration': iteration + 1,
+                        'index': index,
+                        'tool': tool_data.get('tool'),
+                        'result': result
+                    })
                 
+                execution_results = self.execute_tools(tool_codes, publish_tool_result)
                 execution_history.extend(execution_results)
                 
                 # Формируем сообщение с результатами для следующей итерации
@@ -745,7 +997,7 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
                 # Нет команд для выполнения - возможно, задача завершена
                 logger.info("Команды не найдены, проверяем необходимость продолжения")
                 
-                if not self.should_continue_iteration(response, iteration):
+                if not self.should_continue_iteration(response, iteration, tool_codes):
                     logger.info("Итерации завершены - задача выполнена")
                     break
                 else:
@@ -773,9 +1025,10 @@ Git репозиторий: {'Да' if project_info['is_git_repo'] else 'Нет'
 iterative_executor = IterativeExecutor()
 
 
-def process_message_iteratively(message: str, llm_client, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+def process_message_iteratively(message: str, llm_client, metadata: Optional[Dict] = None,
+                                event_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     """Convenience функция для итеративной обработки сообщения"""
-    return iterative_executor.process_iteratively(message, llm_client, metadata)
+    return iterative_executor.process_iteratively(message, llm_client, metadata, event_callback)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Hedged LLM requests для GopiAI CrewAI сервера
+
+Если основная модель не ответила за p95 своего времени ответа, тот же промпт
+отправляется следующей по роутеру модели; используется первый успешный ответ:
+1. Задержка перед дублированием - p95 основной модели (с нижней границей),
+   до накопления статистики - фиксированная задержка по умолчанию
+2. Дублирующий запрос отправляется, только если монитор лимитов выдал слот
+3. Победитель записывается в роутер; незапущенный проигравший отменяется,
+   ответ уже выполняющегося отбрасывается
+4. cancel_event (таймаут итеративного исполнителя) отменяет оба запроса:
+   ожидание прерывается, cancel_event передается в call_func каждого запроса
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_DELAY = 10.0
+MIN_HEDGE_DELAY = 1.0
+# Как часто ожидание ответа проверяет cancel_event
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def hedging_enabled(request_data: Optional[Dict[str, Any]] = None) -> bool:
+    """Дублирование включается флагом 'hedge' в запросе или GOPIAI_LLM_HEDGING=1"""
+    if request_data and 'hedge' in request_data:
+        return bool(request_data['hedge'])
+    return os.getenv('GOPIAI_LLM_HEDGING', '0').lower() in ('1', 'true', 'yes')
+
+
+class HedgedLLMCaller:
+    """Вызов LLM с дублированием запроса на запасную модель"""
+
+    def __init__(self, call_func: Callable[[Any, str], str], llm_factory: Callable[[str, str, float], Any],
+                 router, monitor, max_workers: int = 8, default_delay: float = DEFAULT_HEDGE_DELAY,
+                 min_delay: float = MIN_HEDGE_DELAY):
+        """
+        Args:
+            call_func: call_func(llm, prompt[, cancel_event=...]) -> ответ (call_llm сервера)
+            llm_factory: llm_factory(provider, model, temperature) -> LLM (пул экземпляров)
+            router: ModelRouter - выбор запасной модели и статистика задержек
+            monitor: RateLimitMonitor - квоты для запасной модели
+        """
+        self.call_func = call_func
+        self.llm_factory = llm_factory
+        self.router = router
+        self.monitor = monitor
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gopiai-hedge")
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'skipped_no_quota': 0}
+
+    def hedge_delay(self, model_id: str) -> float:
+        p95 = self.router.latency_percentile(model_id, 0.95)
+        if p95 is None:
+            return self.default_delay
+        return max(self.min_delay, p95)
+
+    def call(self, llm, prompt: str, provider: str = 'gemini', temperature: float = 0.7,
+             task_type: str = 'dialog', cancel_event: Optional[threading.Event] = None) -> Tuple[str, Any]:
+        """
+        Возвращает (ответ, llm победителя)
+
+        Если выставлен cancel_event, оба запроса отменяются и бросается CancelledError.
+        """
+        primary_model = getattr(llm, 'model', None)
+        started = time.monotonic()
+        self._bump('calls')
+
+        primary = self._submit(llm, prompt, cancel_event)
+        delay = self.hedge_delay(primary_model) if primary_model else self.default_delay
+        done, _ = self._wait({primary}, delay, cancel_event)
+        if done:
+            return primary.result(), llm
+
+        hedge_llm = self._start_hedge_llm(primary_model, provider, temperature, task_type)
+        if hedge_llm is None:
+            self._wait({primary}, None, cancel_event)
+            return primary.result(), llm
+
+        self._bump('hedged')
+        hedge_model = hedge_llm.model
+        logger.info(f"[HEDGE] {primary_model} не ответила за {delay:.1f}с, дублируем запрос в {hedge_model}")
+        hedge = self._submit(hedge_llm, prompt, cancel_event)
+        owners = {primary: (llm, primary_model), hedge: (hedge_llm, hedge_model)}
+
+        pending = {primary, hedge}
+        last_error = None
+        while pending:
+            done, pending = self._wait(pending, None, cancel_event)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+                winner_llm, winner_model = owners[future]
+                for other in pending:
+                    # Незапущенный вызов отменяется, ответ выполняющегося будет отброшен
+                    other.cancel()
+                    loser_model = owners[other][1]
+                    self.router.record_hedge_result(winner_model, loser_model, time.monotonic() - started)
+                if future is hedge:
+                    self._bump('hedge_wins')
+                    logger.info(f"[HEDGE] Первым ответила запасная модель {winner_model}")
+                return future.result(), winner_llm
+        raise last_error
+
+    def _submit(self, llm, prompt: str, cancel_event: Optional[threading.Event]):
+        if cancel_event is None:
+            return self._executor.submit(self.call_func, llm, prompt)
+        return self._executor.submit(self.call_func, llm, prompt, cancel_event=cancel_event)
+
+    @staticmethod
+    def _wait(futures, timeout: Optional[float], cancel_event: Optional[threading.Event]):
+        """wait(FIRST_COMPLETED), прерываемый cancel_event: отменяет незапущенные запросы и бросает CancelledError"""
+        if cancel_event is None:
+            return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = CANCEL_POLL_INTERVAL if deadline is None else min(CANCEL_POLL_INTERVAL, deadline - time.monotonic())
+            done, pending = wait(futures, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            # Запросы, прерванные отменой, завершаются ошибкой - важнее сама отмена
+            if cancel_event.is_set():
+                for future in futures:
+                    future.cancel()
+                raise CancelledError("Дублированный вызов LLM отменен")
+            if done or (deadline is not None and time.monotonic() >= deadline):
+                return done, pending
+
+    def _start_hedge_llm(self, primary_model, provider, temperature, task_type):
+        exclude = [primary_model] if primary_model else []
+        hedge_model = self.router.select(task_type, exclude_models=exclude)
+        if not hedge_model:
+            return None
+        if not self.monitor.acquire(hedge_model, timeout=0):
+            self._bump('skipped_no_quota')
+            logger.debug(f"[HEDGE] Нет свободного слота для {hedge_model}, дублирование пропущено")
+            return None
+        try:
+            return self.llm_factory(provider, hedge_model, temperature)
+        except Exception as e:
+            logger.warning(f"[HEDGE] Не удалось создать LLM для {hedge_model}: {e}")
+            return None
+
+    def _bump(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
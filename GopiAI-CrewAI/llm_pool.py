@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+LLM Pool для GopiAI CrewAI сервера
+
+Кэш экземпляров crewai.LLM вместо создания нового объекта на каждое сообщение:
+1. Ключ кэша - (provider, model, temperature)
+2. Вытеснение по LRU при превышении max_size
+3. Состояние здоровья на модель: ошибки провайдера выбрасывают экземпляр из кэша
+   и помечают модель как нездоровую до истечения cooldown
+4. Один общий httpx.Client с keep-alive, подключенный к litellm (litellm.client_session
+   используется синхронными вызовами всех провайдеров), чтобы повторные запросы
+   не открывали новое TCP/TLS соединение. Клиент и фоновая проверка создаются в каждом
+   процессе отдельно (по os.getpid()): при preload_app воркеры gunicorn не должны
+   делить сокеты и потоки мастера
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_UNHEALTHY_COOLDOWN = 300  # 5 минут
+
+
+class LLMPool:
+    """Потокобезопасный LRU-кэш экземпляров LLM с учетом здоровья моделей"""
+
+    def __init__(self, factory: Callable[..., Any], max_size: int = DEFAULT_POOL_SIZE,
+                 unhealthy_cooldown: float = DEFAULT_UNHEALTHY_COOLDOWN):
+        """
+        Args:
+            factory: функция factory(model=..., temperature=...) создающая LLM
+            max_size: максимальное число закэшированных экземпляров
+            unhealthy_cooldown: сколько секунд модель считается нездоровой после ошибки
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.unhealthy_cooldown = unhealthy_cooldown
+        self._instances: "OrderedDict[Tuple[str, str, float], Any]" = OrderedDict()
+        self._health: Dict[str, Dict[str, Any]] = {}
+        self._http_client = None
+        self._http_client_pid = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float) -> Tuple[str, str, float]:
+        return (provider or '', model, round(float(temperature), 3))
+
+    def get(self, provider: str, model: str, temperature: float = 0.7):
+        """Возвращает закэшированный LLM или создает новый (создание - вне блокировки)"""
+        key = self.make_key(provider, model, temperature)
+        with self._lock:
+            llm = self._instances.get(key)
+            if llm is not None:
+                self._instances.move_to_end(key)
+                self._stats['hits'] += 1
+                return llm
+            self._stats['misses'] += 1
+
+        self.ensure_http_client()
+        llm = self.factory(model=model, temperature=temperature)
+
+        with self._lock:
+            # Другой поток мог успеть создать тот же экземпляр
+            existing = self._instances.get(key)
+            if existing is not None:
+                self._instances.move_to_end(key)
+                return existing
+            self._instances[key] = llm
+            while len(self._instances) > self.max_size:
+                evicted_key, _ = self._instances.popitem(last=False)
+                self._stats['evictions'] += 1
+                logger.debug(f"[LLM-POOL] Вытеснен экземпляр {evicted_key}")
+        return llm
+
+    def is_healthy(self, model: str) -> bool:
+        with self._lock:
+            health = self._health.get(model)
+            if not health or health['healthy']:
+                return True
+            if time.time() >= health['unhealthy_until']:
+                health['healthy'] = True
+                return True
+            return False
+
+    def mark_unhealthy(self, model: str, error: str = ''):
+        """Помечает модель нездоровой и выбрасывает ее экземпляры из кэша"""
+        with self._lock:
+            health = self._health.setdefault(model, {'healthy': True, 'failures': 0})
+            health['healthy'] = False
+            health['failures'] += 1
+            health['last_error'] = error[:200]
+            health['unhealthy_until'] = time.time() + self.unhealthy_cooldown
+            for key in [k for k in self._instances if k[1] == model]:
+                del self._instances[key]
+        logger.warning(f"[LLM-POOL] Модель {model} помечена нездоровой: {error[:100]}")
+
+    def mark_healthy(self, model: str):
+        """Сбрасывает счетчик ошибок модели после успешного вызова"""
+        with self._lock:
+            health = self._health.get(model)
+            if health:
+                health['healthy'] = True
+                health['failures'] = 0
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._instances),
+                'max_size': self.max_size,
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'evictions': self._stats['evictions'],
+                'unhealthy_models': {
+                    model: {
+                        'failures': h['failures'],
+                        'last_error': h.get('last_error'),
+                        'retry_in': max(0, int(h['unhealthy_until'] - time.time()))
+                    }
+                    for model, h in self._health.items() if not h['healthy']
+                },
+            }
+
+    def ensure_http_client(self):
+        """Подключает к litellm общий keep-alive HTTP клиент (один на процесс)"""
+        pid = os.getpid()
+        with self._lock:
+            if self._http_client_pid == pid:
+                return
+            self._http_client_pid = pid
+        try:
+            import httpx
+            import litellm
+        except ImportError:
+            return
+        # Клиент, уже заданный в litellm приложением, не заменяется;
+        # клиент, созданный до fork(), заменяется - его сокеты принадлежат родителю
+        current = getattr(litellm, 'client_session', None)
+        if current is None or current is self._http_client:
+            self._http_client = litellm.client_session = httpx.Client(
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+            )
+            logger.debug(f"[LLM-POOL] Общий keep-alive HTTP клиент подключен к litellm (pid {pid})")
+
+
+_validation_lock = threading.Lock()
+
+
+def run_startup_validation(check: Callable[[], Any], state: Dict[str, Any]) -> Optional[threading.Thread]:
+    """
+    Запускает проверку LLM в фоне, не блокируя старт сервера
+
+    Проверка выполняется один раз в каждом процессе: повторный вызов в том же процессе
+    возвращает None, а в процессе после fork() (state унаследован от родителя) запускает ее заново.
+    Результат пишется в state: {'status': 'pending'|'ok'|'failed', 'error': ..., 'checked_at': ..., 'pid': ...}
+    """
+    pid = os.getpid()
+    with _validation_lock:
+        if state.get('pid') == pid:
+            return None
+        state.update({'status': 'pending', 'error': None, 'checked_at': None, 'pid': pid})
+
+    def _run():
+        try:
+            check()
+            state.update({'status': 'ok', 'checked_at': time.time()})
+            logger.info("✅ Фоновая проверка API прошла успешно")
+        except Exception as e:
+            state.update({'status': 'failed', 'error': str(e), 'checked_at': time.time()})
+            logger.error(f"❌ Фоновая проверка API не прошла: {e}")
+            logger.error("🔍 Проверьте GEMINI_API_KEY в .env файле")
+
+    thread = threading.Thread(target=_run, name="gopiai-llm-validation", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,13 @@
+import logging
+import math
 import os
 import time
 import threading
+
+from model_router import ModelRouter
+from rate_limiter import RateLimiterMetrics, create_rate_limit_backend
+
+logger = logging.getLogger(__name__)
 # Конфиг моделей Gemini/Gemma для ротации и задач (обновлено согласно официальной документации)
 LLM_MODELS_CONFIG = [
     # Production-optimized config for Gemini free tier limits
@@ -166,133 +173,137 @@ def get_api_key_for_provider(provider_name: str):
         print(f"[DEBUG] Current environment variables: {[k for k in os.environ if 'GEMINI' in k or 'API' in k]}")
     
     return api_key
-# 🚨 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Улучшенный монитор лимитов с blacklist механизмом
+# Монитор лимитов: скользящие окна RPM/TPM/RPD на модель (rate_limiter.py) + blacklist
 class RateLimitMonitor:
-    def __init__(self, models_config):
+    def __init__(self, models_config, backend=None):
         self.models = {m["id"]: m for m in models_config}
-        self.usage = {
-            m["id"]: {
-                "rpm": 0, 
-                "tpm": 0, 
-                "rpd": 0, 
-                "last_reset": time.time(), 
-                "last_day_reset": time.time()
-            } for m in models_config
-        }
+        self.backend = backend or create_rate_limit_backend()
+        self.metrics = RateLimiterMetrics()
         
-        # 🚨 НОВОЕ: Blacklist для временно недоступных моделей
+        # Blacklist для временно недоступных моделей
         self.blacklisted_models = {}  # {model_id: expiry_timestamp}
-        self.lock = threading.Lock()
-        
-        print("[OK] RateLimitMonitor инициализирован с blacklist механизмом")
-    def _reset_if_needed(self, model_id):
-        now = time.time()
-        
-        if model_id not in self.usage:
-            self.usage[model_id] = {
-                "rpm": 0, 
-                "tpm": 0, 
-                "rpd": 0, 
-                "last_reset": now, 
-                "last_day_reset": now
-            }
-        
-        # Сброс usage каждую минуту
-        if now - self.usage[model_id]["last_reset"] > 60:
-            print(f"🔄 [RESET] Сбрасываем минутные лимиты для {model_id}")
-            self.usage[model_id]["rpm"] = 0
-            self.usage[model_id]["tpm"] = 0
-            self.usage[model_id]["last_reset"] = now
+        self.lock = threading.Lock()  # защищает только blacklist
+        self._unknown_models = set()  # модели без лимитов, о которых уже предупредили
         
-        # Сброс RPD каждые 24 часа
-        if now - self.usage[model_id]["last_day_reset"] > 86400:  # 24 часа
-            print(f"🔄 [RESET] Сбрасываем дневные лимиты для {model_id}")
-            self.usage[model_id]["rpd"] = 0
-            self.usage[model_id]["last_day_reset"] = now
-    # 🚨 НОВОЕ: Проверка блокировки модели
+        logger.info(f"[OK] RateLimitMonitor инициализирован ({type(self.backend).__name__})")
+    def _limits(self, model_id):
+        """Лимиты модели; None для модели без конфигурации - такие модели не используются"""
+        model = self.models.get(model_id)
+        if model is None:
+            if model_id not in self._unknown_models:
+                self._unknown_models.add(model_id)
+                logger.warning(f"[LIMIT] Модель {model_id} отсутствует в конфигурации лимитов и не будет использоваться")
+            return None
+        return {"rpm": model["rpm"], "tpm": model["tpm"], "rpd": model["rpd"]}
+    @property
+    def usage(self):
+        """Текущее использование всех моделей в скользящих окнах: {model_id: {rpm, tpm, rpd}}"""
+        return {model_id: self.get_usage(model_id) for model_id in self.models}
+    def get_usage(self, model_id):
+        return self.backend.usage(model_id)
+    # Проверка блокировки модели
     def is_model_blocked(self, model_id):
         """Проверяет, заблокирована ли модель временно
         ВНИМАНИЕ: Эта функция должна вызываться только изнутри блокировки self.lock!
         """
-        now = time.time()
-        if model_id in self.blacklisted_models:
-            expiry_time = self.blacklisted_models[model_id]
-            if now >= expiry_time:
-                # Модель восстановлена, удаляем из blacklist
-                del self.blacklisted_models[model_id]
-                print(f"✅ Модель {model_id} восстановлена и удалена из blacklist")
-                return False
-            else:
-                remaining_time = int(expiry_time - now)
-                print(f"🚫 Модель {model_id} заблокирована еще {remaining_time} секунд")
-                return True
-        return False
+        expiry_time = self.blacklisted_models.get(model_id)
+        if expiry_time is None:
+            return False
+        if time.time() >= expiry_time:
+            # Модель восстановлена, удаляем из blacklist
+            del self.blacklisted_models[model_id]
+            logger.info(f"✅ Модель {model_id} восстановлена и удалена из blacklist")
+            return False
+        return True
 
     
     def is_model_blocked_safe(self, model_id):
         """Публичная версия is_model_blocked с собственной блокировкой"""
+        if model_id not in self.blacklisted_models:
+            return False
         with self.lock:
             return self.is_model_blocked(model_id)
-    # 🚨 НОВОЕ: Блокировка модели при ошибках API
+    # Блокировка модели при ошибках API
     def mark_model_unavailable(self, model_id, duration=3600):
         """Помечает модель как недоступную на указанное время (в секундах)"""
         with self.lock:
             expiry_time = time.time() + duration
             self.blacklisted_models[model_id] = expiry_time
-            
-            # Также искусственно исчерпываем лимиты для двойной защиты
-            if model_id in self.models:
-                self.usage[model_id]["rpm"] = self.models[model_id]["rpm"]
-                self.usage[model_id]["rpd"] = max(self.models[model_id]["rpd"], 1) if self.models[model_id]["rpd"] > 0 else 999
-                
-            print(f"🚫 Модель {model_id} заблокирована на {duration} секунд до {time.strftime('%H:%M:%S', time.localtime(expiry_time))}")
-    # 🚨 ИСПРАВЛЕНО: can_use теперь учитывает blacklist
+        logger.warning(f"🚫 Модель {model_id} заблокирована на {duration} секунд до {time.strftime('%H:%M:%S', time.localtime(expiry_time))}")
+    def time_until_available(self, model_id, tokens=0):
+        """Сколько секунд ждать слота для модели (0 - можно сейчас, inf - не уложится в лимиты)"""
+        with self.lock:
+            if self.is_model_blocked(model_id):
+                return self.blacklisted_models[model_id] - time.time()
+        limits = self._limits(model_id)
+        if limits is None:
+            return math.inf
+        return self.backend.check(model_id, limits, tokens)
     def can_use(self, model_id, tokens=0):
         try:
-            print(f"[CHECK] Проверка модели {model_id} с {tokens} токенами...")
-            
-            # Защита от зависания: используем timeout
-            with self.lock:
-                # Первая проверка: модель в blacklist?
-                if self.is_model_blocked(model_id):
-                    print(f"[BLOCKED] Модель {model_id} в blacklist")
-                    return False
-                    
-                self._reset_if_needed(model_id)
-                model = self.models[model_id]
-                usage = self.usage[model_id]
-                
-                print(f"[STATS] Модель {model_id}: текущее использование RPM={usage['rpm']}/{model['rpm']}, TPM={usage['tpm']}/{model['tpm']}, RPD={usage['rpd']}/{model['rpd']}")
-                
-                # Проверяем все лимиты: RPM, TPM и RPD
-                rpm_ok = usage["rpm"] < model["rpm"]
-                tpm_ok = usage["tpm"] + tokens < model["tpm"]
-                rpd_ok = model["rpd"] == 0 or usage["rpd"] < model["rpd"]  # Если RPD=0, игнорируем проверку
-                
-                result = rpm_ok and tpm_ok and rpd_ok
-                
-                print(f"[OK] Модель {model_id}: RPM_OK={rpm_ok}, TPM_OK={tpm_ok}, RPD_OK={rpd_ok} -> RESULT={result}")
-                
-                if not result:
-                    print(f"[WARNING] Модель {model_id} недоступна: RPM={usage['rpm']}/{model['rpm']}, TPM={usage['tpm']}/{model['tpm']}, RPD={usage['rpd']}/{model['rpd']}")
-                
-                return result
+            if self.is_model_blocked_safe(model_id):
+                self.metrics.record(model_id, "blocked")
+                return False
+            limits = self._limits(model_id)
+            if limits is None:
+                return False
+            result = self.backend.check(model_id, limits, tokens) == 0.0
+            if not result:
+                self.metrics.record(model_id, "throttled")
+                logger.debug(f"[LIMIT] Модель {model_id} недоступна: {self.get_usage(model_id)} / {limits}")
+            return result
         except Exception as e:
-            print(f"[ERROR] ОШИБКА в can_use для модели {model_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"[ERROR] Ошибка в can_use для модели {model_id}: {e}")
             return False
     def register_use(self, model_id, tokens=0):
-        with self.lock:
-            self._reset_if_needed(model_id)
-            self.usage[model_id]["rpm"] += 1
-            self.usage[model_id]["tpm"] += tokens
-            self.usage[model_id]["rpd"] += 1  # Также увеличиваем счетчик запросов в день
-            print(f"📊 [USAGE] {model_id}: RPM={self.usage[model_id]['rpm']}, TPM={self.usage[model_id]['tpm']}, RPD={self.usage[model_id]['rpd']}")
-    def wait_for_slot(self, model_id, tokens=0):
-        # Ждать, пока не появится слот для запроса
-        while not self.can_use(model_id, tokens):
-            time.sleep(1)
+        self.backend.record(model_id, tokens)
+        self.metrics.record(model_id, "allowed")
+    def acquire(self, model_id, tokens=0, timeout=None):
+        """
+        Занимает слот для запроса, при необходимости ожидая его освобождения
+
+        Проверка и регистрация атомарны. Ждет ровно до выхода старого запроса из окна;
+        если слот не освободится до timeout (или модель в blacklist), сразу возвращает False.
+        """
+        return self._wait(model_id, tokens, timeout, reserve=True)
+    def wait_for_slot(self, model_id, tokens=0, timeout=None):
+        # Ждать, пока не появится слот для запроса (без регистрации использования)
+        return self._wait(model_id, tokens, timeout, reserve=False)
+    def _wait(self, model_id, tokens, timeout, reserve):
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        limits = self._limits(model_id)
+        if limits is None:
+            return False
+        while True:
+            if self.is_model_blocked_safe(model_id):
+                self.metrics.record(model_id, "blocked")
+                return False
+            wait = self.backend.check(model_id, limits, tokens, reserve=reserve)
+            if wait == 0.0:
+                if reserve:
+                    self.metrics.record(model_id, "allowed", time.monotonic() - started)
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if math.isinf(wait) or (remaining is not None and wait > remaining):
+                self.metrics.record(model_id, "timeouts", time.monotonic() - started)
+                return False
+            logger.debug(f"[LIMIT] Ожидание слота {model_id}: {wait:.2f}с")
+            # Другой поток может занять освободившийся слот - тогда пересчитываем ожидание
+            time.sleep(wait + 0.001)
+    def get_metrics(self):
+        """Метрики лимитера: решения, текущее использование и лимиты по моделям"""
+        counters = self.metrics.snapshot()
+        blacklist = self.get_blacklist_status()
+        return {
+            model_id: {
+                **counters.get(model_id, {}),
+                "usage": self.get_usage(model_id),
+                "limits": self._limits(model_id),
+                "blocked_for": blacklist.get(model_id, 0),
+            }
+            for model_id in self.models
+        }
     # 🚨 НОВОЕ: Получение доступных моделей с учетом blacklist
     def get_available_models(self, task_type):
         """Возвращает список доступных (не заблокированных) моделей для task_type"""
@@ -316,68 +327,19 @@ class RateLimitMonitor:
             return active_blocks
 # Инициализация глобального монитора
 rate_limit_monitor = RateLimitMonitor(LLM_MODELS_CONFIG)
-# 🚨 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: select_llm_model_safe с учетом blacklist
+# Единый роутер моделей: EWMA задержки/ошибок, квоты и circuit breaker (model_router.py)
+model_router = ModelRouter(LLM_MODELS_CONFIG, rate_limit_monitor)
 def select_llm_model_safe(task_type, tokens=0, intelligence_priority=False, exclude_models=None):
     """
     task_type: тип задачи
     tokens: количество токенов
     intelligence_priority: если True, приоритизируем модели с высоким base_score
     exclude_models: список моделей для исключения (дополнительно к blacklist)
-    """
-    exclude_models = exclude_models or []
-    
-    # Получаем подходящие модели с учетом blacklist и exclude_models
-    suitable_models = []
-    for m in LLM_MODELS_CONFIG:
-        if (task_type in m["type"] and 
-            not m.get("deprecated", False) and
-            m["id"] not in exclude_models and
-            not rate_limit_monitor.is_model_blocked_safe(m["id"])):
-            suitable_models.append(m)
     
-    if not suitable_models:
-        print(f"❌ Нет доступных моделей для task_type '{task_type}'. Blacklist: {rate_limit_monitor.get_blacklist_status()}")
-        return None
-    
-    # Сортируем с учётом base_score или обычного приоритета
-    if intelligence_priority:
-        suitable_models = sorted(suitable_models, key=lambda m: (-m["base_score"], m["priority"]))
-    else:
-        suitable_models = sorted(suitable_models, key=lambda m: m["priority"])
-    
-    print(f"[AVAILABLE] Доступные модели для '{task_type}': {[m['id'] for m in suitable_models]}")
-    
-    # ПЕРВЫЙ ПРОХОД: Ищем доступную модель
-    for model in suitable_models:
-        if rate_limit_monitor.can_use(model["id"], tokens):
-            print(f"[SELECTED] AI Router: Выбрана модель '{model['id']}' (приоритет {model['priority']})")
-            return model["id"]
-    
-    # ВТОРОЙ ПРОХОД: Если все модели заняты, берем модель с наименьшим использованием
-    print("⚠️ Все доступные модели близки к лимитам, выбираем наименее загруженную...")
-    best_model = None
-    best_score = float('inf')
-    
-    for model in suitable_models:
-        usage = rate_limit_monitor.usage[model["id"]]
-        model_config = rate_limit_monitor.models[model["id"]]
-        
-        # Считаем "загруженность" как процент от лимитов
-        rpm_load = usage["rpm"] / model_config["rpm"]
-        tpm_load = (usage["tpm"] + tokens) / model_config["tpm"]
-        total_load = rpm_load + tpm_load
-        
-        if total_load < best_score:
-            best_score = total_load
-            best_model = model
-    
-    if best_model:
-        print(f"⚠️ AI Router: Принудительно выбрана наименее загруженная модель '{best_model['id']}' (загрузка: {best_score:.2f})")
-        return best_model["id"]
-    
-    # ТРЕТИЙ ПРОХОД: В крайнем случае возвращаем None для graceful degradation
-    print("😴 Все доступные модели исчерпали лимиты. Требуется ожидание или fallback.")
-    return None
+    Выбор делегируется model_router: модель с минимальным ожидаемым временем выполнения.
+    Если все модели упираются в лимиты, выбирается та, у которой слот освободится раньше.
+    """
+    return model_router.select(task_type, tokens, intelligence_priority, exclude_models)
 # 🚨 НОВОЕ: Функция для получения следующей доступной модели (fallback chain)
 def get_next_available_model(task_type, current_model_id, tokens=0):
     """Получает следующую доступную модель в цепочке fallback"""
@@ -429,13 +391,14 @@ def update_model_deprecated_status(model_id, deprecated=True):
     for model in LLM_MODELS_CONFIG:
         if model["id"] == model_id:
             model["deprecated"] = deprecated
+            model_router.refresh()
             print(f"📝 Модель {model_id} помечена как {'deprecated' if deprecated else 'active'}")
             return True
     return False
 def get_model_usage_stats(model_id):
     """Возвращает статистику использования модели"""
-    if model_id in rate_limit_monitor.usage:
-        usage = rate_limit_monitor.usage[model_id]
+    if model_id in rate_limit_monitor.models:
+        usage = rate_limit_monitor.get_usage(model_id)
         model_config = rate_limit_monitor.models[model_id]
         return {
             "rpm_used": usage["rpm"],
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Долговременная семантическая память чата на сервере CrewAI
+
+1. Каждое сообщение диалога upsert'ится в гибридный индекс txtai (dense + BM25),
+   который хранится в VECTOR_INDEX_PATH (~/.gopiai/memory/vectors, как в memory_config UI)
+2. add_message только записывает сообщение в очередь SQLite рядом с индексом и никогда
+   не задерживает ответ; индексирует очередь фоновый поток, а из очереди сообщения
+   удаляются только после сохранения индекса на диск
+3. Под gunicorn индекс пишет один процесс (держатель lock-файла), остальные воркеры
+   кладут сообщения в общую очередь и перечитывают индекс после его сохранения;
+   поколение индекса в файле рядом с ним нечетно, пока идет сохранение, поэтому
+   читатели не загружают наполовину записанный индекс
+4. search возвращает top-k релевантных фрагментов прошлых разговоров в пределах
+   бюджета задержки: поиск (эмбеддинг запроса и запрос к индексу) выполняется в
+   отдельном потоке, ответ не ждет его дольше бюджета; если индекс занят, еще не
+   загружен или поиск не успел - память пропускается
+5. Векторы запросов кэшируются (LRU), повторный запрос не пересчитывает эмбеддинг
+6. Фоновый поток запускается при первом обращении в каждом процессе (после fork),
+   без txtai сервис отключается и сервер работает без долговременной памяти
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from context_builder import MEMORY_BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VECTOR_INDEX_PATH = Path(os.getenv('GOPIAI_VECTOR_INDEX_PATH', str(MEMORY_BASE_DIR / "vectors")))
+DEFAULT_EMBEDDINGS_MODEL = os.getenv(
+    'GOPIAI_EMBEDDINGS_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+)
+# Бюджет задержки поиска (сек) и число фрагментов на запрос
+DEFAULT_SEARCH_TIMEOUT = float(os.getenv('GOPIAI_MEMORY_SEARCH_TIMEOUT', '0.3'))
+DEFAULT_TOP_K = int(os.getenv('GOPIAI_MEMORY_TOP_K', '5'))
+# Фрагменты с меньшей гибридной оценкой не возвращаются
+DEFAULT_MIN_SCORE = float(os.getenv('GOPIAI_MEMORY_MIN_SCORE', '0.2'))
+INDEX_BATCH_SIZE = 16
+# Сколько ждать следующих сообщений, прежде чем индексировать неполную пачку
+INDEX_FLUSH_INTERVAL = 1.0
+# Индекс сохраняется на диск не чаще одного раза за интервал
+INDEX_SAVE_INTERVAL = 30.0
+# Как часто процессы, не пишущие индекс, проверяют его обновление
+INDEX_RELOAD_INTERVAL = 10.0
+QUERY_CACHE_SIZE = 1024
+
+SEARCH_QUERY = (
+    "select id, text, session_id, role, timestamp, score from txtai "
+    "where similar(:query) and score >= :min_score"
+)
+
+
+class QueryVectorCache:
+    """LRU-кэш векторов запросов по (category, text)"""
+
+    def __init__(self, size: int = QUERY_CACHE_SIZE):
+        self.size = size
+        self._vectors: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[tuple]) -> Dict[tuple, Any]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._vectors.get(key)
+                if vector is None:
+                    self.misses += 1
+                    continue
+                self._vectors.move_to_end(key)
+                found[key] = vector
+                self.hits += 1
+        return found
+
+    def put_many(self, items: Dict[tuple, Any]):
+        with self._lock:
+            for key, vector in items.items():
+                self._vectors[key] = vector
+                self._vectors.move_to_end(key)
+            while len(self._vectors) > self.size:
+                self._vectors.popitem(last=False)
+
+
+def create_embeddings(config: Dict[str, Any], cache: QueryVectorCache):
+    """Embeddings txtai, у которого векторы запросов берутся из кэша"""
+    import numpy as np
+    from txtai import Embeddings
+
+    class QueryCachedEmbeddings(Embeddings):
+        # Индексация строит векторы через модель напрямую; batchtransform вызывается
+        # только для запросов (search, similarity), поэтому кэшируется только он
+        def batchtransform(self, documents, category=None, index=None):
+            documents = list(documents)
+            texts = [document[1] if isinstance(document, tuple) else document for document in documents]
+            if index or not all(isinstance(text, str) for text in texts):
+                return super().batchtransform(documents, category, index)
+
+            keys = [(category, text) for text in texts]
+            vectors = cache.get_many(keys)
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            if missing:
+                computed = super().batchtransform([(None, text, None) for _, text in missing], category, index)
+                new = {key: vector for key, vector in zip(missing, computed)}
+                cache.put_many(new)
+                vectors.update(new)
+            return np.array([vectors[key] for key in keys])
+
+    return QueryCachedEmbeddings(config)
+
+
+def message_id(session_id: Optional[str], role: str, content: str) -> str:
+    raw = f"{session_id or ''}\x00{role}\x00{content}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _acquire_writer_lock(path: Path):
+    """Неблокирующая эксклюзивная блокировка файла; None - индекс пишет другой процесс"""
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: сервер работает в одном процессе
+        return True
+    handle = open(path, 'a+')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return handle
+    except OSError:
+        handle.close()
+        return None
+
+
+class PendingMessageQueue:
+    """Очередь сообщений на индексацию в SQLite, общая для всех процессов сервера"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # После fork() соединение родителя использовать нельзя
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "id TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put(self, uid: str, data: Dict[str, Any]):
+        self._connect().execute(
+            "INSERT INTO pending (id, data) VALUES (?, ?)", (uid, json.dumps(data, ensure_ascii=False))
+        )
+
+    def take(self, limit: int, after: int = 0) -> List[tuple]:
+        """Самые старые сообщения (seq, id, data) после seq=after, без удаления"""
+        rows = self._connect().execute(
+            "SELECT seq, id, data FROM pending WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+        )
+        return [(seq, uid, json.loads(data)) for seq, uid, data in rows]
+
+    def ack(self, last_seq: int):
+        self._connect().execute("DELETE FROM pending WHERE seq <= ?", (last_seq,))
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+
+class MemoryService:
+    """Фоновая индексация сообщений и поиск по долговременной памяти"""
+
+    def __init__(self, index_path=DEFAULT_VECTOR_INDEX_PATH, model: str = DEFAULT_EMBEDDINGS_MODEL,
+                 config: Optional[Dict[str, Any]] = None, search_timeout: float = DEFAULT_SEARCH_TIMEOUT,
+                 min_score: float = DEFAULT_MIN_SCORE, batch_size: int = INDEX_BATCH_SIZE,
+                 flush_interval: float = INDEX_FLUSH_INTERVAL, save_interval: float = INDEX_SAVE_INTERVAL,
+                 reload_interval: float = INDEX_RELOAD_INTERVAL, query_cache_size: int = QUERY_CACHE_SIZE):
+        self.index_path = Path(index_path)
+        # config переопределяет настройки индекса (например, method/transform в тестах)
+        self.config = {'path': model, 'content': True, 'hybrid': True, **(config or {})}
+        self.search_timeout = search_timeout
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.save_interval = save_interval
+        self.reload_interval = reload_interval
+        self.query_cache = QueryVectorCache(query_cache_size)
+        self.queue = PendingMessageQueue(self.index_path.parent / f"{self.index_path.name}.queue.db")
+        self.lock_path = self.index_path.parent / f"{self.index_path.name}.lock"
+        self.generation_path = self.index_path.parent / f"{self.index_path.name}.generation"
+        self.enabled = True
+        self.embeddings = None
+
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread: Optional[threading.Thread] = None
+        self._search_pool: Optional[ThreadPoolExecutor] = None
+        self._stats = {'indexed': 0, 'searches': 0, 'timeouts': 0, 'errors': 0, 'reloads': 0}
+
+    # --- Жизненный цикл ---
+
+    def start(self):
+        """Запускает фоновый поток текущего процесса (повторный вызов ничего не делает)"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return self
+            # Процесс после fork() не наследует потоки и блокировки родителя
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._ready = threading.Event()
+            self._wake = threading.Event()
+            self._stopping = threading.Event()
+            self._writer = None
+            self._dirty = False
+            # seq последнего проиндексированного сообщения; из очереди удаляется после сохранения индекса
+            self._indexed_seq = 0
+            self._last_save = self._last_reload_check = time.monotonic()
+            # Поколение загруженного индекса; -1 - загружен индекс, который мог сохраняться в этот момент
+            self._index_generation = 0
+            # Один поток поиска: запросы, не уложившиеся в бюджет, не копят потоки
+            self._search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-search")
+            self._thread = threading.Thread(target=self._run, name="memory-indexer", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        self.start()
+        return self._ready.wait(timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Индексирует оставшуюся очередь (если процесс пишет индекс), сохраняет индекс и останавливает поток"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._search_pool.shutdown(wait=False, cancel_futures=True)
+        self._search_pool = None
+        self._pid = None
+
+    @property
+    def is_writer(self) -> bool:
+        return bool(self._pid == os.getpid() and self._writer)
+
+    def _read_generation(self) -> int:
+        """Поколение индекса на диске: четное - сохранение завершено, нечетное - идет запись"""
+        try:
+            return int(self.generation_path.read_text().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_generation(self, generation: int):
+        tmp_path = self.generation_path.with_name(f"{self.generation_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(str(generation))
+        os.replace(tmp_path, self.generation_path)
+
+    def _load(self):
+        generation = self._read_generation()
+        embeddings = create_embeddings(self.config, self.query_cache)
+        if embeddings.exists(str(self.index_path)):
+            embeddings.load(str(self.index_path), config=self.config)
+        # Индекс мог сохраняться во время загрузки - перечитаем после следующего сохранения
+        stable = generation % 2 == 0 and generation == self._read_generation()
+        self._index_generation = generation if stable else -1
+        return embeddings
+
+    def _run(self):
+        try:
+            self.embeddings = self._load()
+            logger.info(f"[MEMORY] 📂 Индекс памяти {self.index_path}: {self.embeddings.count()} записей")
+        except Exception as e:
+            self.enabled = False
+            logger.warning(f"[MEMORY] ⚠️ Долговременная память отключена: {e}")
+            return
+        self._ready.set()
+
+        while True:
+            stopping = self._stopping.is_set()
+            if not self._writer:
+                self._writer = _acquire_writer_lock(self.lock_path)
+            try:
+                if self._writer:
+                    indexed = self._drain(everything=stopping)
+                    if self._dirty and (stopping or time.monotonic() - self._last_save >= self.save_interval):
+                        self._save()
+                    if indexed >= self.batch_size and not stopping:
+                        continue
+                else:
+                    self._reload_if_changed()
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"[MEMORY] ❌ Ошибка фоновой индексации: {e}")
+            if stopping:
+                if hasattr(self._writer, 'close'):
+                    self._writer.close()
+                self._writer = None
+                return
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def _drain(self, everything: bool = False) -> int:
+        """Индексирует пачку сообщений из очереди (или всю очередь); возвращает их число"""
+        total = 0
+        while True:
+            rows = self.queue.take(self.batch_size, after=self._indexed_seq)
+            if not rows:
+                return total
+            # Повторы одного сообщения в пачке схлопываются, иначе upsert создаст дубликаты
+            documents = list({uid: data for _, uid, data in rows}.items())
+            with self._lock:
+                self.embeddings.upsert(documents)
+            self._indexed_seq = rows[-1][0]
+            self._dirty = True
+            self._stats['indexed'] += len(rows)
+            total += len(rows)
+            if not everything:
+                return total
+
+    def _save(self):
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        generation = self._read_generation()
+        # Нечетное поколение на время записи: читатели не загружают частично сохраненный индекс
+        generation += 1 if generation % 2 == 0 else 2
+        self._write_generation(generation)
+        with self._lock:
+            self.embeddings.save(str(self.index_path))
+        self._write_generation(generation + 1)
+        # После сбоя до сохранения сообщения будут проиндексированы повторно (upsert по тому же id)
+        self.queue.ack(self._indexed_seq)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _reload_if_changed(self):
+        """Подхватывает индекс, сохраненный пишущим процессом"""
+        if time.monotonic() - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = time.monotonic()
+        generation = self._read_generation()
+        if generation % 2 or generation == self._index_generation:
+            return
+        embeddings = self._load()
+        if self._index_generation != generation:
+            # Пишущий процесс начал новое сохранение во время загрузки
+            embeddings.close()
+            return
+        with self._lock:
+            previous, self.embeddings = self.embeddings, embeddings
+        previous.close()
+        self._stats['reloads'] += 1
+
+    # --- Публичный API ---
+
+    def add_message(self, session_id: Optional[str], role: str, content: str,
+                    timestamp: Optional[str] = None) -> bool:
+        """Ставит сообщение в очередь индексации (одна вставка в SQLite)"""
+        if not self.enabled or not content or not content.strip():
+            return False
+        self.start()
+        data = {
+            'text': content,
+            'session_id': session_id or '',
+            'role': role,
+            'timestamp': timestamp or time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        try:
+            self.queue.put(message_id(session_id, role, content), data)
+        except sqlite3.Error as e:
+            self._stats['errors'] += 1
+            logger.warning(f"[MEMORY] ⚠️ Сообщение не поставлено в очередь памяти: {e}")
+            return False
+        self._wake.set()
+        return True
+
+    def search(self, query: str, limit: int = DEFAULT_TOP_K,
+               timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Top-k фрагментов прошлых разговоров, релевантных запросу
+
+        Если индекс не готов, занят или поиск не укладывается в timeout, возвращает пустой список.
+        """
+        if not self.enabled or not query or not query.strip():
+            return []
+        self.start()
+        if not self._ready.is_set():
+            return []
+        timeout = self.search_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._stats['searches'] += 1
+        future = self._search_pool.submit(self._search, query, limit, deadline)
+        try:
+            results = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Начатый поиск доработает в фоне, ответ его не ждет
+            future.cancel()
+            results = None
+        if results is None:
+            self._stats['timeouts'] += 1
+            logger.debug(f"[MEMORY] Поиск в памяти не уложился в бюджет {timeout * 1000:.0f} мс, пропущен")
+            return []
+        return results
+
+    def _search(self, query: str, limit: int, deadline: float) -> Optional[List[Dict[str, Any]]]:
+        """Поиск в потоке memory-search; None - бюджет исчерпан до начала поиска"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._lock.acquire(timeout=remaining):
+            return None
+        try:
+            if not self.embeddings.count():
+                return []
+            return self.embeddings.search(
+                SEARCH_QUERY, limit, parameters={'query': query, 'min_score': self.min_score}
+            )
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.warning(f"[MEMORY] ⚠️ Ошибка поиска в памяти: {e}")
+            return []
+        finally:
+            self._lock.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({
+            'enabled': self.enabled,
+            'ready': self._pid == os.getpid() and self._ready.is_set(),
+            'writer': self.is_writer,
+            'query_cache_hits': self.query_cache.hits,
+            'query_cache_misses': self.query_cache.misses,
+        })
+        try:
+            stats['queued'] = self.queue.count()
+        except sqlite3.Error:
+            stats['queued'] = None
+        return stats
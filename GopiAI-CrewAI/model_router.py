@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Model Router для GopiAI CrewAI сервера
+
+Единый выбор модели вместо select_llm_model_safe + EnhancedModelRotator:
+1. Кандидаты для каждого task_type вычисляются один раз при загрузке конфигурации
+2. На модель хранятся EWMA задержки и доли ошибок, circuit breaker и остаток квоты
+3. Выбирается модель с минимальным ожидаемым временем выполнения:
+   ожидание слота + задержка / вероятность успеха, с поправкой на загрузку квоты
+4. Последние решения и оценки всех кандидатов доступны для отладки (explain / get_decisions)
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Априорная задержка модели без измерений (секунды)
+DEFAULT_LATENCY = 5.0
+EWMA_ALPHA = 0.2
+# Минимальная вероятность успеха, чтобы ожидаемое время оставалось конечным
+MIN_SUCCESS_RATE = 0.05
+# Насколько сильно почти исчерпанная квота увеличивает ожидаемое время
+QUOTA_PRESSURE_WEIGHT = 0.5
+# Сколько последних времен ответа хранить для перцентилей
+LATENCY_SAMPLES = 100
+
+
+class ModelHealth(Enum):
+    HEALTHY = "healthy"
+    RATE_LIMITED = "rate_limited"
+    OVERLOADED = "overloaded"
+    ERROR = "error"
+    BLACKLISTED = "blacklisted"
+
+
+class _ModelState:
+    """Накопленная статистика модели"""
+
+    __slots__ = ("latency", "samples", "error_rate", "requests", "failures", "consecutive_failures",
+                 "circuit_open_until", "health", "last_error", "last_success", "hedge_wins", "hedge_losses")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.health = ModelHealth.HEALTHY
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.hedge_wins = 0
+        self.hedge_losses = 0
+
+
+def _percentile(samples, percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+
+def classify_error(error: str) -> ModelHealth:
+    """Определяет тип сбоя модели по тексту ошибки"""
+    error_lower = error.lower()
+    if any(keyword in error_lower for keyword in ['quota', 'rate limit', 'resource_exhausted', '429']):
+        return ModelHealth.RATE_LIMITED
+    if any(keyword in error_lower for keyword in ['overloaded', '503', 'unavailable', 'service_unavailable']):
+        return ModelHealth.OVERLOADED
+    return ModelHealth.ERROR
+
+
+class ModelRouter:
+    """Выбор модели по ожидаемому времени выполнения с учетом задержек, ошибок и квот"""
+
+    def __init__(self, models_config: List[Dict[str, Any]], monitor,
+                 circuit_breaker_threshold: int = 3, circuit_breaker_timeout: float = 300,
+                 rate_limited_timeout: float = 1800, overloaded_timeout: float = 600,
+                 decision_log_size: int = 50):
+        """
+        Args:
+            models_config: список моделей (LLM_MODELS_CONFIG)
+            monitor: RateLimitMonitor - источник квот и blacklist
+        """
+        self.models_config = models_config
+        self.monitor = monitor
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_timeout = circuit_breaker_timeout
+        self.rate_limited_timeout = rate_limited_timeout
+        self.overloaded_timeout = overloaded_timeout
+        self._lock = threading.Lock()
+        self._state: Dict[str, _ModelState] = {}
+        self._decisions = deque(maxlen=decision_log_size)
+        self.refresh()
+
+    def refresh(self):
+        """Перестраивает индекс task_type -> кандидаты (после изменения конфигурации)"""
+        candidates: Dict[str, List[Dict[str, Any]]] = {}
+        for model in sorted(self.models_config, key=lambda m: m["priority"]):
+            if model.get("deprecated", False):
+                continue
+            self._state.setdefault(model["id"], _ModelState())
+            for task_type in model["type"]:
+                candidates.setdefault(task_type, []).append(model)
+        self._candidates = {task_type: tuple(models) for task_type, models in candidates.items()}
+
+    def _state_for(self, model_id: str) -> _ModelState:
+        state = self._state.get(model_id)
+        if state is None:
+            with self._lock:
+                state = self._state.setdefault(model_id, _ModelState())
+        return state
+
+    def _score(self, model: Dict[str, Any], tokens: int, intelligence_priority: bool, now: float) -> Dict[str, Any]:
+        model_id = model["id"]
+        state = self._state_for(model_id)
+        entry = {"model": model_id, "priority": model["priority"]}
+
+        if state.circuit_open_until > now:
+            entry.update(excluded="circuit_open", retry_in=round(state.circuit_open_until - now, 1))
+            return entry
+
+        if self.monitor.is_model_blocked_safe(model_id):
+            entry.update(excluded="blacklisted")
+            return entry
+
+        wait = self.monitor.time_until_available(model_id, tokens)
+        if math.isinf(wait):
+            entry.update(excluded="exceeds_limits")
+            return entry
+
+        usage = self.monitor.get_usage(model_id)
+        loads = [usage["rpm"] / max(model["rpm"], 1), (usage["tpm"] + tokens) / max(model["tpm"], 1)]
+        if model["rpd"]:
+            loads.append(usage["rpd"] / model["rpd"])
+        headroom = max(0.0, 1.0 - max(loads))
+
+        latency = state.latency if state.latency is not None else DEFAULT_LATENCY
+        expected = latency / max(1.0 - state.error_rate, MIN_SUCCESS_RATE)
+        expected *= 1.0 + QUOTA_PRESSURE_WEIGHT * (1.0 - headroom)
+        expected += wait
+        if intelligence_priority:
+            expected /= max(model["base_score"], 0.1)
+
+        entry.update(
+            score=round(expected, 3),
+            wait=round(wait, 3),
+            latency=round(latency, 3),
+            error_rate=round(state.error_rate, 3),
+            headroom=round(headroom, 3),
+            health=state.health.value,
+        )
+        return entry
+
+    def explain(self, task_type: str, tokens: int = 0, intelligence_priority: bool = False,
+                exclude_models: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Оценки всех кандидатов для task_type без выбора (меньше score - лучше)"""
+        exclude_models = exclude_models or []
+        now = time.time()
+        scored = []
+        for model in self._candidates.get(task_type, ()):
+            if model["id"] in exclude_models:
+                scored.append({"model": model["id"], "priority": model["priority"], "excluded": "excluded_by_caller"})
+            else:
+                scored.append(self._score(model, tokens, intelligence_priority, now))
+        return scored
+
+    def select(self, task_type: str, tokens: int = 0, intelligence_priority: bool = False,
+               exclude_models: Optional[List[str]] = None) -> Optional[str]:
+        """Возвращает id модели с минимальным ожидаемым временем выполнения или None"""
+        scored = self.explain(task_type, tokens, intelligence_priority, exclude_models)
+
+        best = None
+        for entry in scored:
+            if "excluded" in entry:
+                continue
+            # Кандидаты уже упорядочены по priority, поэтому при равенстве побеждает приоритетная
+            if best is None or entry["score"] < best["score"]:
+                best = entry
+
+        chosen = best["model"] if best else None
+        with self._lock:
+            self._decisions.append({
+                "timestamp": time.time(),
+                "task_type": task_type,
+                "tokens": tokens,
+                "intelligence_priority": intelligence_priority,
+                "chosen": chosen,
+                "candidates": scored,
+            })
+
+        if chosen:
+            logger.debug(f"[ROUTER] {task_type}: выбрана {chosen} (ожидаемое время {best['score']}с)")
+        else:
+            logger.warning(f"[ROUTER] Нет доступных моделей для task_type '{task_type}'. "
+                           f"Blacklist: {self.monitor.get_blacklist_status()}")
+        return chosen
+
+    def record_success(self, model_id: str, response_time: float = 0.0):
+        state = self._state_for(model_id)
+        with self._lock:
+            state.requests += 1
+            state.consecutive_failures = 0
+            state.circuit_open_until = 0.0
+            state.health = ModelHealth.HEALTHY
+            state.last_success = time.time()
+            state.error_rate *= (1 - EWMA_ALPHA)
+            if response_time > 0:
+                state.samples.append(response_time)
+                state.latency = response_time if state.latency is None else (
+                    state.latency * (1 - EWMA_ALPHA) + response_time * EWMA_ALPHA
+                )
+
+    def latency_percentile(self, model_id: str, percentile: float = 0.95,
+                           min_samples: int = 5) -> Optional[float]:
+        """Перцентиль времени ответа по последним вызовам; None, если измерений мало"""
+        state = self._state_for(model_id)
+        with self._lock:
+            if len(state.samples) < min_samples:
+                return None
+            return _percentile(state.samples, percentile)
+
+    def record_hedge_result(self, winner: str, loser: str, elapsed: float):
+        """
+        Учитывает исход дублированного запроса
+
+        Проигравшая модель не ответила за elapsed секунд - ее EWMA задержки
+        поднимается хотя бы до этого значения, не дожидаясь завершения вызова.
+        """
+        winner_state = self._state_for(winner)
+        loser_state = self._state_for(loser)
+        with self._lock:
+            winner_state.hedge_wins += 1
+            loser_state.hedge_losses += 1
+            loser_state.latency = max(loser_state.latency or 0.0, elapsed)
+
+    def record_failure(self, model_id: str, error: str):
+        """Учитывает ошибку модели; квоты и перегрузки блокируют модель в мониторе лимитов"""
+        state = self._state_for(model_id)
+        health = classify_error(error)
+        blacklist_for = None
+        with self._lock:
+            state.requests += 1
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = error[:200]
+            state.error_rate = state.error_rate * (1 - EWMA_ALPHA) + EWMA_ALPHA
+            state.health = health
+            if health == ModelHealth.RATE_LIMITED:
+                blacklist_for = self.rate_limited_timeout
+            elif health == ModelHealth.OVERLOADED:
+                blacklist_for = self.overloaded_timeout
+            if state.consecutive_failures >= self.circuit_breaker_threshold:
+                # После истечения таймаута circuit breaker пропускает пробный запрос (half-open)
+                state.health = ModelHealth.BLACKLISTED
+                state.circuit_open_until = time.time() + self.circuit_breaker_timeout
+                logger.warning(f"[ROUTER] Circuit breaker для {model_id} после {state.consecutive_failures} ошибок")
+        if blacklist_for:
+            self.monitor.mark_model_unavailable(model_id, duration=blacklist_for)
+        logger.warning(f"[ROUTER] Ошибка модели {model_id}: {error[:200]}")
+
+    def reset_model(self, model_id: str):
+        """Вручную возвращает модель в здоровое состояние"""
+        state = self._state_for(model_id)
+        with self._lock:
+            state.health = ModelHealth.HEALTHY
+            state.consecutive_failures = 0
+            state.circuit_open_until = 0.0
+            state.error_rate = 0.0
+
+    def get_decisions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._decisions)[-limit:]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return {
+                model_id: {
+                    "health": state.health.value,
+                    "avg_response_time": state.latency,
+                    "p95_response_time": _percentile(state.samples, 0.95),
+                    "error_rate": round(state.error_rate, 3),
+                    "total_requests": state.requests,
+                    "error_count": state.failures,
+                    "consecutive_failures": state.consecutive_failures,
+                    "circuit_open_for": max(0, int(state.circuit_open_until - now)),
+                    "last_success_ago": now - state.last_success if state.last_success else None,
+                    "last_error": state.last_error,
+                    "hedge_wins": state.hedge_wins,
+                    "hedge_losses": state.hedge_losses,
+                }
+                for model_id, state in self._state.items()
+            }
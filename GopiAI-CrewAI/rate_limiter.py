@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter для GopiAI CrewAI сервера
+
+Скользящее окно лимитов RPM / TPM / RPD для каждой модели:
+1. Каждая модель имеет собственную блокировку - проверки разных моделей не мешают друг другу
+2. Окно скользящее (60 секунд / 24 часа от текущего момента), без всплесков x2 на границе минуты
+3. acquire() ждет ровно до освобождения слота, без опроса раз в секунду
+4. Опциональный общий бэкенд в SQLite, чтобы все воркеры gunicorn соблюдали одни и те же квоты
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MINUTE_WINDOW = 60
+DAY_WINDOW = 86400
+
+DEFAULT_RATE_LIMIT_DB_PATH = Path.home() / ".gopiai" / "rate_limits.db"
+
+
+def _compute_wait(limits: Dict[str, Any], tokens: int, minute_events, minute_tokens: int,
+                  day_events, now: float) -> float:
+    """
+    Сколько секунд нужно подождать, чтобы запрос на tokens токенов уложился в лимиты
+
+    minute_events - события (ts, tokens) последней минуты по возрастанию времени,
+    day_events - метки времени последних суток по возрастанию.
+    Возвращает 0.0, если запрос можно выполнить сейчас, и inf, если не уложится никогда.
+    """
+    rpm, tpm, rpd = limits.get("rpm", 0), limits.get("tpm", 0), limits.get("rpd", 0)
+    wait = 0.0
+
+    if rpm and len(minute_events) >= rpm:
+        # Должно выйти из окна столько событий, чтобы осталось rpm - 1
+        oldest_ts = minute_events[len(minute_events) - rpm][0]
+        wait = max(wait, oldest_ts + MINUTE_WINDOW - now)
+
+    if tpm and minute_tokens + tokens >= tpm:
+        if tokens >= tpm:
+            return math.inf
+        freed = 0
+        for ts, used in minute_events:
+            freed += used
+            if minute_tokens - freed + tokens < tpm:
+                wait = max(wait, ts + MINUTE_WINDOW - now)
+                break
+
+    if rpd and len(day_events) >= rpd:
+        oldest_ts = day_events[len(day_events) - rpd]
+        wait = max(wait, oldest_ts + DAY_WINDOW - now)
+
+    return max(wait, 0.0)
+
+
+class _ModelWindow:
+    """Скользящие окна одной модели; защищены собственной блокировкой"""
+
+    __slots__ = ("lock", "minute", "minute_tokens", "day")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.minute = deque()  # (ts, tokens)
+        self.minute_tokens = 0
+        self.day = deque()  # ts
+
+    def prune(self, now: float):
+        minute = self.minute
+        while minute and now - minute[0][0] >= MINUTE_WINDOW:
+            self.minute_tokens -= minute.popleft()[1]
+        day = self.day
+        while day and now - day[0] >= DAY_WINDOW:
+            day.popleft()
+
+    def record(self, tokens: int, now: float):
+        self.minute.append((now, tokens))
+        self.minute_tokens += tokens
+        self.day.append(now)
+
+
+class MemoryRateLimitBackend:
+    """Лимиты в памяти процесса (по умолчанию)"""
+
+    def __init__(self):
+        self._windows: Dict[str, _ModelWindow] = {}
+        self._create_lock = threading.Lock()
+
+    def _window(self, model_id: str) -> _ModelWindow:
+        window = self._windows.get(model_id)
+        if window is None:
+            with self._create_lock:
+                window = self._windows.setdefault(model_id, _ModelWindow())
+        return window
+
+    def check(self, model_id: str, limits: Dict[str, Any], tokens: int = 0, reserve: bool = False) -> float:
+        """Возвращает время ожидания; при reserve=True и нулевом ожидании сразу регистрирует запрос"""
+        window = self._window(model_id)
+        now = time.time()
+        with window.lock:
+            window.prune(now)
+            wait = _compute_wait(limits, tokens, window.minute, window.minute_tokens, window.day, now)
+            if reserve and wait == 0.0:
+                window.record(tokens, now)
+            return wait
+
+    def record(self, model_id: str, tokens: int = 0):
+        window = self._window(model_id)
+        now = time.time()
+        with window.lock:
+            window.prune(now)
+            window.record(tokens, now)
+
+    def usage(self, model_id: str) -> Dict[str, int]:
+        window = self._window(model_id)
+        now = time.time()
+        with window.lock:
+            window.prune(now)
+            return {"rpm": len(window.minute), "tpm": window.minute_tokens, "rpd": len(window.day)}
+
+
+class SQLiteRateLimitBackend:
+    """
+    Лимиты в общем файле SQLite
+
+    Проверка и регистрация выполняются в одной транзакции BEGIN IMMEDIATE,
+    поэтому несколько воркеров gunicorn не могут одновременно занять последний слот.
+    Проверки без регистрации (оценки роутера) только читают и не берут блокировку записи;
+    старые события удаляются при регистрации.
+    """
+
+    def __init__(self, db_path=DEFAULT_RATE_LIMIT_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # После fork() соединение родителя использовать нельзя
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_events (
+                model_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                tokens INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_events_model_ts ON rate_events (model_id, ts)")
+
+    def _load(self, conn: sqlite3.Connection, model_id: str, now: float):
+        minute_events = conn.execute(
+            "SELECT ts, tokens FROM rate_events WHERE model_id = ? AND ts > ? ORDER BY ts",
+            (model_id, now - MINUTE_WINDOW)
+        ).fetchall()
+        day_events = [row[0] for row in conn.execute(
+            "SELECT ts FROM rate_events WHERE model_id = ? AND ts > ? ORDER BY ts", (model_id, now - DAY_WINDOW)
+        )]
+        return minute_events, sum(t for _, t in minute_events), day_events
+
+    def check(self, model_id: str, limits: Dict[str, Any], tokens: int = 0, reserve: bool = False) -> float:
+        conn = self._connect()
+        now = time.time()
+        if not reserve:
+            return _compute_wait(limits, tokens, *self._load(conn, model_id, now), now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM rate_events WHERE model_id = ? AND ts <= ?", (model_id, now - DAY_WINDOW))
+            minute_events, minute_tokens, day_events = self._load(conn, model_id, now)
+            wait = _compute_wait(limits, tokens, minute_events, minute_tokens, day_events, now)
+            if wait == 0.0:
+                conn.execute("INSERT INTO rate_events (model_id, ts, tokens) VALUES (?, ?, ?)", (model_id, now, tokens))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(self, model_id: str, tokens: int = 0):
+        conn = self._connect()
+        conn.execute("INSERT INTO rate_events (model_id, ts, tokens) VALUES (?, ?, ?)", (model_id, time.time(), tokens))
+
+    def usage(self, model_id: str) -> Dict[str, int]:
+        conn = self._connect()
+        now = time.time()
+        rpm, tpm = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM rate_events WHERE model_id = ? AND ts > ?",
+            (model_id, now - MINUTE_WINDOW)
+        ).fetchone()
+        rpd = conn.execute(
+            "SELECT COUNT(*) FROM rate_events WHERE model_id = ? AND ts > ?", (model_id, now - DAY_WINDOW)
+        ).fetchone()[0]
+        return {"rpm": rpm, "tpm": tpm, "rpd": rpd}
+
+
+def create_rate_limit_backend(backend: Optional[str] = None):
+    """
+    Создает бэкенд лимитов по настройкам окружения
+
+    GOPIAI_RATE_LIMIT_BACKEND: memory (по умолчанию) или sqlite - общий для всех воркеров
+    GOPIAI_RATE_LIMIT_DB: путь к файлу SQLite
+    """
+    backend = (backend or os.getenv('GOPIAI_RATE_LIMIT_BACKEND', 'memory')).lower()
+    if backend != 'sqlite':
+        return MemoryRateLimitBackend()
+
+    db_path = os.getenv('GOPIAI_RATE_LIMIT_DB', str(DEFAULT_RATE_LIMIT_DB_PATH))
+    try:
+        return SQLiteRateLimitBackend(db_path)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"[RATE-LIMIT] Не удалось открыть SQLite {db_path}: {e}. Используем память процесса")
+        return MemoryRateLimitBackend()
+
+
+class RateLimiterMetrics:
+    """Счетчики решений лимитера по моделям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, float]] = {}
+
+    def record(self, model_id: str, outcome: str, waited: float = 0.0):
+        with self._lock:
+            entry = self._data.setdefault(
+                model_id, {"allowed": 0, "throttled": 0, "blocked": 0, "timeouts": 0, "wait_time": 0.0}
+            )
+            entry[outcome] += 1
+            entry["wait_time"] += waited
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {model_id: dict(entry) for model_id, entry in self._data.items()}
@@ -0,0 +1,744 @@
+#!/usr/bin/env python3
+"""
+Task Engine для GopiAI CrewAI сервера
+
+Ограниченный пул воркеров и межпроцессное хранилище задач:
+1. Задачи выполняются в общем ThreadPoolExecutor вместо отдельного Thread на сообщение
+2. Глубина очереди ограничена - при переполнении submit() бросает TaskQueueFullError (HTTP 429)
+3. Состояние задач хранится в SQLite (по умолчанию), поэтому /api/tasks/<id>
+   консистентен между воркерами gunicorn и переживает перезапуск
+4. Завершенные задачи вытесняются по TTL; задачи, брошенные упавшим или
+   перезапущенным воркером, через GOPIAI_TASK_STALE_TIMEOUT помечаются FAILED
+5. Для каждой задачи пишутся метрики времени (ожидание в очереди, выполнение, общее)
+6. Журнал событий задачи (прогресс, итерации, результаты инструментов, токены)
+   для потоковой выдачи через /api/tasks/<id>/stream
+7. Каждое создание/изменение задачи получает монотонную версию хранилища,
+   поэтому /api/tasks?since=<cursor> отдает только изменившиеся задачи; вытеснение
+   оставляет запись об удалении (task_id + версия), чтобы клиенты убирали строки
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum, auto
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_DB_PATH = Path.home() / ".gopiai" / "tasks.db"
+DEFAULT_TASK_TTL_SECONDS = 3600
+DEFAULT_TASK_STALE_SECONDS = 1800
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE_DEPTH = 32
+
+
+class TaskStatus(Enum):
+    PENDING = auto()
+    PROCESSING = auto()
+    COMPLETED = auto()
+    FAILED = auto()
+
+
+# Статусы, после которых задача больше не меняется и может быть вытеснена по TTL
+FINISHED_STATUSES = (TaskStatus.COMPLETED.name, TaskStatus.FAILED.name)
+
+# Ошибка задач, которые не обновлялись дольше stale_seconds: их воркер упал или перезапущен
+INTERRUPTED_ERROR = "interrupted: воркер остановился до завершения задачи"
+
+
+class TaskQueueFullError(Exception):
+    """Очередь задач переполнена - клиенту нужно повторить запрос позже"""
+
+    def __init__(self, depth: int, limit: int, retry_after: int = 5):
+        super().__init__(f"Очередь задач переполнена ({depth}/{limit})")
+        self.depth = depth
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def _normalize_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит значения к JSON-совместимому виду (TaskStatus -> имя)"""
+    normalized = {}
+    for key, value in fields.items():
+        if isinstance(value, TaskStatus):
+            value = value.name
+        normalized[key] = value
+    return normalized
+
+
+class TaskStore:
+    """Базовый интерфейс хранилища задач"""
+
+    # Как часто (в секундах) запускать вытеснение устаревших задач при записи
+    EVICTION_INTERVAL = 60
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TASK_TTL_SECONDS,
+                 stale_seconds: int = DEFAULT_TASK_STALE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._last_eviction = 0.0
+        # Будит потоковых подписчиков этого процесса сразу после записи события
+        self._events_cond = threading.Condition()
+
+    def create(self, task: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, task_id: str, **fields) -> bool:
+        raise NotImplementedError
+
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Помечает FAILED незавершенные задачи без обновлений дольше stale_seconds
+        и удаляет завершенные задачи старше TTL; возвращает число удаленных
+        """
+        raise NotImplementedError
+
+    def count_active(self) -> int:
+        raise NotImplementedError
+
+    def current_version(self) -> int:
+        """Версия последнего изменения задач в хранилище"""
+        raise NotImplementedError
+
+    def list_changed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Задачи, созданные или измененные после версии since, в порядке версий"""
+        raise NotImplementedError
+
+    def list_removed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Записи об удалении {'task_id', 'version'} после версии since, в порядке версий"""
+        raise NotImplementedError
+
+    def removed_floor(self) -> int:
+        """Версия, до которой записи об удалении уже вытеснены; более старый cursor требует полного списка"""
+        raise NotImplementedError
+
+    def changes_since(self, since: int, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Дельта для /api/tasks?since=<cursor>: {'tasks', 'removed', 'cursor'}
+
+        Изменения и удаления объединяются в порядке версий и обрезаются по limit, поэтому
+        cursor не перескакивает через непрочитанные записи. None - cursor больше версии
+        хранилища или старше сохраненных записей об удалении: клиенту нужен полный список.
+        """
+        if since > self.current_version() or since < self.removed_floor():
+            return None
+        records = [(task['version'], task, False) for task in self.list_changed(since, limit)]
+        records += [(tombstone['version'], tombstone, True) for tombstone in self.list_removed(since, limit)]
+        records.sort(key=lambda record: record[0])
+        if limit is not None:
+            records = records[:limit]
+        return {
+            'tasks': [record for _, record, removed in records if not removed],
+            'removed': [record['task_id'] for _, record, removed in records if removed],
+            'cursor': records[-1][0] if records else since,
+        }
+
+    def append_event(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """Добавляет событие в журнал задачи и возвращает его порядковый номер"""
+        raise NotImplementedError
+
+    def get_events(self, task_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Возвращает события задачи с номером больше after_seq"""
+        raise NotImplementedError
+
+    def publish_event(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """Записывает событие и будит ожидающих подписчиков"""
+        seq = self.append_event(task_id, event, data)
+        with self._events_cond:
+            self._events_cond.notify_all()
+        return seq
+
+    def wait_for_events(self, task_id: str, after_seq: int = 0, timeout: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        Ждет новые события задачи не дольше timeout секунд
+
+        События из того же процесса приходят сразу; события других воркеров
+        gunicorn подхватываются не позже чем через timeout.
+        """
+        with self._events_cond:
+            events = self.get_events(task_id, after_seq)
+            if events:
+                return events
+            self._events_cond.wait(timeout)
+        return self.get_events(task_id, after_seq)
+
+    def _maybe_evict(self, now: float):
+        if now - self._last_eviction < self.EVICTION_INTERVAL:
+            return
+        self._last_eviction = now
+        try:
+            self.evict_expired(now)
+        except sqlite3.Error as e:
+            logger.warning(f"[TASK-STORE] Ошибка вытеснения задач: {e}")
+
+
+class MemoryTaskStore(TaskStore):
+    """Хранилище в памяти процесса - для тестов и однопроцессного режима"""
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TASK_TTL_SECONDS,
+                 stale_seconds: int = DEFAULT_TASK_STALE_SECONDS):
+        super().__init__(ttl_seconds, stale_seconds)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._tombstones: Dict[str, Dict[str, Any]] = {}
+        self._removed_floor = 0
+        self._event_seq = 0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def create(self, task: Dict[str, Any]) -> None:
+        task = _normalize_fields(task)
+        now = time.time()
+        task.setdefault('created_at', now)
+        task['updated_at'] = now
+        with self._lock:
+            self._version += 1
+            task['version'] = self._version
+            self._tasks[task['task_id']] = task
+            self._tombstones.pop(task['task_id'], None)
+        self._maybe_evict(now)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        fields = _normalize_fields(fields)
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task.update(fields)
+            task['updated_at'] = time.time()
+            self._version += 1
+            task['version'] = self._version
+            return True
+
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            tasks = sorted(self._tasks.values(), key=lambda t: t.get('created_at', 0), reverse=True)
+            if limit is not None:
+                tasks = tasks[:limit]
+            return [dict(t) for t in tasks]
+
+    def current_version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def list_changed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            tasks = sorted((t for t in self._tasks.values() if t['version'] > since), key=lambda t: t['version'])
+            if limit is not None:
+                tasks = tasks[:limit]
+            return [dict(t) for t in tasks]
+
+    def list_removed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            removed = sorted((t for t in self._tombstones.values() if t['version'] > since), key=lambda t: t['version'])
+            if limit is not None:
+                removed = removed[:limit]
+            return [dict(t) for t in removed]
+
+    def removed_floor(self) -> int:
+        with self._lock:
+            return self._removed_floor
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        cutoff = now - self.ttl_seconds
+        stale_cutoff = now - self.stale_seconds
+        with self._lock:
+            for task in self._tasks.values():
+                if task.get('status') not in FINISHED_STATUSES and task.get('updated_at', 0) < stale_cutoff:
+                    self._version += 1
+                    task.update(status=TaskStatus.FAILED.name, error=INTERRUPTED_ERROR,
+                                completed_at=now, updated_at=now, version=self._version)
+            expired = [
+                task_id for task_id, task in self._tasks.items()
+                if task.get('status') in FINISHED_STATUSES and task.get('updated_at', 0) < cutoff
+            ]
+            for task_id in expired:
+                del self._tasks[task_id]
+                self._events.pop(task_id, None)
+                self._version += 1
+                self._tombstones[task_id] = {'task_id': task_id, 'version': self._version, 'removed_at': now}
+            # Записи об удалении живут столько же, сколько завершенные задачи
+            for task_id in [t for t, tombstone in self._tombstones.items() if tombstone['removed_at'] < cutoff]:
+                self._removed_floor = max(self._removed_floor, self._tombstones.pop(task_id)['version'])
+        return len(expired)
+
+    def count_active(self) -> int:
+        with self._lock:
+            return sum(1 for t in self._tasks.values() if t.get('status') not in FINISHED_STATUSES)
+
+    def append_event(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            self._event_seq += 1
+            self._events.setdefault(task_id, []).append({
+                'seq': self._event_seq,
+                'event': event,
+                'data': _normalize_fields(data or {}),
+                'created_at': time.time(),
+            })
+            return self._event_seq
+
+    def get_events(self, task_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(e) for e in self._events.get(task_id, []) if e['seq'] > after_seq]
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Хранилище задач в SQLite (WAL)
+
+    Каждый поток и каждый процесс открывает собственное соединение, поэтому
+    хранилище безопасно использовать из пула воркеров и из форкнутых воркеров gunicorn.
+    """
+
+    def __init__(self, db_path=DEFAULT_TASK_DB_PATH, ttl_seconds: int = DEFAULT_TASK_TTL_SECONDS,
+                 stale_seconds: int = DEFAULT_TASK_STALE_SECONDS):
+        super().__init__(ttl_seconds, stale_seconds)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+        # Задачи, оставшиеся PENDING/PROCESSING после падения или перезапуска воркеров
+        self._maybe_evict(time.time())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # После fork() соединение родителя использовать нельзя
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Базы, созданные до появления версий
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if 'version' not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_updated ON tasks (status, updated_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks (version)")
+        # Счетчик версий отдельно от tasks, чтобы он не откатывался при вытеснении задач
+        conn.execute("CREATE TABLE IF NOT EXISTS task_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO task_meta (key, value) VALUES ('version', 0)")
+        # Записи об удалении вытесненных задач для дельт ?since=; removed_floor - версия
+        # последней вытесненной записи об удалении
+        conn.execute("INSERT OR IGNORE INTO task_meta (key, value) VALUES ('removed_floor', 0)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_tombstones (
+                task_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                removed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_task_tombstones_version ON task_tombstones (version)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events (task_id, seq)")
+
+    def create(self, task: Dict[str, Any]) -> None:
+        task = _normalize_fields(task)
+        now = time.time()
+        task.setdefault('created_at', now)
+        task['updated_at'] = now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            task['version'] = self._next_version(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, created_at, updated_at, data, version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (task['task_id'], task.get('status', TaskStatus.PENDING.name), task['created_at'], now,
+                 json.dumps(task, ensure_ascii=False, default=str), task['version']),
+            )
+            conn.execute("DELETE FROM task_tombstones WHERE task_id = ?", (task['task_id'],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_evict(now)
+
+    @staticmethod
+    def _next_version(conn: sqlite3.Connection) -> int:
+        """Увеличивает счетчик версий; вызывается внутри BEGIN IMMEDIATE"""
+        conn.execute("UPDATE task_meta SET value = value + 1 WHERE key = 'version'")
+        return conn.execute("SELECT value FROM task_meta WHERE key = 'version'").fetchone()[0]
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        fields = _normalize_fields(fields)
+        conn = self._connect()
+        # BEGIN IMMEDIATE сериализует read-modify-write между процессами
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            task = json.loads(row[0])
+            task.update(fields)
+            task['updated_at'] = time.time()
+            task['version'] = self._next_version(conn)
+            conn.execute(
+                "UPDATE tasks SET status = ?, updated_at = ?, data = ?, version = ? WHERE task_id = ?",
+                (task.get('status'), task['updated_at'], json.dumps(task, ensure_ascii=False, default=str),
+                 task['version'], task_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT data FROM tasks ORDER BY created_at DESC"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        return [json.loads(row[0]) for row in self._connect().execute(query, params)]
+
+    def current_version(self) -> int:
+        return self._connect().execute("SELECT value FROM task_meta WHERE key = 'version'").fetchone()[0]
+
+    def list_changed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT data FROM tasks WHERE version > ? ORDER BY version"
+        params = (since,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (since, limit)
+        return [json.loads(row[0]) for row in self._connect().execute(query, params)]
+
+    def list_removed(self, since: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT task_id, version, removed_at FROM task_tombstones WHERE version > ? ORDER BY version"
+        params = (since,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (since, limit)
+        return [
+            {'task_id': task_id, 'version': version, 'removed_at': removed_at}
+            for task_id, version, removed_at in self._connect().execute(query, params)
+        ]
+
+    def removed_floor(self) -> int:
+        return self._connect().execute("SELECT value FROM task_meta WHERE key = 'removed_floor'").fetchone()[0]
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        cutoff = now - self.ttl_seconds
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = conn.execute(
+                "SELECT task_id, data FROM tasks WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (*FINISHED_STATUSES, now - self.stale_seconds),
+            ).fetchall()
+            for task_id, data in stale:
+                task = json.loads(data)
+                task.update(status=TaskStatus.FAILED.name, error=INTERRUPTED_ERROR,
+                            completed_at=now, updated_at=now, version=self._next_version(conn))
+                conn.execute(
+                    "UPDATE tasks SET status = ?, updated_at = ?, data = ?, version = ? WHERE task_id = ?",
+                    (task['status'], now, json.dumps(task, ensure_ascii=False, default=str),
+                     task['version'], task_id),
+                )
+            expired = [row[0] for row in conn.execute(
+                "SELECT task_id FROM tasks WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff),
+            )]
+            for task_id in expired:
+                conn.execute("DELETE FROM task_events WHERE task_id = ?", (task_id,))
+                conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO task_tombstones (task_id, version, removed_at) VALUES (?, ?, ?)",
+                    (task_id, self._next_version(conn), now),
+                )
+            # Записи об удалении живут столько же, сколько завершенные задачи
+            conn.execute(
+                "UPDATE task_meta SET value = MAX(value, "
+                "(SELECT COALESCE(MAX(version), 0) FROM task_tombstones WHERE removed_at < ?)) "
+                "WHERE key = 'removed_floor'",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM task_tombstones WHERE removed_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if stale:
+            logger.warning(f"[TASK-STORE] {len(stale)} незавершенных задач помечены как прерванные")
+        if expired:
+            logger.debug(f"[TASK-STORE] Вытеснено {len(expired)} устаревших задач")
+        return len(expired)
+
+    def count_active(self) -> int:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM tasks WHERE status NOT IN (?, ?)", FINISHED_STATUSES
+        ).fetchone()
+        return row[0]
+
+    def append_event(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        cursor = self._connect().execute(
+            "INSERT INTO task_events (task_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, event, json.dumps(_normalize_fields(data or {}), ensure_ascii=False, default=str), time.time()),
+        )
+        return cursor.lastrowid
+
+    def get_events(self, task_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, event, data, created_at FROM task_events WHERE task_id = ? AND seq > ? ORDER BY seq",
+            (task_id, after_seq),
+        )
+        return [
+            {'seq': seq, 'event': event, 'data': json.loads(data), 'created_at': created_at}
+            for seq, event, data, created_at in rows
+        ]
+
+
+
+def create_task_store(backend: Optional[str] = None) -> TaskStore:
+    """
+    Создает хранилище задач по настройкам окружения
+
+    GOPIAI_TASK_STORE: sqlite (по умолчанию) или memory
+    GOPIAI_TASK_DB: путь к файлу SQLite
+    GOPIAI_TASK_TTL: время жизни завершенных задач в секундах
+    GOPIAI_TASK_STALE_TIMEOUT: через сколько секунд без обновлений незавершенная задача
+        считается прерванной (FAILED)
+    """
+    backend = (backend or os.getenv('GOPIAI_TASK_STORE', 'sqlite')).lower()
+    ttl = int(os.getenv('GOPIAI_TASK_TTL', DEFAULT_TASK_TTL_SECONDS))
+    stale = int(os.getenv('GOPIAI_TASK_STALE_TIMEOUT', DEFAULT_TASK_STALE_SECONDS))
+
+    if backend == 'memory':
+        return MemoryTaskStore(ttl_seconds=ttl, stale_seconds=stale)
+
+    db_path = os.getenv('GOPIAI_TASK_DB', str(DEFAULT_TASK_DB_PATH))
+    try:
+        return SQLiteTaskStore(db_path, ttl_seconds=ttl, stale_seconds=stale)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"[TASK-STORE] Не удалось открыть SQLite хранилище {db_path}: {e}. Используем память процесса")
+        return MemoryTaskStore(ttl_seconds=ttl, stale_seconds=stale)
+
+
+class TaskEngine:
+    """
+    Ограниченный пул воркеров для фоновых задач
+
+    Одновременно выполняется не более max_workers задач, еще не более
+    max_queue_depth ждут в очереди. Все сверх этого отклоняется через TaskQueueFullError.
+    """
+
+    def __init__(self, store: TaskStore, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_queue_depth: int = DEFAULT_MAX_QUEUE_DEPTH):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gopiai-task")
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'total_queue_time': 0.0,
+            'total_run_time': 0.0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_depth
+
+    def submit(self, task: Dict[str, Any], func: Callable, *args, **kwargs):
+        """
+        Сохраняет задачу и ставит её в очередь
+
+        Raises:
+            TaskQueueFullError: если пул и очередь заполнены
+        """
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self._stats['rejected'] += 1
+                raise TaskQueueFullError(self._inflight, self.capacity)
+            self._inflight += 1
+            self._stats['submitted'] += 1
+
+        task = dict(task)
+        task.setdefault('status', TaskStatus.PENDING)
+        task['queued_at'] = time.time()
+        try:
+            self.store.create(task)
+            return self._executor.submit(self._run, task['task_id'], task['queued_at'], func, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._inflight -= 1
+            raise
+
+    def _run(self, task_id: str, queued_at: float, func: Callable, *args, **kwargs):
+        started_at = time.time()
+        queue_time = started_at - queued_at
+        failed = False
+        try:
+            self.store.update(task_id, status=TaskStatus.PROCESSING, started_at=started_at)
+            self.store.publish_event(task_id, 'status', {'status': TaskStatus.PROCESSING, 'queue_time': round(queue_time, 4)})
+            return func(task_id, *args, **kwargs)
+        except Exception as e:
+            failed = True
+            logger.error(f"[TASK-ENGINE] Необработанная ошибка задачи {task_id}: {e}")
+            self._store_safely(task_id, self.store.update, task_id, status=TaskStatus.FAILED, error=str(e))
+        finally:
+            finished_at = time.time()
+            run_time = finished_at - started_at
+            metrics = {
+                'queue_time': round(queue_time, 4),
+                'run_time': round(run_time, 4),
+                'total_time': round(finished_at - queued_at, 4),
+            }
+            try:
+                task = self.store.get(task_id) or {}
+                failed = failed or task.get('status') == TaskStatus.FAILED.name
+                self.store.update(task_id, completed_at=task.get('completed_at') or finished_at, metrics=metrics)
+                # Финальное событие закрывает поток /api/tasks/<id>/stream
+                self.store.publish_event(task_id, 'done', {
+                    'status': task.get('status') if not failed else TaskStatus.FAILED,
+                    'result': task.get('result'),
+                    'error': task.get('error'),
+                    'metrics': metrics,
+                })
+            except Exception as e:
+                failed = True
+                logger.error(f"[TASK-ENGINE] Не удалось записать итог задачи {task_id}: {e}")
+                # Подписчики потока не должны ждать до его максимальной длительности
+                self._store_safely(task_id, self.store.publish_event, task_id, 'done', {
+                    'status': TaskStatus.FAILED, 'result': None, 'error': str(e), 'metrics': metrics,
+                })
+            finally:
+                # Слот пула освобождается даже при ошибках хранилища, иначе емкость пула уменьшается навсегда
+                with self._lock:
+                    self._inflight -= 1
+                    self._stats['failed' if failed else 'completed'] += 1
+                    self._stats['total_queue_time'] += queue_time
+                    self._stats['total_run_time'] += run_time
+
+    @staticmethod
+    def _store_safely(task_id: str, operation: Callable, *args, **kwargs):
+        """Выполняет запись в хранилище, ошибка которой не должна прерывать учет задачи"""
+        try:
+            operation(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"[TASK-ENGINE] Ошибка хранилища для задачи {task_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сводные метрики пула для мониторинга"""
+        with self._lock:
+            stats = dict(self._stats)
+            inflight = self._inflight
+        finished = stats['completed'] + stats['failed']
+        return {
+            'max_workers': self.max_workers,
+            'max_queue_depth': self.max_queue_depth,
+            'inflight': inflight,
+            'queued': max(0, inflight - self.max_workers),
+            'submitted': stats['submitted'],
+            'rejected': stats['rejected'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'avg_queue_time': round(stats['total_queue_time'] / finished, 4) if finished else 0.0,
+            'avg_run_time': round(stats['total_run_time'] / finished, 4) if finished else 0.0,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def create_task_engine(store: Optional[TaskStore] = None) -> TaskEngine:
+    """
+    Создает TaskEngine по настройкам окружения
+
+    GOPIAI_TASK_WORKERS: число воркеров пула
+    GOPIAI_TASK_QUEUE_DEPTH: максимальное число задач, ожидающих в очереди
+    """
+    return TaskEngine(
+        store or create_task_store(),
+        max_workers=int(os.getenv('GOPIAI_TASK_WORKERS', DEFAULT_MAX_WORKERS)),
+        max_queue_depth=int(os.getenv('GOPIAI_TASK_QUEUE_DEPTH', DEFAULT_MAX_QUEUE_DEPTH)),
+    )
+
+
+class TokenEventBuffer:
+    """
+    Склеивает поток токенов LLM в события 'token' разумного размера
+
+    Запись события на каждый токен нагружала бы хранилище, поэтому токены
+    копятся до min_chars символов или max_delay секунд.
+    """
+
+    def __init__(self, store: TaskStore, task_id: str, min_chars: int = 32, max_delay: float = 0.1):
+        self.store = store
+        self.task_id = task_id
+        self.min_chars = min_chars
+        self.max_delay = max_delay
+        self._parts: List[str] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def __call__(self, token: str):
+        if not token:
+            return
+        self._parts.append(token)
+        self._size += len(token)
+        if self._size >= self.min_chars or time.monotonic() - self._last_flush >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.store.publish_event(self.task_id, 'token', {'text': ''.join(self._parts)})
+            self._parts = []
+            self._size = 0
+        self._last_flush = time.monotonic()
@@ -12,6 +12,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont
 import requests
+from gopiai.ui.utils.http_client import get_http_client
 from gopiai.ui.utils.icon_helpers import create_icon_button
 from gopiai.ui.components.utils.shared_widgets import create_attached_frame
 
@@ -156,19 +157,19 @@ class AgentsTab(QWidget):
         
         # Кнопка обновления
         refresh_btn = create_icon_button("refresh-cw", "Обновить список агентов")
-        refresh_btn.clicked.connect(self._load_agents)
+        refresh_btn.clicked.connect(lambda: self._load_agents(force=True))
         control_buttons.addWidget(refresh_btn)
         
         control_buttons.addStretch()
         
         layout.addLayout(control_buttons)
     
-    def _load_agents(self):
-        """Загружает список агентов с сервера"""
+    def _load_agents(self, force: bool = False):
+        """Загружает список агентов с сервера (force - в обход кэша)"""
         self.status_label.setText("Загрузка агентов...")
         
         try:
-            response = requests.get(f"{self.api_base}/api/agents", timeout=5)
+            response = get_http_client().get(f"{self.api_base}/api/agents", timeout=5, force=force)
             if response.status_code == 200:
                 data = response.json()
                 self.agents_data = data.get('agents', [])
@@ -42,7 +42,7 @@ except Exception as _log_exc:
     logger.warning("Failed to attach FileHandler: %s", _log_exc)
 
 class ChatAsyncHandler(QObject):
-    """Объединенный асинхронный обработчик чата с оптимизированным polling"""
+    """Объединенный асинхронный обработчик чата: SSE-поток событий задачи с fallback на polling"""
     
     # Основные сигналы
     response_ready = Signal(dict)  # Полный ответ готов
@@ -55,13 +55,19 @@ class ChatAsyncHandler(QObject):
     message_completed = Signal(dict)  # Алиас для response_ready
     status_updated = Signal(str)  # Алиас для status_update
     start_polling_signal = Signal(str)  # Сигнал для безопасного запуска таймера
+    server_availability_changed = Signal(bool)  # Доступность сервера по фоновой проверке клиента
+    _task_status_received = Signal(str, object)  # Статус задачи из фонового потока (task_id, status)
 
     def __init__(self, crew_ai_client: Any, parent: Optional[QObject] = None):
         super().__init__(parent)
         self.crew_ai_client = crew_ai_client
         self._current_task_id = None
+        # Таймер однократный: следующий опрос планируется после получения ответа,
+        # поэтому запросы статуса не накладываются друг на друга
         self._polling_timer = QTimer(self)
+        self._polling_timer.setSingleShot(True)
         self._polling_timer.timeout.connect(self._check_task_status)
+        self._status_request_in_flight = False
         
         # Настройки оптимизированного polling
         self.polling_active = False
@@ -75,8 +81,19 @@ class ChatAsyncHandler(QObject):
         self.fast_polling_threshold = 10  # первые N попыток - быстрый polling
         self.progress_reset_count = 0  # сброс задержки при прогрессе
         
+        # Потоковый режим: события задачи приходят через SSE, polling остается запасным вариантом
+        self.streaming_enabled = hasattr(crew_ai_client, 'stream_task_events')
+        # Сервер закрывает SSE соединение раньше timeout воркера - долгие задачи дочитываются
+        # новым соединением с последнего полученного события
+        self.stream_max_reconnects = 20
+        
         # Подключаем сигналы
         self.start_polling_signal.connect(self._start_polling_from_main_thread)
+        self._task_status_received.connect(self._handle_task_status)
+
+        # Клиент сообщает об изменении доступности сервера из своего фонового потока
+        if hasattr(crew_ai_client, 'add_health_listener'):
+            crew_ai_client.add_health_listener(self.server_availability_changed.emit)
         
         # Подключаем алиасы сигналов для совместимости
         self.message_completed.connect(self.response_ready.emit)
@@ -136,6 +153,10 @@ class ChatAsyncHandler(QObject):
         self.last_response_length = 0
         self.current_delay = self.initial_delay
         
+        # Просим сервер публиковать токены LLM в поток событий задачи
+        if self.streaming_enabled and isinstance(message_data, dict):
+            message_data['stream'] = True
+        
         # Запускаем обработку в отдельном потоке
         try:
             thread = threading.Thread(target=self._process_in_background, args=(message_data,))
@@ -164,7 +185,8 @@ class ChatAsyncHandler(QObject):
             logger.debug(f"[ASYNC] Отправка сообщения в CrewAI: {msg_log}")
             
             print("[DEBUG-ASYNC-BG] Проверяем доступность CrewAI API...")
-            is_available = self.crew_ai_client.is_available(force_check=True)
+            # Состояние из кэша клиента; сетевая проверка только если кэш говорит, что сервер недоступен
+            is_available = self.crew_ai_client.is_available() or self.crew_ai_client.is_available(force_check=True)
             print(f"[DEBUG-ASYNC-BG] CrewAI API доступен: {is_available}")
             logger.debug(f"[ASYNC] CrewAI API доступен: {is_available}")
             
@@ -200,6 +222,8 @@ class ChatAsyncHandler(QObject):
             # Ожидаемые варианты ответа: dict с task_id (асинхронный) или dict/str для синхронного
             if isinstance(response, dict) and "task_id" in response and isinstance(response["task_id"], str):
                 task_id = cast(str, response["task_id"])
+                if self.streaming_enabled and self._consume_task_stream(task_id):
+                    return
                 print(f"[DEBUG-ASYNC-BG] Получен task_id: {task_id}, запуск опроса статуса")
                 logger.info(f"[ASYNC] Получен task_id: %s, запуск опроса статуса", task_id)
                 self.start_polling_signal.emit(task_id)
@@ -219,6 +243,56 @@ class ChatAsyncHandler(QObject):
             logger.error(f"[ASYNC-ERROR] Ошибка в фоновой обработке: {e}", exc_info=True)
             self.message_error.emit(str(e))
             
+    def _consume_task_stream(self, task_id: str) -> bool:
+        """
+        Читает SSE поток событий задачи в фоновом потоке и транслирует его в сигналы.
+
+        Returns:
+            bool: True, если получено финальное событие done; False - нужно перейти на polling
+        """
+        self._current_task_id = task_id
+        logger.info(f"[STREAM] Подписка на поток событий задачи {task_id}")
+        last_seq = 0
+        try:
+            for attempt in range(self.stream_max_reconnects + 1):
+                if attempt:
+                    logger.debug(f"[STREAM] Переподключение к потоку задачи {task_id} после события {last_seq}")
+                for event in self.crew_ai_client.stream_task_events(task_id, after_seq=last_seq):
+                    last_seq = int(event.get("id") or last_seq)
+                    name = event.get("event")
+                    data = event.get("data") or {}
+                    if name == "token":
+                        self.partial_response.emit(data.get("text", ""), "token")
+                    elif name == "iteration":
+                        self.status_update.emit(f"Итерация {data.get('iteration')}/{data.get('max_iterations')}")
+                    elif name == "tool_result":
+                        self.status_update.emit(f"Выполнен инструмент: {data.get('tool', 'unknown')}")
+                    elif name in ("status", "progress"):
+                        self.status_update.emit("Обрабатываю запрос")
+                    elif name == "done":
+                        logger.info(f"[STREAM-COMPLETE] Задача {task_id} завершена со статусом: {data.get('status')}")
+                        self._current_task_id = None
+                        self._emit_stream_result(data)
+                        return True
+            logger.warning(f"[STREAM] Поток задачи {task_id} закрыт без события done, переходим на polling")
+        except Exception as e:
+            logger.warning(f"[STREAM] Потоковый режим недоступен для задачи {task_id}: {e}. Переходим на polling")
+        return False
+
+    def _emit_stream_result(self, data: Dict[str, Any]) -> None:
+        """Отправляет финальный результат из события done в UI"""
+        task_status = str(data.get("status", "")).lower()
+        if task_status == "failed":
+            self.message_error.emit(data.get("error") or "Task failed with unknown error")
+            return
+        result = data.get("result")
+        if isinstance(result, dict):
+            self.response_ready.emit(result)
+        elif result is None:
+            self.response_ready.emit({"response": "Пустой результат"})
+        else:
+            self.response_ready.emit({"response": str(result)})
+
     # ### ИЗМЕНЕНО: Создаем новый слот, который будет выполняться в основном потоке ###
     @Slot(str)
     def _start_polling_from_main_thread(self, task_id: str):
@@ -245,37 +319,61 @@ class ChatAsyncHandler(QObject):
         self.status_update.emit("Обработка запроса начата...")
 
     def _check_task_status(self) -> None:
-        """Периодически опрашивает сервер о ходе выполнения задачи."""
+        """Слот таймера: запускает запрос статуса задачи в фоновом потоке, не блокируя GUI."""
         if self._current_task_id is None:
             logger.warning("[POLLING] Попытка опроса статуса без task_id, останавливаем таймер")
             self._stop_and_reset_polling()
             return
+        if self._status_request_in_flight:
+            logger.debug("[POLLING] Предыдущий запрос статуса еще выполняется, откладываем опрос")
+            self._polling_timer.start(self.current_delay)
+            return
+
+        # Добавляем счетчик попыток для отладки
+        if not hasattr(self, '_current_polling_attempt'):
+            self._current_polling_attempt = 0
+        self._current_polling_attempt += 1
+        logger.debug(f"[POLLING] Попытка #{self._current_polling_attempt} проверки статуса задачи {self._current_task_id}")
 
+        self._status_request_in_flight = True
+        thread = threading.Thread(target=self._fetch_task_status, args=(self._current_task_id,), daemon=True)
+        thread.start()
+
+    def _fetch_task_status(self, task_id: str) -> None:
+        """Выполняется в фоновом потоке; результат возвращается в GUI-поток сигналом _task_status_received."""
         try:
-            # Добавляем счетчик попыток для отладки
-            if not hasattr(self, '_current_polling_attempt'):
-                self._current_polling_attempt = 0
-            self._current_polling_attempt += 1
-            
-            logger.debug(f"[POLLING] Попытка #{self._current_polling_attempt} проверки статуса задачи {self._current_task_id}")
-            
             # Проверяем наличие метода check_task_status или get_task_status
             if hasattr(self.crew_ai_client, 'check_task_status'):
-                status_raw = self.crew_ai_client.check_task_status(self._current_task_id)
+                status_raw = self.crew_ai_client.check_task_status(task_id)
             elif hasattr(self.crew_ai_client, 'get_task_status'):
-                status_raw = self.crew_ai_client.get_task_status(self._current_task_id)
+                status_raw = self.crew_ai_client.get_task_status(task_id)
             else:
                 logger.error("[POLLING-ERROR] Клиент CrewAI не имеет методов check_task_status или get_task_status")
                 status_raw = {"error": "Метод проверки статуса недоступен", "status": "error"}
-                
+        except Exception as e:
+            logger.error(f"[POLLING-ERROR] Ошибка при запросе статуса задачи {task_id}: {e}", exc_info=True)
+            status_raw = {"error": str(e), "status": "error"}
+        self._task_status_received.emit(task_id, status_raw)
+
+    @Slot(str, object)
+    def _handle_task_status(self, task_id: str, status_raw: Any) -> None:
+        """Обрабатывает статус задачи в GUI-потоке и планирует следующий опрос."""
+        self._status_request_in_flight = False
+        if task_id != self._current_task_id:
+            # Ответ по задаче, опрос которой уже завершен или перезапущен
+            logger.debug(f"[POLLING] Игнорируем устаревший статус задачи {task_id}")
+            return
+
+        try:
             logger.debug("[POLLING] Получен статус: %s", status_raw)
             status: Dict[str, Any] = status_raw if isinstance(status_raw, dict) else {"status": str(status_raw)}
             
             done = (bool(status.get("done")) or
-                   status.get("status") in ("completed", "error", "failed", "cancelled"))
+                   str(status.get("status", "")).lower() in ("completed", "error", "failed", "cancelled"))
             
             if done:
-                task_status = status.get("status")
+                # Сервер возвращает статусы в верхнем регистре (COMPLETED/FAILED)
+                task_status = str(status.get("status", "")).lower()
                 logger.info(f"[POLLING-COMPLETE] Задача {self._current_task_id} завершена после {self._current_polling_attempt} попыток со статусом: {task_status}")
                 self._stop_and_reset_polling()
                 
@@ -0,0 +1,350 @@
+# --- START OF FILE chat_transcript.py ---
+
+"""
+Виртуализированная лента сообщений чата
+
+Вместо вставки HTML в один QTextEdit каждое сообщение - строка модели:
+1. QListView отрисовывает только видимые сообщения
+2. Делегат держит LRU-кэш сверстанных QTextDocument и кэш размеров для текущей ширины
+   (по одной записи на сообщение), поэтому новое сообщение верстается один раз, независимо от длины истории
+3. При прокрутке к началу испускается older_requested для ленивой подгрузки истории
+"""
+
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QAbstractListModel, QEvent, QModelIndex, QPoint, QRect, QSize, Qt, QTimer, QUrl, Signal
+from PySide6.QtGui import QAbstractTextDocumentLayout, QColor, QKeySequence, QPainter, QPalette, QTextDocument
+from PySide6.QtWidgets import QAbstractItemView, QApplication, QListView, QStyle, QStyledItemDelegate
+
+logger = logging.getLogger(__name__)
+
+HtmlRole = Qt.ItemDataRole.UserRole + 1
+MessageRole = Qt.ItemDataRole.UserRole + 2
+CacheKeyRole = Qt.ItemDataRole.UserRole + 3
+
+# Фон пузырей сообщений (как в CSS стилях чата)
+BUBBLE_COLORS = {
+    'user': QColor(0, 120, 255, 38),
+    'assistant': QColor(128, 128, 128, 26),
+    'system': QColor(255, 193, 7, 13),
+    'error': QColor(220, 53, 69, 26),
+}
+# Доля ширины ленты, которую занимают сообщения пользователя и ассистента
+BUBBLE_WIDTH_RATIO = 0.75
+BUBBLE_PADDING = 8
+BUBBLE_MARGIN = 6
+BUBBLE_RADIUS = 12
+DOCUMENT_CACHE_SIZE = 300
+
+
+class TranscriptModel(QAbstractListModel):
+    """Список сообщений ленты: role, html, text; revision меняется при каждом обновлении"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: List[Dict[str, Any]] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return message['text']
+        if role == HtmlRole:
+            return message['html']
+        if role == MessageRole:
+            return message
+        if role == CacheKeyRole:
+            return (message['id'], message['revision'])
+        return None
+
+    @staticmethod
+    def _make(role: str, html: str, text: str) -> Dict[str, Any]:
+        return {'id': uuid.uuid4().hex[:8], 'role': role, 'html': html, 'text': text, 'revision': 0}
+
+    def append_message(self, role: str, html: str, text: str = '') -> str:
+        row = len(self._messages)
+        message = self._make(role, html, text)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(message)
+        self.endInsertRows()
+        return message['id']
+
+    def prepend_messages(self, messages: List[Dict[str, str]]):
+        """Добавляет в начало ленты более старые сообщения: [{'role', 'html', 'text'}, ...]"""
+        if not messages:
+            return
+        entries = [self._make(m['role'], m['html'], m.get('text', '')) for m in messages]
+        self.beginInsertRows(QModelIndex(), 0, len(entries) - 1)
+        self._messages[:0] = entries
+        self.endInsertRows()
+
+    def _row_of(self, message_id: str) -> int:
+        # Обновляются почти всегда последние сообщения (статус, потоковый ответ)
+        for row in range(len(self._messages) - 1, -1, -1):
+            if self._messages[row]['id'] == message_id:
+                return row
+        return -1
+
+    def update_message(self, message_id: str, html: str, text: Optional[str] = None) -> bool:
+        row = self._row_of(message_id)
+        if row < 0:
+            return False
+        message = self._messages[row]
+        message['html'] = html
+        if text is not None:
+            message['text'] = text
+        message['revision'] += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def remove_message(self, message_id: str) -> bool:
+        row = self._row_of(message_id)
+        if row < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._messages[row]
+        self.endRemoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self._messages = []
+        self.endResetModel()
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    Рисует сообщение как пузырь с rich text.
+
+    Кэши индексируются по id сообщения и хранят одну версию на сообщение:
+    верстка (LRU) - для последних (revision, ширина), размеры - только для текущей ширины ленты.
+    """
+
+    link_activated = Signal(QUrl)
+
+    def __init__(self, parent=None, cache_size: int = DOCUMENT_CACHE_SIZE):
+        super().__init__(parent)
+        self.cache_size = cache_size
+        self._style_sheet = ''
+        # id -> (revision, ширина текста, документ)
+        self._documents: "OrderedDict[str, Tuple[int, int, QTextDocument]]" = OrderedDict()
+        # id -> (revision, размер) для ширины _sizes_width
+        self._sizes: Dict[str, Tuple[int, QSize]] = {}
+        self._sizes_width = -1
+
+    def set_style_sheet(self, css: str):
+        self._style_sheet = css
+        self.clear_cache()
+
+    def clear_cache(self):
+        self._documents.clear()
+        self._sizes.clear()
+
+    def forget(self, message_id: str):
+        """Удаляет сообщение из кэшей (после обновления или удаления)"""
+        self._documents.pop(message_id, None)
+        self._sizes.pop(message_id, None)
+
+    @staticmethod
+    def _text_width(message: Dict[str, Any], view_width: int) -> int:
+        width = view_width - 2 * (BUBBLE_MARGIN + BUBBLE_PADDING)
+        if message['role'] in ('user', 'assistant'):
+            width = int(width * BUBBLE_WIDTH_RATIO)
+        return max(width, 50)
+
+    def _document(self, index, view_width: int) -> QTextDocument:
+        message = index.data(MessageRole)
+        width = self._text_width(message, view_width)
+        cached = self._documents.get(message['id'])
+        if cached is not None and cached[:2] == (message['revision'], width):
+            self._documents.move_to_end(message['id'])
+            return cached[2]
+
+        document = QTextDocument()
+        document.setDocumentMargin(0)
+        document.setDefaultStyleSheet(self._style_sheet)
+        document.setHtml(message['html'])
+        document.setTextWidth(width)
+        self._documents[message['id']] = (message['revision'], width, document)
+        self._documents.move_to_end(message['id'])
+        while len(self._documents) > self.cache_size:
+            self._documents.popitem(last=False)
+        return document
+
+    def sizeHint(self, option, index):
+        view_width = option.rect.width() if option.rect.width() > 0 else 600
+        parent = self.parent()
+        if isinstance(parent, QListView):
+            view_width = parent.viewport().width()
+        if view_width != self._sizes_width:
+            # Размеры для прежней ширины больше не понадобятся
+            self._sizes.clear()
+            self._sizes_width = view_width
+        message = index.data(MessageRole)
+        cached = self._sizes.get(message['id'])
+        if cached is not None and cached[0] == message['revision']:
+            return cached[1]
+        document = self._document(index, view_width)
+        height = int(document.size().height()) + 2 * (BUBBLE_PADDING + BUBBLE_MARGIN)
+        size = QSize(view_width, height)
+        self._sizes[message['id']] = (message['revision'], size)
+        return size
+
+    def _bubble_rect(self, option, index, document: QTextDocument) -> QRect:
+        message = index.data(MessageRole)
+        rect = option.rect.adjusted(BUBBLE_MARGIN, BUBBLE_MARGIN, -BUBBLE_MARGIN, -BUBBLE_MARGIN)
+        width = min(rect.width(), int(document.idealWidth()) + 2 * BUBBLE_PADDING)
+        if message['role'] == 'user':
+            return QRect(rect.right() - width, rect.top(), width, rect.height())
+        if message['role'] == 'assistant':
+            return QRect(rect.left(), rect.top(), width, rect.height())
+        return QRect(rect.left() + (rect.width() - width) // 2, rect.top(), width, rect.height())
+
+    def paint(self, painter: QPainter, option, index):
+        message = index.data(MessageRole)
+        document = self._document(index, option.rect.width())
+        bubble = self._bubble_rect(option, index, document)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        color = BUBBLE_COLORS.get(message['role'])
+        if option.state & QStyle.StateFlag.State_Selected:
+            color = option.palette.color(QPalette.ColorRole.Highlight)
+            color.setAlpha(60)
+        if color is not None:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(color)
+            painter.drawRoundedRect(bubble, BUBBLE_RADIUS, BUBBLE_RADIUS)
+
+        painter.translate(bubble.left() + BUBBLE_PADDING, bubble.top() + BUBBLE_PADDING)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette.setColor(QPalette.ColorRole.Text, option.palette.color(QPalette.ColorRole.Text))
+        document.documentLayout().draw(painter, context)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        # Клик по ссылке внутри сообщения
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            document = self._document(index, option.rect.width())
+            bubble = self._bubble_rect(option, index, document)
+            pos = event.position().toPoint() - QPoint(bubble.left() + BUBBLE_PADDING, bubble.top() + BUBBLE_PADDING)
+            anchor = document.documentLayout().anchorAt(pos)
+            if anchor:
+                self.link_activated.emit(QUrl(anchor))
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ChatTranscriptView(QListView):
+    """Лента сообщений чата на основе модели/представления"""
+
+    link_activated = Signal(QUrl)
+    older_requested = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.transcript = TranscriptModel(self)
+        self.delegate = MessageDelegate(self)
+        self.setModel(self.transcript)
+        self.setItemDelegate(self.delegate)
+
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(False)
+        self.setMouseTracking(True)
+
+        self.has_older = False
+        self._older_pending = False
+        self.delegate.link_activated.connect(self.link_activated)
+        self.transcript.dataChanged.connect(self._on_data_changed)
+        self.transcript.rowsAboutToBeRemoved.connect(self._on_rows_removed)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+
+    def set_document_style_sheet(self, css: str):
+        self.delegate.set_style_sheet(css)
+
+    # --- Операции с сообщениями ---
+
+    def append_message(self, role: str, html: str, text: str = '') -> str:
+        return self.transcript.append_message(role, html, text)
+
+    def update_message(self, message_id: str, html: str, text: Optional[str] = None) -> bool:
+        # Старая верстка сообщения больше не понадобится
+        self.delegate.forget(message_id)
+        return self.transcript.update_message(message_id, html, text)
+
+    def remove_message(self, message_id: str) -> bool:
+        return self.transcript.remove_message(message_id)
+
+    def prepend_messages(self, messages: List[Dict[str, str]], has_older: bool):
+        """Вставляет более старые сообщения, сохраняя видимую позицию ленты"""
+        scrollbar = self.verticalScrollBar()
+        distance_from_bottom = scrollbar.maximum() - scrollbar.value()
+        self.transcript.prepend_messages(messages)
+        self.has_older = has_older
+        QTimer.singleShot(0, lambda: self._restore_position(distance_from_bottom))
+
+    def clear(self):
+        self.has_older = False
+        self.delegate.clear_cache()
+        self.transcript.clear()
+
+    def scroll_to_end(self):
+        QTimer.singleShot(0, self.scrollToBottom)
+
+    def _restore_position(self, distance_from_bottom: int):
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum() - distance_from_bottom)
+        self._older_pending = False
+
+    # --- Обработчики ---
+
+    def _on_data_changed(self, top_left, bottom_right, roles=None):
+        # Размер обновленного сообщения мог измениться: сбрасываем только его кэш,
+        # остальные строки берут размеры из кэша без пересчета верстки
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            index = self.transcript.index(row)
+            key = index.data(CacheKeyRole)
+            if key:
+                self.delegate.forget(key[0])
+            self.delegate.sizeHintChanged.emit(index)
+
+    def _on_rows_removed(self, parent, first, last):
+        for row in range(first, last + 1):
+            key = self.transcript.index(row).data(CacheKeyRole)
+            if key:
+                self.delegate.forget(key[0])
+
+    def _on_scrolled(self, value: int):
+        if value == self.verticalScrollBar().minimum() and self.has_older and not self._older_pending:
+            self._older_pending = True
+            self.older_requested.emit()
+
+    def resizeEvent(self, event):
+        # Размеры кэшируются для одной ширины: при ее изменении кэш размеров сбрасывается
+        # и все строки заново верстаются через QTextDocument (кэш документов ограничен cache_size)
+        super().resizeEvent(event)
+        if event.oldSize().width() != event.size().width():
+            self.scheduleDelayedItemsLayout()
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            text = "\n\n".join(self.transcript.index(row).data(Qt.ItemDataRole.DisplayRole) or '' for row in rows)
+            if text:
+                QApplication.clipboard().setText(text)
+            event.accept()
+            return
+        super().keyPressEvent(event)
+
+# --- END OF FILE chat_transcript.py ---
@@ -5,11 +5,10 @@ import time
 import os
 import html
 import re
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QTextBrowser, QFileDialog, QSizePolicy, QListWidget, QListWidgetItem, QTabWidget
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QFileDialog, QSizePolicy, QListWidget, QListWidgetItem, QTabWidget
 )
 from PySide6.QtCore import Qt, Slot, QTimer, Signal
-from PySide6.QtGui import QResizeEvent, QTextCursor, QTextOption
-import uuid
+from PySide6.QtGui import QResizeEvent
 from datetime import datetime
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QImageWriter
 import tempfile
@@ -19,9 +18,11 @@ from PySide6.QtWidgets import QMessageBox
 
 # --- Импорты наших новых модулей-обработчиков ---
 from .crewai_client import CrewAIClient
-from ..memory import get_memory_manager
+from ..memory import ChatStore, get_memory_manager
 from .chat_async_handler import ChatAsyncHandler
+from .chat_transcript import ChatTranscriptView
 from gopiai.ui.utils.icon_helpers import create_icon_button
+from gopiai.ui.utils.markdown_renderer import IncrementalMarkdownRenderer, get_markdown_renderer
 from .enhanced_browser_widget import EnhancedBrowserWidget
 
 # Импорт виджетов моделей
@@ -36,6 +37,9 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Сколько сообщений истории загружается при открытии сессии и при прокрутке к началу
+HISTORY_PAGE_SIZE = 50
+
 class ChatWidget(QWidget):
     # Сигналы
     link_clicked = Signal(str)  # URL для открытия во встроенном браузере
@@ -55,6 +59,11 @@ class ChatWidget(QWidget):
         self._animation_timer = None
         self._pending_updates = []
         self._is_updating = False
+        self._stream_msg_id = None  # Сообщение ленты с потоковым текстом текущего ответа
+        self._markdown = get_markdown_renderer()
+        self._stream_renderer = IncrementalMarkdownRenderer()
+        self._status_msg_id = None
+        self._oldest_loaded_cursor = None  # Курсор (timestamp, seq) самого старого загруженного сообщения
         self.attached_files = []
         
         # Информация о выбранной модели
@@ -99,12 +108,10 @@ class ChatWidget(QWidget):
         if self._animation_timer is not None:
             self._animation_timer.stop()
         
+        self._discard_streamed_text()
+        
         # Удаляем статусное сообщение
-        doc = self.history.document()
-        cursor = doc.find('id="status_msg"')
-        if cursor:
-            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
-            cursor.removeSelectedText()
+        self._remove_status_message()
         
         # Отображаем ошибку
         self._append_message_with_style("error", f"Ошибка: {error_message}")
@@ -138,38 +145,15 @@ class ChatWidget(QWidget):
         chat_area_layout = QVBoxLayout(self.chat_area_widget)
         chat_area_layout.setContentsMargins(0, 0, 0, 0)
 
-        # Используем QTextBrowser для поддержки кликабельных ссылок
-        self.history = QTextBrowser(self)
+        # Лента сообщений: отрисовываются только видимые сообщения, верстка кэшируется
+        self.history = ChatTranscriptView(self)
         self.history.setObjectName("ChatHistory")
-        self.history.setReadOnly(True)
-        # Настройка для обработки кликов по ссылкам
-        self.history.anchorClicked.connect(self._on_link_clicked)  # Подключаем обработчик
-        # Добавляем обработчик клавиш для области истории
-        self.history.keyPressEvent = self._history_key_press_event
-        # Включаем корректные переносы и ограничение ширины
-        opt = self.history.document().defaultTextOption()
-        opt.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
-        self.history.document().setDefaultTextOption(opt)
-        self.history.setWordWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
-        self.history.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
-        self.history.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        # Применяем объединенные стили (базовые + markdown)
-        # Перебиваем глобальные стили и темы: добавляем повышенную специфичность и !important
-        def _strong_css(css: str) -> str:
-            # оборачиваем правила для повышения специфичности и добавляем !important к ключевым свойствам переноса
-            css = css.replace("QTextEdit {", "QTextEdit, QTextEdit#ChatHistory {")
-            replacements = [
-                ("word-break: break-word;", "word-break: break-word !important;"),
-                ("word-wrap: break-word;", "word-wrap: break-word !important;"),
-                ("overflow-wrap: anywhere;", "overflow-wrap: anywhere !important;"),
-                ("white-space: pre-wrap;", "white-space: pre-wrap !important;"),
-                ("max-width: 100%;", "max-width: 100% !important;"),
-            ]
-            for old, new in replacements:
-                css = css.replace(old, new)
-            return css
-        self.history.setStyleSheet(_strong_css(self._get_basic_chat_styles() + self._get_markdown_styles()))
-        
+        # Клики по ссылкам в сообщениях
+        self.history.link_activated.connect(self._on_link_clicked)
+        # Более старые сообщения подгружаются при прокрутке к началу
+        self.history.older_requested.connect(self._load_older_history)
+        self.history.setStyleSheet(self._get_basic_chat_styles())
+        self.history.set_document_style_sheet(self._get_markdown_styles())
         chat_area_layout.addWidget(self.history)
         self.tab_widget.addTab(self.chat_area_widget, "Чат")
 
@@ -177,10 +161,14 @@ class ChatWidget(QWidget):
         history_tab = QWidget()
         history_layout = QVBoxLayout(history_tab)
         self.sessions_list = QListWidget()
-        sessions = sorted(self.memory_manager.list_sessions(), key=lambda s: s.get('created_at', '0'), reverse=True)
+        # Список строится только по индексу сессий; сообщения загружаются при открытии сессии
+        sessions = sorted(self.memory_manager.list_sessions(),
+                          key=lambda s: s.get('last_activity') or s.get('created_at', '0'), reverse=True)
         for sess in sessions:
             item = QListWidgetItem(sess.get('title', sess['id']))
             item.setData(Qt.ItemDataRole.UserRole, sess['id'])
+            if sess.get('message_count'):
+                item.setToolTip(f"Сообщений: {sess['message_count']}, последняя активность: {sess.get('last_activity', '')}")
             self.sessions_list.addItem(item)
         self.sessions_list.itemClicked.connect(self._load_session_history)
         self.sessions_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
@@ -273,6 +261,7 @@ class ChatWidget(QWidget):
                 if self.session_id == session_id:
                     self.session_id = None
                     self.history.clear()
+                    self._oldest_loaded_cursor = None
                 logger.debug(f"[DELETE] Session {session_id} deleted")
         except Exception as e:
             logger.error(f"[DELETE] Error in confirmation dialog: {e}")
@@ -415,11 +404,8 @@ class ChatWidget(QWidget):
             logger.debug(f"[BROWSER] _apply_browser_actions_from_response error: {e}")
 
     def resizeEvent(self, event: QResizeEvent):
-        """Обрабатывает изменение размера виджета"""
+        """Обрабатывает изменение размера виджета (лента пересчитывает размеры сама)"""
         super().resizeEvent(event)
-        if hasattr(self, 'history'):
-            self.history.document().setTextWidth(self.history.viewport().width())
-            self.history.document().adjustSize()
 
     def _setup_action_buttons(self, parent_layout):
         """Настраивает кнопки действий"""
@@ -443,9 +429,9 @@ class ChatWidget(QWidget):
         parent_layout.addWidget(self.send_btn)
 
     def _get_basic_chat_styles(self) -> str:
-        """Возвращает базовые стили для обычного QTextEdit"""
+        """Возвращает базовые стили виджета ленты сообщений"""
         return """
-        QTextEdit {
+        QListView#ChatHistory {
             border-radius: 8px;
             padding: 8px;
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
@@ -615,121 +601,17 @@ class ChatWidget(QWidget):
         """
 
     def _render_markdown(self, text: str) -> str:
-        """Улучшенная функция рендеринга markdown в HTML"""
-        if not text:
-            return ""
-            
-        # Экранируем HTML символы, сохраняя уже существующие HTML теги
-        text = self._safe_html_escape(text)
-        
-        # Обработка блоков кода с разбивкой длинных строк
-        def insert_zws(match):
-            code = match.group(1)
-            # Вставляем zero-width space каждые 80 chars в длинных строках
-            lines = []
-            for line in code.splitlines():
-                if len(line) > 80:
-                    line = ''.join(c + '&#8203;' if i > 0 and i % 80 == 0 else c for i, c in enumerate(line))
-                lines.append(line)
-            return f'<pre><code>{"\n".join(lines)}</code></pre>'
-        
-        text = re.sub(r'```([^`]*?)```', insert_zws, text)
-        
-        # Обработка инлайн-кода (тоже с zws для очень длинных)
-        def inline_zws(match):
-            code = match.group(1)
-            if len(code) > 80:
-                code = ''.join(c + '&#8203;' if i > 0 and i % 80 == 0 else c for i, c in enumerate(code))
-            return f'<code>{code}</code>'
-        
-        text = re.sub(r'`([^`]+)`', inline_zws, text)
-        
-        # Заголовки
-        for i in range(6, 0, -1):
-            pattern = r'^{} (.+)$'.format('#' * i)
-            text = re.sub(pattern, r'<h{0}>\1</h{0}>'.format(i), text, flags=re.MULTILINE)
-        
-        # Жирный текст
-        text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
-        
-        # Курсив
-        text = re.sub(r'\*(.+?)\*', r'<em>\1</em>', text)
-        
-        # Списки
-        text = re.sub(r'^\* (.+)$', r'<ul><li>\1</li></ul>', text, flags=re.MULTILINE)
-        text = re.sub(r'^\d+\. (.+)$', r'<ol><li>\1</li></ol>', text, flags=re.MULTILINE)
-        
-        # Ссылки
-        text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
-        
-        # Горизонтальная линия
-        text = re.sub(r'^---$', r'<hr>', text, flags=re.MULTILINE)
-        
-        # Параграфы (только для строк, которые не являются HTML)
-        lines = []
-        for line in text.split('\n'):
-            if line.strip() and not line.strip().startswith(('<', '>')):
-                lines.append(f'<p>{line}</p>')
-            else:
-                lines.append(line)
-        
-        return '\n'.join(lines)
-
-    def _safe_html_escape(self, text: str) -> str:
-        """Безопасное экранирование HTML с сохранением существующих тегов"""
-        chunks = []
-        last_pos = 0
-        
-        for match in re.finditer(r'<[^>]+>', text):
-            start, end = match.span()
-            # Экранируем текст до тега
-            if start > last_pos:
-                chunks.append(html.escape(text[last_pos:start]))
-            # Сохраняем тег как есть
-            chunks.append(text[start:end])
-            last_pos = end
-            
-        # Добавляем оставшийся текст
-        if last_pos < len(text):
-            chunks.append(html.escape(text[last_pos:]))
-            
-        return ''.join(chunks)
+        """Рендерит markdown в HTML (однопроходный рендерер с кэшем)"""
+        return self._markdown.render(text)
 
     def _scroll_history_to_end(self):
         """Прокручивает окно истории чата к концу безопасно."""
         try:
             if hasattr(self, 'history') and self.history is not None:
-                cursor = self.history.textCursor()
-                cursor.movePosition(QTextCursor.MoveOperation.End)
-                self.history.setTextCursor(cursor)
-                self.history.ensureCursorVisible()
+                self.history.scroll_to_end()
         except Exception as e:
             logger.debug(f"[CHAT] _scroll_history_to_end error: {e}")
 
-    def _get_chat_history(self, limit: int = 50):
-        """Возвращает последние сообщения текущей сессии в формате списка словарей.
-
-        Каждый элемент: { 'role': 'user'|'assistant'|'system', 'content': str, 'timestamp': str }
-        Используется при отправке сообщения для передачи контекста в backend.
-        """
-        try:
-            if not getattr(self, 'session_id', None):
-                return []
-            if not hasattr(self, 'memory_manager') or self.memory_manager is None:
-                return []
-            msgs = self.memory_manager.get_session_messages(self.session_id, limit=limit)
-            history = []
-            for m in msgs:
-                history.append({
-                    'role': m.get('role', ''),
-                    'content': m.get('content', ''),
-                    'timestamp': m.get('timestamp', '')
-                })
-            return history
-        except Exception as e:
-            logger.warning(f"[CHAT] Не удалось получить историю чата: {e}")
-            return []
-
     def _send_message_basic_wrapper(self):
         """Обертка для совместимости: вызывает основной send_message ниже."""
         try:
@@ -741,31 +623,16 @@ class ChatWidget(QWidget):
     def _show_loading_indicator(self):
         """Показывает индикатор загрузки с анимацией"""
         self._current_status_text = "Обрабатываю запрос"
-        status_html = f"""
-        <div id="status_msg" class="status-message">
-            <div class="spinner"></div>
-            {self._current_status_text}
-        </div>
-        """
-        cursor = self.history.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertHtml(status_html)
+        self._remove_status_message()
+        self._status_msg_id = self.history.append_message(
+            'status', self._status_html(self._current_status_text), self._current_status_text
+        )
         self._scroll_history_to_end()
         if self._animation_timer is not None:
             self._animation_timer.start()
 
-    def _append_message_with_style(self, role: str, text: str):
-        """Добавляет сообщение с соответствующим стилем"""
-        msg_id = 'status_msg' if role == 'status' else f'msg_{uuid.uuid4().hex[:8]}'
-        
-        style_class = {
-            "user": "user-message",
-            "assistant": "assistant-message",
-            "system": "system-message",
-            "error": "error-message",
-            "status": "status-message"
-        }.get(role, "message")
-        
+    def _format_message_html(self, role: str, text: str, timestamp: str = None) -> str:
+        """Формирует HTML содержимого сообщения (фон пузыря рисует делегат ленты)"""
         formatted_text = self._render_markdown(text) if role in ["assistant", "system"] else html.escape(text)
         
         author = {
@@ -783,53 +650,37 @@ class ChatWidget(QWidget):
         elif role == 'assistant':
             avatar = '<span class="avatar assistant-avatar"></span>'
         
-        timestamp = datetime.now().strftime('%H:%M')
+        timestamp = timestamp or datetime.now().strftime('%H:%M')
         
-        # Инлайн-стили, чтобы перебить глобальные qApp стили/темы
-        bubble_style = "max-width:75%; display:inline-block; position:relative; white-space:pre-wrap; word-wrap:break-word; word-break:break-word; overflow-wrap:anywhere;"
-        pre_style = "background:rgba(0,0,0,0.05); padding:8px; border-radius:8px; overflow-x:auto; white-space:pre-wrap; word-wrap:break-word; word-break:break-word; overflow-wrap:anywhere; max-height:300px; max-width:100%;"
-        code_style = "background:rgba(0,0,0,0.05); padding:2px 4px; border-radius:4px; word-break:break-word; overflow-wrap:anywhere;"
+        pre_style = "background:rgba(0,0,0,0.05); padding:8px; border-radius:8px; white-space:pre-wrap;"
+        code_style = "background:rgba(0,0,0,0.05); padding:2px 4px; border-radius:4px;"
         # Подставляем стили в сгенерированный HTML (минимально инвазивно)
         formatted_text_styled = formatted_text.replace("<pre>", f'<pre style="{pre_style}">').replace("<code>", f'<code style="{code_style}">')
         
-        message_html = f"""
-        <div id="{msg_id}" class="message {style_class}" style="{bubble_style}">
+        return f"""
             {avatar}
             <b>{author}:</b> {formatted_text_styled}
             <div class="timestamp">{timestamp}</div>
-        </div>
         """
-        
-        cursor = self.history.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertHtml(message_html)
-        self.history.setTextCursor(cursor)
-        self.history.document().setTextWidth(self.history.viewport().width())
-        self.history.document().adjustSize()
-        self.history.ensureCursorVisible()
-        # На всякий случай отключаем горизонтальный скролл и выставляем перенос по виджету каждый раз
-        self.history.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
-        self.history.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+
+    def _append_message_with_style(self, role: str, text: str):
+        """Добавляет сообщение с соответствующим стилем"""
+        self.history.append_message(role, self._format_message_html(role, text), text)
         self._scroll_history_to_end()
 
+    def _status_html(self, text: str) -> str:
+        return f'<div class="status-message"><i>{html.escape(text)}</i></div>'
+
     def _update_status_display(self, text: str):
         """Обновляет текст статусного сообщения без повторного добавления"""
-        doc = self.history.document()
-        cursor = doc.find('id="status_msg"')
-        if cursor:
-            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
-            cursor.removeSelectedText()
-            updated_html = f"""
-            <div id="status_msg" class="status-message">
-                <div class="spinner"></div>
-                {text}
-            </div>
-            """
-            cursor.insertHtml(updated_html)
-            self.history.document().setTextWidth(self.history.viewport().width())
-            self.history.document().adjustSize()
-            self.history.ensureCursorVisible()
-            self._scroll_history_to_end()
+        if self._status_msg_id is None:
+            return
+        self.history.update_message(self._status_msg_id, self._status_html(text), text)
+
+    def _remove_status_message(self):
+        if self._status_msg_id is not None:
+            self.history.remove_message(self._status_msg_id)
+            self._status_msg_id = None
 
     @Slot(str)
     def _update_status_message(self, status_text: str):
@@ -842,12 +693,11 @@ class ChatWidget(QWidget):
         if self._animation_timer is not None:
             self._animation_timer.stop()
         
+        # Черновик из потоковых токенов заменяется финальным оформленным сообщением
+        self._discard_streamed_text()
+        
         # Удаляем статусное сообщение
-        doc = self.history.document()
-        cursor = doc.find('id="status_msg"')
-        if cursor:
-            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
-            cursor.removeSelectedText()
+        self._remove_status_message()
         
         # Обрабатываем успешный ответ
         if isinstance(response, dict):
@@ -876,29 +726,33 @@ class ChatWidget(QWidget):
     @Slot(str)
     def _handle_partial_response(self, partial_text: str):
         """Обрабатывает частичные ответы для streaming отображения"""
-        # Fallback для обычного QTextEdit
-        cursor = self.history.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertText(partial_text)
-        self.history.setTextCursor(cursor)
+        # Потоковый текст копится в одном сообщении ленты - перерисовывается только оно,
+        # а в нем заново рендерится только последний незавершенный блок markdown
+        stream_html = self._stream_renderer.feed(partial_text)
+        stream_text = self._stream_renderer.text
+        if self._stream_msg_id is None:
+            self._stream_msg_id = self.history.append_message('assistant', stream_html, stream_text)
+        else:
+            self.history.update_message(self._stream_msg_id, stream_html, stream_text)
         
         self._scroll_history_to_end()
 
+    def _discard_streamed_text(self):
+        """Удаляет текст, добавленный потоковыми частями текущего ответа"""
+        if self._stream_msg_id is None:
+            return
+        self.history.remove_message(self._stream_msg_id)
+        self._stream_msg_id = None
+        self._stream_renderer.reset()
+
     def _append_message_basic(self, role: str, message: str):
         """Метод для добавления сообщений с базовым стилем"""
         timestamp = datetime.now().strftime("%H:%M")
-        role_class = f"{role}-message"
-        avatar_class = f"{role}-avatar"
         html_message = f"""
-        <div class="message {role_class}">
-            <div class="avatar {avatar_class}"></div>
             {self._render_markdown(message)}
             <div class="timestamp">{timestamp}</div>
-        </div>
         """
-        cursor = self.history.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertHtml(html_message)
+        self.history.append_message(role, html_message, message)
         self._scroll_history_to_end()
 
     def _handle_terminal_output(self, term_out: dict):
@@ -928,10 +782,6 @@ class ChatWidget(QWidget):
         
         return message
 
-    def _scroll_history_to_end(self):
-        scrollbar = self.history.verticalScrollBar()
-        QTimer.singleShot(0, lambda: scrollbar.setValue(scrollbar.maximum()))
-
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls() or event.mimeData().hasImage():
             event.acceptProposedAction()
@@ -1011,32 +861,6 @@ class ChatWidget(QWidget):
         # Все остальные клавиши - стандартная обработка
         QTextEdit.keyPressEvent(self.input, event)
 
-    def _history_key_press_event(self, event):
-        """Обработка нажатий клавиш в области истории чата"""
-        # Ctrl+C - копирование выделенного текста
-        if event.key() == Qt.Key.Key_C and (event.modifiers() & Qt.KeyboardModifier.ControlModifier):
-            QTextEdit.keyPressEvent(self.history, event)
-            return
-        
-        # Ctrl+A - выделить всё
-        if event.key() == Qt.Key.Key_A and (event.modifiers() & Qt.KeyboardModifier.ControlModifier):
-            QTextEdit.keyPressEvent(self.history, event)
-            return
-        
-        # Ctrl+F - поиск (если поддерживается)
-        if event.key() == Qt.Key.Key_F and (event.modifiers() & Qt.KeyboardModifier.ControlModifier):
-            QTextEdit.keyPressEvent(self.history, event)
-            return
-        
-        # Стрелки, Page Up/Down, Home/End - навигация
-        if event.key() in (Qt.Key.Key_Up, Qt.Key.Key_Down, Qt.Key.Key_Left, Qt.Key.Key_Right,
-                          Qt.Key.Key_PageUp, Qt.Key.Key_PageDown, Qt.Key.Key_Home, Qt.Key.Key_End):
-            QTextEdit.keyPressEvent(self.history, event)
-            return
-        
-        # Все остальные клавиши - стандартная обработка для read-only поля
-        QTextEdit.keyPressEvent(self.history, event)
-
     def keyPressEvent(self, event):
         """Глобальная обработка клавиш для всего виджета чата"""
         # Ctrl+Enter - отправка сообщения (альтернативный способ)
@@ -1106,15 +930,16 @@ class ChatWidget(QWidget):
         self._load_history()
 
     def _load_history(self):
-        """Загружает и отображает историю сообщений из памяти для текущей сессии"""
+        """Загружает и отображает последние сообщения текущей сессии; более старые - при прокрутке"""
         if not self.session_id:
             logger.warning("[CHAT] Сессия не инициализирована, история не загружена")
             return
         
+        self._oldest_loaded_cursor = None
         try:
-            messages = self.memory_manager.get_chat_history(self.session_id)
+            messages = self.memory_manager.get_session_messages(self.session_id, limit=HISTORY_PAGE_SIZE)
         except AttributeError:
-            logger.warning("[CHAT] Метод get_chat_history не найден в MemoryManager")
+            logger.warning("[CHAT] Метод get_session_messages не найден в MemoryManager")
             messages = []
         
         if not messages:
@@ -1122,23 +947,56 @@ class ChatWidget(QWidget):
             return
         
         logger.info(f"[CHAT] Загрузка {len(messages)} сообщений из истории")
-        for msg in messages:
-            role = msg.get('role', 'system')
-            content = msg.get('content', '')
-            if role == 'user':
-                self._append_message_with_style('user', content)
-            elif role == 'assistant':
-                self._append_message_with_style('assistant', content)
-            else:
-                self._append_message_with_style('system', content)
+        self._oldest_loaded_cursor = ChatStore.page_cursor(messages[0])
+        self.history.prepend_messages(self._history_entries(messages), has_older=len(messages) >= HISTORY_PAGE_SIZE)
         
         # Прокручиваем к концу после загрузки
         self._scroll_history_to_end()
 
+    def _load_older_history(self):
+        """Подгружает предыдущую страницу истории при прокрутке ленты к началу"""
+        messages = []
+        if self.session_id and self._oldest_loaded_cursor:
+            try:
+                messages = self.memory_manager.get_session_messages(
+                    self.session_id, limit=HISTORY_PAGE_SIZE, before=self._oldest_loaded_cursor
+                )
+            except Exception as e:
+                logger.warning(f"[CHAT] Не удалось загрузить более старые сообщения: {e}")
+        if messages:
+            self._oldest_loaded_cursor = ChatStore.page_cursor(messages[0])
+            logger.debug(f"[CHAT] Подгружено {len(messages)} более старых сообщений")
+        self.history.prepend_messages(self._history_entries(messages), has_older=len(messages) >= HISTORY_PAGE_SIZE)
+
+    def _history_entries(self, messages):
+        entries = []
+        for msg in messages:
+            role = msg.get('role', 'system')
+            if role not in ('user', 'assistant'):
+                role = 'system'
+            content = msg.get('content', '')
+            entries.append({
+                'role': role,
+                'html': self._format_message_html(role, content, self._format_time(msg.get('timestamp'))),
+                'text': content,
+            })
+        return entries
+
+    @staticmethod
+    def _format_time(timestamp) -> str:
+        try:
+            return datetime.fromisoformat(timestamp).strftime('%H:%M')
+        except (TypeError, ValueError):
+            return ''
+
     def _load_session_history(self, item):
+        """Открывает сессию из списка: ее сообщения читаются с диска только сейчас"""
         session_id = item.data(Qt.ItemDataRole.UserRole)
         self.session_id = session_id
         self.history.clear()
+        self._stream_msg_id = None
+        self._stream_renderer.reset()
+        self._status_msg_id = None
         self._load_history()
         self.tab_widget.setCurrentIndex(0)  # Switch to Chat tab
 
@@ -1302,7 +1160,6 @@ class ChatWidget(QWidget):
         metadata = {
             'session_id': self.session_id,
             'current_tool': self.current_tool,
-            'chat_history': self._get_chat_history(),
             'attachments': self.attached_files.copy() if self.attached_files else [],
             'attached_files': self.attached_files.copy() if self.attached_files else [],
             'model_provider': self.current_provider,
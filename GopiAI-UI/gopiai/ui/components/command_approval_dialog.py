@@ -4,16 +4,19 @@
 """
 
 import logging
+import socket
+import threading
 import requests
 from typing import Dict, List, Optional
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
     QTextEdit, QWidget, QScrollArea, QFrame, QMessageBox
 )
-from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtCore import Qt, QTimer, Signal, QThread, QCoreApplication
 from PySide6.QtGui import QFont, QColor, QPalette
+from gopiai.ui.utils.http_client import get_http_client
 from gopiai.ui.utils.icon_helpers import create_icon_button, get_icon
-from gopiai.ui.utils.network import get_crewai_server_base_url
+from gopiai.ui.utils.network import get_crewai_server_base_url, iter_sse_events
 
 logger = logging.getLogger(__name__)
 
@@ -165,6 +168,79 @@ class CommandApprovalWidget(QFrame):
         self.command_rejected.emit(self.command_id)
 
 
+class ApprovalStreamWorker(QThread):
+    """Фоновое чтение SSE потока /api/commands/stream с переподключением"""
+    
+    snapshot_received = Signal(list)   # список ожидающих команд
+    command_pending = Signal(dict)     # новая команда
+    command_resolved = Signal(str, str)  # command_id, status
+    
+    RECONNECT_DELAY = 2.0
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 30  # сервер шлет keepalive каждые 15 секунд
+    
+    def __init__(self, api_base: str, parent=None):
+        super().__init__(parent)
+        self.api_base = api_base
+        self._running = True
+        self._stop_event = threading.Event()
+        self._response: Optional[requests.Response] = None
+    
+    def stop(self):
+        """Останавливает поток: закрывает текущий ответ, чтобы прервать блокирующее чтение"""
+        self._running = False
+        self._stop_event.set()
+        response = self._response
+        if response is not None:
+            _abort_response(response)
+    
+    def run(self):
+        url = f"{self.api_base}/api/commands/stream"
+        while self._running:
+            try:
+                with get_http_client().get(url, headers={"Accept": "text/event-stream"}, stream=True,
+                                           timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT)) as response:
+                    self._response = response
+                    if not self._running:
+                        return
+                    response.raise_for_status()
+                    for event in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                        if not self._running:
+                            return
+                        data = event["data"]
+                        if event["event"] == "snapshot":
+                            self.snapshot_received.emit(data.get("pending_commands", []))
+                        elif event["event"] == "pending":
+                            self.command_pending.emit(data)
+                        elif event["event"] == "resolved":
+                            self.command_resolved.emit(data.get("id", ""), data.get("status", ""))
+            except Exception as e:
+                # Ошибка чтения после stop() - ожидаемое следствие закрытия ответа
+                if not self._running:
+                    return
+                if not isinstance(e, requests.RequestException):
+                    raise
+                logger.debug(f"Поток подтверждений недоступен: {e}")
+            finally:
+                self._response = None
+            # Сервер закрывает поток по истечении максимальной длительности - переподключаемся
+            self._stop_event.wait(self.RECONNECT_DELAY)
+
+
+def _abort_response(response: requests.Response):
+    """Прерывает чтение потокового ответа из другого потока (close() сокета не будит recv)"""
+    try:
+        raw = response.raw
+        if hasattr(raw, "shutdown"):  # urllib3 >= 2.3
+            raw.shutdown()
+        else:
+            sock = getattr(getattr(raw, "_connection", None), "sock", None)
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+    except Exception as e:
+        logger.debug(f"Не удалось прервать поток подтверждений: {e}")
+
+
 class CommandApprovalDialog(QDialog):
     """Диалог для подтверждения команд"""
     
@@ -173,13 +249,17 @@ class CommandApprovalDialog(QDialog):
         self.api_base = get_crewai_server_base_url()
         self.pending_commands: Dict[str, CommandApprovalWidget] = {}
         
-        # Таймер для polling pending команд
-        self.poll_timer = QTimer()
-        self.poll_timer.timeout.connect(self._poll_pending_commands)
-        self.poll_timer.start(2000)  # Проверяем каждые 2 секунды
-        
         self._setup_ui()
-        self._poll_pending_commands()  # Первоначальная загрузка
+        
+        # Сервер присылает новые и обработанные команды через SSE - без опроса
+        self.stream_worker = ApprovalStreamWorker(self.api_base, self)
+        self.stream_worker.snapshot_received.connect(self._update_commands_display)
+        self.stream_worker.command_pending.connect(self._add_command)
+        self.stream_worker.command_resolved.connect(self._on_command_resolved)
+        self.stream_worker.start()
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self._stop_stream)
         
         logger.info("CommandApprovalDialog инициализирован")
     
@@ -237,7 +317,7 @@ class CommandApprovalDialog(QDialog):
         buttons_layout = QHBoxLayout()
         
         refresh_btn = QPushButton("🔄 Обновить")
-        refresh_btn.clicked.connect(self._poll_pending_commands)
+        refresh_btn.clicked.connect(self._fetch_pending_commands)
         buttons_layout.addWidget(refresh_btn)
         
         buttons_layout.addStretch()
@@ -248,13 +328,14 @@ class CommandApprovalDialog(QDialog):
         
         layout.addLayout(buttons_layout)
     
-    def _poll_pending_commands(self):
-        """Запрашивает список pending команд с сервера"""
+    def _fetch_pending_commands(self):
+        """Однократно запрашивает список pending команд (ручное обновление)"""
         try:
-            response = requests.get(f"{self.api_base}/api/commands/pending", timeout=5)
+            response = get_http_client().get(f"{self.api_base}/api/commands/pending", timeout=5)
             if response.status_code == 200:
                 data = response.json()
-                pending_commands = data.get('commands', [])
+                # Сервер возвращает словарь {command_id: command_info}
+                pending_commands = list(data.get('pending_commands', {}).values())
                 self._update_commands_display(pending_commands)
             else:
                 logger.warning(f"Не удалось получить pending команды: {response.status_code}")
@@ -262,24 +343,25 @@ class CommandApprovalDialog(QDialog):
             logger.warning(f"Ошибка при запросе pending команд: {e}")
     
     def _update_commands_display(self, commands: List[Dict]):
-        """Обновляет отображение команд"""
-        # Удаляем команды, которых больше нет
+        """Синхронизирует отображение с полным списком ожидающих команд"""
         current_command_ids = {cmd.get('id') for cmd in commands}
         for command_id in list(self.pending_commands.keys()):
             if command_id not in current_command_ids:
-                widget = self.pending_commands.pop(command_id)
-                widget.deleteLater()
+                self._remove_command(command_id)
         
-        # Добавляем новые команды
         for command_info in commands:
-            command_id = command_info.get('id')
-            if command_id and command_id not in self.pending_commands:
-                widget = CommandApprovalWidget(command_info)
-                widget.command_approved.connect(self._approve_command)
-                widget.command_rejected.connect(self._reject_command)
-                
-                self.pending_commands[command_id] = widget
-                self.commands_layout.addWidget(widget)
+            self._add_command(command_info)
+    
+    def _add_command(self, command_info: Dict):
+        """Добавляет новую команду и показывает диалог"""
+        command_id = command_info.get('id')
+        if command_id and command_id not in self.pending_commands:
+            widget = CommandApprovalWidget(command_info)
+            widget.command_approved.connect(self._approve_command)
+            widget.command_rejected.connect(self._reject_command)
+            
+            self.pending_commands[command_id] = widget
+            self.commands_layout.addWidget(widget)
         
         # Показываем/скрываем сообщение о отсутствии команд
         has_commands = len(self.pending_commands) > 0
@@ -291,25 +373,33 @@ class CommandApprovalDialog(QDialog):
             self.raise_()
             self.activateWindow()
     
+    def _on_command_resolved(self, command_id: str, status: str):
+        """Команда обработана (в том числе в другом окне или по таймауту)"""
+        logger.debug(f"Команда {command_id} обработана сервером: {status}")
+        self._remove_command(command_id)
+    
+    def _remove_command(self, command_id: str):
+        if command_id not in self.pending_commands:
+            return
+        widget = self.pending_commands.pop(command_id)
+        widget.deleteLater()
+        
+        # Проверяем, остались ли команды
+        if not self.pending_commands:
+            self.no_commands_label.setVisible(True)
+            # Закрываем диалог через 3 секунды, если больше нет команд
+            QTimer.singleShot(3000, self._auto_close_if_empty)
+    
     def _approve_command(self, command_id: str):
         """Подтверждает выполнение команды"""
         try:
-            response = requests.post(
+            response = get_http_client().post(
                 f"{self.api_base}/api/commands/{command_id}/approve",
                 timeout=5
             )
             if response.status_code == 200:
                 logger.info(f"Команда {command_id} успешно подтверждена")
-                # Удаляем виджет команды
-                if command_id in self.pending_commands:
-                    widget = self.pending_commands.pop(command_id)
-                    widget.deleteLater()
-                    
-                    # Проверяем, остались ли команды
-                    if not self.pending_commands:
-                        self.no_commands_label.setVisible(True)
-                        # Закрываем диалог через 3 секунды, если больше нет команд
-                        QTimer.singleShot(3000, self._auto_close_if_empty)
+                self._remove_command(command_id)
             else:
                 QMessageBox.warning(self, "Ошибка", f"Не удалось подтвердить команду: {response.status_code}")
         except requests.RequestException as e:
@@ -318,22 +408,13 @@ class CommandApprovalDialog(QDialog):
     def _reject_command(self, command_id: str):
         """Отклоняет выполнение команды"""
         try:
-            response = requests.post(
+            response = get_http_client().post(
                 f"{self.api_base}/api/commands/{command_id}/reject",
                 timeout=5
             )
             if response.status_code == 200:
                 logger.info(f"Команда {command_id} отклонена")
-                # Удаляем виджет команды
-                if command_id in self.pending_commands:
-                    widget = self.pending_commands.pop(command_id)
-                    widget.deleteLater()
-                    
-                    # Проверяем, остались ли команды
-                    if not self.pending_commands:
-                        self.no_commands_label.setVisible(True)
-                        # Закрываем диалог через 3 секунды, если больше нет команд
-                        QTimer.singleShot(3000, self._auto_close_if_empty)
+                self._remove_command(command_id)
             else:
                 QMessageBox.warning(self, "Ошибка", f"Не удалось отклонить команду: {response.status_code}")
         except requests.RequestException as e:
@@ -344,10 +425,17 @@ class CommandApprovalDialog(QDialog):
         if not self.pending_commands:
             self.close()
     
+    def _stop_stream(self):
+        """Останавливает фоновое чтение потока подтверждений (при выходе из приложения)"""
+        self.stream_worker.stop()
+        # stop() прерывает чтение; если прервать не удалось - чтение завершится по таймауту
+        worker = ApprovalStreamWorker
+        if not self.stream_worker.wait((worker.CONNECT_TIMEOUT + worker.READ_TIMEOUT) * 1000):
+            logger.warning("Поток подтверждений не остановился")
+    
     def closeEvent(self, event):
         """Обработчик закрытия диалога"""
-        # Останавливаем таймер polling при закрытии
-        self.poll_timer.stop()
+        # Поток подтверждений продолжает работать: диалог появится снова при новой команде
         super().closeEvent(event)
     
     def show(self):
@@ -9,15 +9,16 @@ import logging
 import os
 import re
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import requests
 import requests.exceptions
 
-from gopiai.ui.utils.network import get_crewai_server_base_url
-from ..memory.manager import MemoryManager
+from gopiai.ui.utils.http_client import get_http_client
+from gopiai.ui.utils.network import get_crewai_server_base_url, iter_sse_events
 
 # Настройка логирования для CrewAI клиента
 logger = logging.getLogger(__name__)
@@ -29,6 +30,14 @@ UI_DIR = CURRENT_DIR.parent.parent
 PROJECT_ROOT = UI_DIR.parent.parent
 CREWAI_DIR = PROJECT_ROOT / "GopiAI-CrewAI"
 
+# Фоновая проверка /api/health: интервалы (сек) для доступного и недоступного сервера
+HEALTH_CHECK_INTERVAL_ONLINE = float(os.environ.get("GOPIAI_HEALTH_INTERVAL", "30"))
+HEALTH_CHECK_INTERVAL_OFFLINE = float(os.environ.get("GOPIAI_HEALTH_INTERVAL_OFFLINE", "5"))
+HEALTH_CHECK_TIMEOUT = 3
+# Повторы при ошибке подключения в process_request: задержка растет от 0.5 до 4 сек
+REQUEST_MAX_RETRIES = 4
+REQUEST_RETRY_DELAY = 0.5
+
 # Эмоциональный классификатор отключен после рефакторинга
 EMOTIONAL_CLASSIFIER_AVAILABLE = False
 EmotionalClassifier = None
@@ -153,13 +162,25 @@ class CrewAIClient:
     запущенного в отдельном окружении через REST API.
     """
 
-    def __init__(self, base_url=None):  # Стандартный порт CrewAI API сервера
+    def __init__(self, base_url=None, health_monitor: bool = True):  # Стандартный порт CrewAI API сервера
         # Разрешаем динамический порт, если используется значение по умолчанию
         self.base_url = base_url or get_crewai_server_base_url()
         self.timeout = 30  # Таймаут для API запросов (в секундах)
         self._server_available = None
         self._last_check = 0
 
+        # Keep-alive сессия общего HTTP-клиента UI: соединения переиспользуются между запросами и потоками
+        self.session = get_http_client().session
+
+        # Состояние сервера обновляется фоновым потоком, is_available() не ходит в сеть
+        self._health_listeners: List[Callable[[bool], None]] = []
+        self._health_lock = threading.Lock()
+        self._health_wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_monitor:
+            self.start_health_monitor()
+
         # MCP клиент отключен по умолчанию, чтобы избежать ошибок отсутствия атрибута
         self.mcp_client = None
         
@@ -222,25 +243,82 @@ class CrewAIClient:
             logger.error(f"Ошибка Brave Search: {e}")
         return None
 
-    def is_available(self, force_check=False):
-        """Проверяет доступность CrewAI API сервера"""
-        # Перепроверяем чаще, если предыдущая попытка показала, что сервер недоступен.
-        current_time = time.time()
-        cache_window = 5 if self._server_available is False else 30  # 5 сек, если сервер был оффлайн
-        if (not force_check
-                and self._server_available is not None
-                and (current_time - self._last_check) < cache_window):
-            return self._server_available
-
+    def start_health_monitor(self):
+        """Запускает фоновую проверку /api/health (повторный вызов ничего не делает)"""
+        if self._health_thread and self._health_thread.is_alive():
+            return
+        self._health_thread = threading.Thread(target=self._health_loop, name="crewai-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._closed.is_set():
+            self._check_health()
+            interval = HEALTH_CHECK_INTERVAL_ONLINE if self._server_available else HEALTH_CHECK_INTERVAL_OFFLINE
+            self._health_wakeup.wait(interval)
+            self._health_wakeup.clear()
+
+    def _check_health(self) -> bool:
         try:
-            response = requests.get(f"{self.base_url}/api/health", timeout=self.timeout)
-            self._server_available = response.status_code == 200
-            self._last_check = current_time
-            return self._server_available
+            response = self.session.get(f"{self.base_url}/api/health", timeout=HEALTH_CHECK_TIMEOUT)
+            available = response.status_code == 200
         except requests.RequestException:
-            self._server_available = False
-            self._last_check = current_time
-            return False
+            available = False
+        self._set_server_available(available)
+        return available
+
+    def _set_server_available(self, available: bool):
+        """Обновляет кэш состояния сервера и уведомляет подписчиков об изменении"""
+        with self._health_lock:
+            changed = self._server_available != available
+            self._server_available = available
+            self._last_check = time.time()
+            listeners = list(self._health_listeners) if changed else []
+        if changed:
+            logger.info(f"[HEALTH] {'✅ Сервер CrewAI доступен' if available else '❌ Сервер CrewAI недоступен'}")
+        for listener in listeners:
+            try:
+                listener(available)
+            except Exception as e:
+                logger.error(f"[HEALTH] Ошибка обработчика состояния сервера: {e}")
+
+    def add_health_listener(self, callback: Callable[[bool], None]):
+        """
+        Подписка на изменение доступности сервера.
+
+        Обработчик вызывается из фонового потока - Qt-код должен
+        пробрасывать значение через сигнал.
+        """
+        with self._health_lock:
+            self._health_listeners.append(callback)
+
+    def remove_health_listener(self, callback: Callable[[bool], None]):
+        with self._health_lock:
+            if callback in self._health_listeners:
+                self._health_listeners.remove(callback)
+
+    def refresh_health(self):
+        """Просит фоновый поток проверить сервер сейчас, не дожидаясь интервала"""
+        self._health_wakeup.set()
+
+    def close(self):
+        """Останавливает фоновую проверку (сессия общая и остается открытой)"""
+        self._closed.set()
+        self._health_wakeup.set()
+
+    def is_available(self, force_check=False):
+        """
+        Проверяет доступность CrewAI API сервера
+
+        Без force_check возвращает состояние из кэша, который обновляет фоновый поток,
+        и не блокирует вызывающий поток. Синхронный запрос выполняется только при
+        force_check, если сервер еще ни разу не проверялся или (без фоновой проверки)
+        кэш старше HEALTH_CHECK_INTERVAL_ONLINE.
+        """
+        monitored = self._health_thread is not None and self._health_thread.is_alive()
+        expired = not monitored and time.time() - self._last_check >= HEALTH_CHECK_INTERVAL_ONLINE
+        if force_check or self._server_available is None or expired:
+            return self._check_health()
+        return self._server_available
 
     def analyze_emotion(self, message_text, context=None):
         """
@@ -304,7 +382,8 @@ class CrewAIClient:
             
         logger.debug(f"[REQUEST] Сообщение: {msg_log}")
         
-        if not self.is_available():
+        # По кэшу сервер недоступен - перепроверяем один раз, прежде чем вернуть ошибку
+        if not self.is_available() and not self.is_available(force_check=True):
             logger.error("[REQUEST-ERROR] Сервер CrewAI недоступен")
             return {"response": "Ошибка: Сервер CrewAI недоступен", "error": "CrewAI server not available"}
             
@@ -325,9 +404,6 @@ class CrewAIClient:
             logger.debug("[REQUEST] Преобразуем не-словарь в словарь")
             message = {"message": str(message)}
             
-        # --- ИСПРАВЛЕНО: Корректная инициализация MemoryManager и получение истории ---
-        memory_manager = MemoryManager()
-
         # Новая обработка через MCP для инструментов
         if 'metadata' in message and 'tool' in message['metadata']:
             tool_type = message['metadata']['tool']
@@ -358,28 +434,8 @@ class CrewAIClient:
             message['metadata']['dynamic_tool_instructions'] = dynamic_instructions
             logger.info(f"[DYNAMIC-TOOLS] ✅ Добавлены динамические инструкции для {len(dynamic_instructions)} инструментов")
             
-        try:
-            # Получаем ID сессии из переданных метаданных
-            session_id = message.get('metadata', {}).get('session_id', 'default_session')
-            logger.debug(f"[REQUEST] Получаем историю сообщений для сессии: {session_id}")
-            
-            # Получаем историю сообщений (последние 20 сообщений)
-            chat_history = memory_manager.get_chat_history(session_id)
-            if chat_history:
-                # Берем только 20 сообщений
-                chat_history = chat_history[-20:]
-                logger.info(f"[REQUEST] Получено {len(chat_history)} сообщений из истории для сессии {session_id}")
-                
-                # Добавляем историю сообщений в переданные данные
-                message['metadata']['chat_history'] = chat_history
-                logger.debug("[REQUEST] История сообщений добавлена в запрос")
-            else:
-                logger.debug(f"[REQUEST] История сообщений для сессии {session_id} не найдена")
-        except Exception as e:
-            logger.error(f"[REQUEST-ERROR] Ошибка при получении истории сообщений: {e}")
-            # Устанавливаем пустую историю в случае ошибки, чтобы не падать
-            message['metadata']['chat_history'] = []
-            
+        # История чата не пересылается: сервер собирает контекст сам по session_id
+        # из базы чатов (chats.db) в пределах бюджета токенов модели
         logger.debug("[REQUEST] Продолжаем с отправкой запроса к CrewAI API")
             
         # Process attachments if present
@@ -540,8 +596,8 @@ class CrewAIClient:
             
         logger.debug("[REQUEST] Подготовка к отправке запроса в CrewAI API")
         
-        max_retries = 5
-        retry_delay = 5  # seconds
+        max_retries = REQUEST_MAX_RETRIES
+        retry_delay = REQUEST_RETRY_DELAY
 
         for attempt in range(max_retries):
             try:
@@ -552,7 +608,7 @@ class CrewAIClient:
                 url = f"{self.base_url}/api/process"
                 logger.debug(f"[REQUEST] Отправка POST запроса на {url} с заголовком Content-Type: application/json; charset=utf-8")
                 
-                response = requests.post(
+                response = self.session.post(
                     url,
                     json=message,
                     headers={"Content-Type": "application/json; charset=utf-8"},
@@ -560,6 +616,7 @@ class CrewAIClient:
                 )
                 
                 logger.debug(f"[REQUEST] Получен ответ от сервера: HTTP {response.status_code}")
+                self._set_server_available(True)
                 response.raise_for_status()
                 
                 # Обработка ответа
@@ -611,8 +668,11 @@ class CrewAIClient:
 
             except requests.exceptions.ConnectionError as e:
                 logger.warning(f"[REQUEST-RETRY] Ошибка подключения к CrewAI (попытка {attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                self._set_server_available(False)
+                self.refresh_health()
+                # Ожидание прерывается при закрытии клиента
+                if attempt < max_retries - 1 and not self._closed.wait(retry_delay):
+                    retry_delay *= 2
                 else:
                     logger.error(f"[REQUEST-ERROR] Все попытки подключения к CrewAI исчерпаны: {str(e)}")
                     return {
@@ -639,16 +699,14 @@ class CrewAIClient:
             dict: Состояние задачи или сообщение об ошибке
         """
         logger.debug(f"[TASK-CHECK] Проверка статуса задачи: {task_id}")
-        
-        if not self.is_available():
-            logger.error(f"[TASK-CHECK] Сервер CrewAI недоступен при проверке задачи {task_id}")
-            return {"error": "Сервер CrewAI недоступен", "status": "error"}
-            
+
+        # Отдельная проверка /api/health не нужна: ошибка соединения сама обновит кэш состояния
         try:
             url = f"{self.base_url}/api/tasks/{task_id}"
             logger.debug(f"[TASK-CHECK] Отправка GET запроса на: {url}")
             
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
+            self._set_server_available(True)
             
             if response.status_code == 200:
                 result = response.json()
@@ -689,8 +747,40 @@ class CrewAIClient:
                 
         except requests.RequestException as e:
             logger.error(f"[TASK-ERROR] Ошибка соединения при проверке задачи {task_id}: {str(e)}")
+            if isinstance(e, requests.exceptions.ConnectionError):
+                self._set_server_available(False)
+                self.refresh_health()
             return {"error": f"Ошибка соединения: {str(e)}", "status": "error"}
             
+    def stream_task_events(self, task_id, after_seq: int = 0, timeout: Optional[int] = None):
+        """
+        Подписывается на SSE поток событий задачи (/api/tasks/<id>/stream)
+
+        Генератор возвращает словари {'id', 'event', 'data'} по мере поступления:
+        status, progress, iteration, tool_result, token и финальное done.
+        При ошибке соединения бросает requests.RequestException - вызывающий код
+        должен перейти на опрос check_task_status.
+
+        Args:
+            task_id: ID задачи
+            after_seq: номер последнего полученного события (для возобновления)
+            timeout: таймаут чтения между событиями в секундах
+        """
+        url = f"{self.base_url}/api/tasks/{task_id}/stream"
+        headers = {"Accept": "text/event-stream"}
+        if after_seq:
+            headers["Last-Event-ID"] = str(after_seq)
+        logger.debug(f"[TASK-STREAM] Подключение к {url}")
+
+        # Сервер шлет keepalive каждые 15 секунд, поэтому таймаут чтения больше
+        read_timeout = timeout or max(self.timeout, 30)
+        with self.session.get(url, headers=headers, stream=True, timeout=(10, read_timeout)) as response:
+            response.raise_for_status()
+            for event in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                yield event
+                if event["event"] == "done":
+                    return
+
     def get_task_status(self, task_id):
         """
         Алиас для check_task_status для обратной совместимости
@@ -710,7 +800,7 @@ class CrewAIClient:
             return False
             
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/index_docs",
                 timeout=60
             )
@@ -741,7 +831,7 @@ class CrewAIClient:
         ]
         for url in endpoints:
             try:
-                resp = requests.get(url, timeout=10)
+                resp = self.session.get(url, timeout=10)
                 logger.debug(f"[UNSAFE] GET {url} -> {resp.status_code}")
                 if resp.status_code == 200:
                     data = resp.json()
@@ -778,7 +868,7 @@ class CrewAIClient:
         ]
         for url in endpoints:
             try:
-                resp = requests.post(url, json=payload, headers=headers, timeout=10)
+                resp = self.session.post(url, json=payload, headers=headers, timeout=10)
                 logger.debug(f"[UNSAFE] POST {url} -> {resp.status_code}")
                 if resp.status_code in (200, 204):
                     return True
@@ -923,5 +1013,6 @@ class CrewAIClient:
         logger.info(f"[NLP] entities: {entities}, tokens: {tokens}")
         return {"entities": entities, "tokens": tokens, "lang": lang}
 
-# Глобальный экземпляр клиента
-crewai_client = CrewAIClient()
+# Глобальный экземпляр клиента. Без фоновой проверки здоровья: импорт модуля (например,
+# из settings_dialog) не запускает сетевой поток, фоновую проверку ведет клиент ChatWidget
+crewai_client = CrewAIClient(health_monitor=False)
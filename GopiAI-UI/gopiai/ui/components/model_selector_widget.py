@@ -12,7 +12,6 @@ Dependencies: PySide6, requests
 """
 from __future__ import annotations
 import sys
-import requests
 from pathlib import Path
 from typing import Optional
 
@@ -27,6 +26,7 @@ from PySide6.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
+from gopiai.ui.utils.http_client import get_http_client
 from gopiai.ui.utils.icon_helpers import create_icon_button
 from gopiai.ui.utils.network import get_crewai_server_base_url
 _repo_root = Path(__file__).resolve().parents[3]  # .../GopiAI-UI
@@ -139,7 +139,7 @@ class ModelSelectorWidget(QWidget):
     def _load_initial_state(self):
         """Load initial state from backend API."""
         try:
-            response = requests.get(f"{BACKEND_BASE_URL}/internal/state", timeout=5)
+            response = get_http_client().get(f"{BACKEND_BASE_URL}/internal/state", timeout=5)
             if response.status_code == 200:
                 state = response.json()
                 provider = state.get("provider", "gemini")
@@ -186,9 +186,9 @@ class ModelSelectorWidget(QWidget):
         try:
             current_model_id = self.model_combo.currentData()
             if current_model_id:
-                requests.post(f"{BACKEND_BASE_URL}/internal/state", 
-                            json={"provider": provider, "model_id": current_model_id},
-                            timeout=5)
+                get_http_client().post(f"{BACKEND_BASE_URL}/internal/state",
+                                       json={"provider": provider, "model_id": current_model_id},
+                                       timeout=5)
         except Exception as e:
             print(f"[WARNING] Could not notify backend about provider change: {e}")
 
@@ -200,7 +200,7 @@ class ModelSelectorWidget(QWidget):
         
         try:
             # Try to get models from backend API first
-            response = requests.get(f"{BACKEND_BASE_URL}/internal/models?provider={provider}", timeout=5)
+            response = get_http_client().get(f"{BACKEND_BASE_URL}/internal/models", params={"provider": provider}, timeout=5)
             if response.status_code == 200:
                 models = response.json()
             else:
@@ -226,9 +226,9 @@ class ModelSelectorWidget(QWidget):
             # Notify backend about model change
             provider = self.provider_combo.currentText()
             try:
-                requests.post(f"{BACKEND_BASE_URL}/internal/state", 
-                            json={"provider": provider, "model_id": model_id},
-                            timeout=5)
+                get_http_client().post(f"{BACKEND_BASE_URL}/internal/state",
+                                       json={"provider": provider, "model_id": model_id},
+                                       timeout=5)
             except Exception as e:
                 print(f"[WARNING] Could not notify backend about model change: {e}")
 
@@ -1,17 +1,25 @@
 """
 Компонент мониторинга выполнения задач CrewAI
 Отображает статус выполнения команд в реальном времени
+
+Воркер запрашивает у сервера только изменившиеся задачи (/api/tasks?since=<cursor>),
+список задач - модель с индексом по task_id, поэтому обновляются только строки
+изменившихся задач, а QListView рисует только видимые строки.
 """
 
 import logging
-from typing import Dict, List
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
 from datetime import datetime
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QPushButton, QLabel, QProgressBar, QTextEdit, QTabWidget, QSplitter, QMessageBox
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QTabWidget, QSplitter, QMessageBox,
+    QListView, QStyledItemDelegate, QStyle, QAbstractItemView
 )
-from PySide6.QtCore import Qt, Signal, QThread, pyqtSignal
-from PySide6.QtGui import QFont
+from PySide6.QtCore import Qt, Signal, QThread, QAbstractListModel, QModelIndex, QRect, QSize
+from PySide6.QtGui import QFont, QColor, QPen
 import requests
+from gopiai.ui.utils.http_client import get_http_client
 from gopiai.ui.utils.icon_helpers import create_icon_button
 
 logger = logging.getLogger(__name__)
@@ -24,147 +32,225 @@ class TaskStatus:
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+    # Сервер отдает имена TaskStatus из task_engine (PENDING, PROCESSING, ...)
+    _SERVER_ALIASES = {"processing": RUNNING}
+
+    @classmethod
+    def normalize(cls, status) -> str:
+        status = str(status or cls.PENDING).lower()
+        return cls._SERVER_ALIASES.get(status, status)
+
+STATUS_COLORS = {
+    TaskStatus.PENDING: "#f39c12",     # Оранжевый
+    TaskStatus.RUNNING: "#3498db",     # Синий
+    TaskStatus.COMPLETED: "#2ecc71",   # Зеленый
+    TaskStatus.FAILED: "#e74c3c",      # Красный
+    TaskStatus.CANCELLED: "#95a5a6"    # Серый
+}
+
+TaskIdRole = Qt.ItemDataRole.UserRole + 1
+TaskDataRole = Qt.ItemDataRole.UserRole + 2
+
 class TaskMonitorWorker(QThread):
-    """Воркер для периодического опроса статуса задач"""
+    """Воркер для периодического опроса изменившихся задач"""
     
-    tasks_updated = pyqtSignal(list)
-    error_occurred = pyqtSignal(str)
+    tasks_updated = Signal(list, bool, list)  # задачи, полный список (True) или изменения (False), id удаленных
+    error_occurred = Signal(str)
     
     def __init__(self, api_base: str, refresh_interval: int = 5):
         super().__init__()
         self.api_base = api_base
         self.refresh_interval = refresh_interval
         self.running = False
+        self.cursor: Optional[int] = None
+        self._wakeup = threading.Event()
+
+    def _fetch(self):
+        """Запрашивает изменения после cursor; первый запрос и сброс на сервере - полный список"""
+        params = {'since': self.cursor} if self.cursor is not None else None
+        response = get_http_client().get(f"{self.api_base}/api/tasks", params=params, timeout=10)
+        if response.status_code != 200:
+            self.error_occurred.emit(f"Ошибка HTTP: {response.status_code}")
+            return
+        data = response.json()
+        tasks = data.get('tasks', [])
+        if 'cursor' not in data:
+            # Сервер без поддержки дельт - каждый раз полный список
+            self.tasks_updated.emit(tasks, True, [])
+            return
+        full = self.cursor is None or bool(data.get('reset'))
+        removed = [] if full else data.get('removed', [])
+        self.cursor = data['cursor']
+        if full or tasks or removed:
+            self.tasks_updated.emit(tasks, full, removed)
     
     def run(self):
         """Основной цикл мониторинга"""
         self.running = True
         while self.running:
             try:
-                # Получаем список задач
-                response = requests.get(f"{self.api_base}/api/tasks", timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    tasks = data.get('tasks', [])
-                    self.tasks_updated.emit(tasks)
-                else:
-                    self.error_occurred.emit(f"Ошибка HTTP: {response.status_code}")
-                    
+                self._fetch()
             except requests.RequestException as e:
                 self.error_occurred.emit(f"Ошибка сети: {str(e)}")
             except Exception as e:
                 self.error_occurred.emit(f"Неожиданная ошибка: {str(e)}")
             
-            # Ждем перед следующим обновлением
-            self.msleep(self.refresh_interval * 1000)
+            # Ждем перед следующим обновлением (refresh() и stop() прерывают ожидание)
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+    def refresh(self):
+        """Запросить изменения сейчас, не дожидаясь интервала"""
+        self._wakeup.set()
     
     def stop(self):
         """Остановка мониторинга"""
         self.running = False
+        self._wakeup.set()
         self.quit()
         self.wait()
 
-class TaskItemWidget(QWidget):
-    """Виджет отображения отдельной задачи"""
-    
-    task_selected = Signal(str)  # task_id
-    
-    def __init__(self, task_data: Dict, parent=None):
+class TaskListModel(QAbstractListModel):
+    """Задачи (новые сверху) с индексом строк по task_id"""
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.task_data = task_data
-        self._setup_ui()
-        self._update_display()
-    
-    def _setup_ui(self):
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(8, 8, 8, 8)
-        layout.setSpacing(4)
-        
-        # Заголовок задачи
-        header_layout = QHBoxLayout()
-        
-        # ID задачи (кликабельный)
-        self.task_id_label = QPushButton(f"#{self.task_data.get('task_id', '')[:8]}")
-        self.task_id_label.setFlat(True)
-        self.task_id_label.setStyleSheet("text-align: left; font-weight: bold;")
-        self.task_id_label.clicked.connect(self._on_task_clicked)
-        header_layout.addWidget(self.task_id_label)
-        
-        header_layout.addStretch()
-        
-        # Статус
-        self.status_label = QLabel()
-        header_layout.addWidget(self.status_label)
-        
-        # Время создания
-        created_at = self.task_data.get('created_at', 0)
+        self._tasks: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tasks)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self._tasks[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return task.get('task_id', '')
+        if role == TaskIdRole:
+            return task.get('task_id', '')
+        if role == TaskDataRole:
+            return task
+        return None
+
+    @staticmethod
+    def _prepare(task: Dict) -> Dict:
+        task = dict(task)
+        task['status'] = TaskStatus.normalize(task.get('status'))
+        return task
+
+    def _reindex(self):
+        self._rows = {task.get('task_id', ''): row for row, task in enumerate(self._tasks)}
+
+    def set_tasks(self, tasks: List[Dict]):
+        """Полная замена списка (первая загрузка или сброс курсора на сервере)"""
+        self.beginResetModel()
+        self._tasks = sorted((self._prepare(t) for t in tasks), key=lambda t: t.get('created_at', 0), reverse=True)
+        self._reindex()
+        self.endResetModel()
+
+    def apply_changes(self, tasks: List[Dict], removed: Optional[List[str]] = None):
+        """
+        Обновляет строки изменившихся задач, вставляет новые на свое место по времени создания
+        и удаляет строки задач, вытесненных на сервере (removed - их task_id)
+        """
+        for task in tasks:
+            task = self._prepare(task)
+            task_id = task.get('task_id', '')
+            row = self._rows.get(task_id)
+            if row is not None:
+                self._tasks[row] = task
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                continue
+            created_at = task.get('created_at', 0)
+            # Новые задачи почти всегда самые свежие - поиск места с начала списка
+            row = 0
+            while row < len(self._tasks) and self._tasks[row].get('created_at', 0) > created_at:
+                row += 1
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._tasks.insert(row, task)
+            self._reindex()
+            self.endInsertRows()
+        if removed:
+            removed = set(removed)
+            self.remove_where(lambda task: task.get('task_id', '') in removed)
+
+    def remove_where(self, predicate) -> int:
+        """Удаляет задачи, для которых predicate(task) истинно"""
+        rows = [row for row, task in enumerate(self._tasks) if predicate(task)]
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._tasks[row]
+            self.endRemoveRows()
+        if rows:
+            self._reindex()
+        return len(rows)
+
+    def status_counts(self) -> Counter:
+        return Counter(task['status'] for task in self._tasks)
+
+class TaskItemDelegate(QStyledItemDelegate):
+    """Строка задачи: ID, статус, время создания, описание прогресса и полоса статуса"""
+
+    ROW_HEIGHT = 56
+    PADDING = 8
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        task = index.data(TaskDataRole)
+        if not task:
+            return
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        rect = option.rect.adjusted(self.PADDING, self.PADDING // 2, -self.PADDING, -self.PADDING // 2)
+        status = task.get('status', TaskStatus.PENDING)
+        color = QColor(STATUS_COLORS.get(status, "#95a5a6"))
+        line_height = option.fontMetrics.height()
+        top = QRect(rect.left(), rect.top(), rect.width(), line_height)
+
+        font = QFont(option.font)
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(option.palette.text().color())
+        painter.drawText(top, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, f"#{task.get('task_id', '')[:8]}")
+
+        right = top
+        created_at = task.get('created_at', 0)
         if created_at:
-            created_time = datetime.fromtimestamp(created_at)
-            time_str = created_time.strftime("%H:%M:%S")
-            time_label = QLabel(time_str)
-            time_label.setStyleSheet("color: gray; font-size: 12px;")
-            header_layout.addWidget(time_label)
-        
-        layout.addLayout(header_layout)
-        
-        # Прогресс бар
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setMaximumHeight(6)
-        layout.addWidget(self.progress_bar)
-        
-        # Описание прогресса
-        self.progress_label = QLabel()
-        self.progress_label.setWordWrap(True)
-        self.progress_label.setStyleSheet("color: gray; font-size: 12px;")
-        layout.addWidget(self.progress_label)
-    
-    def _update_display(self):
-        """Обновляет отображение данных задачи"""
-        status = self.task_data.get('status', TaskStatus.PENDING)
-        
-        # Обновляем статус
-        self.status_label.setText(status.upper())
-        self._set_status_color(status)
-        
-        # Обновляем прогресс
-        progress_text = self.task_data.get('progress', '')
-        self.progress_label.setText(progress_text)
-        
-        # Обновляем прогресс бар
-        if status == TaskStatus.PENDING:
-            self.progress_bar.setValue(0)
-        elif status == TaskStatus.RUNNING:
-            self.progress_bar.setRange(0, 0)  # Индетерминированный
-        elif status == TaskStatus.COMPLETED:
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(100)
-        elif status == TaskStatus.FAILED:
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
-            self.progress_bar.setStyleSheet("QProgressBar::chunk { background-color: #e74c3c; }")
-    
-    def _set_status_color(self, status: str):
-        """Устанавливает цвет статуса"""
-        colors = {
-            TaskStatus.PENDING: "#f39c12",     # Оранжевый
-            TaskStatus.RUNNING: "#3498db",     # Синий  
-            TaskStatus.COMPLETED: "#2ecc71",   # Зеленый
-            TaskStatus.FAILED: "#e74c3c",      # Красный
-            TaskStatus.CANCELLED: "#95a5a6"    # Серый
-        }
-        
-        color = colors.get(status, "#95a5a6")
-        self.status_label.setStyleSheet(f"color: {color}; font-weight: bold;")
-    
-    def _on_task_clicked(self):
-        """Обрабатывает клик по задаче"""
-        task_id = self.task_data.get('task_id', '')
-        self.task_selected.emit(task_id)
-    
-    def update_task_data(self, new_data: Dict):
-        """Обновляет данные задачи"""
-        self.task_data = new_data
-        self._update_display()
+            painter.setFont(option.font)
+            painter.setPen(QColor("gray"))
+            time_str = datetime.fromtimestamp(created_at).strftime("%H:%M:%S")
+            painter.drawText(top, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, time_str)
+            right = top.adjusted(0, 0, -option.fontMetrics.horizontalAdvance(time_str) - self.PADDING, 0)
+        painter.setFont(font)
+        painter.setPen(color)
+        painter.drawText(right, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, status.upper())
+
+        progress_text = task.get('progress', '')
+        if progress_text and not isinstance(progress_text, str):
+            progress_text = str(progress_text)
+        if progress_text:
+            painter.setFont(option.font)
+            painter.setPen(QColor("gray"))
+            second = QRect(rect.left(), top.bottom() + 2, rect.width(), line_height)
+            elided = option.fontMetrics.elidedText(progress_text, Qt.TextElideMode.ElideRight, rect.width())
+            painter.drawText(second, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, elided)
+
+        # Полоса статуса: заполнена для завершенных, половина - для выполняющихся
+        bar = QRect(rect.left(), rect.bottom() - 3, rect.width(), 4)
+        painter.fillRect(bar, QColor(128, 128, 128, 40))
+        fill = {TaskStatus.COMPLETED: 1.0, TaskStatus.RUNNING: 0.5, TaskStatus.FAILED: 1.0}.get(status, 0.0)
+        if fill:
+            painter.fillRect(QRect(bar.left(), bar.top(), int(bar.width() * fill), bar.height()), color)
+
+        painter.setPen(QPen(QColor(128, 128, 128, 60)))
+        painter.drawLine(option.rect.bottomLeft(), option.rect.bottomRight())
+        painter.restore()
 
 class TaskDetailsWidget(QWidget):
     """Виджет с детальной информацией о задаче"""
@@ -239,7 +325,7 @@ class TaskDetailsWidget(QWidget):
         
         try:
             # Получаем детальную информацию о задаче
-            response = requests.get(f"{api_base}/api/tasks/{task_id}", timeout=10)
+            response = get_http_client().get(f"{api_base}/api/tasks/{task_id}", timeout=10)
             
             if response.status_code == 200:
                 task_data = response.json()
@@ -316,8 +402,7 @@ class TaskMonitorTab(QWidget):
         from gopiai.ui.utils.network import get_crewai_server_base_url
         self.api_base = get_crewai_server_base_url()
         
-        self.tasks_data = []
-        self.task_widgets = {}  # task_id -> TaskItemWidget
+        self.tasks_model = TaskListModel(self)
         self.monitor_worker = None
         
         self._setup_ui()
@@ -404,18 +489,15 @@ class TaskMonitorTab(QWidget):
         
         layout.addLayout(filters_layout)
         
-        # Скролл-область для задач
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        
-        self.tasks_container = QWidget()
-        self.tasks_layout = QVBoxLayout(self.tasks_container)
-        self.tasks_layout.setContentsMargins(0, 0, 0, 0)
-        self.tasks_layout.setSpacing(4)
-        
-        scroll_area.setWidget(self.tasks_container)
-        layout.addWidget(scroll_area)
+        # Список задач: рисуются только видимые строки
+        self.tasks_view = QListView()
+        self.tasks_view.setModel(self.tasks_model)
+        self.tasks_view.setItemDelegate(TaskItemDelegate(self.tasks_view))
+        self.tasks_view.setUniformItemSizes(True)
+        self.tasks_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.tasks_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.tasks_view.clicked.connect(lambda index: self._on_task_selected(index.data(TaskIdRole)))
+        layout.addWidget(self.tasks_view)
         
         return widget
     
@@ -444,43 +526,23 @@ class TaskMonitorTab(QWidget):
             self.pause_btn.setToolTip("Приостановить мониторинг")
             # Обновляем иконку на pause
     
-    def _update_tasks(self, tasks: List[Dict]):
-        """Обновляет список задач"""
-        self.tasks_data = tasks
-        
-        # Обновляем статистику
-        total = len(tasks)
-        running = len([t for t in tasks if t.get('status') == TaskStatus.RUNNING])
-        completed = len([t for t in tasks if t.get('status') == TaskStatus.COMPLETED])
-        failed = len([t for t in tasks if t.get('status') == TaskStatus.FAILED])
-        
-        self.stats_label.setText(f"Всего: {total} | Выполняется: {running} | Завершено: {completed} | Ошибки: {failed}")
-        
-        # Обновляем виджеты задач
-        self._render_tasks()
+    def _update_tasks(self, tasks: List[Dict], full: bool = True, removed: Optional[List[str]] = None):
+        """Применяет полный список задач или только изменения и удаления"""
+        if full:
+            self.tasks_model.set_tasks(tasks)
+        else:
+            self.tasks_model.apply_changes(tasks, removed)
+        self._update_stats()
     
-    def _render_tasks(self):
-        """Отображает задачи в интерфейсе"""
-        # Удаляем старые виджеты
-        for widget in self.task_widgets.values():
-            widget.setParent(None)
-        self.task_widgets.clear()
-        
-        # Сортируем задачи по времени создания (новые сверху)
-        sorted_tasks = sorted(self.tasks_data, key=lambda t: t.get('created_at', 0), reverse=True)
-        
-        # Создаем виджеты для задач
-        for task_data in sorted_tasks:
-            task_id = task_data.get('task_id', '')
-            
-            task_widget = TaskItemWidget(task_data)
-            task_widget.task_selected.connect(self._on_task_selected)
-            
-            self.task_widgets[task_id] = task_widget
-            self.tasks_layout.addWidget(task_widget)
+    def _update_stats(self):
+        """Обновляет статистику по задачам"""
+        counts = self.tasks_model.status_counts()
+        total = self.tasks_model.rowCount()
+        running = counts[TaskStatus.RUNNING]
+        completed = counts[TaskStatus.COMPLETED]
+        failed = counts[TaskStatus.FAILED]
         
-        # Добавляем растягивающийся элемент
-        self.tasks_layout.addStretch()
+        self.stats_label.setText(f"Всего: {total} | Выполняется: {running} | Завершено: {completed} | Ошибки: {failed}")
     
     def _on_task_selected(self, task_id: str):
         """Обрабатывает выбор задачи"""
@@ -495,8 +557,7 @@ class TaskMonitorTab(QWidget):
     def _refresh_tasks(self):
         """Обновляет задачи вручную"""
         if self.monitor_worker:
-            # Форсируем обновление
-            pass
+            self.monitor_worker.refresh()
     
     def _clear_completed_tasks(self):
         """Очищает завершенные задачи"""
@@ -510,6 +571,9 @@ class TaskMonitorTab(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             # TODO: Отправить запрос на сервер для удаления
             logger.info("Запрос на очистку завершенных задач")
+            finished = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+            self.tasks_model.remove_where(lambda task: task['status'] in finished)
+            self._update_stats()
     
     def _show_error(self, error_msg: str):
         """Показывает ошибку мониторинга"""
@@ -12,6 +12,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont
 import requests
+from gopiai.ui.utils.http_client import get_http_client
 from gopiai.ui.utils.icon_helpers import create_icon_button, get_icon
 from gopiai.ui.components.utils.shared_widgets import create_attached_frame
 
@@ -192,15 +193,15 @@ class ToolsTab(QWidget):
         
         # Кнопка обновления
         refresh_btn = create_icon_button("refresh-cw", "Обновить список инструментов")
-        refresh_btn.clicked.connect(self._load_tools)
+        refresh_btn.clicked.connect(lambda: self._load_tools(force=True))
         layout.addWidget(refresh_btn)
     
-    def _load_tools(self):
-        """Загружает список инструментов с сервера"""
+    def _load_tools(self, force: bool = False):
+        """Загружает список инструментов с сервера (force - в обход кэша)"""
         self.status_label.setText("Загрузка инструментов...")
         
         try:
-            response = requests.get(f"{self.api_base}/api/tools", timeout=5)
+            response = get_http_client().get(f"{self.api_base}/api/tools", timeout=5, force=force)
             if response.status_code == 200:
                 self.tools_data = response.json()
                 self._render_tools()
@@ -291,7 +292,7 @@ class ToolsTab(QWidget):
     def _on_tool_toggled(self, tool_name: str, enabled: bool):
         """Обрабатывает переключение инструмента"""
         try:
-            response = requests.post(
+            response = get_http_client().post(
                 f"{self.api_base}/api/tools/toggle",
                 json={"tool_name": tool_name, "enabled": enabled},
                 timeout=5
@@ -313,7 +314,7 @@ class ToolsTab(QWidget):
     def _on_key_set(self, tool_name: str, api_key: str):
         """Обрабатывает установку API ключа"""
         try:
-            response = requests.post(
+            response = get_http_client().post(
                 f"{self.api_base}/api/tools/set_key",
                 json={"tool_name": tool_name, "api_key": api_key},
                 timeout=5
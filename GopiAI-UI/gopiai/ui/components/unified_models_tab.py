@@ -11,7 +11,6 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Signal
 import os
 import json
-import requests
 import time
 from PySide6.QtGui import QFont
 from PySide6.QtCore import QTimer
@@ -325,7 +324,9 @@ class UnifiedModelsTab(QWidget):
         Поддерживает автоматическую ротацию моделей.
         """
         try:
+            from ..utils.http_client import get_http_client
             from ..utils.network import get_crewai_server_base_url
+            http = get_http_client()
             base_url = os.environ.get("CREWAI_API_BASE_URL", get_crewai_server_base_url())
             url = f"{base_url}/internal/state"
             
@@ -351,7 +352,7 @@ class UnifiedModelsTab(QWidget):
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    resp = requests.post(url, data=json.dumps(payload), headers=headers, timeout=5)
+                    resp = http.post(url, data=json.dumps(payload), headers=headers, timeout=5)
                     if resp.status_code == 200:
                         rotation_status = "с ротацией" if self.rotation_enabled else "без ротации"
                         logger.info(f"Модель Gemini синхронизирована с сервером: {model_id} ({rotation_status})")
@@ -363,7 +364,7 @@ class UnifiedModelsTab(QWidget):
                         if resp.status_code == 400:
                             simple_payload = {"provider": provider, "model_id": model_id}
                             logger.debug(f"Пробуем упрощенный формат: {simple_payload}")
-                            alt_resp = requests.post(url, data=json.dumps(simple_payload), headers=headers, timeout=5)
+                            alt_resp = http.post(url, data=json.dumps(simple_payload), headers=headers, timeout=5)
                             if alt_resp.status_code == 200:
                                 logger.info("Модель синхронизирована с сервером (упрощенный формат)")
                                 return
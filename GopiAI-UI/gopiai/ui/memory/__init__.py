@@ -9,6 +9,7 @@ This package provides memory management functionality, including:
 """
 
 from .manager import MemoryManager, get_memory_manager
+from .chat_store import ChatStore
 
 # Export public API
-__all__ = ['MemoryManager', 'get_memory_manager']
+__all__ = ['MemoryManager', 'get_memory_manager', 'ChatStore']
@@ -0,0 +1,279 @@
+"""
+Chat Store for GopiAI UI
+
+SQLite (WAL) storage for chat history instead of rewriting chats.json on every message.
+Messages are appended with a single INSERT and read per session through
+the (session_id, timestamp) index. A persisted session index (title, created_at,
+message count, last activity) is updated in the same transaction, so startup
+reads only the index. The legacy chats.json is imported once.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Поля сообщения, которые хранятся в отдельных колонках; остальное - в metadata
+MESSAGE_COLUMNS = ('id', 'session_id', 'role', 'content', 'timestamp')
+# Порядковый номер вставки: возвращается при чтении как часть курсора страниц, не сохраняется
+SEQ_FIELD = 'seq'
+
+
+class ChatStore:
+    """Append-only chat history in SQLite with an index on (session_id, timestamp)."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # После fork() соединение родителя использовать нельзя
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                session_id TEXT NOT NULL,
+                role TEXT,
+                content TEXT,
+                timestamp TEXT NOT NULL,
+                metadata TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, timestamp, seq)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                created_at TEXT NOT NULL,
+                last_activity TEXT NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self.get_meta('session_index') is None:
+            # База создана до появления индекса сессий - строим его один раз по сообщениям
+            self.rebuild_session_index()
+
+    def rebuild_session_index(self):
+        """Rebuilds the session index from the messages table (one pass over the index)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._rebuild_session_index(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rebuild_session_index(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM sessions")
+        conn.execute(
+            """
+            INSERT INTO sessions (id, title, created_at, last_activity, message_count)
+            SELECT session_id,
+                   (SELECT SUBSTR(COALESCE(first.content, ''), 1, 30) FROM messages first
+                    WHERE first.session_id = m.session_id ORDER BY first.timestamp, first.seq LIMIT 1),
+                   MIN(timestamp), MAX(timestamp), COUNT(*)
+            FROM messages m
+            GROUP BY session_id
+            """
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('session_index', '1')")
+
+    @staticmethod
+    def _to_row(message: Dict[str, Any]):
+        metadata = {k: v for k, v in message.items() if k not in MESSAGE_COLUMNS and k != SEQ_FIELD}
+        return (
+            str(message.get('id') or uuid.uuid4()),
+            str(message.get('session_id')),
+            message.get('role'),
+            message.get('content'),
+            message.get('timestamp') or '0',
+            json.dumps(metadata, ensure_ascii=False) if metadata else None,
+        )
+
+    @staticmethod
+    def _from_row(row) -> Dict[str, Any]:
+        message = {
+            'id': row[0],
+            'session_id': row[1],
+            'role': row[2],
+            'content': row[3],
+            'timestamp': row[4],
+        }
+        if row[5]:
+            message.update(json.loads(row[5]))
+        message[SEQ_FIELD] = row[6]
+        return message
+
+    def append(self, message: Dict[str, Any]):
+        """Appends one message and updates the session index (no rewrite of the history)."""
+        row = self._to_row(message)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO messages (id, session_id, role, content, timestamp, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+            if cursor.rowcount:
+                session_id, content, timestamp = row[1], row[3], row[4]
+                conn.execute(
+                    """
+                    INSERT INTO sessions (id, title, created_at, last_activity, message_count)
+                    VALUES (?, ?, ?, ?, 1)
+                    ON CONFLICT(id) DO UPDATE SET
+                        message_count = message_count + 1,
+                        title = CASE WHEN excluded.created_at < created_at THEN excluded.title ELSE title END,
+                        created_at = MIN(created_at, excluded.created_at),
+                        last_activity = MAX(last_activity, excluded.last_activity)
+                    """,
+                    (session_id, (content or '')[:30], timestamp, timestamp)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None,
+                     before: Optional[Union[str, Tuple[str, int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Messages of a session ordered by time.
+
+        limit - only the last `limit` messages; before - only messages older than
+        this cursor (paging backwards through the history). The cursor is
+        (timestamp, seq) of the oldest loaded message, see page_cursor(), so messages
+        sharing the boundary timestamp are not skipped; a bare timestamp is also accepted.
+        """
+        conn = self._connect()
+        where = "WHERE session_id = ?"
+        params: List[Any] = [str(session_id)]
+        if isinstance(before, (tuple, list)):
+            timestamp, seq = before
+            where += " AND (timestamp < ? OR (timestamp = ? AND seq < ?))"
+            params.extend([timestamp, timestamp, int(seq)])
+        elif before is not None:
+            where += " AND timestamp < ?"
+            params.append(before)
+        columns = "SELECT id, session_id, role, content, timestamp, metadata, seq FROM messages "
+        if limit:
+            rows = conn.execute(
+                columns + where + " ORDER BY timestamp DESC, seq DESC LIMIT ?", params + [int(limit)]
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = conn.execute(columns + where + " ORDER BY timestamp, seq", params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    @staticmethod
+    def page_cursor(message: Dict[str, Any]) -> Union[str, Tuple[str, int]]:
+        """Cursor for get_messages(before=...) pointing just before this message."""
+        if message.get(SEQ_FIELD) is None:
+            return message.get('timestamp')
+        return (message.get('timestamp'), message[SEQ_FIELD])
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Session index: id, title, created_at, last_activity, message_count (no messages are read)."""
+        rows = self._connect().execute(
+            "SELECT id, title, created_at, last_activity, message_count FROM sessions ORDER BY last_activity DESC"
+        ).fetchall()
+        return [
+            {
+                'id': session_id,
+                'title': title or '',
+                'created_at': created_at,
+                'last_activity': last_activity,
+                'message_count': message_count,
+            }
+            for session_id, title, created_at, last_activity, message_count in rows
+        ]
+
+    def update_session_title(self, session_id: str, title: str) -> bool:
+        cursor = self._connect().execute("UPDATE sessions SET title = ? WHERE id = ?", (title, str(session_id)))
+        return cursor.rowcount > 0
+
+    def delete_session(self, session_id: str) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute("DELETE FROM messages WHERE session_id = ?", (str(session_id),))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (str(session_id),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate_from_json(self, json_path) -> int:
+        """
+        One-time import of the legacy chats.json.
+
+        Runs in a single transaction; afterwards the file is left untouched
+        and is not read again. Returns the number of imported messages.
+        """
+        json_path = Path(json_path)
+        if self.get_meta('migrated_from_json') is not None or not json_path.exists():
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                messages = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[CHAT-STORE] Не удалось прочитать {json_path} для миграции: {e}")
+            return 0
+
+        rows = [self._to_row(msg) for msg in messages if isinstance(msg, dict) and msg.get('session_id')]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages (id, session_id, role, content, timestamp, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            imported = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] - before
+            self._rebuild_session_index(conn)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         ('migrated_from_json', str(json_path)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info(f"[CHAT-STORE] Импортировано {imported} сообщений из {json_path}")
+        return imported
@@ -8,14 +8,14 @@ This module provides an interface for managing chat history for the current UI s
 согласованности данных между клиентом и сервером.
 """
 
-import json
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
 
 # Импортируем локальную конфигурацию памяти
-from .memory_config import MEMORY_BASE_DIR, CHATS_FILE_PATH
+from .memory_config import MEMORY_BASE_DIR, CHATS_FILE_PATH, CHATS_DB_PATH
+from .chat_store import ChatStore
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +25,7 @@ class MemoryManager:
     Uses shared memory configuration with CrewAI API server.
     """
     
-    def __init__(self):
+    def __init__(self, db_path=None, legacy_json_path=None):
         """Initialize the memory manager with shared configuration."""
         # Используем общую конфигурацию памяти
         logger.info(f"[UNIFIED-MEMORY] Initializing memory manager with shared config. Path: {MEMORY_BASE_DIR}")
@@ -33,62 +33,32 @@ class MemoryManager:
         # Создаем директорию, если она не существует
         MEMORY_BASE_DIR.mkdir(parents=True, exist_ok=True)
         
-        # Инициализируем структуры данных
-        self.chats: List[Dict[str, Any]] = []
+        # История хранится в SQLite: добавление сообщения - одна запись, без перезаписи файла
+        self.store = ChatStore(db_path or CHATS_DB_PATH)
         self.sessions: Dict[str, Any] = {}
         
-        # Загружаем историю из общего файла
-        self._load_chat_history()
+        # Загружаем историю (при первом запуске импортируем chats.json)
+        self._load_chat_history(legacy_json_path or CHATS_FILE_PATH)
         
-    def _load_chat_history(self):
+    def _load_chat_history(self, legacy_json_path):
         """
-        Loads chat history from the shared chats.json file.
-        Uses the same file as the CrewAI API server.
+        Imports the legacy chats.json once and loads the persisted session index.
+        Messages are not read at startup - they are loaded per session on demand.
         """
         try:
-            if CHATS_FILE_PATH.exists():
-                with open(CHATS_FILE_PATH, 'r', encoding='utf-8') as f:
-                    self.chats = json.load(f)
-                logger.info(f"[UNIFIED-MEMORY] Loaded {len(self.chats)} messages from shared file: {CHATS_FILE_PATH}")
-                
-                # Создаем словарь сессий на основе загруженных чатов
-                session_ids_raw = set(msg.get('session_id') for msg in self.chats if msg.get('session_id'))
-                # Явно фильтруем и приводим к str, чтобы удовлетворить Pylance (ключи словаря строго строки)
-                session_ids = [str(sid) for sid in session_ids_raw if isinstance(sid, (str, int))]
-                for session_id in session_ids:
-                    session_msgs = [msg for msg in self.chats if str(msg.get('session_id')) == session_id]
-                    if session_msgs:
-                        first_msg = min(session_msgs, key=lambda x: x.get('timestamp') or '0')
-                        created_at = first_msg.get('timestamp') or datetime.now().isoformat()
-                        self.sessions[session_id] = {
-                            'id': session_id,
-                            'title': (first_msg.get('content', '') or '')[:30],
-                            'created_at': created_at
-                        }
-            else:
-                logger.info(f"[UNIFIED-MEMORY] No shared chats file found at {CHATS_FILE_PATH}. Creating a new one.")
-                # Создаем пустой файл
-                with open(CHATS_FILE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
+            self.store.migrate_from_json(legacy_json_path)
+            self.sessions = {session['id']: session for session in self.store.list_sessions()}
+            logger.info(f"[UNIFIED-MEMORY] Loaded {len(self.sessions)} sessions from {self.store.db_path}")
         except Exception as e:
-            logger.error(f"[UNIFIED-MEMORY] Error loading shared chat history: {e}")
+            logger.error(f"[UNIFIED-MEMORY] Error loading chat history: {e}")
 
     def add_message(self, session_id: str, role: str, content: str, **metadata) -> str:
         """
-        Adds a message to the chat history and saves it to the shared file.
+        Adds a message to the chat history (single append to the store).
         """
         if not content.strip():
             return ""
 
-        # Управляем сессиями
-        if session_id not in self.sessions:
-            sid = str(session_id)
-            self.sessions[sid] = {  # type: ignore[type-arg]
-                'id': sid, 
-                'title': content[:30], # Название чата - первые 30 символов
-                'created_at': datetime.now().isoformat()
-            }
-        
         message = {
             'id': str(uuid.uuid4()),
             'session_id': str(session_id),
@@ -98,40 +68,52 @@ class MemoryManager:
             **metadata
         }
         
-        self.chats.append(message)
-        
-        # Сохраняем в общий файл
         try:
-            with open(CHATS_FILE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.chats, f, ensure_ascii=False, indent=2)
-            logger.info(f"[UNIFIED-MEMORY] Added message and saved to shared file: {CHATS_FILE_PATH}")
+            self.store.append(message)
+            logger.debug(f"[UNIFIED-MEMORY] Added message to session {session_id}")
         except Exception as e:
-            logger.error(f"[UNIFIED-MEMORY] Error saving to shared file: {e}")
+            logger.error(f"[UNIFIED-MEMORY] Error saving message: {e}")
+        
+        # Обновляем индекс сессий в памяти (в базе он обновлен той же транзакцией)
+        sid = str(session_id)
+        session = self.sessions.get(sid)
+        if session is None:
+            self.sessions[sid] = {  # type: ignore[type-arg]
+                'id': sid, 
+                'title': content[:30], # Название чата - первые 30 символов
+                'created_at': message['timestamp'],
+                'last_activity': message['timestamp'],
+                'message_count': 1,
+            }
+        else:
+            session['last_activity'] = message['timestamp']
+            session['message_count'] = session.get('message_count', 0) + 1
             
         return message['id']
 
     def get_chat_history(self, session_id: str) -> List[Dict]:
-        """Gets chat history for a session from the in-memory list."""
+        """Gets chat history for a session (indexed read, ordered by time)."""
         if session_id:
-            sid = str(session_id)
-            # Фильтруем сообщения для текущей сессии (приводим к строке для надежного сравнения)
-            session_messages = [msg for msg in self.chats if str(msg.get('session_id')) == sid]
-            # Сортируем их по времени
-            session_messages.sort(key=lambda x: x.get('timestamp') or '0')
-            return session_messages
+            return self.store.get_messages(str(session_id))
         return []
     
-    def get_session_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
-        """Возвращает сообщения сессии с поддержкой optional limit (совместимость с вызовами UI)."""
-        messages = self.get_chat_history(session_id)
+    def get_session_messages(self, session_id: str, limit: Optional[int] = None,
+                             before=None) -> List[Dict]:
+        """
+        Возвращает сообщения сессии с поддержкой optional limit и before (подгрузка более старых).
+
+        before - курсор ChatStore.page_cursor() самого старого загруженного сообщения.
+        """
+        if not session_id:
+            return []
+        lim = None
         if limit is not None:
             try:
                 lim = int(limit)
-                if lim > 0:
-                    return messages[-lim:]
             except Exception:
-                pass
-        return messages
+                lim = None
+        # LIMIT выполняется в SQL, читаются только последние сообщения
+        return self.store.get_messages(str(session_id), limit=lim if lim and lim > 0 else None, before=before)
 
     # Дополнительные методы для работы с общей памятью
     def list_sessions(self) -> List[Dict]:
@@ -140,25 +122,27 @@ class MemoryManager:
     def get_session_title(self, session_id: str) -> str:
         return self.sessions.get(session_id, {}).get('title', 'New Chat')
 
+    def get_session_info(self, session_id: str) -> Optional[Dict]:
+        """Запись индекса сессии (title, created_at, last_activity, message_count)."""
+        return self.sessions.get(str(session_id))
+
     def update_session_title(self, session_id: str, title: str):
         if session_id in self.sessions:
             self.sessions[str(session_id)]['title'] = title
-            self._save_data()
+            try:
+                self.store.update_session_title(str(session_id), title)
+            except Exception as e:
+                logger.error(f'Error saving session title: {e}')
 
     def delete_session(self, session_id: str):
         if not session_id:
             return
         if session_id in self.sessions:
             del self.sessions[str(session_id)]
-        self.chats = [msg for msg in self.chats if str(msg.get('session_id')) != str(session_id)]
-        self._save_data()
-
-    def _save_data(self):
         try:
-            with open(CHATS_FILE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.chats, f, ensure_ascii=False, indent=2)
+            self.store.delete_session(str(session_id))
         except Exception as e:
-            logger.error(f'Error saving data: {e}')
+            logger.error(f'Error deleting session: {e}')
 
 # --- Singleton Instance ---
 _memory_manager_instance = None
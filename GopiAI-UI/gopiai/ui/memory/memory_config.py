@@ -11,8 +11,10 @@ from pathlib import Path
 logger = logging.getLogger(__name__)
 
 # Определяем базовую директорию для хранения данных памяти
-# Используем путь, совместимый с CrewAI
-if os.name == 'nt':  # Windows
+# Используем путь, совместимый с CrewAI (GOPIAI_MEMORY_DIR задает его для UI и сервера)
+if os.getenv('GOPIAI_MEMORY_DIR'):
+    MEMORY_BASE_DIR = Path(os.environ['GOPIAI_MEMORY_DIR'])
+elif os.name == 'nt':  # Windows
     MEMORY_BASE_DIR = Path("C:/Users/crazy/GOPI_AI_MODULES/GopiAI-CrewAI/memory")
 else:  # Linux/Mac
     MEMORY_BASE_DIR = Path.home() / ".gopiai" / "memory"
@@ -22,6 +24,9 @@ logger.info(f"Используется директория памяти: {MEMOR
 # Файл для хранения чатов
 CHATS_FILE_PATH = MEMORY_BASE_DIR / "chats.json"
 
+# База истории чатов (SQLite); chats.json импортируется в нее один раз
+CHATS_DB_PATH = MEMORY_BASE_DIR / "chats.db"
+
 # Путь к векторному индексу
 VECTOR_INDEX_PATH = MEMORY_BASE_DIR / "vectors"
 
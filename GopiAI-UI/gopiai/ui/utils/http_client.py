@@ -0,0 +1,177 @@
+"""
+Общий HTTP-клиент UI для запросов к серверу CrewAI.
+
+1. Одна requests.Session с пулом keep-alive соединений на весь процесс
+2. Короткий TTL-кэш ответов для идемпотентных GET (список моделей, инструментов, агентов)
+3. Одинаковые GET, выполняющиеся одновременно, объединяются в один запрос:
+   остальные потоки ждут результат первого
+4. POST/PUT/DELETE сбрасывают кэш для связанных путей (/api/tools/toggle -> /api/tools);
+   GET этих путей, начатые до изменения, отсоединяются: новые запросы к ним не
+   присоединяются, а их ответы не попадают в кэш
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10
+# TTL (сек) кэша GET по пути запроса; остальные GET только объединяются, но не кэшируются
+DEFAULT_CACHE_TTL = float(os.environ.get("GOPIAI_UI_HTTP_CACHE_TTL", "10"))
+CACHED_PATHS = ("/internal/models", "/api/tools", "/api/agents")
+
+
+class _PendingRequest:
+    """GET, который уже выполняется в другом потоке"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[requests.Response] = None
+        self.error: Optional[BaseException] = None
+        # Запрос начат до изменяющего запроса к связанному пути - ответ может быть устаревшим
+        self.stale = False
+
+
+def _related(path_a: str, path_b: str) -> bool:
+    """Пути связаны, если один является префиксом другого по сегментам"""
+    a, b = path_a.rstrip("/") + "/", path_b.rstrip("/") + "/"
+    return a.startswith(b) or b.startswith(a)
+
+
+class UIHttpClient:
+    """Пул соединений, TTL-кэш и объединение одинаковых GET-запросов"""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, cache_ttl: float = DEFAULT_CACHE_TTL,
+                 cached_paths=CACHED_PATHS):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache_ttl = cache_ttl
+        self.cached_paths = tuple(cached_paths)
+        self._cache: Dict[str, Tuple[float, requests.Response]] = {}
+        self._inflight: Dict[str, _PendingRequest] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def _ttl_for(self, path: str) -> float:
+        return self.cache_ttl if path in self.cached_paths else 0.0
+
+    def get(self, url: str, params=None, timeout=DEFAULT_TIMEOUT, cache_ttl: Optional[float] = None,
+            force: bool = False, **kwargs) -> requests.Response:
+        """
+        GET с кэшем и объединением одинаковых запросов.
+
+        cache_ttl переопределяет TTL для пути; force пропускает кэш (кнопки "Обновить").
+        Потоковые запросы (stream=True) выполняются напрямую.
+        """
+        if kwargs.get("stream"):
+            return self.session.get(url, params=params, timeout=timeout, **kwargs)
+
+        key = requests.Request("GET", url, params=params).prepare().url or url
+        path = urlsplit(key).path
+        ttl = self._ttl_for(path) if cache_ttl is None else cache_ttl
+
+        with self._lock:
+            if ttl > 0 and not force:
+                cached = self._cache.get(key)
+                if cached and time.monotonic() - cached[0] < ttl:
+                    self.cache_hits += 1
+                    return cached[1]
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _PendingRequest()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Ждем ответ запроса, который уже выполняется
+            if not pending.done.wait(self._wait_timeout(timeout)):
+                raise requests.Timeout(f"Timed out waiting for coalesced GET {key}")
+            if pending.error is not None:
+                raise pending.error
+            return pending.response
+
+        try:
+            response = self.session.get(url, params=params, timeout=timeout, **kwargs)
+            # Читаем тело сразу, чтобы ответ можно было отдать нескольким потокам
+            response.content
+            pending.response = response
+            with self._lock:
+                self.requests += 1
+                if ttl > 0 and response.status_code == 200 and not pending.stale:
+                    self._cache[key] = (time.monotonic(), response)
+            return response
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                # После изменения под этим ключом мог начаться новый запрос - его не трогаем
+                if self._inflight.get(key) is pending:
+                    del self._inflight[key]
+            pending.done.set()
+
+    @staticmethod
+    def _wait_timeout(timeout) -> Optional[float]:
+        if timeout is None:
+            return None
+        if isinstance(timeout, tuple):
+            return sum(t for t in timeout if t) + 1
+        return timeout + 1
+
+    def request(self, method: str, url: str, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+        """Изменяющий запрос: выполняется всегда и сбрасывает кэш связанных путей"""
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        finally:
+            self.invalidate(urlsplit(url).path)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Сбрасывает кэш и отсоединяет выполняющиеся GET (целиком или для путей, связанных с path)"""
+        with self._lock:
+            for key in [k for k in self._cache if path is None or _related(urlsplit(k).path, path)]:
+                del self._cache[key]
+            for key in [k for k in self._inflight if path is None or _related(urlsplit(k).path, path)]:
+                self._inflight.pop(key).stale = True
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "cache_size": len(self._cache),
+            }
+
+    def close(self):
+        self.invalidate()
+        self.session.close()
+
+
+_client_instance: Optional[UIHttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> UIHttpClient:
+    """Возвращает общий HTTP-клиент процесса UI."""
+    global _client_instance
+    if _client_instance is None:
+        with _client_lock:
+            if _client_instance is None:
+                _client_instance = UIHttpClient()
+    return _client_instance
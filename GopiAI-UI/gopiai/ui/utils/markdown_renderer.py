@@ -1,27 +1,266 @@
 """
-Минимальная утилита для рендеринга Markdown в HTML.
+Рендеринг Markdown в HTML для сообщений чата.
+
+1. Один проход по строкам: блочная разметка определяется одним
+   предкомпилированным выражением, инлайновая - одним выражением с альтернативами
+2. LRU-кэш отрендеренных сообщений по хэшу содержимого
+3. Текст делится на блоки по пустым строкам вне блоков кода;
+   IncrementalMarkdownRenderer для потокового ответа рендерит завершенные
+   блоки один раз и перерисовывает только последний (еще не завершенный) блок
 """
 
+import hashlib
 import html
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
 
-def render_markdown(text):
-    """Простая функция для рендеринга markdown."""
-    if not text:
-        return ""
-    
-    # Просто заменяем звездочки на HTML-теги
-    text = html.escape(text)
-    text = text.replace('**', '<strong>').replace('**', '</strong>')
-    text = text.replace('*', '<em>').replace('*', '</em>')
-    
-    # Разбиваем на параграфы
-    paragraphs = []
+# Длинные строки кода разбиваются zero-width space, чтобы их можно было перенести
+ZWS = '&#8203;'
+CODE_WRAP_WIDTH = 80
+DEFAULT_CACHE_SIZE = 512
+
+_FENCE_RE = re.compile(r'^\s*```')
+_BLOCK_RE = re.compile(
+    r'^(?:(?P<hashes>#{1,6}) (?P<heading>.+)'
+    r'|[*-] (?P<ul>.+)'
+    r'|\d+\. (?P<ol>.+)'
+    r'|(?P<hr>---))$'
+)
+_INLINE_RE = re.compile(
+    r'(?P<tag><[^<>\n]+>)'
+    r'|`(?P<code>[^`]+)`'
+    r'|\*\*(?P<bold>.+?)\*\*'
+    r'|\*(?P<em>[^*]+?)\*'
+    r'|\[(?P<ltext>[^\]]+)\]\((?P<lurl>[^)\s]+)\)'
+)
+
+# Символы, с которых может начинаться блочная разметка
+_BLOCK_CHARS = frozenset('#*-0123456789')
+# Символы, с которых может начинаться инлайновая разметка
+_INLINE_CHARS = frozenset('<`*[')
+
+
+def _wrap_code(text: str) -> str:
+    """Экранирует код и вставляет ZWS каждые CODE_WRAP_WIDTH символов длинной строки"""
+    if len(text) <= CODE_WRAP_WIDTH:
+        return html.escape(text)
+    return ZWS.join(html.escape(text[i:i + CODE_WRAP_WIDTH]) for i in range(0, len(text), CODE_WRAP_WIDTH))
+
+
+def _inline(text: str) -> str:
+    """Инлайновая разметка за один проход; существующие HTML-теги сохраняются как есть"""
+    if not _INLINE_CHARS.intersection(text):
+        return html.escape(text)
+    parts = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        start = match.start()
+        if start > pos:
+            parts.append(html.escape(text[pos:start]))
+        kind = match.lastgroup
+        if kind == 'tag':
+            parts.append(match.group('tag'))
+        elif kind == 'code':
+            parts.append(f'<code>{_wrap_code(match.group("code"))}</code>')
+        elif kind == 'bold':
+            parts.append(f'<strong>{_inline(match.group("bold"))}</strong>')
+        elif kind == 'em':
+            parts.append(f'<em>{_inline(match.group("em"))}</em>')
+        else:
+            url = html.escape(match.group('lurl'), quote=True)
+            parts.append(f'<a href="{url}">{_inline(match.group("ltext"))}</a>')
+        pos = match.end()
+    if pos < len(text):
+        parts.append(html.escape(text[pos:]))
+    return ''.join(parts)
+
+
+def _render_block(lines: List[str]) -> str:
+    """Рендерит последовательность строк, начинающуюся вне блока кода"""
+    out = []
+    code: Optional[List[str]] = None
+    list_tag = None
+
+    for line in lines:
+        if code is not None:
+            if _FENCE_RE.match(line):
+                out.append('<pre><code>' + '\n'.join(code) + '</code></pre>')
+                code = None
+            else:
+                code.append(_wrap_code(line))
+            continue
+
+        if _FENCE_RE.match(line):
+            if list_tag:
+                out.append(f'</{list_tag}>')
+                list_tag = None
+            code = []
+            continue
+
+        match = _BLOCK_RE.match(line) if line[:1] in _BLOCK_CHARS else None
+        item_tag = None
+        if match:
+            if match.group('ul') is not None:
+                item_tag, content = 'ul', match.group('ul')
+            elif match.group('ol') is not None:
+                item_tag, content = 'ol', match.group('ol')
+
+        if list_tag and item_tag != list_tag:
+            out.append(f'</{list_tag}>')
+            list_tag = None
+        if item_tag:
+            if not list_tag:
+                out.append(f'<{item_tag}>')
+                list_tag = item_tag
+            out.append(f'<li>{_inline(content)}</li>')
+            continue
+
+        if match and match.group('hashes'):
+            level = len(match.group('hashes'))
+            out.append(f'<h{level}>{_inline(match.group("heading"))}</h{level}>')
+        elif match and match.group('hr'):
+            out.append('<hr>')
+        elif line.strip():
+            stripped = line.lstrip()
+            # Строки, которые уже являются HTML, не оборачиваются в параграф
+            if stripped.startswith('<') and _INLINE_RE.match(stripped):
+                out.append(_inline(line))
+            else:
+                out.append(f'<p>{_inline(line)}</p>')
+
+    if list_tag:
+        out.append(f'</{list_tag}>')
+    if code is not None:
+        # Незакрытый блок кода (например, ответ еще приходит)
+        out.append('<pre><code>' + '\n'.join(code) + '</code></pre>')
+    return '\n'.join(out)
+
+
+def split_blocks(text: str) -> List[str]:
+    """
+    Делит текст на блоки по пустым строкам вне блоков кода.
+
+    Каждый блок начинается вне блока кода, поэтому блоки рендерятся независимо,
+    а результат совпадает с рендерингом всего текста целиком.
+    """
+    blocks = []
+    current: List[str] = []
+    in_code = False
     for line in text.split('\n'):
-        if line.strip():
-            paragraphs.append(f'<p>{line}</p>')
-    
-    return '\n'.join(paragraphs)
-
-def get_markdown_renderer():
-    """Заглушка для совместимости."""
-    return None
\ No newline at end of file
+        if _FENCE_RE.match(line):
+            in_code = not in_code
+        elif not in_code and not line.strip():
+            if current:
+                blocks.append('\n'.join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append('\n'.join(current))
+    return blocks
+
+
+def render_blocks(text: str) -> str:
+    """Рендерит текст без кэширования"""
+    return '\n'.join(_render_block(block.split('\n')) for block in split_blocks(text))
+
+
+class MarkdownRenderer:
+    """Markdown -> HTML с LRU-кэшем сообщений по хэшу содержимого"""
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def _cached(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return result
+
+    def _store(self, key: bytes, result: str):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def render(self, text: str) -> str:
+        if not text:
+            return ""
+        key = self._key(text)
+        result = self._cached(key)
+        if result is None:
+            result = render_blocks(text)
+            self._store(key, result)
+        return result
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {'size': len(self._cache), 'max_size': self.cache_size, 'hits': self.hits, 'misses': self.misses}
+
+
+class IncrementalMarkdownRenderer:
+    """
+    Рендеринг потокового ответа: завершенные блоки рендерятся один раз,
+    при каждом новом фрагменте перерисовывается только последний блок.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._done_html: List[str] = []
+        self._tail_start = 0  # Начало незавершенного блока в self.text
+
+    def feed(self, chunk: str) -> str:
+        """Добавляет фрагмент ответа и возвращает HTML всего текста"""
+        self.text += chunk
+        tail = self.text[self._tail_start:]
+        blocks = split_blocks(tail)
+        # Последний блок может еще продолжиться, пока после него нет пустой строки вне кода
+        if len(blocks) > 1:
+            for block in blocks[:-1]:
+                self._done_html.append(_render_block(block.split('\n')))
+            last_start = tail.rfind(blocks[-1])
+            self._tail_start += last_start
+            tail = self.text[self._tail_start:]
+        tail_html = _render_block(tail.split('\n')) if tail.strip() else ''
+        return '\n'.join(self._done_html + ([tail_html] if tail_html else []))
+
+    def reset(self):
+        self.text = ""
+        self._done_html = []
+        self._tail_start = 0
+
+
+_renderer_instance: Optional[MarkdownRenderer] = None
+
+
+def get_markdown_renderer() -> MarkdownRenderer:
+    """Возвращает общий экземпляр MarkdownRenderer."""
+    global _renderer_instance
+    if _renderer_instance is None:
+        _renderer_instance = MarkdownRenderer()
+    return _renderer_instance
+
+
+def render_markdown(text):
+    """Рендерит markdown в HTML с кэшированием."""
+    return get_markdown_renderer().render(text)
@@ -1,4 +1,5 @@
 
+import json
 from pathlib import Path
 
 def get_crewai_server_port():
@@ -23,3 +24,39 @@ def get_crewai_server_base_url():
     """
     port = get_crewai_server_port()
     return f"http://127.0.0.1:{port}"
+
+
+def iter_sse_events(lines):
+    """
+    Разбирает поток Server-Sent Events построчно.
+
+    lines - итератор строк (например, response.iter_lines(decode_unicode=True)).
+    Возвращает словари {'id', 'event', 'data'}; data декодируется из JSON,
+    если это не JSON - возвращается {'text': data}. Keepalive-комментарии пропускаются.
+    """
+    event_id, event_name, data_lines = None, "message", []
+    for raw_line in lines:
+        if raw_line is None:
+            continue
+        line = raw_line.rstrip("\r")
+        if not line:
+            # Пустая строка завершает событие
+            if data_lines:
+                payload = "\n".join(data_lines)
+                try:
+                    data = json.loads(payload)
+                except ValueError:
+                    data = {"text": payload}
+                yield {"id": event_id, "event": event_name, "data": data}
+            event_id, event_name, data_lines = None, "message", []
+            continue
+        if line.startswith(":"):
+            continue  # keepalive-комментарий
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event_id = int(value) if value.isdigit() else value
+        elif field == "event":
+            event_name = value
+        elif field == "data":
+            data_lines.append(value)
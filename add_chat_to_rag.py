@@ -1,202 +1,302 @@
 #!/usr/bin/env python3
 """
-Скрипт для добавления истории чатов в RAG систему GopiAI
-Разбивает большой файл на логические кусочки и индексирует их
+Импорт истории чатов (текстовых транскриптов) в RAG индекс txtai
+
+1. Файл читается потоково, построчно - большие транскрипты не загружаются в память целиком
+2. Текст режется на фрагменты по числу токенов (tiktoken, без него - оценка по байтам)
+   с перекрытием; границы фрагментов совпадают с границами слов
+3. id фрагмента - хэш его содержимого: повторный импорт не создает дублей,
+   уже проиндексированные фрагменты пропускаются без вычисления эмбеддингов
+4. Фрагменты пишутся пачками (upsert) прямо в индекс txtai Embeddings (dense + BM25)
+5. После каждого сохранения индекса смещение в файле записывается в файл состояния:
+   прерванный импорт продолжается с места остановки, дописанный транскрипт догружается
+6. Скорость импорта выводится во фрагментах в секунду
+
+Использование:
+    python add_chat_to_rag.py Chat_for_editing_chunks.txt [--index PATH] [--restart]
 """
 
+import argparse
+import hashlib
 import json
+import math
+import os
+import re
+import time
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
-
-
-def split_chat_into_topics(chat_content: str) -> list:
-    """Разбивает чат на темы по заголовкам"""
-    
-    # Ищем заголовки тем (строки без "user" или "ChatGPT" в начале)
-    lines = chat_content.split('\n')
-    topics = []
-    current_topic = {'title': '', 'content': ''}
-    current_content = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Определяем заголовок темы (обычно первая строка без user/ChatGPT)
-        if (not line.startswith('user') and 
-            not line.startswith('ChatGPT') and 
-            not line.startswith('tool') and
-            not line.startswith('```') and
-            not line.startswith('#') and
-            len(current_content) == 0):
-            
-            # Сохраняем предыдущую тему если была
-            if current_topic['content']:
-                topics.append({
-                    'title': current_topic['title'],
-                    'content': current_topic['content'],
-                    'chunk_size': len(current_topic['content'])
-                })
-            
-            # Начинаем новую тему
-            current_topic = {
-                'title': line,
-                'content': ''
-            }
-            current_content = []
-            
-        else:
-            current_content.append(line)
-            current_topic['content'] = '\n'.join(current_content)
-    
-    # Добавляем последнюю тему
-    if current_topic['content']:
-        topics.append({
-            'title': current_topic['title'],
-            'content': current_topic['content'],
-            'chunk_size': len(current_topic['content'])
-        })
-    
-    return topics
-
-
-def chunk_large_topics(topics: list, max_chunk_size: int = 3000) -> list:
-    """Разбивает большие темы на более мелкие кусочки"""
-    
-    chunked_topics = []
-    
-    for topic in topics:
-        if topic['chunk_size'] <= max_chunk_size:
-            chunked_topics.append(topic)
-        else:
-            # Разбиваем большую тему на части
-            content = topic['content']
-            lines = content.split('\n')
-            
-            chunk_lines = []
-            current_chunk_size = 0
-            chunk_num = 1
-            
-            for line in lines:
-                if current_chunk_size + len(line) > max_chunk_size and chunk_lines:
-                    # Сохраняем текущий кусочек
-                    chunked_topics.append({
-                        'title': f"{topic['title']} (часть {chunk_num})",
-                        'content': '\n'.join(chunk_lines),
-                        'chunk_size': current_chunk_size
-                    })
-                    
-                    chunk_lines = [line]
-                    current_chunk_size = len(line)
-                    chunk_num += 1
-                else:
-                    chunk_lines.append(line)
-                    current_chunk_size += len(line) + 1
-            
-            # Сохраняем последний кусочек
-            if chunk_lines:
-                chunked_topics.append({
-                    'title': f"{topic['title']} (часть {chunk_num})" if chunk_num > 1 else topic['title'],
-                    'content': '\n'.join(chunk_lines),
-                    'chunk_size': current_chunk_size
-                })
-    
-    return chunked_topics
-
-
-def add_chunks_to_rag(chunks: list) -> bool:
-    """Добавляет кусочки в RAG систему через файловую систему"""
-    
-    # Путь к файлу чатов RAG системы
-    rag_chats_file = Path("/home/amritagopi/GopiAI/GopiAI-CrewAI/memory/chats.json")
-    
+
+DEFAULT_CHAT_FILE = Path(__file__).parent / "Chat_for_editing_chunks.txt"
+DEFAULT_INDEX_PATH = Path(os.getenv(
+    "GOPIAI_RAG_INDEX_PATH", str(Path(__file__).parent / "rag_memory_system" / "index" / "chat_history")
+))
+DEFAULT_EMBEDDINGS_MODEL = os.getenv(
+    "GOPIAI_EMBEDDINGS_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_OVERLAP_TOKENS = 32
+DEFAULT_BATCH_SIZE = 64
+# Индекс сохраняется (и фиксируется контрольная точка) раз в столько пачек
+DEFAULT_SAVE_EVERY = 10
+SOURCE_TAG = "imported_chat_history"
+
+# Слово вместе с последующими пробелами; текст склеивается из кусочков без потерь
+PIECE_RE = re.compile(r"\S+\s*|\s+")
+
+
+def make_token_counter(encoding_name="cl100k_base"):
+    """Счетчик токенов для кусочка текста: tiktoken, без него ~4 байта UTF-8 на токен"""
     try:
-        # Читаем существующие чаты
-        if rag_chats_file.exists():
-            with open(rag_chats_file, 'r', encoding='utf-8') as f:
-                existing_chats = json.load(f)
-        else:
-            existing_chats = []
-        
-        # Добавляем новые кусочки
-        for i, chunk in enumerate(chunks):
-            chat_entry = {
-                "id": f"imported_chat_{datetime.now().strftime('%Y%m%d')}_{i+1}",
-                "timestamp": datetime.now().isoformat(),
-                "role": "user",
-                "content": f"Тема: {chunk['title']}\n\n{chunk['content']}",
-                "metadata": {
-                    "source": "imported_chat_history", 
-                    "topic": chunk['title'],
-                    "chunk_size": chunk['chunk_size'],
-                    "imported": True
-                }
-            }
-            existing_chats.append(chat_entry)
-        
-        # Сохраняем обновленный файл
-        rag_chats_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(rag_chats_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_chats, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ Добавлено {len(chunks)} кусочков в {rag_chats_file}")
-        return True
-        
+        import tiktoken
+        encode = tiktoken.get_encoding(encoding_name).encode
+
+        @lru_cache(maxsize=65536)
+        def count(piece):
+            return len(encode(piece, disallowed_special=()))
     except Exception as e:
-        print(f"❌ Ошибка добавления в RAG: {e}")
-        return False
-
-
-def main():
-    """Основная функция"""
-    
-    chat_file = Path("/home/amritagopi/GopiAI/Chat_for_editing_chunks.txt")
-    
-    if not chat_file.exists():
-        print(f"❌ Файл не найден: {chat_file}")
-        return
-    
-    print(f"📖 Читаем файл: {chat_file}")
-    with open(chat_file, 'r', encoding='utf-8') as f:
-        chat_content = f.read()
-    
-    print(f"📝 Размер файла: {len(chat_content)} символов")
-    
-    # Разбиваем на темы
-    print("🔍 Разбиваем на темы...")
-    topics = split_chat_into_topics(chat_content)
-    print(f"📋 Найдено тем: {len(topics)}")
-    
-    # Показываем статистику по темам
-    for i, topic in enumerate(topics[:10]):  # Показываем только первые 10
-        print(f"  {i+1}. {topic['title'][:50]}... ({topic['chunk_size']} символов)")
-    
-    if len(topics) > 10:
-        print(f"  ... и еще {len(topics) - 10} тем")
-    
-    # Разбиваем большие темы на кусочки
-    print("✂️ Разбиваем большие темы...")
-    chunks = chunk_large_topics(topics, max_chunk_size=3000)
-    print(f"📦 Итоговых кусочков: {len(chunks)}")
-    
-    # Статистика размеров
-    total_chars = sum(chunk['chunk_size'] for chunk in chunks)
-    avg_size = total_chars // len(chunks)
-    max_size = max(chunk['chunk_size'] for chunk in chunks)
-    print(f"📊 Средний размер кусочка: {avg_size} символов")
-    print(f"📊 Максимальный размер: {max_size} символов")
-    
-    # Добавляем в RAG
-    print("💾 Добавляем в RAG систему...")
-    success = add_chunks_to_rag(chunks)
-    
-    if success:
-        print("🎉 История чатов успешно добавлена в RAG!")
-        print("🔄 Теперь нужно перезапустить сервер для переиндексации")
-    else:
-        print("❌ Не удалось добавить в RAG")
+        print(f"⚠️ tiktoken недоступен ({e}), токены оцениваются по байтам")
+
+        @lru_cache(maxsize=65536)
+        def count(piece):
+            return math.ceil(len(piece.encode("utf-8", "surrogateescape")) / 4)
+    return count
+
+
+def iter_pieces(path, offset=0):
+    """Кусочки текста файла с байтовыми смещениями, начиная с offset; файл читается построчно"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        position = offset
+        for line in f:
+            # surrogateescape сохраняет точное число байт даже для битых последовательностей UTF-8
+            for match in PIECE_RE.finditer(line.decode("utf-8", "surrogateescape")):
+                piece = match.group()
+                yield position, piece
+                position += len(piece.encode("utf-8", "surrogateescape"))
+
+
+def iter_chunks(pieces, count_tokens, chunk_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Собирает кусочки во фрагменты по chunk_tokens токенов с перекрытием overlap_tokens
+
+    Yields:
+        (text, resume_offset): resume_offset - смещение, чтение с которого воспроизводит
+        все следующие фрагменты (начало перекрытия)
+    """
+    window = deque()
+    window_tokens = 0
+    fresh = False
+    for offset, piece in pieces:
+        tokens = count_tokens(piece)
+        window.append((offset, piece, tokens))
+        window_tokens += tokens
+        fresh = True
+        if window_tokens < chunk_tokens:
+            continue
+        text = "".join(p for _, p, _ in window)
+        # Оставляем в окне хвост не длиннее перекрытия
+        while window and window_tokens > overlap_tokens:
+            window_tokens -= window.popleft()[2]
+        fresh = False
+        resume_offset = window[0][0] if window else offset + len(piece.encode("utf-8", "surrogateescape"))
+        yield text, resume_offset
+    if fresh:
+        yield "".join(p for _, p, _ in window), None
+
+
+def clean_text(text):
+    return text.encode("utf-8", "surrogateescape").decode("utf-8", "replace").strip()
+
+
+def chunk_id(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ImportState:
+    """Контрольные точки импорта по файлам: смещение, размер и число фрагментов"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        if self.path.exists():
+            try:
+                self.files = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Файл состояния {self.path} поврежден ({e}), импорт начнется заново")
+
+    def get(self, source):
+        return self.files.get(source)
+
+    def update(self, source, **values):
+        self.files.setdefault(source, {}).update(values)
+        self.save()
+
+    def reset(self, source):
+        self.files.pop(source, None)
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"files": self.files}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class ChatImporter:
+    """Потоковый импорт транскриптов в индекс txtai с дедупликацией по хэшу содержимого"""
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, model=DEFAULT_EMBEDDINGS_MODEL,
+                 chunk_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                 batch_size=DEFAULT_BATCH_SIZE, save_every=DEFAULT_SAVE_EVERY, embeddings=None,
+                 count_tokens=None):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens должен быть меньше chunk_tokens")
+        self.index_path = Path(index_path)
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+        self.save_every = save_every
+        self.embeddings = embeddings
+        self.count_tokens = count_tokens or make_token_counter()
+        self.state = ImportState(self.index_path.parent / f"{self.index_path.name}.import.json")
+
+    def open_index(self):
+        if self.embeddings is None:
+            from txtai import Embeddings
+            self.embeddings = Embeddings(path=self.model, content=True, hybrid=True)
+            if self.embeddings.exists(str(self.index_path)):
+                self.embeddings.load(str(self.index_path))
+                print(f"📂 Загружен индекс {self.index_path} ({self.embeddings.count()} фрагментов)")
+        return self.embeddings
+
+    def existing_ids(self, ids):
+        """id из списка, которые уже есть в индексе (ids - hex-хэши, безопасны для SQL)"""
+        if not ids or not self.embeddings.count():
+            return set()
+        query = f"select id from txtai where id in ({', '.join(repr(i) for i in ids)})"
+        return {row["id"] for row in self.embeddings.search(query, limit=len(ids))}
+
+    def save_index(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.embeddings.save(str(self.index_path))
+
+    def import_file(self, path, restart=False):
+        """Импортирует один файл; возвращает статистику (chunks, added, duplicates, seconds)"""
+        path = Path(path)
+        source = str(path.resolve())
+        size = path.stat().st_size
+        self.open_index()
+
+        checkpoint = None if restart else self.state.get(source)
+        offset = 0
+        if checkpoint and checkpoint.get("offset", 0) <= size:
+            if checkpoint.get("done") and checkpoint.get("size") == size:
+                print(f"✅ {path.name} уже импортирован, пропускаем (--restart для повторного импорта)")
+                return {"chunks": 0, "added": 0, "duplicates": 0, "seconds": 0.0}
+            offset = checkpoint.get("offset", 0)
+            print(f"↩️ {path.name}: продолжаем с байта {offset} из {size}")
+        else:
+            checkpoint = None
+            self.state.reset(source)
+
+        imported_before = checkpoint.get("chunks", 0) if checkpoint else 0
+        stats = {"chunks": 0, "added": 0, "duplicates": 0}
+        started = time.perf_counter()
+        batch, batch_ids = [], set()
+        resume_offset = offset
+        pending_batches = 0
+        dirty = False
+
+        def flush(final=False):
+            nonlocal batch, batch_ids, pending_batches, dirty
+            if batch:
+                existing = self.existing_ids([uid for uid, _ in batch])
+                new = [(uid, data) for uid, data in batch if uid not in existing]
+                stats["duplicates"] += len(batch) - len(new)
+                if new:
+                    self.embeddings.upsert(new)
+                    stats["added"] += len(new)
+                    dirty = True
+                batch, batch_ids = [], set()
+                pending_batches += 1
+            if not final and pending_batches < self.save_every:
+                return
+            if dirty:
+                self.save_index()
+                dirty = False
+            # Контрольная точка пишется только после сохранения индекса
+            self.state.update(source, offset=size if final else resume_offset, size=size, done=final,
+                              chunks=imported_before + stats["chunks"])
+            pending_batches = 0
+            self._report(path, stats, started)
+
+        pieces = iter_pieces(path, offset)
+        for text, next_offset in iter_chunks(pieces, self.count_tokens, self.chunk_tokens, self.overlap_tokens):
+            text = clean_text(text)
+            if next_offset is not None:
+                resume_offset = next_offset
+            if not text:
+                continue
+            stats["chunks"] += 1
+            uid = chunk_id(text)
+            if uid in batch_ids:
+                stats["duplicates"] += 1
+                continue
+            batch_ids.add(uid)
+            batch.append((uid, {"text": text, "source": SOURCE_TAG, "file": path.name}))
+            if len(batch) >= self.batch_size:
+                flush()
+        flush(final=True)
+
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+
+    @staticmethod
+    def _report(path, stats, started):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(
+            f"📦 {path.name}: {stats['chunks']} фрагментов, +{stats['added']} новых, "
+            f"{stats['duplicates']} дублей, {stats['chunks'] / elapsed:.1f} фрагм./с"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт истории чатов в RAG индекс txtai")
+    parser.add_argument("files", nargs="*", type=Path, default=[DEFAULT_CHAT_FILE],
+                        help="текстовые транскрипты чатов")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX_PATH, help="каталог индекса txtai")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDINGS_MODEL, help="модель эмбеддингов")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--save-every", type=int, default=DEFAULT_SAVE_EVERY,
+                        help="сохранять индекс и контрольную точку раз в N пачек")
+    parser.add_argument("--restart", action="store_true", help="игнорировать контрольные точки")
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.files if not path.exists()]
+    if missing:
+        for path in missing:
+            print(f"❌ Файл не найден: {path}")
+        return 1
+
+    importer = ChatImporter(args.index, args.model, args.chunk_tokens, args.overlap_tokens,
+                            args.batch_size, args.save_every)
+    total = {"chunks": 0, "added": 0, "duplicates": 0, "seconds": 0.0}
+    for path in args.files:
+        print(f"📖 Импортируем {path} ({path.stat().st_size} байт)")
+        for key, value in importer.import_file(path, restart=args.restart).items():
+            total[key] += value
+
+    rate = total["chunks"] / total["seconds"] if total["seconds"] else 0.0
+    print(
+        f"🎉 Готово: {total['chunks']} фрагментов за {total['seconds']:.1f} с ({rate:.1f} фрагм./с), "
+        f"добавлено {total['added']}, дублей {total['duplicates']}. Индекс: {args.index}"
+    )
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
@@ -2,6 +2,8 @@
 HNSW module
 """
 
+import threading
+
 import numpy as np
 
 # Conditional import
@@ -27,6 +29,12 @@ class HNSW(ANN):
         if not HNSWLIB:
             raise ImportError('HNSW is not available - install "ann" extra to enable')
 
+        # Guards index updates and the swap to a compacted index
+        self.lock = threading.RLock()
+
+        # Background compaction thread and ids deleted while a compaction is running
+        self.compaction, self.pending = None, None
+
     def load(self, path):
         # Load index
         self.backend = Index(dim=self.config["dimensions"], space=self.config["metric"])
@@ -36,14 +44,8 @@ class HNSW(ANN):
         # Inner product is equal to cosine similarity on normalized vectors
         self.config["metric"] = "ip"
 
-        # Lookup index settings
-        efconstruction = self.setting("efconstruction", 200)
-        m = self.setting("m", 16)
-        seed = self.setting("randomseed", 100)
-
         # Create index
-        self.backend = Index(dim=self.config["dimensions"], space=self.config["metric"])
-        self.backend.init_index(max_elements=embeddings.shape[0], ef_construction=efconstruction, M=m, random_seed=seed)
+        self.backend = self.create(embeddings.shape[0])
 
         # Add items - position in embeddings is used as the id
         self.backend.add_items(embeddings, np.arange(embeddings.shape[0], dtype=np.int64))
@@ -51,39 +53,78 @@ class HNSW(ANN):
         # Add id offset, delete counter and index build metadata
         self.config["offset"] = embeddings.shape[0]
         self.config["deletes"] = 0
-        self.metadata({"efconstruction": efconstruction, "m": m, "seed": seed})
+        self.metadata(
+            {"efconstruction": self.setting("efconstruction", 200), "m": self.setting("m", 16), "seed": self.setting("randomseed", 100)}
+        )
 
     def append(self, embeddings):
         new = embeddings.shape[0]
 
-        # Resize index
-        self.backend.resize_index(self.config["offset"] + new)
+        with self.lock:
+            # Resize index
+            self.backend.resize_index(self.config["offset"] + new)
 
-        # Append new ids - position in embeddings + existing offset is used as the id
-        self.backend.add_items(embeddings, np.arange(self.config["offset"], self.config["offset"] + new, dtype=np.int64))
+            # Append new ids - position in embeddings + existing offset is used as the id
+            self.backend.add_items(embeddings, np.arange(self.config["offset"], self.config["offset"] + new, dtype=np.int64))
 
-        # Update id offset and index metadata
-        self.config["offset"] += new
-        self.metadata()
+            # Update id offset and index metadata
+            self.config["offset"] += new
+            self.metadata()
 
     def delete(self, ids):
-        # Mark elements as deleted to omit from search results
-        for uid in ids:
-            try:
-                self.backend.mark_deleted(uid)
-                self.config["deletes"] += 1
-            except RuntimeError:
-                # Ignore label not found error
-                continue
+        with self.lock:
+            # Mark elements as deleted to omit from search results
+            for uid in ids:
+                try:
+                    self.backend.mark_deleted(uid)
+                    self.config["deletes"] += 1
+
+                    # Replay on the compacted index when a compaction is running
+                    if self.pending is not None:
+                        self.pending.append(uid)
+                except RuntimeError:
+                    # Ignore label not found error
+                    continue
+
+        # Rebuild index without deleted elements once the deleted fraction reaches the compact threshold.
+        # Automatic compaction is disabled unless a threshold is set.
+        threshold = self.setting("compact")
+        if threshold and self.config["deletes"] and self.config["deletes"] >= threshold * self.backend.get_current_count():
+            self.compact(self.setting("background", False))
+
+    def search(self, queries, limit, ids=None):
+        """
+        Searches ANN index for query. Returns topn results.
+
+        Args:
+            queries: queries array
+            limit: maximum results
+            ids: optional allowlist of index ids, only these ids are returned
+
+        Returns:
+            query results
+        """
 
-    def search(self, queries, limit):
         # Set ef query param
         ef = self.setting("efsearch")
         if ef:
             self.backend.set_ef(ef)
 
-        # Run the query
-        ids, distances = self.backend.knn_query(queries, k=limit)
+        backend = self.backend
+        if ids is not None:
+            # Small allowlists are scored exactly, graph traversal would visit most of the index to find them
+            ids = set(ids)
+            if len(ids) <= self.setting("exact", 1024):
+                return self.exact(backend, queries, limit, ids)
+
+            # Push allowlist into graph traversal. Falls back to exact scoring when not enough ids are found.
+            try:
+                ids, distances = backend.knn_query(queries, k=min(limit, len(ids)), filter=ids.__contains__)
+            except RuntimeError:
+                return self.exact(backend, queries, limit, ids)
+        else:
+            # Run the query
+            ids, distances = backend.knn_query(queries, k=limit)
 
         # Map results to [(id, score)]
         results = []
@@ -102,3 +143,155 @@ class HNSW(ANN):
     def save(self, path):
         # Write index
         self.backend.save_index(path)
+
+    def close(self):
+        # Wait for background compaction
+        if self.compaction:
+            self.compaction.join()
+            self.compaction = None
+
+        super().close()
+
+    def compact(self, background=False):
+        """
+        Rebuilds the index without deleted elements. Element ids are kept. Searches continue to run against
+        the current index while the new index is built, it's swapped in once complete. Appends and deletes made
+        during the rebuild are copied over to the new index before the swap.
+
+        Args:
+            background: runs the rebuild in a background thread if True
+        """
+
+        with self.lock:
+            # Skip if a compaction is already running
+            if self.pending is not None:
+                return
+
+            self.pending = []
+            offset = self.config["offset"]
+
+        if background:
+            self.compaction = threading.Thread(target=self.rebuild, args=(offset,), daemon=True)
+            self.compaction.start()
+        else:
+            self.rebuild(offset)
+
+    def rebuild(self, offset):
+        """
+        Builds a compacted index and swaps it in.
+
+        Args:
+            offset: id offset when compaction started
+        """
+
+        try:
+            # Copy elements that aren't deleted. Appends resize the index, read it under the lock.
+            with self.lock:
+                labels, vectors = self.items(self.backend, range(offset))
+
+            # Build the new graph without blocking appends and deletes
+            index = self.create(max(len(labels), 1))
+            if labels:
+                index.add_items(vectors, np.array(labels, dtype=np.int64))
+
+            with self.lock:
+                # Copy elements appended while rebuilding
+                labels, vectors = self.items(self.backend, range(offset, self.config["offset"]))
+                if labels:
+                    index.resize_index(index.get_current_count() + len(labels))
+                    index.add_items(vectors, np.array(labels, dtype=np.int64))
+
+                # Replay deletes made while rebuilding
+                deletes = 0
+                for uid in self.pending:
+                    try:
+                        index.mark_deleted(uid)
+                        deletes += 1
+                    except RuntimeError:
+                        continue
+
+                # Swap in compacted index
+                self.backend, self.config["deletes"] = index, deletes
+                self.metadata()
+        finally:
+            with self.lock:
+                self.pending = None
+
+    def create(self, capacity):
+        """
+        Creates a new empty index.
+
+        Args:
+            capacity: maximum number of elements
+
+        Returns:
+            hnswlib index
+        """
+
+        # Lookup index settings
+        efconstruction = self.setting("efconstruction", 200)
+        m = self.setting("m", 16)
+        seed = self.setting("randomseed", 100)
+
+        # Create index
+        index = Index(dim=self.config["dimensions"], space=self.config["metric"])
+        index.init_index(max_elements=capacity, ef_construction=efconstruction, M=m, random_seed=seed)
+
+        return index
+
+    def items(self, backend, ids, batch=1024):
+        """
+        Gets vectors for ids, skipping deleted and unknown ids.
+
+        Args:
+            backend: hnswlib index
+            ids: list of ids
+            batch: number of ids to read at once
+
+        Returns:
+            (ids, vectors)
+        """
+
+        ids, labels, vectors = list(ids), [], []
+        for x in range(0, len(ids), batch):
+            chunk = ids[x : x + batch]
+            try:
+                vectors.append(np.asarray(backend.get_items(chunk), dtype=np.float32))
+                labels.extend(chunk)
+            except RuntimeError:
+                # Chunk has deleted ids, read one at a time
+                for uid in chunk:
+                    try:
+                        vectors.append(np.asarray(backend.get_items([uid]), dtype=np.float32))
+                        labels.append(uid)
+                    except RuntimeError:
+                        continue
+
+        return labels, np.concatenate(vectors) if vectors else np.zeros((0, self.config["dimensions"]), dtype=np.float32)
+
+    def exact(self, backend, queries, limit, ids):
+        """
+        Scores queries against an allowlist of ids with a full dot product.
+
+        Args:
+            backend: hnswlib index
+            queries: queries array
+            limit: maximum results
+            ids: allowlist of ids
+
+        Returns:
+            query results
+        """
+
+        labels, vectors = self.items(backend, sorted(ids))
+        labels = np.array(labels, dtype=np.int64)
+
+        # Inner product is equal to cosine similarity on normalized vectors
+        scores = np.dot(queries, vectors.T)
+
+        results = []
+        for score in scores:
+            indices = np.argsort(-score)[:limit]
+            results.append(list(zip(labels[indices].tolist(), score[indices].tolist())))
+
+        return results
@@ -2,12 +2,17 @@
 NumPy module
 """
 
+import os
+
 import numpy as np
 
 from ..serialize import SerializeFactory
 
 from .base import ANN
 
+# Number of bits set for each distinct uint8 value
+BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
 
 class NumPy(ANN):
     """
@@ -25,65 +30,205 @@ class NumPy(ANN):
         quantize = self.config.get("quantize")
         self.qbits = quantize if quantize and isinstance(quantize, int) and not isinstance(quantize, bool) else None
 
+        # Number of hamming search candidates per result to re-rank with full precision vectors
+        self.rerank = self.setting("rerank") if self.qbits else None
+
+        # Array buffer with spare capacity for appends, backend is a view of the rows in use. Full precision
+        # vectors buffer is only stored when re-ranking.
+        self.buffer, self.floats = None, None
+
+        # Deleted rows bitmap and number of deleted rows. Built on first use when not known.
+        self.deleted, self.removed = None, 0
+
+        # Path of memory-mapped array file
+        self.mapped = None
+
     def load(self, path):
+        # Memory-map files with copy-on-write, pages are only read on access and writes stay private
+        mmap = "c" if self.setting("mmap") is True else None
+
         # Load array from file
         try:
-            self.backend = self.tensor(np.load(path, allow_pickle=False))
+            self.buffer = self.tensor(np.load(path, mmap_mode=mmap, allow_pickle=False))
+            self.mapped = path if mmap else None
         except ValueError:
             # Backwards compatible support for previously pickled data
-            self.backend = self.tensor(SerializeFactory.create("pickle").load(path))
+            self.buffer = self.tensor(SerializeFactory.create("pickle").load(path))
+            self.mapped = None
+
+        # Load full precision vectors
+        self.floats = self.tensor(np.load(f"{path}.floats", mmap_mode=mmap, allow_pickle=False)) if self.rerank else None
+
+        self.backend = self.buffer
+        self.deleted, self.removed = None, 0
 
     def index(self, embeddings):
+        # Keep full precision vectors and quantize
+        if self.rerank:
+            self.floats, embeddings = self.tensor(embeddings), self.quantize(embeddings)
+
         # Create index
-        self.backend = self.tensor(embeddings)
+        self.buffer = self.backend = self.tensor(embeddings)
+        self.deleted, self.removed, self.mapped = None, 0, None
 
         # Add id offset and index build metadata
         self.config["offset"] = embeddings.shape[0]
         self.metadata(self.settings())
 
     def append(self, embeddings):
-        # Append new data to array
-        self.backend = self.cat((self.backend, self.tensor(embeddings)), axis=0)
+        rows = self.backend.shape[0]
+        total = rows + embeddings.shape[0]
+
+        # Keep full precision vectors and quantize
+        floats = None
+        if self.rerank:
+            floats, embeddings = embeddings, self.quantize(embeddings)
+
+        # Double buffer capacity when full. This copies the array (or memory-mapped file) once per
+        # doubling instead of on every append.
+        if total > self.buffer.shape[0]:
+            capacity = max(total, 2 * self.buffer.shape[0])
+            self.buffer = self.resize(self.backend, capacity)
+            self.floats = self.resize(self.floats[:rows], capacity) if self.floats is not None else None
+            self.mapped = None
+
+        # Copy new data into buffers
+        self.buffer[rows:total] = self.tensor(embeddings)
+        self.backend = self.buffer[:total]
+
+        if floats is not None:
+            self.floats[rows:total] = self.tensor(floats)
+
+        # Extend deleted rows bitmap
+        if self.deleted is not None and total > self.deleted.shape[0]:
+            deleted = np.zeros(self.buffer.shape[0], dtype=bool)
+            deleted[:rows] = self.deleted[:rows]
+            self.deleted = deleted
 
         # Update id offset and index metadata
         self.config["offset"] += embeddings.shape[0]
         self.metadata()
 
     def delete(self, ids):
-        # Filter any index greater than size of array
-        ids = [x for x in ids if x < self.backend.shape[0]]
+        deleted = self.bitmap()
+
+        # Filter any index greater than size of array and rows already deleted
+        ids = sorted(x for x in set(ids) if x < self.backend.shape[0] and not deleted[x])
 
         # Clear specified ids
-        self.backend[ids] = self.tensor(self.zeros((len(ids), self.backend.shape[1])))
+        self.backend[ids] = 0
+        if self.floats is not None:
+            self.floats[ids] = 0
+
+        deleted[ids] = True
+        self.removed += len(ids)
 
     def search(self, queries, limit):
-        if self.qbits:
-            # Calculate hamming score for integer vectors
-            scores = self.hammingscore(queries)
-        else:
-            # Dot product on normalized vectors is equal to cosine similarity
-            scores = self.dot(self.tensor(queries), self.backend.T)
+        limit = min(limit, self.backend.shape[0])
 
-        # Get topn ids
-        ids = self.argsort(-scores)[:, :limit]
+        # Return empty results when the index is empty
+        if limit <= 0:
+            return [[] for _ in range(queries.shape[0])]
 
-        # Map results to [(id, score)]
-        results = []
-        for x, score in enumerate(scores):
-            # Add results
-            results.append(list(zip(ids[x].tolist(), score[ids[x]].tolist())))
+        if self.rerank:
+            # Get hamming search candidates
+            candidates, _ = self.scan(self.tensor(self.quantize(queries)), limit * self.rerank)
+
+            # Re-rank candidates with full precision vectors
+            queries = self.tensor(queries)
+            scores = self.cat([self.dot(queries[x : x + 1], self.floats[uids].T) for x, uids in enumerate(candidates)], axis=0)
+            indices, scores = self.topk(scores, limit)
+            ids = self.take(candidates, indices)
+        else:
+            ids, scores = self.scan(self.tensor(queries), limit)
 
-        return results
+        # Map results to [(id, score)]
+        return [list(zip(x, y)) for x, y in zip(ids.tolist(), scores.tolist())]
 
     def count(self):
-        # Get count of non-zero rows (ignores deleted rows)
-        return self.backend[~self.all(self.backend == 0, axis=1)].shape[0]
+        # Number of rows less deleted rows
+        self.bitmap()
+        return self.backend.shape[0] - self.removed
 
     def save(self, path):
+        # A memory-mapped file can't be overwritten while mapped, copy arrays to memory first
+        if self.mapped and self.overwrites(path):
+            rows = self.backend.shape[0]
+            self.buffer = self.backend = self.resize(self.backend, rows)
+            self.floats = self.resize(self.floats[:rows], rows) if self.floats is not None else None
+            self.mapped = None
+
         # Save array to file. Use stream to prevent ".npy" suffix being added.
         with open(path, "wb") as handle:
             np.save(handle, self.numpy(self.backend), allow_pickle=False)
 
+        # Save full precision vectors
+        if self.floats is not None:
+            with open(f"{path}.floats", "wb") as handle:
+                np.save(handle, self.numpy(self.floats[: self.backend.shape[0]]), allow_pickle=False)
+
+    def close(self):
+        super().close()
+
+        self.buffer, self.floats, self.deleted, self.removed, self.mapped = None, None, None, 0, None
+
+    def overwrites(self, path):
+        """
+        Checks if path is the memory-mapped file backing this index. Either file may have been removed since
+        the index was loaded.
+
+        Args:
+            path: output path
+
+        Returns:
+            True if writing to path overwrites the memory-mapped file
+        """
+
+        try:
+            return os.path.exists(self.mapped) and os.path.exists(path) and os.path.samefile(self.mapped, path)
+        except OSError:
+            return False
+
+    def bitmap(self):
+        """
+        Gets the deleted rows bitmap. Deleted rows are stored as all zeros, the bitmap is built
+        from the array (or full precision vectors when present) once and then maintained by delete and append.
+
+        Returns:
+            deleted rows bitmap
+        """
+
+        if self.deleted is None:
+            rows = self.backend.shape[0]
+            blocksize = self.setting("blocksize", 65536)
+
+            # Scan array in blocks for zero rows
+            array = self.floats if self.floats is not None else self.backend
+            self.deleted = np.zeros(self.buffer.shape[0], dtype=bool)
+            for start in range(0, rows, blocksize):
+                block = self.numpy(array[start : min(start + blocksize, rows)])
+                self.deleted[start : start + block.shape[0]] = ~np.any(block, axis=1)
+
+            self.removed = int(np.count_nonzero(self.deleted[:rows]))
+
+        return self.deleted
+
+    def resize(self, array, capacity):
+        """
+        Copies array into a new buffer with capacity rows. Rows past the end of array are uninitialized.
+
+        Args:
+            array: data array
+            capacity: number of rows in new buffer
+
+        Returns:
+            new buffer
+        """
+
+        buffer = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        buffer[: array.shape[0]] = array
+        return buffer
+
     def tensor(self, array):
         """
         Handles backend-specific code such as loading to a GPU device.
@@ -110,19 +255,84 @@ class NumPy(ANN):
 
         return array
 
-    def totype(self, array, dtype):
+    def scan(self, queries, limit):
+        """
+        Runs an exact search over the array. Rows are scored in fixed-size blocks and only the running top n
+        candidates for each query are kept between blocks, which bounds peak memory to queries x blocksize scores.
+
+        Args:
+            queries: queries array
+            limit: maximum results
+
+        Returns:
+            (ids, scores) sorted by score descending
+        """
+
+        rows, blocksize = self.backend.shape[0], self.setting("blocksize", 65536)
+
+        ids, scores = None, None
+        for start in range(0, rows, blocksize):
+            block = self.backend[start : start + blocksize]
+
+            if self.qbits:
+                # Calculate hamming score for integer vectors
+                bscores = self.hammingscore(queries, block)
+            else:
+                # Dot product on normalized vectors is equal to cosine similarity
+                bscores = self.dot(queries, block.T)
+
+            # Get topn ids for this block and shift to global ids
+            bids, bscores = self.topk(bscores, limit)
+            bids = bids + start
+
+            # Merge with running topn
+            if ids is not None:
+                bids, bscores = self.cat((ids, bids), axis=1), self.cat((scores, bscores), axis=1)
+                indices, bscores = self.topk(bscores, limit)
+                bids = self.take(bids, indices)
+
+            ids, scores = bids, bscores
+
+        return ids, scores
+
+    def topk(self, scores, k):
+        """
+        Selects the top k scores for each row with a partial sort. Only the selected k elements are fully sorted.
+
+        Args:
+            scores: scores array
+            k: maximum number of elements to select
+
+        Returns:
+            (indices, scores) sorted by score descending
         """
-        Casts array to dtype.
+
+        # Partition top k elements to the end of each row, full sort not required
+        k = min(k, scores.shape[1])
+        if k < scores.shape[1]:
+            indices = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+        else:
+            indices = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+
+        # Sort the selected elements
+        scores = np.take_along_axis(scores, indices, axis=1)
+        order = np.argsort(-scores, axis=1)
+
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def take(self, array, indices):
+        """
+        Gathers elements from each row of array.
 
         Args:
-            array: input array
-            dtype: dtype
+            array: data array
+            indices: indices to gather for each row
 
         Returns:
-            array cast as dtype
+            gathered elements
         """
 
-        return np.int64(array) if dtype == np.int64 else array
+        return np.take_along_axis(array, indices, axis=1)
 
     def settings(self):
         """
@@ -134,7 +344,7 @@ class NumPy(ANN):
 
         return {"numpy": np.__version__}
 
-    def hammingscore(self, queries):
+    def hammingscore(self, queries, vectors):
         """
         Calculates a hamming distance score.
 
@@ -144,21 +354,70 @@ class NumPy(ANN):
 
         Args:
             queries: queries array
+            vectors: block of index vectors to score
 
         Returns:
             scores
         """
 
-        # Build table of number of bits for each distinct uint8 value
-        table = 1 << np.arange(8)
-        table = self.tensor(np.array([np.count_nonzero(x & table) for x in np.arange(256)]))
-
-        # Number of different bits
-        delta = self.xor(self.tensor(queries[:, None]), self.backend)
-
-        # Cast to long array
-        delta = self.totype(delta, np.int64)
+        # Compare vectors as packed words, one query at a time. Peak memory is a single block of words.
+        words = self.words(vectors)
+        distance = [self.popcount(self.xor(words, query)).sum(axis=1)[None] for query in self.words(queries)]
 
         # Calculate score as 1.0 - percentage of different bits
         # Bound score from 0 to 1
-        return self.clip(1.0 - (table[delta].sum(axis=2) / (self.config["dimensions"] * 8)), 0.0, 1.0)
+        return self.clip(1.0 - (self.cat(distance, axis=0) / (vectors.shape[1] * 8)), 0.0, 1.0)
+
+    def words(self, array):
+        """
+        Views a uint8 array as 64-bit words, when the number of bytes per row allows it.
+
+        Args:
+            array: uint8 array
+
+        Returns:
+            array of words
+        """
+
+        array = np.ascontiguousarray(array)
+        return array.view(np.uint64) if array.shape[1] % 8 == 0 else array
+
+    def popcount(self, array):
+        """
+        Counts the number of set bits in each element of array.
+
+        Args:
+            array: integer array
+
+        Returns:
+            bit counts
+        """
+
+        # Use table of number of bits for each distinct uint8 value with NumPy < 2.0
+        return np.bitwise_count(array) if hasattr(np, "bitwise_count") else BITS[array.view(np.uint8)]
+
+    def quantize(self, embeddings):
+        """
+        Quantizes full precision vectors using scalar quantization. Used when re-ranking, the vectors model
+        skips quantization in that case.
+
+        Args:
+            embeddings: input embeddings
+
+        Returns:
+            quantized embeddings
+        """
+
+        # Scale factor is midpoint in range
+        qbits = max(min(self.qbits, 8), 1)
+        factor = 2 ** (qbits - 1)
+
+        # Quantize to uint8
+        scalars = (embeddings * factor).clip(-factor, factor - 1) + factor
+        scalars = scalars.astype(np.uint8)
+
+        # Transform uint8 to bits and remove unused bits
+        bits = np.unpackbits(scalars.reshape(-1, 1), axis=1)[:, -qbits:]
+
+        # Reshape using original data dimensions and pack bits into uint8 array
+        return np.packbits(bits.reshape(embeddings.shape[0], embeddings.shape[1] * qbits), axis=1)
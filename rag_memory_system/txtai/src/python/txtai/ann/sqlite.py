@@ -4,6 +4,11 @@ SQLite module
 
 import os
 import sqlite3
+import threading
+
+from pathlib import Path
+
+import numpy as np
 
 # Conditional import
 try:
@@ -30,6 +35,9 @@ class SQLite(ANN):
         # Database parameters
         self.connection, self.cursor, self.path = None, None, ""
 
+        # Read-only search connections, one per thread
+        self.readers, self.local = [], threading.local()
+
         # Quantization setting
         self.quantize = self.setting("quantize")
         self.quantize = 8 if isinstance(self.quantize, bool) else int(self.quantize) if self.quantize else None
@@ -37,34 +45,37 @@ class SQLite(ANN):
     def load(self, path):
         self.path = path
 
+        # Reset search connections
+        self.closereaders()
+
     def index(self, embeddings):
         # Initialize tables
         self.initialize(recreate=True)
 
         # Add vectors
-        self.database().executemany(self.insertsql(), enumerate(embeddings))
+        self.write(self.insertsql(), enumerate(embeddings))
 
         # Add id offset and index build metadata
         self.config["offset"] = embeddings.shape[0]
         self.metadata(self.settings())
 
     def append(self, embeddings):
-        self.database().executemany(self.insertsql(), [(x + self.config["offset"], row) for x, row in enumerate(embeddings)])
+        self.write(self.insertsql(), [(x + self.config["offset"], row) for x, row in enumerate(embeddings)])
 
         self.config["offset"] += embeddings.shape[0]
         self.metadata()
 
     def delete(self, ids):
-        self.database().executemany(self.deletesql(), [(x,) for x in ids])
+        self.write(self.deletesql(), [(x,) for x in ids])
 
     def search(self, queries, limit):
-        results = []
-        for query in queries:
-            # Execute query
-            self.database().execute(self.searchsql(), [query, limit])
+        # Run all queries with a single statement. Queries are bound as one blob and split into rows with SQL.
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        size = queries.shape[1] * queries.itemsize
 
-            # Add query results
-            results.append(list(self.database()))
+        results = [[] for _ in range(queries.shape[0])]
+        for x, uid, score in self.reader().execute(self.searchsql(), [queries.shape[0], queries.tobytes(), size, size, limit]):
+            results[x].append((uid, score))
 
         return results
 
@@ -89,9 +100,10 @@ class SQLite(ANN):
             self.cursor = self.connection.cursor()
             self.path = path
 
-        # Paths are equal, commit changes
+        # Paths are equal, commit changes and copy them from the write-ahead log into the database file
         elif self.path == path:
             self.connection.commit()
+            self.connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
 
         # New path is different from current path, copy data and continue using current connection
         else:
@@ -101,6 +113,9 @@ class SQLite(ANN):
         # Parent logic
         super().close()
 
+        # Close search connections
+        self.closereaders()
+
         # Close database connection
         if self.connection:
             self.connection.close()
@@ -121,6 +136,25 @@ class SQLite(ANN):
         if recreate:
             self.database().execute(self.tosql("DELETE FROM {table}"))
 
+    def write(self, sql, rows):
+        """
+        Runs a batch of writes as a single transaction.
+
+        A new index is built in a temporary database that is copied to the target path on save. Each batch
+        is committed to the temporary database, which lets save copy it with the SQLite backup API. Writes to
+        a saved database stay in a transaction until the next save.
+
+        Args:
+            sql: INSERT or DELETE statement
+            rows: statement parameters
+        """
+
+        self.database().executemany(sql, rows)
+
+        # Commit each batch to temporary database
+        if not self.path:
+            self.connection.commit()
+
     def settings(self):
         """
         Returns settings for this index.
@@ -148,25 +182,69 @@ class SQLite(ANN):
 
         return self.cursor
 
-    def connect(self, path):
+    def reader(self):
+        """
+        Gets a cursor for searches. Once the database is saved, each thread searches with its own read-only
+        connection, which allows concurrent searches while the database is written. Uncommitted changes are
+        only visible to the main connection, it's used until these changes are saved.
+
+        Returns:
+            cursor
+        """
+
+        if not self.path or not os.path.exists(self.path) or (self.connection and self.connection.in_transaction):
+            return self.database()
+
+        connection = getattr(self.local, "connection", None)
+        if not connection:
+            connection = self.connect(self.path, readonly=True)
+            self.local.connection = connection
+            self.readers.append(connection)
+
+        return connection.cursor()
+
+    def closereaders(self):
+        """
+        Closes read-only search connections.
+        """
+
+        for connection in self.readers:
+            connection.close()
+
+        self.readers, self.local = [], threading.local()
+
+    def connect(self, path, readonly=False):
         """
         Creates a new database connection.
 
         Args:
             path: path to database file
+            readonly: open a read-only connection if True
 
         Returns:
             database connection
         """
 
         # Create connection
-        connection = sqlite3.connect(path, check_same_thread=False)
+        if readonly:
+            connection = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            connection = sqlite3.connect(path, check_same_thread=False)
 
         # Load sqlite-vec extension
         connection.enable_load_extension(True)
         sqlite_vec.load(connection)
         connection.enable_load_extension(False)
 
+        # Write-ahead log lets readers run concurrently with a writer
+        if path and not readonly:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+        # Durability isn't needed while building a new index in a temporary database
+        elif not path:
+            connection.execute("PRAGMA synchronous=OFF")
+
         # Return connection and cursor
         return connection
 
@@ -181,9 +259,10 @@ class SQLite(ANN):
             new database connection
         """
 
-        # Delete existing file, if necessary
-        if os.path.exists(path):
-            os.remove(path)
+        # Delete existing file and write-ahead log files, if necessary
+        for name in [path, f"{path}-wal", f"{path}-shm"]:
+            if os.path.exists(name):
+                os.remove(name)
 
         # Create new connection
         connection = self.connect(path)
@@ -248,13 +327,20 @@ class SQLite(ANN):
 
     def searchsql(self):
         """
-        Creates a SELECT SQL statement for search.
+        Creates a SELECT SQL statement for a batch of queries. Parameters are the number of queries, queries blob,
+        query size in bytes (twice) and the number of results per query.
 
         Returns:
             SELECT
         """
 
-        return self.tosql(("SELECT indexid, 1 - distance FROM {table} " f"WHERE embedding MATCH {self.embeddingsql()} AND k = ? ORDER BY distance"))
+        return self.tosql(
+            (
+                "WITH RECURSIVE queries(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM queries WHERE x + 1 < ?) "
+                "SELECT x, indexid, 1 - distance FROM queries, {table} "
+                f"WHERE embedding MATCH {self.embeddingsql('substr(?, x * ? + 1, ?)')} AND k = ? ORDER BY x, distance"
+            )
+        )
 
     def countsql(self):
         """
@@ -266,25 +352,28 @@ class SQLite(ANN):
 
         return self.tosql("SELECT count(indexid) FROM {table}")
 
-    def embeddingsql(self):
+    def embeddingsql(self, value="?"):
         """
         Creates an embeddings column SQL snippet.
 
+        Args:
+            value: SQL expression for the input vector
+
         Returns:
             embeddings column SQL
         """
 
         # Binary quantization
         if self.quantize == 1:
-            embedding = "vec_quantize_binary(?)"
+            embedding = f"vec_quantize_binary({value})"
 
         # INT8 quantization
         elif self.quantize == 8:
-            embedding = "vec_quantize_int8(?, 'unit')"
+            embedding = f"vec_quantize_int8({value}, 'unit')"
 
         # Standard FLOAT32
         else:
-            embedding = "?"
+            embedding = value
 
         return embedding
 
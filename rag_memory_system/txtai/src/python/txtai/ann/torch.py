@@ -31,8 +31,29 @@ class Torch(NumPy):
     def numpy(self, array):
         return array.cpu().numpy()
 
-    def totype(self, array, dtype):
-        return array.long() if dtype == np.int64 else array
+    def topk(self, scores, k):
+        scores, indices = torch.topk(scores, min(k, scores.shape[1]), dim=1)
+        return indices, scores
+
+    def take(self, array, indices):
+        return torch.gather(array, 1, indices)
+
+    def resize(self, array, capacity):
+        buffer = array.new_empty((capacity,) + tuple(array.shape[1:]))
+        buffer[: array.shape[0]] = array
+        return buffer
 
     def settings(self):
         return {"torch": torch.__version__}
+
+    def words(self, array):
+        # Bitwise ops on unsigned 64-bit tensors aren't supported, use signed words
+        array = array.contiguous()
+        return array.view(torch.int64) if array.shape[1] % 8 == 0 else array.long()
+
+    def popcount(self, array):
+        # Parallel bit count, shifts are arithmetic but each step masks out the sign extension bits
+        array = array - ((array >> 1) & 0x5555555555555555)
+        array = (array & 0x3333333333333333) + ((array >> 2) & 0x3333333333333333)
+        array = (array + (array >> 4)) & 0x0F0F0F0F0F0F0F0F
+        return (array * 0x0101010101010101) >> 56
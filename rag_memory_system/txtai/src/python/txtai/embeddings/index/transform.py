@@ -41,10 +41,6 @@ class Transform:
         self.offset = embeddings.config.get("offset", 0) if action == Action.UPSERT else 0
         self.batch = embeddings.config.get("batch", 1024)
 
-        # Scalar quantization
-        quantize = embeddings.config.get("quantize")
-        self.qbits = quantize if isinstance(quantize, int) and not isinstance(quantize, bool) else None
-
         # Transform columns
         columns = embeddings.config.get("columns", {})
         self.text = columns.get("text", "text")
@@ -98,8 +94,8 @@ class Transform:
         # Check that embeddings are available and load as a memmap
         embeddings = None
         if ids:
-            # Determine dtype
-            dtype = np.uint8 if self.qbits else np.float32
+            # Determine dtype, vectors are quantized by the model when scalar quantization is enabled
+            dtype = np.uint8 if self.model.qbits else np.float32
 
             # Write batches
             embeddings = np.memmap(buffer, dtype=dtype, shape=(len(ids), dimensions), mode="w+")
@@ -53,9 +53,11 @@ class Vectors:
             # Truncate embeddings to this dimensionality
             self.dimensionality = config.get("dimensionality")
 
-            # Scalar quantization - supports 1-bit through 8-bit quantization
+            # Scalar quantization - supports 1-bit through 8-bit quantization. Skipped when the ANN quantizes
+            # vectors itself to re-rank results with full precision vectors.
             quantize = config.get("quantize")
-            self.qbits = max(min(quantize, 8), 1) if isinstance(quantize, int) and not isinstance(quantize, bool) else None
+            rerank = (config.get(config.get("backend")) or {}).get("rerank")
+            self.qbits = max(min(quantize, 8), 1) if isinstance(quantize, int) and not isinstance(quantize, bool) and not rerank else None
 
     def loadmodel(self, path):
         """
@@ -8,6 +8,7 @@ import sys
 import tempfile
 import unittest
 
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
 import numpy as np
@@ -113,6 +114,87 @@ class TestANN(unittest.TestCase):
         # Test with custom settings
         self.runTests("hnsw", {"hnsw": {"efconstruction": 100, "m": 4, "randomseed": 0, "efsearch": 5}})
 
+    def testHnswCompact(self):
+        """
+        Test Hnswlib backend compaction
+        """
+
+        for background in [False, True]:
+            model = self.backend("hnsw", {"hnsw": {"compact": 0.5, "background": background}}, 1000)
+            data = model.backend.get_items([10, 900])
+
+            # Below threshold, deleted elements stay in the graph
+            model.delete(range(400))
+            self.assertEqual(model.backend.get_current_count(), 1000)
+
+            # Crossing threshold rebuilds the index without deleted elements
+            model.delete(range(400, 500))
+            if model.compaction:
+                model.compaction.join()
+
+            self.assertEqual(model.backend.get_current_count(), 500)
+            self.assertEqual(model.count(), 500)
+            self.assertEqual(model.config["deletes"], 0)
+
+            # Ids are kept
+            self.assertEqual(model.search(np.array(data), 1)[1][0][0], 900)
+            self.assertNotEqual(model.search(np.array(data), 1)[0][0][0], 10)
+
+            # Append continues from the id offset
+            model.append(np.array(data))
+            self.assertEqual(model.search(np.array(data[:1]), 1)[0][0][0], 1000)
+            self.assertEqual(model.count(), 502)
+
+            model.close()
+
+    def testHnswCompactConcurrent(self):
+        """
+        Test Hnswlib backend changes made during a background compaction
+        """
+
+        model = self.backend("hnsw", None, 1000)
+        model.delete(range(100))
+
+        # Hold lock to make changes before the swap
+        with model.lock:
+            model.compact(background=True)
+            model.delete([500])
+            model.append(np.array(model.backend.get_items([600])))
+
+        model.compaction.join()
+        self.assertEqual(model.count(), 900)
+        self.assertIn(model.search(np.array(model.backend.get_items([1000])), 1)[0][0][0], [600, 1000])
+        self.assertNotIn(500, [uid for uid, _ in model.search(np.array(model.backend.get_items([501])), 100)[0]])
+
+    def testHnswFilter(self):
+        """
+        Test Hnswlib backend search with an allowlist of ids
+        """
+
+        np.random.seed(100)
+        model = self.backend("hnsw", None, 5000)
+        queries = np.array(model.backend.get_items([10, 20]))
+
+        # Exact scoring for small allowlists and graph search for large allowlists
+        for ids, exact in [(range(0, 5000, 2), 5000), (range(0, 5000, 2), 10), ([11, 20, 30, 4999], 1024)]:
+            model.config["hnsw"] = {"exact": exact}
+            results = model.search(queries, 3, ids=ids)
+            for x, result in enumerate(results):
+                self.assertEqual(len(result), 3)
+                self.assertTrue(all(uid in set(ids) for uid, _ in result))
+
+                # Scores match the stored vectors
+                vectors = np.array(model.backend.get_items([uid for uid, _ in result]))
+                self.assertTrue(np.allclose([score for _, score in result], np.dot(vectors, queries[x]), atol=1e-5))
+
+            # Graph search is approximate, only exact scoring is guaranteed to return the query itself
+            if len(ids) <= exact:
+                self.assertEqual(results[1][0][0], 20)
+
+        # Deleted ids are skipped
+        model.delete([20])
+        self.assertEqual(model.search(queries, 5, ids=[20, 30])[1], [(30, model.search(queries, 5, ids=[30])[1][0][1])])
+
     def testNotImplemented(self):
         """
         Test exceptions for non-implemented methods
@@ -135,6 +217,126 @@ class TestANN(unittest.TestCase):
 
         self.runTests("numpy")
 
+    def testNumPyBlocks(self):
+        """
+        Test NumPy and Torch backends with blocked scoring
+        """
+
+        for name in ["numpy", "torch"]:
+            # Block size smaller than the limit and not a divisor of the number of rows
+            model = self.backend(name, {name: {"blocksize": 7}}, 1000)
+
+            # Generate query vectors
+            queries = np.random.rand(3, 240).astype(np.float32)
+            self.normalize(queries)
+
+            # Results must match a full sort of all scores, ids can swap places on near ties
+            scores = np.dot(queries, model.numpy(model.backend).T)
+            for x, result in enumerate(model.search(queries, 10)):
+                self.assertTrue(np.allclose([score for _, score in result], np.sort(scores[x])[::-1][:10]))
+                self.assertTrue(np.allclose([score for _, score in result], scores[x][[uid for uid, _ in result]]))
+
+            # Limit larger than the index returns all rows
+            self.assertEqual(len(model.search(queries[:1], 2000)[0]), 1000)
+
+    def testNumPyMmap(self):
+        """
+        Test NumPy backend with mmap enabled
+        """
+
+        self.runTests("numpy", {"numpy": {"mmap": True}})
+
+        model = self.backend("numpy", {"numpy": {"mmap": True}}, 100)
+        data = model.backend.copy()
+
+        # Save and reload as memory-mapped array
+        index = os.path.join(tempfile.gettempdir(), "ann.mmap")
+        model.save(index)
+        model.load(index)
+        self.assertIsInstance(model.backend, np.memmap)
+
+        # Deletes are private to this instance, file is unchanged
+        model.delete([0, 0, 1])
+        self.assertEqual(model.count(), 98)
+        self.assertTrue(np.array_equal(np.load(index), data))
+
+        # Appends grow buffer capacity by doubling
+        for _ in range(3):
+            model.append(data[:10])
+
+        self.assertEqual(model.count(), 128)
+        self.assertEqual(model.buffer.shape[0], 200)
+        self.assertIn(model.search(data[:1], 1)[0][0][0], [100, 110, 120])
+
+        # Save over the memory-mapped file
+        model.load(index)
+        model.delete([5])
+        model.save(index)
+        model.load(index)
+        self.assertEqual(model.count(), 99)
+
+        # Save after the memory-mapped file was removed
+        other = os.path.join(tempfile.gettempdir(), "ann.other")
+        model.save(other)
+        model.load(index)
+        os.remove(index)
+        model.save(other)
+        model.load(other)
+        self.assertEqual(model.count(), 99)
+
+    def testNumPyQuantize(self):
+        """
+        Test NumPy and Torch backends with binary quantization
+        """
+
+        for name in ["numpy", "torch"]:
+            # Test vector sizes that are and aren't a multiple of 64-bit words
+            for size in [32, 30]:
+                data = np.random.randint(0, 256, (1000, size), dtype=np.uint8)
+                model = ANNFactory.create({"backend": name, "quantize": 1, "dimensions": size, name: {"blocksize": 64}})
+                model.index(data)
+
+                # Scores must match a brute force hamming score
+                scores = 1.0 - np.unpackbits(data[:3, None] ^ data, axis=2).sum(axis=2) / (size * 8)
+                for x, result in enumerate(model.search(data[:3], 5)):
+                    self.assertEqual(result[0][0], x)
+                    self.assertTrue(np.allclose([score for _, score in result], np.sort(scores[x])[::-1][:5]))
+
+    def testNumPyRerank(self):
+        """
+        Test NumPy and Torch backends with binary quantization and full precision re-ranking
+        """
+
+        for name in ["numpy", "torch"]:
+            data = np.random.rand(1000, 240).astype(np.float32) - 0.5
+            self.normalize(data)
+
+            model = ANNFactory.create({"backend": name, "quantize": 1, "dimensions": 240, name: {"rerank": 10}})
+            model.index(data[:900])
+            model.append(data[900:])
+
+            # Binary index stores packed bits
+            self.assertEqual(model.backend.shape, (1000, 30))
+
+            # Queries close to indexed vectors
+            queries = data[[5, 950]] + np.random.rand(2, 240).astype(np.float32) * 0.01
+            self.normalize(queries)
+
+            # Scores are full precision similarity
+            results = model.search(queries, 3)
+            self.assertEqual([result[0][0] for result in results], [5, 950])
+            self.assertAlmostEqual(results[0][0][1], float(np.dot(queries[0], data[5])), places=5)
+
+            # Save, load and delete
+            index = os.path.join(tempfile.gettempdir(), f"ann.{name}.rerank")
+            model.save(index)
+            model.load(index)
+            self.assertEqual(model.search(queries, 3), results)
+
+            model.delete([5])
+            self.assertEqual(model.count(), 999)
+            self.assertNotEqual(model.search(queries, 1)[0][0][0], 5)
+
     @patch.dict(os.environ, {"ALLOW_PICKLE": "True"})
     def testNumPyLegacy(self):
         """
@@ -212,6 +414,45 @@ class TestANN(unittest.TestCase):
 
         self.runTests("sqlite")
 
+    @unittest.skipIf(platform.system() == "Darwin", "SQLite extensions not supported on macOS")
+    def testSQLiteBatch(self):
+        """
+        Test SQLite backend batch search and read-only search connections
+        """
+
+        model = self.backend("sqlite", None, 1000)
+
+        # Generate query vectors
+        queries = np.random.rand(5, 240).astype(np.float32)
+        self.normalize(queries)
+
+        # Batch results must match single query results
+        results = model.search(queries, 3)
+        self.assertEqual(results, [model.search(queries[x : x + 1], 3)[0] for x in range(5)])
+
+        # Saved database is searched with read-only connections
+        index = os.path.join(tempfile.gettempdir(), "ann.sqlite.batch")
+        model.save(index)
+
+        with ThreadPoolExecutor(4) as executor:
+            for output in executor.map(lambda _: model.search(queries, 3), range(8)):
+                self.assertEqual(output, results)
+
+        self.assertGreater(len(model.readers), 0)
+
+        # Uncommitted changes are visible to searches
+        uid = results[0][0][0]
+        model.delete([uid])
+        self.assertNotEqual(model.search(queries[:1], 1)[0][0][0], uid)
+
+        # Committed changes are visible to read-only connections
+        model.save(index)
+        self.assertNotEqual(model.search(queries[:1], 1)[0][0][0], uid)
+        self.assertEqual(model.count(), 999)
+
+        model.close()
+        self.assertEqual(model.readers, [])
+
     @unittest.skipIf(platform.system() == "Darwin", "SQLite extensions not supported on macOS")
     def testSQLiteCustom(self):
         """
@@ -349,9 +349,9 @@ class TestEmbeddings(unittest.TestCase):
         Test scalar quantization
         """
 
-        for ann in ["faiss", "numpy", "torch"]:
+        for ann, params in [("faiss", {}), ("numpy", {}), ("torch", {}), ("numpy", {"numpy": {"rerank": 4}})]:
             # Index data with 1-bit scalar quantization
-            embeddings = Embeddings({"path": "sentence-transformers/nli-mpnet-base-v2", "quantize": 1, "backend": ann})
+            embeddings = Embeddings({"path": "sentence-transformers/nli-mpnet-base-v2", "quantize": 1, "backend": ann, **params})
             embeddings.index([(uid, text, None) for uid, text in enumerate(self.data)])
 
             # Search for best match
@@ -0,0 +1,185 @@
+"""
+Benchmark for exact search in the NumPy/Torch and sqlite-vec ANN backends of txtai.
+
+Searches a 1M x 384 float32 index (PERF_ANN_ROWS overrides the size) with batches
+of 1 and 64 queries and compares blocked scoring with a running top-k against the
+previous implementation (full queries x N score matrix + argsort of every row).
+Each variant runs in its own process so peak RSS is measured independently.
+
+The sqlite-vec backend is built and searched at 100k and 1M vectors
+(PERF_ANN_SQLITE_ROWS) and compared with one statement per query and with NumPy.
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+ann = pytest.importorskip("txtai.ann")
+
+ROWS = int(os.environ.get("PERF_ANN_ROWS", 1_000_000))
+SQLITE_ROWS = [int(rows) for rows in os.environ.get("PERF_ANN_SQLITE_ROWS", "100000,1000000").split(",")]
+SQLITE_BATCH = 8
+DIMENSIONS = 384
+LIMIT = 10
+ROUNDS = 3
+
+
+def legacy_search(backend, queries, limit):
+    """Previous implementation: full score matrix and a full argsort of every row."""
+    scores = np.dot(queries, backend.T)
+    ids = np.argsort(-scores)[:, :limit]
+    results = []
+    for x, score in enumerate(scores):
+        results.append(list(zip(ids[x].tolist(), score[ids[x]].tolist())))
+    return results
+
+
+def legacy_sqlite_search(model, queries, limit):
+    """Previous sqlite-vec implementation: one statement per query on the writer connection."""
+    sql = model.tosql("SELECT indexid, 1 - distance FROM {table} WHERE embedding MATCH ? AND k = ? ORDER BY distance")
+    results = []
+    for query in queries:
+        model.database().execute(sql, [query, limit])
+        results.append(list(model.database()))
+    return results
+
+
+def build_corpus(rows, seed=0):
+    """Random L2-normalized vectors, generated in place to avoid temporary copies."""
+    data = np.empty((rows, DIMENSIONS), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, 1024):
+        block = data[start:start + 1024]
+        rng.random(out=block, dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1)[:, np.newaxis]
+    return data
+
+
+def create_model(variant, data):
+    backend = "torch" if variant == "torch" else "numpy"
+    model = ann.ANNFactory.create({"backend": backend, "dimensions": DIMENSIONS})
+    model.index(data)
+    return model
+
+
+def measure(variant, rows, batch):
+    """Runs one variant in the current process and returns latency and peak RSS growth."""
+    import resource
+
+    import psutil
+
+    data = build_corpus(rows)
+    queries = build_corpus(batch, seed=1)
+    if variant == "legacy":
+        search = lambda: legacy_search(data, queries, LIMIT)  # noqa: E731
+    else:
+        model = create_model(variant, data)
+        search = lambda: model.search(queries, LIMIT)  # noqa: E731
+
+    # Corpus is built in small blocks, so the high-water mark is close to the current RSS here
+    baseline = psutil.Process().memory_info().rss
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        results = search()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline
+    return {"ms": min(timings), "peak_mb": max(peak, 0) / (1024 * 1024),
+            "ids": [[uid for uid, _ in result] for result in results]}
+
+
+def run_variant(variant, rows, batch):
+    output = subprocess.run([sys.executable, __file__, variant, str(rows), str(batch)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class TestAnnSearchBenchmark:
+    """Exact vector search latency and memory."""
+
+    @pytest.mark.parametrize("backend", ["numpy", "torch"])
+    def test_results_match_previous_implementation(self, backend):
+        if backend == "torch":
+            pytest.importorskip("torch")
+        data = build_corpus(20000)
+        queries = build_corpus(8, seed=1)
+        model = ann.ANNFactory.create({"backend": backend, "dimensions": DIMENSIONS, backend: {"blocksize": 3000}})
+        model.index(data)
+
+        expected = legacy_search(data, queries, LIMIT)
+        for result, previous in zip(model.search(queries, LIMIT), expected):
+            assert [uid for uid, _ in result] == [uid for uid, _ in previous]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="peak RSS is measured with the resource module")
+    @pytest.mark.parametrize("batch", [1, 64])
+    def test_search_latency_and_peak_memory(self, batch, benchmark_config, perf_assert):
+        """Blocked scoring compared with the previous implementation."""
+        legacy = run_variant("legacy", ROWS, batch)
+        blocked = run_variant("numpy", ROWS, batch)
+
+        print(f"\nANN search {ROWS}x{DIMENSIONS}, batch {batch}: "
+              f"previous {legacy['ms']:.1f}ms / peak +{legacy['peak_mb']:.0f}MB, "
+              f"blocked {blocked['ms']:.1f}ms / peak +{blocked['peak_mb']:.0f}MB")
+
+        assert blocked["ids"] == legacy["ids"]
+        # Timings are only reported: the margin is within run-to-run noise. The score matrix
+        # of a single query is a few MB, so peak memory is compared only for large batches
+        if batch >= 64:
+            assert blocked["peak_mb"] < legacy["peak_mb"]
+        perf_assert.assert_memory_usage(blocked["peak_mb"], benchmark_config['memory_threshold_mb'],
+                                        "Blocked ANN search")
+
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, "enable_load_extension"), reason="SQLite extensions not supported")
+class TestSqliteVecBenchmark:
+    """sqlite-vec build and search compared with NumPy."""
+
+    @pytest.mark.slow
+    @pytest.mark.parametrize("rows", SQLITE_ROWS)
+    def test_build_and_search_against_numpy(self, rows, tmp_path, benchmark_config, perf_assert):
+        pytest.importorskip("sqlite_vec")
+        data = build_corpus(rows)
+        queries = build_corpus(SQLITE_BATCH, seed=1)
+
+        start = time.perf_counter()
+        model = ann.ANNFactory.create({"backend": "sqlite", "dimensions": DIMENSIONS})
+        model.index(data)
+        model.save(str(tmp_path / "vectors.sqlite"))
+        build_s = time.perf_counter() - start
+
+        numpy = create_model("numpy", data)
+        model.search(queries[:1], LIMIT)
+
+        timings = {}
+        for name, search in [("statements", lambda: legacy_sqlite_search(model, queries, LIMIT)),
+                             ("batched", lambda: model.search(queries, LIMIT)),
+                             ("numpy", lambda: numpy.search(queries, LIMIT))]:
+            start = time.perf_counter()
+            results = search()
+            timings[name] = ((time.perf_counter() - start) * 1000, [[uid for uid, _ in r] for r in results])
+
+        print(f"\nsqlite-vec {rows}x{DIMENSIONS}: build+save {build_s:.1f}s, {SQLITE_BATCH} queries: "
+              + ", ".join(f"{name} {ms:.0f}ms" for name, (ms, _) in timings.items()))
+
+        assert timings["batched"][1] == timings["statements"][1] == timings["numpy"][1]
+        perf_assert.assert_response_time(timings["batched"][0] / SQLITE_BATCH, benchmark_config['api_timeout'] * 1000,
+                                         "sqlite-vec search per query")
+        model.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4:
+        # Запуск одного варианта в отдельном процессе: variant rows batch
+        print(json.dumps(measure(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))))
+    else:
+        for size in (1, 64):
+            for name in ("legacy", "numpy", "torch"):
+                result = run_variant(name, ROWS, size)
+                print(f"{name:>6} batch {size:>2}: {result['ms']:.1f}ms, peak +{result['peak_mb']:.0f}MB")
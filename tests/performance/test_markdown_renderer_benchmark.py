@@ -0,0 +1,145 @@
+"""
+Micro-benchmark for the chat Markdown renderer.
+
+Renders a corpus of recorded assistant responses with the single-pass renderer
+(cold and cached) and in streaming mode, and compares with the previous
+multi-pass regex implementation of ChatWidget._render_markdown.
+"""
+import html
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "GopiAI-UI" / "gopiai" / "ui" / "utils"))
+
+from markdown_renderer import IncrementalMarkdownRenderer, MarkdownRenderer
+
+CORPUS_PATH = Path(__file__).parent / "data" / "assistant_responses.json"
+STREAM_CHUNK = 20
+
+
+def legacy_render_markdown(text):
+    """Previous implementation: ~15 uncompiled re.sub passes per message."""
+    if not text:
+        return ""
+    chunks = []
+    last_pos = 0
+    for match in re.finditer(r'<[^>]+>', text):
+        start, end = match.span()
+        if start > last_pos:
+            chunks.append(html.escape(text[last_pos:start]))
+        chunks.append(text[start:end])
+        last_pos = end
+    if last_pos < len(text):
+        chunks.append(html.escape(text[last_pos:]))
+    text = ''.join(chunks)
+
+    def insert_zws(match):
+        lines = []
+        for line in match.group(1).splitlines():
+            if len(line) > 80:
+                line = ''.join(c + '&#8203;' if i > 0 and i % 80 == 0 else c for i, c in enumerate(line))
+            lines.append(line)
+        return '<pre><code>' + '\n'.join(lines) + '</code></pre>'
+
+    text = re.sub(r'```([^`]*?)```', insert_zws, text)
+
+    def inline_zws(match):
+        code = match.group(1)
+        if len(code) > 80:
+            code = ''.join(c + '&#8203;' if i > 0 and i % 80 == 0 else c for i, c in enumerate(code))
+        return f'<code>{code}</code>'
+
+    text = re.sub(r'`([^`]+)`', inline_zws, text)
+    for i in range(6, 0, -1):
+        text = re.sub(r'^{} (.+)$'.format('#' * i), r'<h{0}>\1</h{0}>'.format(i), text, flags=re.MULTILINE)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    text = re.sub(r'\*(.+?)\*', r'<em>\1</em>', text)
+    text = re.sub(r'^\* (.+)$', r'<ul><li>\1</li></ul>', text, flags=re.MULTILINE)
+    text = re.sub(r'^\d+\. (.+)$', r'<ol><li>\1</li></ol>', text, flags=re.MULTILINE)
+    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
+    text = re.sub(r'^---$', r'<hr>', text, flags=re.MULTILINE)
+    lines = []
+    for line in text.split('\n'):
+        if line.strip() and not line.strip().startswith(('<', '>')):
+            lines.append(f'<p>{line}</p>')
+        else:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        responses = json.load(f)
+    # Длинный ответ, собранный из всего корпуса (типичный итоговый отчет агента)
+    responses.append("\n\n".join(responses * 10))
+    return responses
+
+
+def timed(func, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            func(text)
+    return (time.perf_counter() - start) * 1000
+
+
+def stream(render_chunk, text):
+    result = None
+    for i in range(0, len(text), STREAM_CHUNK):
+        result = render_chunk(text[:i + STREAM_CHUNK], text[i:i + STREAM_CHUNK])
+    return result
+
+
+class TestMarkdownRendererBenchmark:
+    """Markdown renderer throughput."""
+
+    def test_corpus_renders_to_html(self, corpus):
+        renderer = MarkdownRenderer()
+        for text in corpus:
+            result = renderer.render(text)
+            assert result
+            assert '```' not in result
+            assert '**' not in result
+
+    def test_render_throughput(self, corpus, benchmark_config, perf_assert):
+        """Cold (no cache) and cached rendering compared with the previous implementation."""
+        rounds = benchmark_config['test_iterations']
+
+        legacy_ms = timed(legacy_render_markdown, corpus, rounds)
+        cold_ms = timed(lambda text: MarkdownRenderer(cache_size=0).render(text), corpus, rounds)
+        renderer = MarkdownRenderer()
+        cached_ms = timed(renderer.render, corpus, rounds)
+
+        print(f"\nmarkdown render x{rounds}: previous {legacy_ms:.1f}ms, "
+              f"single-pass {cold_ms:.1f}ms, cached {cached_ms:.1f}ms")
+
+        perf_assert.assert_response_time(cold_ms / rounds, benchmark_config['ui_response_threshold_ms'],
+                                         "Markdown rendering of the corpus")
+        assert cached_ms < cold_ms
+
+    def test_streaming_throughput(self, corpus, benchmark_config, perf_assert):
+        """Streaming a long response: full re-render per chunk vs incremental tail rendering."""
+        text = corpus[-1]
+
+        start = time.perf_counter()
+        stream(lambda full, chunk: legacy_render_markdown(full), text)
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        incremental = IncrementalMarkdownRenderer()
+        start = time.perf_counter()
+        result = stream(lambda full, chunk: incremental.feed(chunk), text)
+        incremental_ms = (time.perf_counter() - start) * 1000
+
+        chunks = len(text) // STREAM_CHUNK + 1
+        print(f"\nstreaming {chunks} chunks: full re-render {legacy_ms:.1f}ms, incremental {incremental_ms:.1f}ms")
+
+        assert result == MarkdownRenderer().render(text)
+        perf_assert.assert_response_time(incremental_ms / chunks, benchmark_config['ui_response_threshold_ms'],
+                                         "Incremental rendering of one streamed chunk")
+        assert incremental_ms < legacy_ms
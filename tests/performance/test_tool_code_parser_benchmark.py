@@ -0,0 +1,196 @@
+"""
+Benchmark for the tool_code parser of the iterative execution system.
+
+Runs the parser over a corpus of recorded model responses plus large generated
+ones, checks that the results match the previous (multi-pass) implementation,
+that each response is scanned at most once with precompiled patterns, and
+measures parsing throughput.
+"""
+import ast
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "GopiAI-CrewAI"))
+
+import iterative_execution_system
+from iterative_execution_system import IterativeExecutor
+
+CORPUS_PATH = Path(__file__).parent / "data" / "tool_code_responses.json"
+
+
+def legacy_extract_tool_codes(executor, response):
+    """Previous implementation: regex compiled per call, separate match pass per block."""
+    tool_codes = []
+    matches = re.findall(r'```tool_code\s*\n(.*?)\n```', response, re.DOTALL | re.IGNORECASE)
+    for match in matches:
+        try:
+            match = match.strip()
+            if match.startswith('{'):
+                tool_codes.append(ast.literal_eval(match))
+            else:
+                func_match = re.match(r'(\w+)(?:\.[\w_]+)?\((.*?)\)', match)
+                if func_match:
+                    tool_data = executor.parse_tool_call(func_match.group(1), func_match.group(2))
+                    if tool_data:
+                        tool_codes.append(tool_data)
+                elif 'datetime' in match and 'now()' in match:
+                    tool_codes.append({'tool': 'time_info', 'params': {}})
+                elif match.startswith('bash:'):
+                    tool_codes.append({'tool': 'terminal', 'params': {'command': match[5:].strip()}})
+                elif 'print(' in match or 'import ' in match:
+                    python_code = match.replace('\n', '; ')
+                    tool_codes.append({'tool': 'terminal', 'params': {'command': f'python3 -c "{python_code}"'}})
+                else:
+                    tool_codes.append({'tool': 'terminal', 'params': {'command': match}})
+        except Exception:
+            continue
+    return tool_codes
+
+
+class CountingPattern:
+    """Wraps a compiled pattern and counts full scans of the response."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.scans = 0
+
+    def finditer(self, string, *args):
+        self.scans += 1
+        return self.pattern.finditer(string, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.pattern, name)
+
+
+class ReModuleSpy:
+    """Stands in for the re module and records module-level (per-call compiled) regex use."""
+
+    FUNCTIONS = ('compile', 'match', 'fullmatch', 'search', 'findall', 'finditer', 'sub', 'split')
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        attr = getattr(re, name)
+        if name not in self.FUNCTIONS:
+            return attr
+
+        def wrapper(*args, **kwargs):
+            self.calls.append(name)
+            return attr(*args, **kwargs)
+        return wrapper
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = [(entry["name"], entry["response"]) for entry in json.load(f)]
+
+    paragraph = "Анализирую структуру проекта и подготавливаю следующий шаг выполнения задачи. " * 20
+    # Длинный ответ без инструментов (типичный итоговый отчет)
+    corpus.append(("large_prose", "\n\n".join([paragraph] * 200)))
+    # Длинный ответ с редкими блоками инструментов и обычным кодом
+    blocks = []
+    for i in range(200):
+        blocks.append(paragraph)
+        if i % 20 == 0:
+            blocks.append(f"```tool_code\n{{'tool': 'terminal', 'params': {{'command': 'echo {i}'}}}}\n```")
+        if i % 7 == 0:
+            blocks.append("```python\nprint('example')\n```")
+    corpus.append(("large_sparse_tools", "\n\n".join(blocks)))
+    # Много блоков подряд
+    many = [f"```tool_code\nbash: echo step {i}\n```" for i in range(500)]
+    corpus.append(("many_blocks", "Выполняю шаги:\n" + "\n".join(many)))
+    return corpus
+
+
+@pytest.fixture(scope="module")
+def executor():
+    return IterativeExecutor()
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus()
+
+
+def measure(func, corpus, rounds):
+    total_bytes = sum(len(response.encode("utf-8")) for _, response in corpus)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, response in corpus:
+            func(response)
+    elapsed = time.perf_counter() - start
+    return {
+        'responses_per_sec': rounds * len(corpus) / elapsed,
+        'mb_per_sec': rounds * total_bytes / elapsed / (1024 * 1024),
+        'elapsed_ms': elapsed * 1000,
+    }
+
+
+class TestToolCodeParserBenchmark:
+    """tool_code parser correctness and throughput."""
+
+    def test_matches_legacy_parser(self, executor, corpus):
+        """New parser gives the same tool calls as the previous implementation."""
+        for name, response in corpus:
+            assert executor.extract_tool_codes(response) == legacy_extract_tool_codes(executor, response), name
+
+    def test_expected_tool_calls(self, executor, corpus):
+        """Spot checks over the recorded responses."""
+        parsed = {name: executor.extract_tool_codes(response) for name, response in corpus}
+        assert parsed["plain_answer"] == []
+        assert parsed["markdown_code_no_tool"] == []
+        assert parsed["malformed_dict"] == []
+        assert parsed["bash_prefix"] == [{'tool': 'terminal', 'params': {'command': 'ls -la /tmp'}}]
+        assert parsed["python_datetime"] == [{'tool': 'time_info', 'params': {}}]
+        assert [t['tool'] for t in parsed["multiple_blocks"]] == ['terminal', 'terminal', 'time_info']
+        assert len(parsed["large_sparse_tools"]) == 10
+        assert len(parsed["many_blocks"]) == 500
+
+    def test_should_continue_reuses_parsed_tool_codes(self, executor, monkeypatch):
+        """should_continue_iteration does not re-parse when tool codes are passed in."""
+        calls = []
+        monkeypatch.setattr(executor, "extract_tool_codes", lambda response: calls.append(response) or [])
+        assert executor.should_continue_iteration("Готово.", 1, tool_codes=[]) is False
+        assert executor.should_continue_iteration("Готово.", 1, tool_codes=[{'tool': 'terminal'}]) is True
+        assert calls == []
+
+    def test_single_pass_with_precompiled_patterns(self, executor, corpus, monkeypatch):
+        """Each response is scanned at most once and no regex is compiled per call."""
+        blocks = CountingPattern(iterative_execution_system._TOOL_CODE_BLOCK_RE)
+        re_spy = ReModuleSpy()
+        monkeypatch.setattr(iterative_execution_system, "_TOOL_CODE_BLOCK_RE", blocks)
+        monkeypatch.setattr(iterative_execution_system, "re", re_spy)
+        for name, response in corpus:
+            blocks.scans = 0
+            executor.extract_tool_codes(response)
+            # Ответы без ``` не сканируются регулярным выражением вовсе
+            assert blocks.scans == (1 if '```' in response else 0), name
+        assert re_spy.calls == []
+
+    def test_parser_throughput(self, executor, corpus, benchmark_config, perf_assert):
+        """Parsing throughput over the whole corpus, reported next to the previous implementation.
+
+        Wall time of both parsers is dominated by the same linear regex scan, so the
+        comparison is informational; the single-pass claim is checked above.
+        """
+        rounds = benchmark_config['test_iterations']
+        # Прогрев, чтобы кэш регулярных выражений не искажал результат старой реализации
+        measure(executor.extract_tool_codes, corpus, 1)
+        measure(lambda response: legacy_extract_tool_codes(executor, response), corpus, 1)
+
+        current = measure(executor.extract_tool_codes, corpus, rounds)
+        legacy = measure(lambda response: legacy_extract_tool_codes(executor, response), corpus, rounds)
+
+        print(f"\ntool_code parser: {current['responses_per_sec']:.0f} responses/s, "
+              f"{current['mb_per_sec']:.1f} MB/s (previous: {legacy['responses_per_sec']:.0f} responses/s, "
+              f"{legacy['mb_per_sec']:.1f} MB/s)")
+
+        per_round_ms = current['elapsed_ms'] / rounds
+        perf_assert.assert_response_time(per_round_ms, benchmark_config['ui_response_threshold_ms'],
+                                         "tool_code parsing of the corpus")
@@ -0,0 +1,123 @@
+"""
+Tests for the UI chat history store (SQLite, migration from chats.json)
+"""
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add UI memory package directory to path (the gopiai.ui package itself needs Qt)
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI" / "gopiai" / "ui" / "memory"))
+
+from chat_store import ChatStore
+
+
+class TestChatStore(unittest.TestCase):
+    """Tests for appends, per-session reads and migration"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmpdir.name)
+        self.store = ChatStore(self.dir / "chats.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _message(self, session_id, i, **extra):
+        return {'id': f'{session_id}-{i}', 'session_id': session_id, 'role': 'user',
+                'content': f'msg {i}', 'timestamp': f'2025-01-01T00:00:{i:02d}', **extra}
+
+    def test_session_reads_are_ordered_and_limited(self):
+        for i in (3, 1, 2):
+            self.store.append(self._message('s1', i))
+        self.store.append(self._message('s2', 0))
+        self.assertEqual([m['content'] for m in self.store.get_messages('s1')], ['msg 1', 'msg 2', 'msg 3'])
+        self.assertEqual([m['content'] for m in self.store.get_messages('s1', limit=2)], ['msg 2', 'msg 3'])
+        self.assertEqual(len(self.store.get_messages('missing')), 0)
+
+    def test_paging_backwards_with_before(self):
+        for i in range(1, 6):
+            self.store.append(self._message('s1', i))
+        page = self.store.get_messages('s1', limit=2)
+        self.assertEqual([m['content'] for m in page], ['msg 4', 'msg 5'])
+        older = self.store.get_messages('s1', limit=2, before=page[0]['timestamp'])
+        self.assertEqual([m['content'] for m in older], ['msg 2', 'msg 3'])
+        oldest = self.store.get_messages('s1', limit=2, before=older[0]['timestamp'])
+        self.assertEqual([m['content'] for m in oldest], ['msg 1'])
+
+    def test_paging_with_equal_timestamps_across_page_boundary(self):
+        # Imported or defaulted timestamps are often identical
+        for i in range(1, 6):
+            self.store.append({'id': f'e{i}', 'session_id': 's1', 'role': 'user', 'content': f'msg {i}',
+                               'timestamp': '0'})
+        seen = []
+        page = self.store.get_messages('s1', limit=2)
+        while page:
+            seen[:0] = [m['content'] for m in page]
+            page = self.store.get_messages('s1', limit=2, before=ChatStore.page_cursor(page[0]))
+        self.assertEqual(seen, [f'msg {i}' for i in range(1, 6)])
+
+    def test_seq_is_not_stored_as_metadata(self):
+        self.store.append(self._message('s1', 1))
+        message = self.store.get_messages('s1')[0]
+        self.store.append({**message, 'id': 'copy'})
+        copy = self.store.get_messages('s1')[-1]
+        self.assertNotEqual(copy['seq'], message['seq'])
+        self.assertEqual(ChatStore.page_cursor({'timestamp': 't'}), 't')
+
+    def test_extra_fields_round_trip(self):
+        self.store.append(self._message('s1', 1, model='gemini', tokens=12))
+        message = self.store.get_messages('s1')[0]
+        self.assertEqual(message['model'], 'gemini')
+        self.assertEqual(message['tokens'], 12)
+
+    def test_list_and_delete_sessions(self):
+        self.store.append(self._message('s1', 2))
+        self.store.append(self._message('s1', 1))
+        self.store.append(self._message('s2', 5))
+        sessions = {s['id']: s for s in self.store.list_sessions()}
+        self.assertEqual(sessions['s1']['title'], 'msg 1')
+        self.assertEqual(sessions['s1']['created_at'], '2025-01-01T00:00:01')
+        self.assertEqual(self.store.delete_session('s1'), 2)
+        self.assertEqual([s['id'] for s in self.store.list_sessions()], ['s2'])
+
+    def test_session_index_is_updated_on_append(self):
+        self.store.append(self._message('s1', 1))
+        self.store.append(self._message('s1', 4))
+        self.store.append(self._message('s1', 4))  # duplicate id is ignored
+        self.assertTrue(self.store.update_session_title('s1', 'Renamed'))
+        session = self.store.list_sessions()[0]
+        self.assertEqual(session['message_count'], 2)
+        self.assertEqual(session['last_activity'], '2025-01-01T00:00:04')
+        # The index survives reopening the database
+        reopened = ChatStore(self.dir / "chats.db").list_sessions()[0]
+        self.assertEqual(reopened['title'], 'Renamed')
+        self.assertEqual(reopened['message_count'], 2)
+
+    def test_session_index_rebuilt_for_existing_database(self):
+        self.store.append(self._message('s1', 1))
+        self.store.append(self._message('s2', 2))
+        conn = self.store._connect()
+        conn.execute("DELETE FROM sessions")
+        conn.execute("DELETE FROM meta WHERE key = 'session_index'")
+        sessions = {s['id']: s for s in ChatStore(self.dir / "chats.db").list_sessions()}
+        self.assertEqual(set(sessions), {'s1', 's2'})
+        self.assertEqual(sessions['s1']['title'], 'msg 1')
+
+    def test_migration_from_json_runs_once(self):
+        legacy = self.dir / "chats.json"
+        messages = [self._message('s1', i) for i in range(3)] + [{'content': 'no session'}]
+        legacy.write_text(json.dumps(messages), encoding='utf-8')
+
+        self.assertEqual(self.store.migrate_from_json(legacy), 3)
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.store.list_sessions()[0]['message_count'], 3)
+        # A second run does not read the file again
+        legacy.write_text(json.dumps([self._message('s9', 1)]), encoding='utf-8')
+        self.assertEqual(self.store.migrate_from_json(legacy), 0)
+        self.assertEqual(self.store.count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
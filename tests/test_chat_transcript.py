@@ -0,0 +1,100 @@
+"""
+Tests for the virtualized chat transcript (message model and delegate layout caches)
+"""
+import sys
+import unittest
+from pathlib import Path
+
+# Add UI package directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI"))
+
+try:
+    from PySide6.QtCore import QRect
+    from PySide6.QtWidgets import QApplication, QStyleOptionViewItem
+    from gopiai.ui.components.chat_transcript import (
+        CacheKeyRole, ChatTranscriptView, HtmlRole, MessageDelegate, TranscriptModel
+    )
+    UI_AVAILABLE = True
+except ImportError:
+    UI_AVAILABLE = False
+
+
+@unittest.skipUnless(UI_AVAILABLE, "GopiAI UI (PySide6) not available")
+class TestTranscript(unittest.TestCase):
+    """Tests for TranscriptModel and MessageDelegate caching"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.model = TranscriptModel()
+        self.delegate = MessageDelegate()
+
+    def size_hint(self, message_id, width=600):
+        option = QStyleOptionViewItem()
+        option.rect = QRect(0, 0, width, 0)
+        return self.delegate.sizeHint(option, self.model.index(self.model._row_of(message_id)))
+
+    def test_append_and_update(self):
+        inserted = []
+        self.model.rowsInserted.connect(lambda parent, first, last: inserted.append(first))
+        first = self.model.append_message('user', '<p>hello</p>', 'hello')
+        second = self.model.append_message('assistant', '<p>hi</p>', 'hi')
+        self.assertEqual(inserted, [0, 1])
+
+        changed = []
+        self.model.dataChanged.connect(lambda top_left, bottom_right, roles=None: changed.append(top_left.row()))
+        self.assertTrue(self.model.update_message(second, '<p>hi there</p>'))
+        index = self.model.index(1)
+        self.assertEqual(changed, [1])
+        self.assertEqual(index.data(HtmlRole), '<p>hi there</p>')
+        self.assertEqual(index.data(), 'hi')
+        self.assertEqual(index.data(CacheKeyRole), (second, 1))
+        self.assertEqual(self.model.index(0).data(CacheKeyRole), (first, 0))
+        self.assertFalse(self.model.update_message('missing', '<p></p>'))
+
+    def test_height_is_cached_per_message(self):
+        message_id = self.model.append_message('assistant', '<p>short</p>')
+        short = self.size_hint(message_id)
+        document = self.delegate._documents[message_id][2]
+        self.assertEqual(self.size_hint(message_id), short)
+        self.assertIs(self.delegate._documents[message_id][2], document)
+
+        # A streamed update invalidates only this message and grows its height
+        self.delegate.forget(message_id)
+        self.model.update_message(message_id, '<p>line</p>' * 20)
+        self.assertGreater(self.size_hint(message_id).height(), short.height())
+        self.assertEqual(len(self.delegate._documents), 1)
+        self.assertEqual(len(self.delegate._sizes), 1)
+
+    def test_resize_keeps_one_size_per_message(self):
+        ids = [self.model.append_message('user', f'<p>message {i}</p>') for i in range(3)]
+        for width in (400, 500, 600, 700):
+            for message_id in ids:
+                self.assertEqual(self.size_hint(message_id, width).width(), width)
+        self.assertEqual(set(self.delegate._sizes), set(ids))
+        self.assertEqual(len(self.delegate._documents), 3)
+
+    def test_document_cache_is_bounded(self):
+        self.delegate.cache_size = 2
+        ids = [self.model.append_message('system', f'<p>{i}</p>') for i in range(4)]
+        for message_id in ids:
+            self.size_hint(message_id)
+        self.assertEqual(list(self.delegate._documents), ids[2:])
+
+    def test_update_relayouts_only_changed_row(self):
+        view = ChatTranscriptView()
+        ids = [view.append_message('assistant', f'<p>{i}</p>') for i in range(3)]
+        for message_id in ids:
+            view.delegate.sizeHint(QStyleOptionViewItem(), view.transcript.index(view.transcript._row_of(message_id)))
+        changed = []
+        view.delegate.sizeHintChanged.connect(lambda index: changed.append(index.row()))
+
+        view.transcript.update_message(ids[1], '<p>streamed token</p>')
+        self.assertEqual(changed, [1])
+        self.assertEqual(set(view.delegate._sizes), {ids[0], ids[2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
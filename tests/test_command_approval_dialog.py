@@ -0,0 +1,78 @@
+"""
+Tests for the command approval stream worker (prompt shutdown while blocked in a read)
+"""
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add UI package directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI"))
+
+try:
+    from PySide6.QtCore import QCoreApplication
+    from gopiai.ui.components.command_approval_dialog import ApprovalStreamWorker
+    UI_AVAILABLE = True
+except ImportError:
+    UI_AVAILABLE = False
+
+
+class _SilentStreamHandler(BaseHTTPRequestHandler):
+    """Sends a snapshot event, then keeps the stream open without keepalives"""
+    protocol_version = "HTTP/1.1"
+    release = threading.Event()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        event = b'id: 1\nevent: snapshot\ndata: {"pending_commands": [{"id": "c1"}]}\n\n'
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+        self.wfile.flush()
+        _SilentStreamHandler.release.wait(10)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(UI_AVAILABLE, "GopiAI UI (PySide6) not available")
+class TestApprovalStreamWorker(unittest.TestCase):
+    """stop() interrupts a blocking read instead of waiting for the read timeout"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _SilentStreamHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        _SilentStreamHandler.release.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_stop_interrupts_blocked_read(self):
+        worker = ApprovalStreamWorker(self.base)
+        snapshots = []
+        worker.snapshot_received.connect(snapshots.append)
+        worker.start()
+
+        deadline = time.monotonic() + 5
+        while not snapshots and time.monotonic() < deadline:
+            QCoreApplication.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(snapshots, [[{"id": "c1"}]])
+
+        # The worker is now blocked reading a silent stream
+        started = time.monotonic()
+        worker.stop()
+        self.assertTrue(worker.wait(5000))
+        self.assertLess(time.monotonic() - started, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
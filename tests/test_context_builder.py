@@ -0,0 +1,136 @@
+"""
+Tests for the server-side context builder (history from chats.db, token budget, summaries, memories)
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add CrewAI server and UI memory directories to path (the gopiai.ui package itself needs Qt)
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI" / "gopiai" / "ui" / "memory"))
+
+from chat_store import ChatStore
+from context_builder import (
+    MEMORY_SNIPPET_MAX_TOKENS, MESSAGE_OVERHEAD_TOKENS, SUMMARY_MAX_TOKENS, ChatHistoryStore, ContextBuilder,
+    TokenCounter, format_prompt, get_context_budget,
+)
+
+MODELS = [
+    {'id': 'gemini/small', 'rpm': 10, 'tpm': 10000},
+    {'id': 'gemini/unlimited', 'rpm': 10},
+]
+
+
+class TestContextBuilder(unittest.TestCase):
+    """Tests for history packing against a real chats.db"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmpdir.name) / "chats.db"
+        self.chats = ChatStore(db_path)
+        for i in range(40):
+            self.chats.append({
+                'id': f's1-{i}', 'session_id': 's1', 'role': 'user' if i % 2 == 0 else 'assistant',
+                'content': f'сообщение номер {i} ' + 'текст ' * 20, 'timestamp': f'2025-01-01T00:{i:02d}:00',
+            })
+        self.counter = TokenCounter(encoding_name=None)
+        self.history = ChatHistoryStore(db_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _builder(self, **kwargs):
+        kwargs.setdefault('response_reserve', 0)
+        return ContextBuilder(self.history, MODELS, token_counter=self.counter, **kwargs)
+
+    def test_budget_from_model_limits(self):
+        self.assertEqual(get_context_budget('gemini/small', MODELS, 32000), 1000)
+        self.assertEqual(get_context_budget('small', MODELS, 500), 500)
+        self.assertEqual(get_context_budget('gemini/unlimited', MODELS, 32000), 32000)
+        self.assertEqual(get_context_budget(None, MODELS, 32000), 32000)
+
+    def test_packs_newest_messages_into_budget(self):
+        context = self._builder(max_tokens=600).build('s1', 'новый вопрос')
+        self.assertEqual(context['source'], 'store')
+        self.assertTrue(context['truncated'])
+        self.assertLessEqual(context['tokens'], 600 - self.counter.count('новый вопрос'))
+        # The newest message is last and the packed window is contiguous
+        self.assertTrue(context['messages'][-1]['content'].startswith('сообщение номер 39 '))
+        first = int(context['messages'][0]['content'].split()[2])
+        self.assertEqual(len(context['messages']), 40 - first)
+        expected = sum(self.counter.count(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in context['messages'])
+        self.assertEqual(context['tokens'], expected)
+
+    def test_whole_history_fits_large_budget(self):
+        context = self._builder(max_tokens=100000).build('s1', 'вопрос')
+        self.assertEqual(len(context['messages']), 40)
+        self.assertFalse(context['truncated'])
+
+    def test_current_message_is_not_duplicated(self):
+        self.chats.append({'id': 's1-40', 'session_id': 's1', 'role': 'user', 'content': 'вопрос',
+                           'timestamp': '2025-01-01T00:40:00'})
+        context = self._builder(max_tokens=100000).build('s1', 'вопрос')
+        self.assertEqual(len(context['messages']), 40)
+        self.assertNotEqual(context['messages'][-1]['content'], 'вопрос')
+
+    def test_fit_trims_history_for_growing_message(self):
+        builder = self._builder(max_tokens=600)
+        context = builder.build('s1', 'вопрос', reserved_tokens=50)
+        self.assertIs(builder.fit(context, 'вопрос', reserved_tokens=50), context)
+
+        # Tool results appended to the message take budget from the oldest history
+        message = 'вопрос\n' + 'результат ' * 20
+        fitted = builder.fit(context, message, reserved_tokens=50)
+        self.assertLess(len(fitted['messages']), len(context['messages']))
+        self.assertEqual(fitted['messages'], context['messages'][-len(fitted['messages']):])
+        self.assertLessEqual(fitted['tokens'] + 50 + self.counter.count(message), 600)
+        self.assertTrue(fitted['truncated'])
+        # The context built once per request is left intact for later iterations
+        self.assertEqual(builder.fit(context, 'вопрос', reserved_tokens=50), context)
+
+    def test_fallback_to_request_history(self):
+        fallback = [{'role': 'user', 'content': 'старый'}, {'role': 'assistant', 'content': 'ответ'}]
+        context = self._builder().build('missing', 'вопрос', fallback_history=fallback)
+        self.assertEqual(context['source'], 'request')
+        self.assertEqual([m['content'] for m in context['messages']], ['старый', 'ответ'])
+
+    def test_memories_use_own_budget_and_skip_packed_messages(self):
+        packed_text = 'сообщение номер 39 ' + 'текст ' * 20
+        memories = [
+            {'role': 'user', 'text': packed_text.strip()},
+            {'role': 'assistant', 'text': 'старый ответ про настройку сервера'},
+            {'role': 'user', 'text': 'очень длинный фрагмент ' * 500},
+        ]
+        context = self._builder(max_tokens=100000).build('s1', 'вопрос', memories=memories)
+        texts = [memory['text'] for memory in context['memories']]
+        self.assertNotIn(packed_text.strip(), texts)
+        self.assertIn('старый ответ про настройку сервера', texts)
+        # Long snippets are shortened to the per-snippet limit
+        self.assertLessEqual(self.counter.count(texts[-1]), MEMORY_SNIPPET_MAX_TOKENS + 1)
+
+        prompt = format_prompt('системный промпт', context, 'вопрос')
+        self.assertIn('Релевантные фрагменты прошлых разговоров:\n- (ассистент) старый ответ', prompt)
+
+    def test_summary_is_cached_for_same_window(self):
+        calls = []
+
+        def summarizer(messages):
+            calls.append(len(messages))
+            return 'краткое содержание'
+
+        builder = self._builder(max_tokens=SUMMARY_MAX_TOKENS + 600, summarizer=summarizer)
+        first = builder.build('s1', 'вопрос')
+        second = builder.build('s1', 'вопрос')
+        self.assertEqual(first['summary'], 'краткое содержание')
+        self.assertEqual(second['summary'], first['summary'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0] + len(first['messages']), 40)
+
+        prompt = format_prompt('системный промпт', first, 'вопрос')
+        self.assertTrue(prompt.startswith('System: системный промпт\nSystem: Краткое содержание'))
+        self.assertTrue(prompt.endswith('Human: вопрос\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
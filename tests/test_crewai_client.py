@@ -0,0 +1,152 @@
+"""
+Tests for the UI CrewAI client: cached server health and task status polling off the GUI thread
+"""
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add UI package directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI"))
+
+try:
+    from PySide6.QtCore import QCoreApplication
+    from gopiai.ui.components import crewai_client as crewai_client_module
+    from gopiai.ui.components.chat_async_handler import ChatAsyncHandler
+    from gopiai.ui.components.crewai_client import CrewAIClient
+    UI_AVAILABLE = True
+except ImportError:
+    UI_AVAILABLE = False
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = 0
+
+    def do_GET(self):
+        _HealthHandler.hits += 1
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def process_events_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+    return predicate()
+
+
+@unittest.skipUnless(UI_AVAILABLE, "GopiAI UI (PySide6) not available")
+class TestCrewAIClientHealth(unittest.TestCase):
+    """Server state is cached and refreshed by one background thread"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _HealthHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _HealthHandler.hits = 0
+
+    def test_module_instance_has_no_health_thread(self):
+        self.assertIsNone(crewai_client_module.crewai_client._health_thread)
+
+    def test_is_available_uses_cached_state(self):
+        client = CrewAIClient(self.base, health_monitor=False)
+        self.assertTrue(client.is_available())
+        self.assertTrue(client.is_available())
+        self.assertEqual(_HealthHandler.hits, 1)
+        self.assertTrue(client.is_available(force_check=True))
+        self.assertEqual(_HealthHandler.hits, 2)
+
+    def test_monitor_notifies_listeners_from_background_thread(self):
+        calls = []
+        client = CrewAIClient(self.base, health_monitor=False)
+        client.add_health_listener(lambda available: calls.append((available, threading.current_thread())))
+        client.start_health_monitor()
+        try:
+            deadline = time.monotonic() + 5
+            while not calls and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(calls[0][0], True)
+            self.assertIsNot(calls[0][1], threading.main_thread())
+        finally:
+            client.close()
+
+
+class _BlockingStatusClient:
+    """Client whose status request blocks until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.threads = []
+
+    def check_task_status(self, task_id):
+        self.threads.append(threading.current_thread())
+        self.release.wait(5)
+        return {"status": "COMPLETED", "result": {"response": f"done {task_id}"}}
+
+
+@unittest.skipUnless(UI_AVAILABLE, "GopiAI UI (PySide6) not available")
+class TestTaskStatusPolling(unittest.TestCase):
+    """Task status is fetched in a worker thread and handled on the GUI thread"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def test_status_request_does_not_block_gui_thread(self):
+        client = _BlockingStatusClient()
+        handler = ChatAsyncHandler(client)
+        responses = []
+        handler.response_ready.connect(lambda result: responses.append((result, threading.current_thread())))
+        handler._current_task_id = "t1"
+
+        started = time.perf_counter()
+        handler._check_task_status()
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertTrue(handler._status_request_in_flight)
+
+        # A second tick while the request is in flight does not start another one
+        handler._check_task_status()
+        client.release.set()
+        self.assertTrue(process_events_until(lambda: responses))
+
+        self.assertEqual(len(client.threads), 1)
+        self.assertIsNot(client.threads[0], threading.main_thread())
+        self.assertEqual(responses[0][0], {"response": "done t1"})
+        self.assertIs(responses[0][1], threading.main_thread())
+        self.assertFalse(handler._status_request_in_flight)
+
+    def test_stale_status_is_ignored(self):
+        client = _BlockingStatusClient()
+        client.release.set()
+        handler = ChatAsyncHandler(client)
+        responses = []
+        handler.response_ready.connect(responses.append)
+        handler._current_task_id = "t1"
+        handler._check_task_status()
+        # Polling switched to another task before the answer arrived
+        handler._current_task_id = "t2"
+        self.assertTrue(process_events_until(lambda: not handler._status_request_in_flight))
+        self.assertEqual(responses, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+Tests for the iterative execution system (LLM call handling)
+"""
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from iterative_execution_system import IterativeExecutor, LLMCallManager, LLMCallTimeout
+
+
+class FakeLLM:
+    model = "test/model"
+
+
+class SlowClient:
+    """LLM client that blocks until cancelled"""
+
+    def __init__(self):
+        self.llm = FakeLLM()
+        self.cancelled = threading.Event()
+
+    def generate_response(self, message, metadata, cancel_event=None):
+        if cancel_event.wait(timeout=5):
+            self.cancelled.set()
+            raise RuntimeError("cancelled")
+        return "late"
+
+
+class EchoClient:
+    """LLM client without cancel support"""
+
+    llm = FakeLLM()
+
+    def generate_response(self, message, metadata):
+        return "Готово"
+
+
+class TestLLMCallManager(unittest.TestCase):
+    """Tests for shared, cancellable LLM calls"""
+
+    def test_timeout_sets_cancel_event_and_frees_slot(self):
+        manager = LLMCallManager(max_workers=2, max_concurrent_per_model=1)
+        client = SlowClient()
+        with self.assertRaises(LLMCallTimeout):
+            manager.call(client, "hi", {}, timeout=0.1)
+        self.assertTrue(client.cancelled.wait(timeout=2))
+        # Слот освобождается после фактического завершения вызова
+        deadline = time.monotonic() + 2
+        while manager.get_stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(manager.get_stats()['in_flight'], {})
+        self.assertEqual(manager.call(EchoClient(), "hi", {}, timeout=1), "Готово")
+        self.assertEqual(manager.get_stats()['timeouts'], 1)
+
+    def test_per_model_cap(self):
+        manager = LLMCallManager(max_workers=4, max_concurrent_per_model=1)
+        release = threading.Event()
+
+        class BlockingClient:
+            llm = FakeLLM()
+
+            def generate_response(self, message, metadata):
+                release.wait(timeout=5)
+                return "ok"
+
+        worker = threading.Thread(target=manager.call, args=(BlockingClient(), "a", {}, 5))
+        worker.start()
+        time.sleep(0.05)
+        self.assertEqual(manager.get_stats()['in_flight'], {"test/model": 1})
+        with self.assertRaises(LLMCallTimeout):
+            manager.call(EchoClient(), "b", {}, timeout=0.1)
+        self.assertEqual(manager.get_stats()['cap_rejections'], 1)
+        release.set()
+        worker.join(timeout=5)
+
+    def test_cancelled_queued_call_frees_slot(self):
+        # Пул занят одним вызовом, второй ждёт в очереди и отменяется по таймауту
+        manager = LLMCallManager(max_workers=1, max_concurrent_per_model=2)
+        release = threading.Event()
+
+        class BlockingClient:
+            llm = FakeLLM()
+
+            def generate_response(self, message, metadata):
+                release.wait(timeout=5)
+                return "ok"
+
+        worker = threading.Thread(target=manager.call, args=(BlockingClient(), "a", {}, 5))
+        worker.start()
+        time.sleep(0.05)
+        with self.assertRaises(LLMCallTimeout):
+            manager.call(EchoClient(), "b", {}, timeout=0.1)
+        release.set()
+        worker.join(timeout=5)
+
+        self.assertEqual(manager.get_stats()['in_flight'], {})
+        self.assertEqual(manager._semaphores["test/model"]._value, 2)
+        self.assertEqual(manager.call(EchoClient(), "c", {}, timeout=1), "Готово")
+
+    def test_process_iteratively_uses_manager(self):
+        executor = IterativeExecutor()
+        executor.llm_calls = LLMCallManager(max_workers=1)
+        result = executor.process_iteratively("привет", EchoClient())
+        self.assertEqual(result['final_response'], "Готово")
+        self.assertEqual(executor.llm_calls.get_stats()['calls'], 1)
+
+
+class TestParallelTools(unittest.TestCase):
+    """Tests for dependency-aware parallel tool execution"""
+
+    def setUp(self):
+        self.executor = IterativeExecutor()
+        self.executor.parallel_tools = True
+        self.calls = []
+        self.lock = threading.Lock()
+
+        def fake_execute(tool_data):
+            with self.lock:
+                self.calls.append(('start', tool_data['name']))
+            time.sleep(tool_data.get('delay', 0))
+            with self.lock:
+                self.calls.append(('end', tool_data['name']))
+            return {'success': True, 'error': None, 'output': tool_data['name']}
+
+        self.executor.execute_tool = fake_execute
+
+    def test_read_only_classification(self):
+        is_read_only = self.executor.is_read_only_tool
+        self.assertTrue(is_read_only({'tool': 'file_read', 'params': {'path': 'a'}}))
+        self.assertTrue(is_read_only({'tool': 'terminal', 'params': {'command': 'ls -la'}}))
+        self.assertFalse(is_read_only({'tool': 'terminal', 'params': {'command': 'cat a > b'}}))
+        self.assertFalse(is_read_only({'tool': 'terminal', 'params': {'command': 'rm -rf build'}}))
+        self.assertTrue(is_read_only({'tool': 'terminal', 'params': {'command': 'find . -name "*.py"'}}))
+        self.assertFalse(is_read_only({'tool': 'file_operations', 'params': {}}))
+
+    def test_find_actions_that_write_or_execute_need_approval(self):
+        # Every GNU find action that deletes, runs a command or writes a file
+        actions = {
+            '-delete': '', '-exec': 'rm {} +', '-execdir': 'rm {} +', '-ok': 'rm {} +', '-okdir': 'rm {} +',
+            '-fprint': 'out.txt', '-fprint0': 'out.txt', '-fprintf': 'out.txt %p', '-fls': 'out.txt',
+        }
+        for action, args in actions.items():
+            for command in (f'find . {action} {args}', f'find . -name "*.pyc" {action} {args}'):
+                tool = {'tool': 'terminal', 'params': {'command': command.strip()}}
+                self.assertFalse(self.executor.is_read_only_tool(tool), command)
+
+    def test_reads_run_concurrently_and_keep_order(self):
+        tools = [
+            {'tool': 'system_info', 'name': 'r1', 'delay': 0.2},
+            {'tool': 'terminal', 'params': {'command': 'pwd'}, 'name': 'r2', 'delay': 0.2},
+            {'tool': 'project_info', 'name': 'r3', 'delay': 0.0},
+        ]
+        seen = []
+        started = time.monotonic()
+        results = self.executor.execute_tools(tools, lambda index, tool, result: seen.append(index))
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual([r['output'] for r in results], ['r1', 'r2', 'r3'])
+        self.assertEqual(seen, [0, 1, 2])
+
+    def test_mutating_command_is_a_barrier(self):
+        tools = [
+            {'tool': 'system_info', 'name': 'r1', 'delay': 0.1},
+            {'tool': 'terminal', 'params': {'command': 'mkdir out && touch out/x'}, 'name': 'w1'},
+            {'tool': 'terminal', 'params': {'command': 'ls out'}, 'name': 'r2'},
+        ]
+        results = self.executor.execute_tools(tools)
+        self.assertEqual([r['output'] for r in results], ['r1', 'w1', 'r2'])
+        self.assertLess(self.calls.index(('end', 'r1')), self.calls.index(('start', 'w1')))
+        self.assertLess(self.calls.index(('end', 'w1')), self.calls.index(('start', 'r2')))
+
+
+class TestCommandApproval(unittest.TestCase):
+    """Approvals are signalled through events instead of polling"""
+
+    def setUp(self):
+        self.executor = IterativeExecutor(pending_commands_store={})
+        self.executor.pending_commands_lock = threading.Lock()
+
+    def test_approve_wakes_waiter_immediately(self):
+        command_id = self.executor.request_command_approval('sudo reboot')['command_id']
+        threading.Timer(0.05, self.executor.resolve_command, args=(command_id, 'approved')).start()
+        started = time.monotonic()
+        self.assertTrue(self.executor.wait_for_approval(command_id, timeout=5))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_timeout_marks_command_expired(self):
+        command_id = self.executor.request_command_approval('sudo reboot')['command_id']
+        self.assertFalse(self.executor.wait_for_approval(command_id, timeout=0.05))
+        self.assertEqual(self.executor.pending_commands_store[command_id]['status'], 'expired')
+        self.assertFalse(self.executor.resolve_command(command_id, 'approved'))
+
+    def test_approval_events_are_pushed(self):
+        command_id = self.executor.request_command_approval('sudo reboot')['command_id']
+        self.executor.resolve_command(command_id, 'rejected')
+        events = self.executor.wait_for_approval_events(0, timeout=0)
+        self.assertEqual([e['event'] for e in events], ['pending', 'resolved'])
+        self.assertEqual(events[1]['data'], {'id': command_id, 'status': 'rejected'})
+        self.assertEqual(self.executor.wait_for_approval_events(events[-1]['seq'], timeout=0.05), [])
+        self.assertFalse(self.executor.wait_for_approval(command_id, timeout=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
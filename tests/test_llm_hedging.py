@@ -0,0 +1,106 @@
+"""
+Tests for hedged LLM requests across models
+"""
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from llm_hedging import HedgedLLMCaller
+from llm_rotation_config import RateLimitMonitor
+from model_router import ModelRouter
+from rate_limiter import MemoryRateLimitBackend
+
+MODELS = [
+    {"id": "m/primary", "rpm": 10, "tpm": 100000, "rpd": 0, "priority": 1, "base_score": 0.5,
+     "type": ["dialog"], "deprecated": False},
+    {"id": "m/backup", "rpm": 1, "tpm": 100000, "rpd": 0, "priority": 2, "base_score": 0.5,
+     "type": ["dialog"], "deprecated": False},
+]
+
+
+class FakeLLM:
+    def __init__(self, model, delay):
+        self.model = model
+        self.delay = delay
+
+
+def fake_call(llm, prompt):
+    time.sleep(llm.delay)
+    return f"{llm.model}: {prompt}"
+
+
+class TestHedgedLLMCaller(unittest.TestCase):
+    """Tests for HedgedLLMCaller"""
+
+    def setUp(self):
+        self.monitor = RateLimitMonitor(MODELS, backend=MemoryRateLimitBackend())
+        self.router = ModelRouter(MODELS, self.monitor)
+        self.backup_delay = 0.01
+        self.caller = HedgedLLMCaller(
+            fake_call,
+            lambda provider, model, temperature: FakeLLM(model, self.backup_delay),
+            self.router,
+            self.monitor,
+            default_delay=0.05,
+            min_delay=0.01,
+        )
+
+    def test_fast_primary_is_not_hedged(self):
+        response, llm = self.caller.call(FakeLLM("m/primary", 0), "hi")
+        self.assertEqual(response, "m/primary: hi")
+        self.assertEqual(llm.model, "m/primary")
+        self.assertEqual(self.caller.get_stats()["hedged"], 0)
+
+    def test_slow_primary_loses_to_backup(self):
+        started = time.monotonic()
+        response, llm = self.caller.call(FakeLLM("m/primary", 1.0), "hi")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(response, "m/backup: hi")
+        self.assertEqual(llm.model, "m/backup")
+        stats = self.router.get_stats()
+        self.assertEqual(stats["m/backup"]["hedge_wins"], 1)
+        self.assertEqual(stats["m/primary"]["hedge_losses"], 1)
+        # Квота запасной модели учтена
+        self.assertEqual(self.monitor.get_usage("m/backup")["rpm"], 1)
+
+    def test_no_hedge_without_quota(self):
+        self.monitor.register_use("m/backup")
+        response, _ = self.caller.call(FakeLLM("m/primary", 0.2), "hi")
+        self.assertEqual(response, "m/primary: hi")
+        self.assertEqual(self.caller.get_stats()["skipped_no_quota"], 1)
+
+    def test_cancel_event_cancels_both_requests(self):
+        events = []
+
+        def cancellable_call(llm, prompt, cancel_event=None):
+            events.append(cancel_event)
+            if cancel_event.wait(llm.delay):
+                raise RuntimeError("cancelled")
+            return f"{llm.model}: {prompt}"
+
+        self.caller.call_func = cancellable_call
+        self.backup_delay = 1.0
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        started = time.monotonic()
+        with self.assertRaises(CancelledError):
+            self.caller.call(FakeLLM("m/primary", 1.0), "hi", cancel_event=cancel_event)
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(self.caller.get_stats()["hedged"], 1)
+        self.assertEqual(events, [cancel_event, cancel_event])
+
+    def test_delay_follows_p95(self):
+        for latency in [0.1, 0.2, 0.3, 0.4, 2.0]:
+            self.router.record_success("m/primary", latency)
+        self.assertEqual(self.caller.hedge_delay("m/primary"), 2.0)
+        self.assertEqual(self.caller.hedge_delay("m/unknown"), 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Tests for the CrewAI server LLM instance pool
+"""
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from llm_pool import LLMPool, run_startup_validation
+
+try:
+    import httpx  # noqa: F401
+    import litellm  # noqa: F401
+    HTTP_AVAILABLE = True
+except ImportError:
+    HTTP_AVAILABLE = False
+
+
+class FakeLLM:
+    def __init__(self, model, temperature):
+        self.model = model
+        self.temperature = temperature
+
+
+class TestLLMPool(unittest.TestCase):
+    """Tests for LLMPool caching and health tracking"""
+
+    def setUp(self):
+        self.created = []
+
+        def factory(model, temperature):
+            llm = FakeLLM(model, temperature)
+            self.created.append(llm)
+            return llm
+
+        self.pool = LLMPool(factory, max_size=2, unhealthy_cooldown=60)
+
+    def test_same_key_reuses_instance(self):
+        first = self.pool.get('gemini', 'gemini/gemini-2.0-flash', 0.7)
+        second = self.pool.get('gemini', 'gemini/gemini-2.0-flash', 0.7)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.created), 1)
+        self.assertIsNot(first, self.pool.get('gemini', 'gemini/gemini-2.0-flash', 0.2))
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_lru_eviction(self):
+        a = self.pool.get('gemini', 'a', 0.7)
+        self.pool.get('gemini', 'b', 0.7)
+        self.pool.get('gemini', 'a', 0.7)  # 'a' становится самым свежим
+        self.pool.get('gemini', 'c', 0.7)  # вытесняет 'b'
+        self.assertIs(self.pool.get('gemini', 'a', 0.7), a)
+        self.pool.get('gemini', 'b', 0.7)
+        self.assertEqual([llm.model for llm in self.created], ['a', 'b', 'c', 'b'])
+        self.assertEqual(self.pool.get_stats()['evictions'], 2)
+
+    def test_mark_unhealthy_drops_instances(self):
+        first = self.pool.get('gemini', 'a', 0.7)
+        self.pool.mark_unhealthy('a', 'RateLimitError 429')
+        self.assertFalse(self.pool.is_healthy('a'))
+        self.assertIn('a', self.pool.get_stats()['unhealthy_models'])
+        self.assertIsNot(self.pool.get('gemini', 'a', 0.7), first)
+
+        self.pool.unhealthy_cooldown = 0
+        self.pool.mark_unhealthy('a', 'again')
+        self.assertTrue(self.pool.is_healthy('a'))
+
+    def test_mark_healthy_resets_failures(self):
+        self.pool.mark_unhealthy('a', 'timeout')
+        self.pool.mark_healthy('a')
+        self.assertTrue(self.pool.is_healthy('a'))
+        self.assertEqual(self.pool.get_stats()['unhealthy_models'], {})
+        self.pool.unhealthy_cooldown = 0
+        self.pool.mark_unhealthy('a', 'again')
+        self.assertEqual(self.pool._health['a']['failures'], 1)
+
+    @unittest.skipUnless(HTTP_AVAILABLE, "httpx/litellm not installed")
+    def test_providers_share_one_http_client(self):
+        import litellm
+        previous, litellm.client_session = litellm.client_session, None
+        try:
+            self.pool.get('gemini', 'a', 0.7)
+            client = litellm.client_session
+            self.assertIsNotNone(client)
+            self.pool.get('openai', 'b', 0.7)
+            self.assertIs(litellm.client_session, client)
+
+            # A process forked after the client was created gets its own client
+            self.pool._http_client_pid = -1
+            self.pool.get('gemini', 'c', 0.7)
+            self.assertIsNot(litellm.client_session, client)
+
+            # A client set by the application is kept
+            own = litellm.client_session = object()
+            self.pool._http_client_pid = -1
+            self.pool.get('gemini', 'd', 0.7)
+            self.assertIs(litellm.client_session, own)
+        finally:
+            litellm.client_session = previous
+
+    def test_concurrent_get_returns_single_instance(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.pool.get('gemini', 'a', 0.7)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len({id(r) for r in results}), 1)
+
+
+class TestStartupValidation(unittest.TestCase):
+    """Startup validation runs in background and records the outcome"""
+
+    def test_failure_is_recorded_not_raised(self):
+        state = {}
+
+        def check():
+            time.sleep(0.05)
+            raise RuntimeError("no api key")
+
+        thread = run_startup_validation(check, state)
+        self.assertEqual(state['status'], 'pending')
+        thread.join(timeout=5)
+        self.assertEqual(state['status'], 'failed')
+        self.assertEqual(state['error'], 'no api key')
+
+    def test_runs_once_per_process(self):
+        calls = []
+        state = {}
+        thread = run_startup_validation(lambda: calls.append(1), state)
+        thread.join(timeout=5)
+        self.assertIsNone(run_startup_validation(lambda: calls.append(1), state))
+        self.assertEqual(calls, [1])
+
+        # State inherited from the parent process (preload_app + fork) is re-validated
+        state['pid'] = -1
+        thread = run_startup_validation(lambda: calls.append(2), state)
+        self.assertIsNotNone(thread)
+        thread.join(timeout=5)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(state['status'], 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for the chat Markdown renderer (single pass, cache, incremental streaming mode)
+"""
+import sys
+import unittest
+from unittest import mock
+from pathlib import Path
+
+# Add UI utils directory to path (the gopiai.ui package itself needs Qt)
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI" / "gopiai" / "ui" / "utils"))
+
+import markdown_renderer
+from markdown_renderer import IncrementalMarkdownRenderer, MarkdownRenderer, split_blocks
+
+SAMPLE = """# Заголовок
+Текст с **жирным**, *курсивом*, `code` и [ссылкой](http://example.com?a=1&b=2).
+
+* один
+* два
+
+```python
+x = "<b>" if a < b else 'y'
+
+print(x)
+```
+---
+a < b & c"""
+
+
+class TestMarkdownRenderer(unittest.TestCase):
+    """Tests for block and inline rendering"""
+
+    def setUp(self):
+        self.renderer = MarkdownRenderer(cache_size=8)
+
+    def test_block_and_inline_markup(self):
+        result = self.renderer.render(SAMPLE)
+        self.assertIn('<h1>Заголовок</h1>', result)
+        self.assertIn('<strong>жирным</strong>', result)
+        self.assertIn('<em>курсивом</em>', result)
+        self.assertIn('<code>code</code>', result)
+        self.assertIn('<a href="http://example.com?a=1&amp;b=2">ссылкой</a>', result)
+        self.assertIn('<ul>\n<li>один</li>\n<li>два</li>\n</ul>', result)
+        self.assertIn('<hr>', result)
+        self.assertIn('<p>a &lt; b &amp; c</p>', result)
+
+    def test_code_blocks_are_escaped_and_kept_together(self):
+        result = self.renderer.render(SAMPLE)
+        self.assertIn('<pre><code>x = &quot;&lt;b&gt;&quot;', result)
+        # A blank line inside a code block does not split it
+        self.assertEqual(len(split_blocks(SAMPLE)), 3)
+        self.assertNotIn('<p>print', result)
+
+    def test_long_code_lines_get_break_opportunities(self):
+        result = self.renderer.render("`" + "x" * 200 + "`")
+        self.assertEqual(result.count('&#8203;'), 2)
+
+    def test_cache_hits_and_eviction(self):
+        self.renderer.render(SAMPLE)
+        misses = self.renderer.get_stats()['misses']
+        self.renderer.render(SAMPLE)
+        stats = self.renderer.get_stats()
+        self.assertEqual(stats['misses'], misses)
+        self.assertGreater(stats['hits'], 0)
+        for i in range(20):
+            self.renderer.render(f"message {i}")
+        self.assertLessEqual(self.renderer.get_stats()['size'], 8)
+
+
+class TestIncrementalMarkdownRenderer(unittest.TestCase):
+    """Streaming mode must produce the same HTML as rendering the whole text"""
+
+    def test_incremental_matches_full_render(self):
+        renderer = MarkdownRenderer()
+        expected = renderer.render(SAMPLE)
+        for chunk_size in (1, 3, 17):
+            stream = IncrementalMarkdownRenderer()
+            for i in range(0, len(SAMPLE), chunk_size):
+                result = stream.feed(SAMPLE[i:i + chunk_size])
+            self.assertEqual(result, expected, chunk_size)
+
+    def test_finished_blocks_are_not_rerendered(self):
+        rendered = []
+        original = markdown_renderer._render_block
+
+        def counting_render_block(lines):
+            rendered.append(lines[0])
+            return original(lines)
+
+        stream = IncrementalMarkdownRenderer()
+        with mock.patch.object(markdown_renderer, '_render_block', counting_render_block):
+            stream.feed("first paragraph\n\nsecond")
+            stream.feed(" grows")
+            result = stream.feed(" more")
+        self.assertEqual(rendered.count("first paragraph"), 1)
+        self.assertEqual(result, "<p>first paragraph</p>\n<p>second grows more</p>")
+        stream.reset()
+        self.assertEqual(stream.feed("new"), "<p>new</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Tests for the server long-term memory service (background txtai indexing, budgeted search, query cache)
+"""
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from memory_service import MemoryService, PendingMessageQueue
+
+try:
+    import numpy as np
+    import txtai  # noqa: F401
+    TXTAI_AVAILABLE = True
+except ImportError:
+    TXTAI_AVAILABLE = False
+
+
+def hashed_vectors(texts):
+    vectors = np.zeros((len(texts), 32), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, sum(word.encode()) % 32] += 1.0
+    return vectors
+
+
+class TestPendingMessageQueue(unittest.TestCase):
+    """Tests for the shared SQLite indexing queue"""
+
+    def test_take_after_and_ack(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pending = PendingMessageQueue(Path(tmpdir) / "queue.db")
+            for i in range(5):
+                pending.put(f"id{i}", {"text": f"message {i}"})
+            first = pending.take(2)
+            self.assertEqual([uid for _, uid, _ in first], ["id0", "id1"])
+            rest = pending.take(10, after=first[-1][0])
+            self.assertEqual([data["text"] for _, _, data in rest], ["message 2", "message 3", "message 4"])
+            pending.ack(first[-1][0])
+            self.assertEqual(pending.count(), 3)
+
+
+@unittest.skipUnless(TXTAI_AVAILABLE, "txtai not installed")
+class TestMemoryService(unittest.TestCase):
+    """Tests against a real txtai index with a deterministic vector function"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmpdir.name) / "vectors"
+        self.services = []
+
+    def tearDown(self):
+        for service in self.services:
+            service.stop()
+        self.tmpdir.cleanup()
+
+    def _service(self, **kwargs):
+        config = {"method": "external", "transform": hashed_vectors, "backend": "numpy"}
+        service = MemoryService(self.index_path, config=config, flush_interval=0.05, min_score=0.0,
+                                search_timeout=5.0, **kwargs)
+        self.services.append(service)
+        self.assertTrue(service.wait_ready(10))
+        return service
+
+    def _wait_indexed(self, service, count):
+        deadline = time.monotonic() + 10
+        while service.get_stats()["indexed"] < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertGreaterEqual(service.get_stats()["indexed"], count)
+
+    def test_indexes_in_background_and_finds_relevant_messages(self):
+        service = self._service()
+        self.assertTrue(service.add_message("s1", "user", "как настроить gunicorn воркеры"))
+        self.assertTrue(service.add_message("s1", "assistant", "рецепт борща со сметаной"))
+        self.assertTrue(service.add_message("s2", "user", "gunicorn воркеры и preload"))
+        self._wait_indexed(service, 3)
+
+        results = service.search("gunicorn воркеры", limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all("gunicorn" in result["text"] for result in results))
+        self.assertEqual({result["session_id"] for result in results}, {"s1", "s2"})
+
+    def test_query_vectors_are_cached(self):
+        service = self._service()
+        service.add_message("s1", "user", "первое сообщение")
+        self._wait_indexed(service, 1)
+        service.search("запрос")
+        misses = service.get_stats()["query_cache_misses"]
+        service.search("запрос")
+        stats = service.get_stats()
+        self.assertEqual(stats["query_cache_misses"], misses)
+        self.assertGreaterEqual(stats["query_cache_hits"], 1)
+
+    def test_search_respects_latency_budget_while_index_is_busy(self):
+        service = self._service()
+        service.add_message("s1", "user", "сообщение")
+        self._wait_indexed(service, 1)
+        with service._lock:
+            started = time.perf_counter()
+            self.assertEqual(service.search("сообщение", timeout=0.05), [])
+            self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(service.get_stats()["timeouts"], 1)
+
+    def test_slow_search_does_not_block_past_budget(self):
+        service = self._service()
+        service.add_message("s1", "user", "сообщение")
+        self._wait_indexed(service, 1)
+        search = service.embeddings.search
+
+        def slow_search(*args, **kwargs):
+            time.sleep(0.5)
+            return search(*args, **kwargs)
+
+        service.embeddings.search = slow_search
+        started = time.perf_counter()
+        self.assertEqual(service.search("сообщение", timeout=0.05), [])
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(service.get_stats()["timeouts"], 1)
+
+        # The next search runs once the slow one has finished
+        service.embeddings.search = search
+        time.sleep(0.5)
+        self.assertEqual(len(service.search("сообщение", timeout=5.0)), 1)
+
+    def test_stop_saves_index_and_clears_queue(self):
+        service = self._service(save_interval=3600)
+        for i in range(20):
+            service.add_message("s1", "user", f"сообщение номер {i}")
+        # Duplicates collapse into one index entry
+        service.add_message("s1", "user", "сообщение номер 0")
+        service.stop()
+        self.assertEqual(service.queue.count(), 0)
+
+        reloaded = self._service()
+        self.assertEqual(reloaded.embeddings.count(), 20)
+        # The writer lock is released on stop
+        deadline = time.monotonic() + 5
+        while not reloaded.is_writer and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(reloaded.is_writer)
+
+    def test_reload_skips_index_being_saved(self):
+        service = self._service(reload_interval=0)
+        reloads = service.get_stats()["reloads"]
+        # Odd generation: the writer is in the middle of embeddings.save()
+        service._write_generation(3)
+        service._reload_if_changed()
+        self.assertEqual(service.get_stats()["reloads"], reloads)
+        service._write_generation(4)
+        service._reload_if_changed()
+        service._reload_if_changed()
+        self.assertEqual(service.get_stats()["reloads"], reloads + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
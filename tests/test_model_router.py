@@ -0,0 +1,90 @@
+"""
+Tests for the unified latency- and quota-aware model router
+"""
+import sys
+import unittest
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from llm_rotation_config import RateLimitMonitor
+from model_router import ModelHealth, ModelRouter
+from rate_limiter import MemoryRateLimitBackend
+
+
+def make_model(model_id, priority, rpm=10, base_score=0.5, types=("dialog",)):
+    return {"id": model_id, "rpm": rpm, "tpm": 100000, "rpd": 0, "priority": priority,
+            "base_score": base_score, "type": list(types), "deprecated": False}
+
+
+class TestModelRouter(unittest.TestCase):
+    """Tests for ModelRouter selection and health tracking"""
+
+    def setUp(self):
+        self.models = [
+            make_model("m/primary", 1),
+            make_model("m/secondary", 2, base_score=0.9),
+            make_model("m/code_only", 3, types=("code",)),
+        ]
+        self.monitor = RateLimitMonitor(self.models, backend=MemoryRateLimitBackend())
+        self.router = ModelRouter(self.models, self.monitor, circuit_breaker_threshold=2)
+
+    def test_priority_breaks_ties_and_candidates_are_indexed(self):
+        self.assertEqual(self.router.select("dialog"), "m/primary")
+        self.assertEqual(self.router.select("code"), "m/code_only")
+        self.assertIsNone(self.router.select("embedding"))
+
+    def test_prefers_lower_latency(self):
+        self.router.record_success("m/primary", 8.0)
+        self.router.record_success("m/secondary", 1.0)
+        self.assertEqual(self.router.select("dialog"), "m/secondary")
+        decision = self.router.get_decisions(1)[0]
+        self.assertEqual(decision["chosen"], "m/secondary")
+        scores = {c["model"]: c["score"] for c in decision["candidates"]}
+        self.assertLess(scores["m/secondary"], scores["m/primary"])
+
+    def test_hedge_loser_latency_is_raised_to_elapsed(self):
+        self.router.record_success("m/primary", 1.0)
+        self.router.record_hedge_result("m/secondary", "m/primary", 5.0)
+        self.assertEqual(self.router.get_stats()["m/primary"]["avg_response_time"], 5.0)
+        # A latency already above elapsed is kept
+        self.router.record_hedge_result("m/secondary", "m/primary", 3.0)
+        self.assertEqual(self.router.get_stats()["m/primary"]["avg_response_time"], 5.0)
+        # A model without latency samples starts from elapsed
+        self.router.record_hedge_result("m/primary", "m/code_only", 2.0)
+        self.assertEqual(self.router.get_stats()["m/code_only"]["avg_response_time"], 2.0)
+
+    def test_intelligence_priority_uses_base_score(self):
+        self.assertEqual(self.router.select("dialog", intelligence_priority=True), "m/secondary")
+
+    def test_quota_exhaustion_routes_elsewhere(self):
+        for _ in range(10):
+            self.monitor.register_use("m/primary")
+        self.assertEqual(self.router.select("dialog"), "m/secondary")
+        self.assertEqual(self.router.select("dialog", exclude_models=["m/secondary"]), "m/primary")
+
+    def test_rate_limit_error_blacklists_model(self):
+        self.router.record_failure("m/primary", "RateLimitError: 429 quota exceeded")
+        self.assertTrue(self.monitor.is_model_blocked_safe("m/primary"))
+        self.assertEqual(self.router.get_stats()["m/primary"]["health"], ModelHealth.RATE_LIMITED.value)
+        explained = {c["model"]: c for c in self.router.explain("dialog")}
+        self.assertEqual(explained["m/primary"]["excluded"], "blacklisted")
+        self.assertEqual(self.router.select("dialog"), "m/secondary")
+
+    def test_circuit_breaker_opens_and_success_closes(self):
+        self.router.record_failure("m/primary", "some error")
+        self.router.record_failure("m/primary", "some error")
+        explained = {c["model"]: c for c in self.router.explain("dialog")}
+        self.assertEqual(explained["m/primary"]["excluded"], "circuit_open")
+        self.router.record_success("m/primary", 0.5)
+        self.assertEqual(self.router.select("dialog"), "m/primary")
+
+    def test_refresh_drops_deprecated(self):
+        self.models[0]["deprecated"] = True
+        self.router.refresh()
+        self.assertEqual(self.router.select("dialog"), "m/secondary")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Tests for the streaming chat transcript importer (token chunks, dedup by content hash, checkpoints)
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add repository root to path (the importer is a top-level script)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from add_chat_to_rag import ChatImporter, iter_chunks, iter_pieces
+
+try:
+    import numpy as np
+    from txtai import Embeddings
+    TXTAI_AVAILABLE = True
+except ImportError:
+    TXTAI_AVAILABLE = False
+
+
+def count_words(piece):
+    return 1 if piece.strip() else 0
+
+
+def transcript(lines):
+    return "".join(f"user: вопрос {i} про тему {i % 7}\nChatGPT: ответ {i} с деталями\n" for i in range(lines))
+
+
+class TestChunking(unittest.TestCase):
+    """Tests for streaming chunking on token boundaries"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "chat.txt"
+        self.path.write_text(transcript(30), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_chunks_have_size_and_overlap(self):
+        chunks = list(iter_chunks(iter_pieces(self.path), count_words, chunk_tokens=20, overlap_tokens=5))
+        words = [len(text.split()) for text, _ in chunks]
+        self.assertTrue(all(count == 20 for count in words[:-1]))
+        # Each chunk starts with the last words of the previous one
+        for (previous, _), (current, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.split()[-5:], current.split()[:5])
+        # The text is covered without gaps
+        self.assertEqual(chunks[-1][0].split()[-1], self.path.read_text(encoding="utf-8").split()[-1])
+
+    def test_resume_offset_reproduces_following_chunks(self):
+        chunks = list(iter_chunks(iter_pieces(self.path), count_words, chunk_tokens=20, overlap_tokens=5))
+        _, offset = chunks[3]
+        resumed = list(iter_chunks(iter_pieces(self.path, offset), count_words, chunk_tokens=20, overlap_tokens=5))
+        self.assertEqual([text for text, _ in resumed], [text for text, _ in chunks[4:]])
+
+
+def hashed_vectors(texts):
+    vectors = np.zeros((len(texts), 16), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            vectors[row, hash(word) % 16] += 1.0
+    return vectors
+
+
+@unittest.skipUnless(TXTAI_AVAILABLE, "txtai not installed")
+class TestChatImporter(unittest.TestCase):
+    """Tests for idempotent upserts and resumable imports into a txtai index"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmpdir.name)
+        self.path = self.dir / "chat.txt"
+        self.path.write_text(transcript(60), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _importer(self, transform=hashed_vectors, **kwargs):
+        embeddings = Embeddings(method="external", transform=transform, backend="numpy", content=True, hybrid=True)
+        index = self.dir / "index"
+        if embeddings.exists(str(index)):
+            embeddings.load(str(index), config={"transform": transform})
+        kwargs.setdefault("batch_size", 4)
+        kwargs.setdefault("save_every", 1)
+        return ChatImporter(index, chunk_tokens=20, overlap_tokens=5, embeddings=embeddings,
+                            count_tokens=count_words, **kwargs)
+
+    def test_reimport_adds_nothing(self):
+        first = self._importer().import_file(self.path)
+        self.assertGreater(first["added"], 0)
+        self.assertEqual(first["added"], first["chunks"])
+
+        importer = self._importer()
+        self.assertEqual(importer.import_file(self.path)["chunks"], 0)
+        again = importer.import_file(self.path, restart=True)
+        self.assertEqual(again["added"], 0)
+        self.assertEqual(again["duplicates"], first["chunks"])
+        self.assertEqual(importer.embeddings.count(), first["added"])
+
+    def test_appended_transcript_is_imported_incrementally(self):
+        first = self._importer().import_file(self.path)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(transcript(90)[len(transcript(60)):])
+        importer = self._importer()
+        second = importer.import_file(self.path)
+        self.assertGreater(second["added"], 0)
+        self.assertLess(second["chunks"], first["chunks"])
+        self.assertEqual(importer.embeddings.count(), first["added"] + second["added"])
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        calls = []
+
+        def failing(texts):
+            calls.append(len(texts))
+            if len(calls) > 3:
+                raise RuntimeError("interrupted")
+            return hashed_vectors(texts)
+
+        interrupted = self._importer(transform=failing)
+        with self.assertRaises(RuntimeError):
+            interrupted.import_file(self.path)
+        # A killed process releases its database handle
+        interrupted.embeddings.close()
+        importer = self._importer()
+        checkpoint = importer.state.get(str(self.path.resolve()))
+        self.assertGreater(checkpoint["offset"], 0)
+        self.assertFalse(checkpoint["done"])
+
+        resumed = importer.import_file(self.path)
+        total = importer.embeddings.count()
+        clean = list(iter_chunks(iter_pieces(self.path), count_words, chunk_tokens=20, overlap_tokens=5))
+        self.assertLess(resumed["chunks"], len(clean))
+        self.assertEqual(total, len(clean))
+        self.assertTrue(importer.state.get(str(self.path.resolve()))["done"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for the sliding-window rate limiter used by the LLM rotation config
+"""
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+import rate_limiter
+from rate_limiter import MemoryRateLimitBackend, SQLiteRateLimitBackend
+from llm_rotation_config import RateLimitMonitor
+
+MODELS = [
+    {"id": "test/fast", "rpm": 2, "tpm": 100, "rpd": 3},
+    {"id": "test/unlimited_day", "rpm": 5, "tpm": 1000, "rpd": 0},
+]
+
+
+class TestSlidingWindow(unittest.TestCase):
+    """The window slides instead of resetting on minute boundaries"""
+
+    def test_no_burst_across_boundary(self):
+        backend = MemoryRateLimitBackend()
+        limits = {"rpm": 2, "tpm": 1000, "rpd": 0}
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1000.0):
+            self.assertEqual(backend.check("m", limits, reserve=True), 0.0)
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1059.0):
+            self.assertEqual(backend.check("m", limits, reserve=True), 0.0)
+        # Фиксированный бакет разрешил бы здесь еще два запроса, скользящее окно - только один
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1061.0):
+            self.assertEqual(backend.check("m", limits, reserve=True), 0.0)
+            self.assertAlmostEqual(backend.check("m", limits), 58.0)
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1119.5):
+            self.assertEqual(backend.check("m", limits), 0.0)
+
+    def test_tpm_wait_and_impossible_request(self):
+        backend = MemoryRateLimitBackend()
+        limits = {"rpm": 100, "tpm": 100, "rpd": 0}
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1000.0):
+            backend.record("m", 60)
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1010.0):
+            backend.record("m", 30)
+            self.assertAlmostEqual(backend.check("m", limits, tokens=20), 50.0)
+            self.assertEqual(backend.check("m", limits, tokens=500), float('inf'))
+            self.assertEqual(backend.usage("m"), {"rpm": 2, "tpm": 90, "rpd": 2})
+
+
+class TestRateLimitMonitor(unittest.TestCase):
+    """Tests for RateLimitMonitor on top of the limiter backends"""
+
+    def setUp(self):
+        self.monitor = RateLimitMonitor(MODELS, backend=MemoryRateLimitBackend())
+
+    def test_rpm_and_rpd_limits(self):
+        self.assertTrue(self.monitor.acquire("test/fast"))
+        self.assertTrue(self.monitor.acquire("test/fast"))
+        self.assertFalse(self.monitor.can_use("test/fast"))
+        self.assertFalse(self.monitor.acquire("test/fast", timeout=0.1))
+        metrics = self.monitor.get_metrics()["test/fast"]
+        self.assertEqual(metrics["allowed"], 2)
+        self.assertEqual(metrics["usage"]["rpm"], 2)
+        self.assertGreaterEqual(metrics["timeouts"], 1)
+
+    def test_acquire_waits_for_slot(self):
+        monitor = RateLimitMonitor([{"id": "m", "rpm": 1, "tpm": 100, "rpd": 0}], backend=MemoryRateLimitBackend())
+        with mock.patch.object(rate_limiter.time, 'time', return_value=time.time() - 59.8):
+            self.assertTrue(monitor.acquire("m"))
+        started = time.monotonic()
+        self.assertTrue(monitor.acquire("m", timeout=2))
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_blacklisted_model_fails_fast(self):
+        self.monitor.mark_model_unavailable("test/fast", duration=60)
+        started = time.monotonic()
+        self.assertFalse(self.monitor.acquire("test/fast", timeout=5))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIn("test/fast", self.monitor.get_blacklist_status())
+
+    def test_concurrent_acquire_respects_rpm(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.monitor.acquire("test/unlimited_day", timeout=0)))
+            for _ in range(20)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results.count(True), 5)
+
+    def test_unknown_model_is_denied(self):
+        self.assertFalse(self.monitor.can_use("test/missing"))
+        self.assertFalse(self.monitor.acquire("test/missing", timeout=0))
+        self.assertEqual(self.monitor.time_until_available("test/missing"), float('inf'))
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """The SQLite backend shares quotas between monitors (gunicorn workers)"""
+
+    def test_quota_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir) / "limits.db"
+            first = RateLimitMonitor(MODELS, backend=SQLiteRateLimitBackend(db_path))
+            second = RateLimitMonitor(MODELS, backend=SQLiteRateLimitBackend(db_path))
+            self.assertTrue(first.acquire("test/fast", tokens=10))
+            self.assertTrue(second.acquire("test/fast", tokens=10))
+            self.assertFalse(first.acquire("test/fast", timeout=0))
+            self.assertEqual(second.get_usage("test/fast"), {"rpm": 2, "tpm": 20, "rpd": 2})
+
+    def test_checks_without_reserve_do_not_take_write_lock(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir) / "limits.db"
+            monitor = RateLimitMonitor(MODELS, backend=SQLiteRateLimitBackend(db_path))
+            self.assertTrue(monitor.acquire("test/fast", tokens=10))
+            # Another worker holds the write lock, routing checks still answer immediately
+            writer = SQLiteRateLimitBackend(db_path)._connect()
+            writer.execute("BEGIN IMMEDIATE")
+            try:
+                started = time.monotonic()
+                self.assertEqual(monitor.time_until_available("test/fast", tokens=10), 0.0)
+                self.assertEqual(monitor.get_usage("test/fast")["rpm"], 1)
+                self.assertLess(time.monotonic() - started, 1)
+            finally:
+                writer.execute("ROLLBACK")
+
+
+if __name__ == '__main__':
+    unittest.main()
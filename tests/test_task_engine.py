@@ -0,0 +1,273 @@
+"""
+Tests for the CrewAI server task engine (bounded worker pool + task store)
+"""
+import sys
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from pathlib import Path
+
+# Add CrewAI server directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-CrewAI"))
+
+from task_engine import (
+    INTERRUPTED_ERROR,
+    MemoryTaskStore,
+    SQLiteTaskStore,
+    TaskEngine,
+    TaskQueueFullError,
+    TaskStatus,
+    TokenEventBuffer,
+)
+
+
+class TestSQLiteTaskStore(unittest.TestCase):
+    """Tests for the SQLite task store"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "tasks.db"
+        self.store = SQLiteTaskStore(self.db_path, ttl_seconds=60)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_create_and_get(self):
+        """Status enums are stored by name"""
+        self.store.create({'task_id': 't1', 'status': TaskStatus.PENDING, 'message': 'hi'})
+        task = self.store.get('t1')
+        self.assertEqual(task['status'], 'PENDING')
+        self.assertEqual(task['message'], 'hi')
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_update_visible_from_other_store(self):
+        """A second store on the same file sees updates, as another gunicorn worker would"""
+        other = SQLiteTaskStore(self.db_path)
+        self.store.create({'task_id': 't1', 'status': TaskStatus.PENDING})
+        self.assertTrue(other.update('t1', status=TaskStatus.COMPLETED, result='done'))
+        task = self.store.get('t1')
+        self.assertEqual(task['status'], 'COMPLETED')
+        self.assertEqual(task['result'], 'done')
+        self.assertFalse(other.update('missing', status=TaskStatus.FAILED))
+
+    def test_ttl_eviction_keeps_active_tasks(self):
+        """Only finished tasks older than TTL are evicted"""
+        self.store.create({'task_id': 'old_done', 'status': TaskStatus.COMPLETED})
+        self.store.create({'task_id': 'old_running', 'status': TaskStatus.PROCESSING})
+        evicted = self.store.evict_expired(now=time.time() + 120)
+        self.assertEqual(evicted, 1)
+        self.assertIsNone(self.store.get('old_done'))
+        self.assertIsNotNone(self.store.get('old_running'))
+        self.assertEqual(self.store.count_active(), 1)
+
+    def test_abandoned_tasks_are_marked_interrupted(self):
+        """Tasks left PENDING/PROCESSING by a dead worker fail after the stale timeout"""
+        self.store.create({'task_id': 'running', 'status': TaskStatus.PROCESSING})
+        self.store.create({'task_id': 'queued', 'status': TaskStatus.PENDING})
+        cursor = self.store.current_version()
+
+        # A restarted worker opening the same file cleans up on start
+        restarted = SQLiteTaskStore(self.db_path, ttl_seconds=60, stale_seconds=0)
+        for task_id in ('running', 'queued'):
+            task = self.store.get(task_id)
+            self.assertEqual(task['status'], 'FAILED')
+            self.assertTrue(task['error'].startswith('interrupted'))
+        self.assertEqual(self.store.count_active(), 0)
+        self.assertEqual(len(restarted.changes_since(cursor)['tasks']), 2)
+
+        # Interrupted tasks are then evicted like any other finished task
+        self.assertEqual(restarted.evict_expired(now=time.time() + 120), 2)
+
+    def test_memory_store_evicts_on_create(self):
+        """The memory store stamps created_at and evicts on write like the SQLite store"""
+        store = MemoryTaskStore(ttl_seconds=60, stale_seconds=60)
+        store.create({'task_id': 'done', 'status': TaskStatus.COMPLETED})
+        store.create({'task_id': 'running', 'status': TaskStatus.PROCESSING})
+        self.assertIn('created_at', store.get('done'))
+        store._last_eviction = 0.0
+        with unittest.mock.patch('task_engine.time.time', return_value=time.time() + 120):
+            store.create({'task_id': 'new', 'status': TaskStatus.PENDING})
+        self.assertIsNone(store.get('done'))
+        self.assertEqual(store.get('running')['error'], INTERRUPTED_ERROR)
+        self.assertEqual(store.count_active(), 1)
+
+    def test_event_log_is_ordered_and_resumable(self):
+        """Events are read back in order and can be resumed after a sequence number"""
+        self.store.create({'task_id': 't1', 'status': TaskStatus.PENDING})
+        first = self.store.publish_event('t1', 'progress', {'progress': 10})
+        self.store.publish_event('t1', 'token', {'text': 'Hel'})
+        self.store.publish_event('t1', 'token', {'text': 'lo'})
+        events = self.store.get_events('t1')
+        self.assertEqual([e['event'] for e in events], ['progress', 'token', 'token'])
+        resumed = self.store.get_events('t1', after_seq=first)
+        self.assertEqual(''.join(e['data']['text'] for e in resumed), 'Hello')
+
+    def test_changed_tasks_since_cursor(self):
+        """Every create/update gets a new version; list_changed returns only newer tasks"""
+        for store in (self.store, MemoryTaskStore()):
+            store.create({'task_id': 't1', 'status': TaskStatus.PENDING})
+            store.create({'task_id': 't2', 'status': TaskStatus.PENDING})
+            cursor = store.current_version()
+            self.assertEqual(store.list_changed(cursor), [])
+            store.update('t1', status=TaskStatus.COMPLETED)
+            changed = store.list_changed(cursor)
+            self.assertEqual([t['task_id'] for t in changed], ['t1'])
+            self.assertEqual(changed[0]['version'], store.current_version())
+            self.assertEqual([t['task_id'] for t in store.list_changed(0)], ['t2', 't1'])
+            self.assertEqual(len(store.list_changed(0, limit=1)), 1)
+
+    def test_version_survives_eviction(self):
+        """The version counter does not go back when the newest tasks are evicted"""
+        self.store.create({'task_id': 't1', 'status': TaskStatus.COMPLETED})
+        version = self.store.current_version()
+        self.store.evict_expired(now=time.time() + 120)
+        # Eviction itself is a change: the removal record gets the next version
+        self.assertEqual(SQLiteTaskStore(self.db_path).current_version(), version + 1)
+        self.store.create({'task_id': 't2', 'status': TaskStatus.PENDING})
+        self.assertGreater(self.store.get('t2')['version'], version + 1)
+
+    def test_evicted_tasks_are_reported_as_removed(self):
+        """Deltas since a cursor list evicted task ids; expired removal records force a full list"""
+        for store in (self.store, MemoryTaskStore(ttl_seconds=60)):
+            store.create({'task_id': 'done', 'status': TaskStatus.COMPLETED})
+            store.create({'task_id': 'running', 'status': TaskStatus.PROCESSING})
+            cursor = store.current_version()
+            now = time.time() + 120
+            self.assertEqual(store.evict_expired(now=now), 1)
+            store.update('running', progress=50)
+
+            delta = store.changes_since(cursor)
+            self.assertEqual(delta['removed'], ['done'])
+            self.assertEqual([t['task_id'] for t in delta['tasks']], ['running'])
+            self.assertEqual(delta['cursor'], store.current_version())
+
+            # Changes and removals are cut in version order, the cursor does not skip records
+            first = store.changes_since(cursor, limit=1)
+            self.assertEqual((first['tasks'], first['removed']), ([], ['done']))
+            self.assertEqual([t['task_id'] for t in store.changes_since(first['cursor'])['tasks']], ['running'])
+
+            # Removal records live as long as finished tasks
+            store.evict_expired(now=now + 120)
+            self.assertEqual(store.changes_since(delta['cursor'])['removed'], [])
+            self.assertIsNone(store.changes_since(cursor))
+            self.assertIsNone(store.changes_since(store.current_version() + 1))
+
+
+class TestTaskEvents(unittest.TestCase):
+    """Tests for task event streaming helpers"""
+
+    def test_wait_for_events_wakes_on_publish(self):
+        store = MemoryTaskStore()
+        threading.Timer(0.05, store.publish_event, args=('t1', 'iteration', {'iteration': 1})).start()
+        started = time.monotonic()
+        events = store.wait_for_events('t1', timeout=2)
+        self.assertEqual(events[0]['event'], 'iteration')
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_token_buffer_coalesces_tokens(self):
+        store = MemoryTaskStore()
+        buffer = TokenEventBuffer(store, 't1', min_chars=5, max_delay=60)
+        for token in ['a', 'b', 'c', 'de', 'f']:
+            buffer(token)
+        buffer.flush()
+        texts = [e['data']['text'] for e in store.get_events('t1')]
+        self.assertEqual(texts, ['abcde', 'f'])
+
+    def test_engine_publishes_done_event(self):
+        store = MemoryTaskStore()
+        engine = TaskEngine(store, max_workers=1, max_queue_depth=1)
+
+        def work(task_id):
+            store.update(task_id, status=TaskStatus.COMPLETED, result='ok')
+
+        engine.submit({'task_id': 't1'}, work).result(timeout=5)
+        events = store.get_events('t1')
+        self.assertEqual(events[0]['event'], 'status')
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertEqual(events[-1]['data']['status'], 'COMPLETED')
+        self.assertEqual(events[-1]['data']['result'], 'ok')
+        engine.shutdown()
+
+
+class TestTaskEngine(unittest.TestCase):
+    """Tests for the bounded worker pool"""
+
+    def test_task_runs_and_records_metrics(self):
+        store = MemoryTaskStore()
+        engine = TaskEngine(store, max_workers=2, max_queue_depth=2)
+
+        def work(task_id, value):
+            store.update(task_id, status=TaskStatus.COMPLETED, result=value * 2)
+
+        engine.submit({'task_id': 't1'}, work, 21).result(timeout=5)
+        task = store.get('t1')
+        self.assertEqual(task['status'], 'COMPLETED')
+        self.assertEqual(task['result'], 42)
+        self.assertIn('run_time', task['metrics'])
+        self.assertIn('queue_time', task['metrics'])
+        self.assertEqual(engine.get_stats()['completed'], 1)
+        engine.shutdown()
+
+    def test_exception_marks_task_failed(self):
+        store = MemoryTaskStore()
+        engine = TaskEngine(store, max_workers=1, max_queue_depth=1)
+
+        def work(task_id):
+            raise RuntimeError("boom")
+
+        engine.submit({'task_id': 't1'}, work).result(timeout=5)
+        task = store.get('t1')
+        self.assertEqual(task['status'], 'FAILED')
+        self.assertEqual(task['error'], 'boom')
+        self.assertEqual(engine.get_stats()['failed'], 1)
+        engine.shutdown()
+
+    def test_backpressure_when_queue_full(self):
+        store = MemoryTaskStore()
+        engine = TaskEngine(store, max_workers=1, max_queue_depth=1)
+        release = threading.Event()
+
+        def work(task_id):
+            release.wait(timeout=5)
+
+        futures = [engine.submit({'task_id': f't{i}'}, work) for i in range(2)]
+        with self.assertRaises(TaskQueueFullError):
+            engine.submit({'task_id': 't_overflow'}, work)
+        self.assertIsNone(store.get('t_overflow'))
+        self.assertEqual(engine.get_stats()['rejected'], 1)
+
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        # Capacity is released once tasks finish
+        engine.submit({'task_id': 't_after'}, work).result(timeout=5)
+        engine.shutdown()
+
+    def test_store_errors_release_capacity_and_close_stream(self):
+        store = MemoryTaskStore()
+        engine = TaskEngine(store, max_workers=1, max_queue_depth=0)
+        calls = []
+
+        def work(task_id):
+            calls.append(task_id)
+
+        # "database is locked" on every update after the task was created
+        with unittest.mock.patch.object(store, 'update', side_effect=sqlite3.OperationalError("database is locked")):
+            engine.submit({'task_id': 't1'}, work).result(timeout=5)
+        self.assertEqual(calls, [])
+        self.assertEqual(engine.get_stats()['inflight'], 0)
+        self.assertEqual(engine.get_stats()['failed'], 1)
+        done = [e for e in store.get_events('t1') if e['event'] == 'done']
+        self.assertEqual(done[0]['data']['status'], 'FAILED')
+
+        # The slot was released, the next task runs
+        engine.submit({'task_id': 't2'}, work).result(timeout=5)
+        self.assertEqual(calls, ['t2'])
+        engine.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
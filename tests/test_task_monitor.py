@@ -0,0 +1,59 @@
+"""
+Tests for the task monitor list model (incremental changes and removal of evicted tasks)
+"""
+import sys
+import unittest
+from pathlib import Path
+
+# Add UI package directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI"))
+
+try:
+    from PySide6.QtCore import QCoreApplication
+    from gopiai.ui.components.task_monitor import TaskIdRole, TaskListModel
+    UI_AVAILABLE = True
+except ImportError:
+    UI_AVAILABLE = False
+
+
+@unittest.skipUnless(UI_AVAILABLE, "GopiAI UI (PySide6) not available")
+class TestTaskListModel(unittest.TestCase):
+    """Tests for TaskListModel.apply_changes"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.model = TaskListModel()
+        self.role = TaskIdRole
+        self.model.set_tasks([
+            {'task_id': 'a', 'status': 'COMPLETED', 'created_at': 1},
+            {'task_id': 'b', 'status': 'PROCESSING', 'created_at': 2},
+            {'task_id': 'c', 'status': 'PENDING', 'created_at': 3},
+        ])
+
+    def ids(self):
+        return [self.model.index(row).data(self.role) for row in range(self.model.rowCount())]
+
+    def test_apply_changes_updates_inserts_and_removes(self):
+        removed_rows = []
+        self.model.rowsRemoved.connect(lambda parent, first, last: removed_rows.append(first))
+
+        self.model.apply_changes(
+            [{'task_id': 'b', 'status': 'COMPLETED', 'created_at': 2},
+             {'task_id': 'd', 'status': 'PENDING', 'created_at': 4}],
+            removed=['a', 'missing'],
+        )
+        self.assertEqual(self.ids(), ['d', 'c', 'b'])
+        self.assertEqual(removed_rows, [3])
+        self.assertEqual(self.model.status_counts()['completed'], 1)
+
+        # The row index stays consistent after removal
+        self.model.apply_changes([{'task_id': 'b', 'status': 'FAILED', 'created_at': 2}], removed=['c'])
+        self.assertEqual(self.ids(), ['d', 'b'])
+        self.assertEqual(self.model.status_counts()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
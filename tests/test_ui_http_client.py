@@ -0,0 +1,145 @@
+"""
+Tests for the shared UI HTTP client (connection pool, GET cache, request coalescing)
+"""
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add UI utils directory to path (the gopiai.ui package itself needs Qt)
+sys.path.insert(0, str(Path(__file__).parent.parent / "GopiAI-UI" / "gopiai" / "ui" / "utils"))
+
+from http_client import UIHttpClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = {}
+    delay = 0.0
+    # (path, hit) -> Event: the reply to that hit waits until the event is set
+    gates = {}
+
+    def _reply(self):
+        hit = _Handler.hits[self.path] = _Handler.hits.get(self.path, 0) + 1
+        time.sleep(_Handler.delay)
+        gate = _Handler.gates.get((self.path, hit))
+        if gate is not None:
+            gate.wait(5)
+        body = f'{{"path": "{self.path}", "hit": {hit}}}'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._reply()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUIHttpClient(unittest.TestCase):
+    """Tests against a local HTTP server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _Handler.hits = {}
+        _Handler.delay = 0.0
+        _Handler.gates = {}
+        self.client = UIHttpClient(cache_ttl=60)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_cached_paths_cost_one_round_trip(self):
+        for _ in range(3):
+            response = self.client.get(f"{self.base}/api/tools")
+            self.assertEqual(response.json()["hit"], 1)
+        self.assertEqual(_Handler.hits["/api/tools"], 1)
+        self.assertEqual(self.client.get_stats()["cache_hits"], 2)
+
+        # Query parameters are part of the cache key
+        self.client.get(f"{self.base}/internal/models", params={"provider": "gemini"})
+        self.client.get(f"{self.base}/internal/models", params={"provider": "openai"})
+        self.assertEqual(_Handler.hits["/internal/models?provider=gemini"], 1)
+        self.assertEqual(_Handler.hits["/internal/models?provider=openai"], 1)
+
+    def test_force_and_uncached_paths_hit_server(self):
+        self.client.get(f"{self.base}/api/tools")
+        self.assertEqual(self.client.get(f"{self.base}/api/tools", force=True).json()["hit"], 2)
+        self.client.get(f"{self.base}/api/tasks")
+        self.client.get(f"{self.base}/api/tasks")
+        self.assertEqual(_Handler.hits["/api/tasks"], 2)
+
+    def test_post_invalidates_related_paths(self):
+        self.client.get(f"{self.base}/api/tools")
+        self.client.get(f"{self.base}/api/agents")
+        self.client.post(f"{self.base}/api/tools/toggle", json={"tool_name": "x", "enabled": True})
+        self.assertEqual(self.client.get(f"{self.base}/api/tools").json()["hit"], 2)
+        self.assertEqual(self.client.get(f"{self.base}/api/agents").json()["hit"], 1)
+
+    def test_concurrent_identical_gets_are_coalesced(self):
+        _Handler.delay = 0.3
+        results = []
+
+        def fetch():
+            results.append(self.client.get(f"{self.base}/internal/state").json()["hit"])
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(_Handler.hits["/internal/state"], 1)
+        self.assertEqual(self.client.get_stats()["coalesced"], 4)
+
+    def test_gets_started_before_a_write_are_not_reused(self):
+        # The first GET is answered only after the POST and a later GET have finished
+        gate = _Handler.gates[("/api/tools", 1)] = threading.Event()
+        results = {}
+        before = threading.Thread(target=lambda: results.update(
+            before=self.client.get(f"{self.base}/api/tools").json()["hit"]))
+        before.start()
+        while not _Handler.hits.get("/api/tools"):
+            time.sleep(0.01)
+
+        self.client.post(f"{self.base}/api/tools/toggle", json={"tool_name": "x", "enabled": True})
+        # Does not join the GET that started before the POST
+        self.assertEqual(self.client.get(f"{self.base}/api/tools").json()["hit"], 2)
+        gate.set()
+        before.join()
+
+        self.assertEqual(results["before"], 1)
+        self.assertEqual(self.client.get_stats()["coalesced"], 0)
+        # The older response does not replace the cached one
+        self.assertEqual(self.client.get(f"{self.base}/api/tools").json()["hit"], 2)
+        self.assertEqual(_Handler.hits["/api/tools"], 2)
+
+    def test_failed_requests_are_not_cached(self):
+        import requests
+        with self.assertRaises(requests.RequestException):
+            self.client.get("http://127.0.0.1:1/api/tools", timeout=1)
+        self.assertEqual(self.client.get_stats()["cache_size"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()